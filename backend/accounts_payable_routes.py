@@ -10,6 +10,8 @@ from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from bson import ObjectId
+from result_cache import cached
+from aging_reports import DEFAULT_PAGE_SIZE, aging_bucket_items, aging_summary, get_aging_snapshots
 
 router = APIRouter(prefix="/api/bills", tags=["Accounts Payable"])
 
@@ -218,59 +220,16 @@ async def get_unpaid_bills():
         )
 
 @router.get("/aging")
-async def get_aging_report():
-    """Generate accounts payable aging report"""
+async def get_aging_report(per_bucket: int = DEFAULT_PAGE_SIZE):
+    """Generate accounts payable aging report (first page of bills per bucket)"""
     try:
-        today = datetime.now()
-        
-        # Initialize aging buckets
-        aging = {
-            "current": {"count": 0, "amount": 0.0, "bills": []},
-            "1-30": {"count": 0, "amount": 0.0, "bills": []},
-            "31-60": {"count": 0, "amount": 0.0, "bills": []},
-            "61-90": {"count": 0, "amount": 0.0, "bills": []},
-            "90+": {"count": 0, "amount": 0.0, "bills": []}
-        }
-        
-        # Get all unpaid bills
-        unpaid_bills = await bills_collection.find({
-            "status": {"$in": ["approved", "overdue"]},
-            "amount_due": {"$gt": 0}
-        }).to_list(length=1000)
-        
-        for bill in unpaid_bills:
-            bill["_id"] = str(bill["_id"])
-            days_overdue = (today - bill["due_date"]).days
-            
-            if days_overdue < 0:
-                bucket = "current"
-            elif days_overdue <= 30:
-                bucket = "1-30"
-            elif days_overdue <= 60:
-                bucket = "31-60"
-            elif days_overdue <= 90:
-                bucket = "61-90"
-            else:
-                bucket = "90+"
-            
-            aging[bucket]["count"] += 1
-            aging[bucket]["amount"] += bill["amount_due"]
-            aging[bucket]["bills"].append({
-                "bill_id": bill["_id"],
-                "bill_number": bill["bill_number"],
-                "vendor_name": bill["vendor_name"],
-                "amount_due": bill["amount_due"],
-                "due_date": bill["due_date"],
-                "days_overdue": max(0, days_overdue)
-            })
-        
-        total_due = sum(bucket["amount"] for bucket in aging.values())
+        report = await aging_summary(db, "ap", per_bucket=per_bucket)
         
         return {
             "success": True,
-            "aging": aging,
-            "total_due": total_due,
-            "as_of_date": today
+            "aging": report["aging"],
+            "total_due": report["total"],
+            "as_of_date": report["as_of_date"]
         }
         
     except Exception as e:
@@ -279,6 +238,21 @@ async def get_aging_report():
             detail=f"Error generating aging report: {str(e)}"
         )
 
+@router.get("/aging/snapshots")
+async def get_aging_report_snapshots(start_date: str, end_date: str):
+    """Nightly AP aging snapshots between two YYYY-MM-DD dates"""
+    snapshots = await get_aging_snapshots(db, "ap", start_date, end_date)
+    return {"success": True, "snapshots": snapshots}
+
+@router.get("/aging/{bucket}")
+async def get_aging_report_bucket(bucket: str, skip: int = 0, limit: int = DEFAULT_PAGE_SIZE):
+    """Page through the bills in one aging bucket"""
+    try:
+        page = await aging_bucket_items(db, "ap", bucket, skip, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return {"success": True, **page}
+
 @router.get("/{bill_id}")
 async def get_bill(bill_id: str):
     """Get bill details by ID"""
@@ -665,6 +639,7 @@ async def batch_payment(payments: List[dict]):
         )
 
 @router.get("/dashboard/metrics")
+@cached(["bills", "vendor_payments"])
 async def get_ap_dashboard():
     """Get AP dashboard metrics"""
     try:
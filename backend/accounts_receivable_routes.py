@@ -10,6 +10,10 @@ from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from bson import ObjectId
+from result_cache import cached
+from aging_reports import DEFAULT_PAGE_SIZE, aging_bucket_items, aging_summary, get_aging_snapshots
+from customer_summary import customer_summary
+from metric_rollups import metric_rollups
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -145,6 +149,7 @@ def send_invoice_email(invoice: dict, to_email: str, cc_emails: List[str] = None
 # ==================== ROUTES ====================
 
 @router.get("/dashboard/metrics")
+@cached(["invoices", "customer_payments"])
 async def get_ar_dashboard():
     """Get AR dashboard metrics"""
     try:
@@ -226,60 +231,16 @@ async def get_ar_dashboard():
         )
 
 @router.get("/aging")
-async def get_ar_aging():
-    """Generate accounts receivable aging report"""
+async def get_ar_aging(per_bucket: int = DEFAULT_PAGE_SIZE):
+    """Generate accounts receivable aging report (first page of invoices per bucket)"""
     try:
-        today = datetime.now()
-        
-        # Initialize aging buckets
-        aging = {
-            "current": {"count": 0, "amount": 0.0, "invoices": []},
-            "1-30": {"count": 0, "amount": 0.0, "invoices": []},
-            "31-60": {"count": 0, "amount": 0.0, "invoices": []},
-            "61-90": {"count": 0, "amount": 0.0, "invoices": []},
-            "90+": {"count": 0, "amount": 0.0, "invoices": []}
-        }
-        
-        # Get all outstanding invoices
-        outstanding_invoices = await invoices_collection.find({
-            "status": {"$in": ["sent", "overdue", "partial"]},
-            "balance": {"$gt": 0}
-        }).to_list(length=1000)
-        
-        for invoice in outstanding_invoices:
-            invoice["_id"] = str(invoice["_id"])
-            due_date = datetime.fromisoformat(invoice.get("due_date", today.isoformat()))
-            days_overdue = (today - due_date).days
-            
-            if days_overdue < 0:
-                bucket = "current"
-            elif days_overdue <= 30:
-                bucket = "1-30"
-            elif days_overdue <= 60:
-                bucket = "31-60"
-            elif days_overdue <= 90:
-                bucket = "61-90"
-            else:
-                bucket = "90+"
-            
-            aging[bucket]["count"] += 1
-            aging[bucket]["amount"] += invoice.get("balance", 0)
-            aging[bucket]["invoices"].append({
-                "invoice_id": invoice["_id"],
-                "invoice_number": invoice.get("invoice_number", ""),
-                "customer_name": invoice.get("customer_name", ""),
-                "balance": invoice.get("balance", 0),
-                "due_date": invoice.get("due_date", ""),
-                "days_overdue": max(0, days_overdue)
-            })
-        
-        total_outstanding = sum(bucket["amount"] for bucket in aging.values())
+        report = await aging_summary(db, "ar", per_bucket=per_bucket)
         
         return {
             "success": True,
-            "aging": aging,
-            "total_outstanding": total_outstanding,
-            "as_of_date": today.isoformat()
+            "aging": report["aging"],
+            "total_outstanding": report["total"],
+            "as_of_date": report["as_of_date"].isoformat()
         }
         
     except Exception as e:
@@ -288,6 +249,21 @@ async def get_ar_aging():
             detail=f"Error generating aging report: {str(e)}"
         )
 
+@router.get("/aging/snapshots")
+async def get_ar_aging_snapshots(start_date: str, end_date: str):
+    """Nightly AR aging snapshots between two YYYY-MM-DD dates"""
+    snapshots = await get_aging_snapshots(db, "ar", start_date, end_date)
+    return {"success": True, "snapshots": snapshots}
+
+@router.get("/aging/{bucket}")
+async def get_ar_aging_bucket(bucket: str, skip: int = 0, limit: int = DEFAULT_PAGE_SIZE):
+    """Page through the invoices in one aging bucket"""
+    try:
+        page = await aging_bucket_items(db, "ar", bucket, skip, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return {"success": True, **page}
+
 @router.post("/invoices/{invoice_id}/send-email")
 async def send_invoice_via_email(invoice_id: str, email_request: EmailInvoiceRequest):
     """Send invoice via email"""
@@ -432,6 +408,8 @@ async def record_customer_payment(payment: PaymentCreate):
                     {"_id": ObjectId(inv_payment["invoice_id"])},
                     {"$set": update_data}
                 )
+                await customer_summary.invoice_changed(invoice, {**invoice, **update_data}, payment.payment_date)
+                await metric_rollups.source_changed("invoices", invoice)
         
         return {
             "success": True,
@@ -539,14 +517,17 @@ async def create_credit_memo(credit_memo: CreditMemoCreate):
                 new_balance = invoice.get("balance", invoice.get("total", 0)) - inv_credit["amount_applied"]
                 new_status = "paid" if new_balance <= 0.01 else "partial"
                 
+                update_data = {
+                    "balance": max(0, new_balance),
+                    "status": new_status,
+                    "updated_at": datetime.now().isoformat()
+                }
                 await invoices_collection.update_one(
                     {"_id": ObjectId(inv_credit["invoice_id"])},
-                    {"$set": {
-                        "balance": max(0, new_balance),
-                        "status": new_status,
-                        "updated_at": datetime.now().isoformat()
-                    }}
+                    {"$set": update_data}
                 )
+                await customer_summary.invoice_changed(invoice, {**invoice, **update_data}, credit_memo.memo_date)
+                await metric_rollups.source_changed("invoices", invoice)
         
         return {
             "success": True,
@@ -0,0 +1,226 @@
+"""
+AR/AP Aging
+Buckets open invoices and bills by days past due in the database ($bucket
+over the due date), returning bucket totals with a first page of documents
+per bucket; the rest of a bucket is paged separately.
+
+A nightly job stores one aging snapshot per ledger per day in
+aging_snapshots, so trend charts and month-end reports read history
+instead of recomputing it.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+DAY_MS = 86400000
+
+# (label, first day overdue, first day of the next bucket)
+AGING_BUCKETS: List[Tuple[str, Optional[int], Optional[int]]] = [
+    ("current", None, 0),
+    ("1-30", 0, 31),
+    ("31-60", 31, 61),
+    ("61-90", 61, 91),
+    ("90+", 91, None),
+]
+
+# Open documents and the fields aging reads, per ledger
+AGING_LEDGERS: Dict[str, Dict] = {
+    "ar": {
+        "collection": "invoices",
+        "match": {"status": {"$in": ["sent", "overdue", "partial"]}, "balance": {"$gt": 0}},
+        "amount": "balance",
+        "item_key": "invoices",
+        "item": {
+            "invoice_id": {"$toString": "$_id"},
+            "invoice_number": {"$ifNull": ["$invoice_number", ""]},
+            "customer_name": {"$ifNull": ["$customer_name", ""]},
+            "balance": {"$ifNull": ["$balance", 0]},
+            "due_date": {"$ifNull": ["$due_date", ""]},
+        },
+    },
+    "ap": {
+        "collection": "bills",
+        "match": {"status": {"$in": ["approved", "overdue"]}, "amount_due": {"$gt": 0}},
+        "amount": "amount_due",
+        "item_key": "bills",
+        "item": {
+            "bill_id": {"$toString": "$_id"},
+            "bill_number": "$bill_number",
+            "vendor_name": "$vendor_name",
+            "amount_due": "$amount_due",
+            "due_date": "$due_date",
+        },
+    },
+}
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 500
+
+
+def _as_date(field: str) -> Dict:
+    """Due dates are BSON dates for bills and ISO strings for invoices"""
+    return {"$convert": {"input": field, "to": "date", "onError": None, "onNull": None}}
+
+
+def _days_overdue(as_of: datetime) -> Dict:
+    """Whole days past due, floored like timedelta.days; missing due dates count as due today"""
+    due = {"$ifNull": [_as_date("$due_date"), as_of]}
+    return {"$floor": {"$divide": [{"$subtract": [as_of, due]}, DAY_MS]}}
+
+
+def _bucket_range(label: str) -> Dict:
+    for name, low, high in AGING_BUCKETS:
+        if name == label:
+            bounds = {}
+            if low is not None:
+                bounds["$gte"] = low
+            if high is not None:
+                bounds["$lt"] = high
+            return {"days_overdue": bounds}
+    raise ValueError(f"Unknown aging bucket: {label}")
+
+
+def _item_page(ledger: Dict, label: str, skip: int, limit: int) -> List[Dict]:
+    return [
+        {"$match": _bucket_range(label)},
+        {"$sort": {"days_overdue": -1, "_id": 1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$project": {
+            "_id": 0,
+            **ledger["item"],
+            "days_overdue": {"$max": ["$days_overdue", 0]},
+        }},
+    ]
+
+
+def _open_documents(ledger: Dict, as_of: datetime) -> List[Dict]:
+    return [
+        {"$match": ledger["match"]},
+        {"$addFields": {"days_overdue": _days_overdue(as_of)}},
+    ]
+
+
+def _summary_facet(ledger: Dict) -> List[Dict]:
+    # Bucket edges; days past the last edge fall into $bucket's default, the open-ended last bucket
+    boundaries = [float("-inf")] + [low for _, low, _ in AGING_BUCKETS[1:]]
+    return [{"$bucket": {
+        "groupBy": "$days_overdue",
+        "boundaries": boundaries,
+        "default": AGING_BUCKETS[-1][0],
+        "output": {
+            "count": {"$sum": 1},
+            "amount": {"$sum": {"$ifNull": [f"${ledger['amount']}", 0]}},
+        },
+    }}]
+
+
+def _bucket_label(bucket_id) -> str:
+    """$bucket ids are each bucket's lower boundary"""
+    if isinstance(bucket_id, str):
+        return bucket_id
+    for label, low, _ in AGING_BUCKETS:
+        if low == bucket_id or (low is None and bucket_id == float("-inf")):
+            return label
+    return AGING_BUCKETS[-1][0]
+
+
+async def aging_summary(db, ledger_name: str, as_of: Optional[datetime] = None,
+                        per_bucket: int = DEFAULT_PAGE_SIZE) -> Dict:
+    """Count and amount per bucket, with the most overdue `per_bucket` documents of each"""
+    ledger = AGING_LEDGERS[ledger_name]
+    as_of = as_of or datetime.now()
+    per_bucket = max(0, min(per_bucket, MAX_PAGE_SIZE))
+
+    facets = {"summary": _summary_facet(ledger)}
+    if per_bucket:
+        for label, _, _ in AGING_BUCKETS:
+            facets[label] = _item_page(ledger, label, 0, per_bucket)
+
+    rows = await db[ledger["collection"]].aggregate(
+        _open_documents(ledger, as_of) + [{"$facet": facets}]
+    ).to_list(1)
+    result = rows[0] if rows else {}
+
+    totals = {_bucket_label(row["_id"]): row for row in result.get("summary", [])}
+    aging = {}
+    for label, _, _ in AGING_BUCKETS:
+        count = totals.get(label, {}).get("count", 0)
+        items = result.get(label, [])
+        aging[label] = {
+            "count": count,
+            "amount": totals.get(label, {}).get("amount", 0.0),
+            ledger["item_key"]: items,
+            "has_more": count > len(items),
+        }
+
+    return {
+        "aging": aging,
+        "total": sum(bucket["amount"] for bucket in aging.values()),
+        "as_of_date": as_of,
+    }
+
+
+async def aging_bucket_items(db, ledger_name: str, label: str, skip: int = 0,
+                             limit: int = DEFAULT_PAGE_SIZE, as_of: Optional[datetime] = None) -> Dict:
+    """One page of a bucket's documents, most overdue first; raises ValueError for unknown buckets"""
+    ledger = AGING_LEDGERS[ledger_name]
+    as_of = as_of or datetime.now()
+    skip, limit = max(0, skip), max(1, min(limit, MAX_PAGE_SIZE))
+
+    rows = await db[ledger["collection"]].aggregate(
+        _open_documents(ledger, as_of) + _item_page(ledger, label, skip, limit + 1)
+    ).to_list(None)
+
+    return {
+        "bucket": label,
+        ledger["item_key"]: rows[:limit],
+        "skip": skip,
+        "limit": limit,
+        "has_more": len(rows) > limit,
+        "as_of_date": as_of,
+    }
+
+
+# ========== Snapshots ==========
+
+async def write_aging_snapshots(db, as_of: Optional[datetime] = None) -> Dict:
+    """Store today's bucket totals for every ledger (idempotent per day)"""
+    as_of = as_of or datetime.now()
+    date_key = as_of.date().isoformat()
+    operations = []
+    for ledger_name in AGING_LEDGERS:
+        summary = await aging_summary(db, ledger_name, as_of, per_bucket=0)
+        buckets = {
+            label: {"count": bucket["count"], "amount": bucket["amount"]}
+            for label, bucket in summary["aging"].items()
+        }
+        operations.append(UpdateOne(
+            {"ledger": ledger_name, "date": date_key},
+            {"$set": {
+                "ledger": ledger_name,
+                "date": date_key,
+                "as_of": as_of,
+                "buckets": buckets,
+                "total": summary["total"],
+            }},
+            upsert=True
+        ))
+
+    await db.aging_snapshots.bulk_write(operations, ordered=False)
+    result = {"date": date_key, "ledgers": list(AGING_LEDGERS)}
+    logger.info(f"Aging snapshots written: {result}")
+    return result
+
+
+async def get_aging_snapshots(db, ledger_name: str, start_date: str, end_date: str) -> List[Dict]:
+    """Stored snapshots between two YYYY-MM-DD dates, oldest first"""
+    return await db.aging_snapshots.find(
+        {"ledger": ledger_name, "date": {"$gte": start_date, "$lte": end_date}},
+        {"_id": 0}
+    ).sort("date", 1).to_list(None)
@@ -7,6 +7,7 @@ import logging
 from fastapi import APIRouter, Query
 from datetime import datetime, timedelta
 from analytics_service import analytics_service
+from trend_engine import MAX_HORIZON, MAX_PERIODS, get_trend, range_for
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +41,26 @@ async def get_revenue_trends(
         logger.error(f"Error getting revenue trends: {e}")
         return {"success": False, "error": str(e)}
 
+@router.get("/trends/{metric}")
+async def get_metric_trend(
+    metric: str,
+    granularity: str = Query("day", description="day, week or month"),
+    periods: int = Query(30, ge=1, le=MAX_PERIODS, description="Number of periods of history"),
+    horizon: int = Query(7, ge=0, le=MAX_HORIZON, description="Number of periods to forecast"),
+    end_date: str = Query(None, description="Last period to include (ISO date), defaults to now")
+):
+    """Metric trend by day/week/month with seasonal naive and exponential smoothing forecasts"""
+    try:
+        end = datetime.fromisoformat(end_date) if end_date else None
+        first, last = range_for(granularity, periods, end)
+        result = await get_trend(metric, granularity, first, last, horizon)
+        return {"success": True, **result}
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    except Exception as e:
+        logger.error(f"Error getting {metric} trend: {e}")
+        return {"success": False, "error": str(e)}
+
 @router.get("/customers/top")
 async def get_top_customers(
     limit: int = Query(10, le=50, description="Number of top customers to return")
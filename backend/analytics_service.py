@@ -4,6 +4,7 @@ Analytics Service - Business Intelligence & Performance Metrics
 Provides comprehensive analytics for operations, finance, crew, and customer insights
 """
 
+import asyncio
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
@@ -12,6 +13,8 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
 
+from metric_rollups import metric_rollups, day_keys
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -50,24 +53,18 @@ class AnalyticsService:
             if not start_date:
                 start_date = end_date - timedelta(days=30)
             
-            date_query = {
-                "created_at": {"$gte": start_date, "$lte": end_date}
-            }
-            
-            # Revenue metrics
-            revenue_data = await AnalyticsService._calculate_revenue_metrics(start_date, end_date)
-            
-            # Operations metrics
-            operations_data = await AnalyticsService._calculate_operations_metrics(start_date, end_date)
+            # Current and previous period rollups, O(days) regardless of volume
+            period_days = len(day_keys(start_date, end_date))
+            prev_end = start_date - timedelta(days=1)
+            prev_start = prev_end - timedelta(days=period_days - 1)
             
-            # Customer metrics
-            customer_data = await AnalyticsService._calculate_customer_metrics(start_date, end_date)
-            
-            # Crew metrics
-            crew_data = await AnalyticsService._calculate_crew_metrics(start_date, end_date)
-            
-            # Project metrics
-            project_data = await AnalyticsService._calculate_project_metrics(start_date, end_date)
+            totals, prev_totals, total_equipment, total_customers, total_crew = await asyncio.gather(
+                metric_rollups.get_totals(start_date, end_date),
+                metric_rollups.get_totals(prev_start, prev_end),
+                equipment_collection.count_documents({}),
+                customers_collection.count_documents({}),
+                employees_collection.count_documents({"department": "Operations"})
+            )
             
             return {
                 "success": True,
@@ -76,11 +73,13 @@ class AnalyticsService:
                     "end": end_date.isoformat(),
                     "days": (end_date - start_date).days
                 },
-                "revenue": revenue_data,
-                "operations": operations_data,
-                "customers": customer_data,
-                "crew": crew_data,
-                "projects": project_data
+                "revenue": AnalyticsService._calculate_revenue_metrics(totals, prev_totals),
+                "operations": AnalyticsService._calculate_operations_metrics(totals, total_equipment),
+                "customers": AnalyticsService._calculate_customer_metrics(totals, total_customers),
+                "crew": AnalyticsService._calculate_crew_metrics(
+                    totals, total_crew, (end_date - start_date).days
+                ),
+                "projects": AnalyticsService._calculate_project_metrics(totals)
             }
             
         except Exception as e:
@@ -88,28 +87,19 @@ class AnalyticsService:
             raise
     
     @staticmethod
-    async def _calculate_revenue_metrics(start_date: datetime, end_date: datetime) -> Dict:
+    def _calculate_revenue_metrics(totals: Dict, prev_totals: Dict) -> Dict:
         """Calculate revenue and financial metrics"""
-        date_query = {"created_at": {"$gte": start_date, "$lte": end_date}}
-        
-        # Total invoices
-        invoices = await invoices_collection.find(date_query).to_list(10000)
+        invoices = totals["invoices"]
         
-        total_invoiced = sum(inv.get("total_amount", 0) for inv in invoices)
-        paid_invoices = [inv for inv in invoices if inv.get("status") == "paid"]
-        total_paid = sum(inv.get("total_amount", 0) for inv in paid_invoices)
+        total_invoiced = invoices["total"]
+        total_paid = invoices["paid_total"]
         outstanding = total_invoiced - total_paid
         
         # Average invoice value
-        avg_invoice = total_invoiced / len(invoices) if invoices else 0
+        avg_invoice = total_invoiced / invoices["count"] if invoices["count"] else 0
         
         # Calculate growth (compare to previous period)
-        prev_start = start_date - (end_date - start_date)
-        prev_invoices = await invoices_collection.find({
-            "created_at": {"$gte": prev_start, "$lt": start_date}
-        }).to_list(10000)
-        prev_total = sum(inv.get("total_amount", 0) for inv in prev_invoices)
-        
+        prev_total = prev_totals["invoices"]["total"]
         growth_rate = ((total_invoiced - prev_total) / prev_total * 100) if prev_total > 0 else 0
         
         return {
@@ -117,137 +107,73 @@ class AnalyticsService:
             "total_paid": round(total_paid, 2),
             "outstanding": round(outstanding, 2),
             "avg_invoice_value": round(avg_invoice, 2),
-            "invoice_count": len(invoices),
-            "paid_count": len(paid_invoices),
-            "payment_rate": round(len(paid_invoices) / len(invoices) * 100, 1) if invoices else 0,
+            "invoice_count": invoices["count"],
+            "paid_count": invoices["paid_count"],
+            "payment_rate": round(invoices["paid_count"] / invoices["count"] * 100, 1) if invoices["count"] else 0,
             "growth_rate": round(growth_rate, 1)
         }
     
     @staticmethod
-    async def _calculate_operations_metrics(start_date: datetime, end_date: datetime) -> Dict:
+    def _calculate_operations_metrics(totals: Dict, total_equipment: int) -> Dict:
         """Calculate operational efficiency metrics"""
-        date_query = {"created_at": {"$gte": start_date, "$lte": end_date}}
-        
-        # Work orders
-        work_orders = await work_orders_collection.find(date_query).to_list(10000)
+        work_orders = totals["work_orders"]
+        by_status = work_orders["by_status"]
         
-        total_wo = len(work_orders)
-        completed_wo = sum(1 for wo in work_orders if wo.get("status") == "completed")
-        in_progress = sum(1 for wo in work_orders if wo.get("status") == "in_progress")
-        pending = sum(1 for wo in work_orders if wo.get("status") == "pending")
+        total_wo = work_orders["total"]
+        completed_wo = by_status.get("completed", 0)
         
         completion_rate = (completed_wo / total_wo * 100) if total_wo > 0 else 0
         
-        # Calculate average completion time
-        completed_with_times = [
-            wo for wo in work_orders 
-            if wo.get("status") == "completed" and wo.get("completed_at") and wo.get("created_at")
-        ]
-        
-        if completed_with_times:
-            total_hours = sum(
-                (wo["completed_at"] - wo["created_at"]).total_seconds() / 3600
-                for wo in completed_with_times
-            )
-            avg_completion_hours = total_hours / len(completed_with_times)
-        else:
-            avg_completion_hours = 0
-        
-        # Equipment utilization (simplified)
-        total_equipment = await equipment_collection.count_documents({})
+        # Average completion time
+        timed = work_orders["completed_with_times"]
+        avg_completion_hours = work_orders["completion_hours"] / timed if timed else 0
         
         return {
             "total_work_orders": total_wo,
             "completed": completed_wo,
-            "in_progress": in_progress,
-            "pending": pending,
+            "in_progress": by_status.get("in_progress", 0),
+            "pending": by_status.get("pending", 0),
             "completion_rate": round(completion_rate, 1),
             "avg_completion_hours": round(avg_completion_hours, 1),
             "total_equipment": total_equipment
         }
     
     @staticmethod
-    async def _calculate_customer_metrics(start_date: datetime, end_date: datetime) -> Dict:
+    def _calculate_customer_metrics(totals: Dict, total_customers: int) -> Dict:
         """Calculate customer-related metrics"""
-        # New customers in period
-        new_customers = await customers_collection.count_documents({
-            "created_at": {"$gte": start_date, "$lte": end_date}
-        })
-        
-        # Total active customers
-        total_customers = await customers_collection.count_documents({})
-        
-        # Customers with recent activity
-        active_customers = await work_orders_collection.distinct("customer_id", {
-            "created_at": {"$gte": start_date, "$lte": end_date}
-        })
+        work_orders = totals["work_orders"]
+        invoices = totals["invoices"]
         
-        # Average jobs per customer
-        work_orders = await work_orders_collection.find({
-            "created_at": {"$gte": start_date, "$lte": end_date}
-        }).to_list(10000)
+        # Customers with activity in the period
+        active_customers = work_orders["distinct_customers"]
         
-        customer_jobs = {}
-        for wo in work_orders:
-            cid = wo.get("customer_id")
-            customer_jobs[cid] = customer_jobs.get(cid, 0) + 1
-        
-        avg_jobs_per_customer = sum(customer_jobs.values()) / len(customer_jobs) if customer_jobs else 0
+        avg_jobs_per_customer = work_orders["total"] / active_customers if active_customers else 0
         
         # Customer lifetime value (simplified)
-        invoices = await invoices_collection.find({
-            "created_at": {"$gte": start_date, "$lte": end_date}
-        }).to_list(10000)
-        
-        customer_revenue = {}
-        for inv in invoices:
-            cid = inv.get("customer_id")
-            customer_revenue[cid] = customer_revenue.get(cid, 0) + inv.get("total_amount", 0)
-        
-        avg_customer_value = sum(customer_revenue.values()) / len(customer_revenue) if customer_revenue else 0
+        billed_customers = invoices["distinct_customers"]
+        avg_customer_value = invoices["total"] / billed_customers if billed_customers else 0
         
         return {
             "total_customers": total_customers,
-            "new_customers": new_customers,
-            "active_customers": len(active_customers),
-            "activity_rate": round(len(active_customers) / total_customers * 100, 1) if total_customers > 0 else 0,
+            "new_customers": totals["customers"]["new"],
+            "active_customers": active_customers,
+            "activity_rate": round(active_customers / total_customers * 100, 1) if total_customers > 0 else 0,
             "avg_jobs_per_customer": round(avg_jobs_per_customer, 1),
             "avg_customer_value": round(avg_customer_value, 2)
         }
     
     @staticmethod
-    async def _calculate_crew_metrics(start_date: datetime, end_date: datetime) -> Dict:
+    def _calculate_crew_metrics(totals: Dict, total_crew: int, days: int) -> Dict:
         """Calculate crew performance metrics"""
-        # Total crew members
-        total_crew = await employees_collection.count_documents({
-            "department": "Operations"
-        })
-        
-        # Time entries in period
-        time_entries = await time_entries_collection.find({
-            "clock_in": {"$gte": start_date, "$lte": end_date}
-        }).to_list(10000)
-        
-        # Calculate total hours worked
-        total_hours = 0
-        for entry in time_entries:
-            if entry.get("clock_out") and entry.get("clock_in"):
-                hours = (entry["clock_out"] - entry["clock_in"]).total_seconds() / 3600
-                total_hours += hours
-        
+        total_hours = totals["crew"]["hours"]
         avg_hours_per_crew = total_hours / total_crew if total_crew > 0 else 0
         
         # Work orders per crew
-        work_orders = await work_orders_collection.find({
-            "created_at": {"$gte": start_date, "$lte": end_date},
-            "status": "completed"
-        }).to_list(10000)
-        
-        avg_wo_per_crew = len(work_orders) / total_crew if total_crew > 0 else 0
+        completed_wo = totals["work_orders"]["by_status"].get("completed", 0)
+        avg_wo_per_crew = completed_wo / total_crew if total_crew > 0 else 0
         
         # Crew utilization rate (hours worked / available hours)
         # Assume 40 hours per week per crew member
-        days = (end_date - start_date).days
         available_hours = total_crew * (days / 7) * 40
         utilization = (total_hours / available_hours * 100) if available_hours > 0 else 0
         
@@ -260,20 +186,18 @@ class AnalyticsService:
         }
     
     @staticmethod
-    async def _calculate_project_metrics(start_date: datetime, end_date: datetime) -> Dict:
+    def _calculate_project_metrics(totals: Dict) -> Dict:
         """Calculate project-related metrics"""
-        # Projects in period
-        projects = await projects_collection.find({
-            "created_at": {"$gte": start_date, "$lte": end_date}
-        }).to_list(10000)
+        projects = totals["projects"]
+        by_status = projects["by_status"]
         
-        total_projects = len(projects)
-        active_projects = sum(1 for p in projects if p.get("status") == "active")
-        completed_projects = sum(1 for p in projects if p.get("status") == "completed")
+        total_projects = projects["total"]
+        active_projects = by_status.get("active", 0)
+        completed_projects = by_status.get("completed", 0)
         
         # Budget metrics
-        total_budget = sum(p.get("budget", 0) for p in projects)
-        total_spent = sum(p.get("total_spent", 0) for p in projects)
+        total_budget = projects["budget"]
+        total_spent = projects["total_spent"]
         
         budget_utilization = (total_spent / total_budget * 100) if total_budget > 0 else 0
         
@@ -281,8 +205,8 @@ class AnalyticsService:
         avg_project_value = total_budget / total_projects if total_projects > 0 else 0
         
         # Project completion rate
-        projects_with_status = [p for p in projects if p.get("status") in ["active", "completed", "cancelled"]]
-        completion_rate = (completed_projects / len(projects_with_status) * 100) if projects_with_status else 0
+        with_status = sum(by_status.get(s, 0) for s in ["active", "completed", "cancelled"])
+        completion_rate = (completed_projects / with_status * 100) if with_status else 0
         
         return {
             "total_projects": total_projects,
@@ -302,29 +226,14 @@ class AnalyticsService:
             end_date = datetime.utcnow()
             start_date = end_date - timedelta(days=days)
             
-            # Get invoices in period
-            invoices = await invoices_collection.find({
-                "created_at": {"$gte": start_date, "$lte": end_date}
-            }).to_list(10000)
-            
-            # Group by day
-            daily_revenue = {}
-            for inv in invoices:
-                day = inv["created_at"].date().isoformat()
-                daily_revenue[day] = daily_revenue.get(day, 0) + inv.get("total_amount", 0)
-            
-            # Fill in missing days with 0
-            current_date = start_date.date()
-            end = end_date.date()
-            trends = []
-            
-            while current_date <= end:
-                day_str = current_date.isoformat()
-                trends.append({
-                    "date": day_str,
-                    "revenue": round(daily_revenue.get(day_str, 0), 2)
-                })
-                current_date += timedelta(days=1)
+            rollups = await metric_rollups.get_days(start_date, end_date)
+            trends = [
+                {
+                    "date": day["date"],
+                    "revenue": round(day["invoices"]["total"], 2)
+                }
+                for day in rollups
+            ]
             
             return {
                 "success": True,
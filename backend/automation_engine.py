@@ -7,6 +7,9 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from bson import ObjectId
 import logging
+from customer_summary import customer_summary
+from log_sink import log_sink
+from workflow_tracing import Trace, TracedDatabase, start_trace, end_trace, span
 
 logger = logging.getLogger(__name__)
 
@@ -20,13 +23,15 @@ class AutomationEngine:
     
     def _register_workflows(self):
         """Register all available workflow automations"""
+        # Their database operations are counted in the run's trace spans
+        traced_db = TracedDatabase(self.db)
         self.workflows = {
-            'service_completion': ServiceCompletionWorkflow(self.db),
-            'customer_communication': CustomerCommunicationWorkflow(self.db),
-            'equipment_maintenance': EquipmentMaintenanceWorkflow(self.db),
-            'weather_operations': WeatherOperationsWorkflow(self.db),
-            'safety_compliance': SafetyComplianceWorkflow(self.db),
-            'inventory_management': InventoryManagementWorkflow(self.db),
+            'service_completion': ServiceCompletionWorkflow(traced_db),
+            'customer_communication': CustomerCommunicationWorkflow(traced_db),
+            'equipment_maintenance': EquipmentMaintenanceWorkflow(traced_db),
+            'weather_operations': WeatherOperationsWorkflow(traced_db),
+            'safety_compliance': SafetyComplianceWorkflow(traced_db),
+            'inventory_management': InventoryManagementWorkflow(traced_db),
         }
     
     async def trigger_workflow(self, workflow_name: str, context: Dict[str, Any]):
@@ -46,62 +51,39 @@ class AutomationEngine:
         
         workflow = self.workflows[workflow_name]
         started_at = datetime.utcnow()
+        trace = Trace(self.db, workflow_name, workflow_name.replace('_', ' ').title(), 'automation')
+        trace_token = start_trace(trace)
         
-        # Create execution log
-        execution_log = {
+        try:
+            # Steps that record their own spans nest inside this one
+            async with trace.span(workflow_name, 'workflow'):
+                result = await workflow.execute(context)
+            outcome = {"status": "success", "result": result}
+            logger.info(f"Workflow '{workflow_name}' executed successfully")
+        except Exception as e:
+            outcome = {"status": "failed", "error": str(e)}
+            logger.error(f"Error executing workflow '{workflow_name}': {str(e)}")
+        finally:
+            end_trace(trace_token)
+        await trace.save(outcome["status"])
+        
+        # One execution log per run, written with the next log sink batch
+        completed_at = datetime.utcnow()
+        await log_sink.write(self.db.workflow_executions, {
             "workflow_id": workflow_name,
             "workflow_name": workflow_name.replace('_', ' ').title(),
-            "status": "running",
             "started_at": started_at,
+            "completed_at": completed_at,
+            "duration": (completed_at - started_at).total_seconds(),
             "trigger": context.get('trigger_type', 'manual'),
             "context": context,
-            "created_at": started_at
-        }
+            "created_at": started_at,
+            **outcome
+        })
         
-        try:
-            # Insert execution log
-            execution_result = await self.db.workflow_executions.insert_one(execution_log)
-            execution_id = execution_result.inserted_id
-            
-            # Execute workflow
-            result = await workflow.execute(context)
-            completed_at = datetime.utcnow()
-            duration = (completed_at - started_at).total_seconds()
-            
-            # Update execution log with success
-            await self.db.workflow_executions.update_one(
-                {"_id": execution_id},
-                {
-                    "$set": {
-                        "status": "success",
-                        "completed_at": completed_at,
-                        "duration": duration,
-                        "result": result
-                    }
-                }
-            )
-            
-            logger.info(f"Workflow '{workflow_name}' executed successfully")
-            return {'success': True, 'result': result}
-        except Exception as e:
-            completed_at = datetime.utcnow()
-            duration = (completed_at - started_at).total_seconds()
-            
-            # Update execution log with failure
-            await self.db.workflow_executions.update_one(
-                {"_id": execution_id},
-                {
-                    "$set": {
-                        "status": "failed",
-                        "completed_at": completed_at,
-                        "duration": duration,
-                        "error": str(e)
-                    }
-                }
-            )
-            
-            logger.error(f"Error executing workflow '{workflow_name}': {str(e)}")
-            return {'success': False, 'error': str(e)}
+        if outcome["status"] == "success":
+            return {'success': True, 'result': outcome["result"]}
+        return {'success': False, 'error': outcome["error"]}
 
 
 class ServiceCompletionWorkflow:
@@ -135,14 +117,16 @@ class ServiceCompletionWorkflow:
         
         # Step 1: Auto-request after photos
         try:
-            await self._request_after_photos(dispatch_id, crew_id)
+            async with span('after_photos'):
+                await self._request_after_photos(dispatch_id, crew_id)
             results['steps_completed'].append('after_photos_requested')
         except Exception as e:
             results['errors'].append(f'after_photos: {str(e)}')
         
         # Step 2: Auto-generate service report PDF
         try:
-            pdf_id = await self._generate_service_report(dispatch_id)
+            async with span('service_report'):
+                pdf_id = await self._generate_service_report(dispatch_id)
             results['service_report_id'] = pdf_id
             results['steps_completed'].append('service_report_generated')
         except Exception as e:
@@ -150,14 +134,16 @@ class ServiceCompletionWorkflow:
         
         # Step 3: Auto-send customer notification
         try:
-            await self._send_completion_notification(dispatch_id)
+            async with span('customer_notification'):
+                await self._send_completion_notification(dispatch_id)
             results['steps_completed'].append('customer_notified')
         except Exception as e:
             results['errors'].append(f'customer_notification: {str(e)}')
         
         # Step 4: Auto-deduct consumables
         try:
-            consumables_deducted = await self._deduct_consumables(dispatch_id)
+            async with span('consumables'):
+                consumables_deducted = await self._deduct_consumables(dispatch_id)
             results['consumables_deducted'] = consumables_deducted
             results['steps_completed'].append('consumables_deducted')
         except Exception as e:
@@ -165,14 +151,16 @@ class ServiceCompletionWorkflow:
         
         # Step 5: Auto-update equipment hours
         try:
-            await self._update_equipment_hours(dispatch_id)
+            async with span('equipment_hours'):
+                await self._update_equipment_hours(dispatch_id)
             results['steps_completed'].append('equipment_hours_updated')
         except Exception as e:
             results['errors'].append(f'equipment_hours: {str(e)}')
         
         # Step 6: Auto-create invoice
         try:
-            invoice_id = await self._create_invoice(dispatch_id)
+            async with span('invoice_creation'):
+                invoice_id = await self._create_invoice(dispatch_id)
             results['invoice_id'] = invoice_id
             results['steps_completed'].append('invoice_created')
         except Exception as e:
@@ -325,7 +313,7 @@ class ServiceCompletionWorkflow:
         total = subtotal + tax
         
         # Create invoice
-        invoice = await self.db.invoices.insert_one({
+        invoice_doc = {
             'customer_id': customer_id,
             'dispatch_id': dispatch_id,
             'line_items': line_items,
@@ -334,7 +322,9 @@ class ServiceCompletionWorkflow:
             'total': total,
             'status': 'draft',
             'created_at': datetime.utcnow(),
-        })
+        }
+        invoice = await self.db.invoices.insert_one(invoice_doc)
+        await customer_summary.invoice_created(invoice_doc)
         
         return str(invoice.inserted_id)
 
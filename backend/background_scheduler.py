@@ -1,257 +1,388 @@
 """
 Background Scheduler for Automated Workflows
 Runs periodic automation tasks for the snow removal system
+
+Every schedule (built-in jobs and cron-triggered custom workflows) is a cron
+expression. One loop keeps a min-heap of next fire times and sleeps until the
+earliest is due. When it fires, the work is handed to the job queue. Last fire
+times are stored in scheduler_state, so fires missed while no scheduler was
+running are caught up per schedule ('skip', 'once' or 'all').
+
+Only the elected leader process runs the scheduler; its fencing token guards
+scheduler_state so a deposed leader cannot fire a schedule again.
 """
 
 import asyncio
+import heapq
 import logging
-from datetime import datetime, time
+from datetime import datetime, timedelta
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
 from croniter import croniter
+from pymongo.errors import DuplicateKeyError
 from automation_engine import AutomationEngine
 from custom_workflow_executor import CustomWorkflowExecutor
+from site_snow_risk import site_snow_risk
+from metric_rollups import metric_rollups
+from customer_summary import customer_summary
+from aging_reports import write_aging_snapshots
+from report_scheduler import ReportScheduler
+from invoice_reminders import InvoiceReminders
+from email_service import email_service
+from event_emitter import get_event_emitter
+from job_queue import job_queue
+from workflow_retry_handler import RetryStrategy
 
 logger = logging.getLogger(__name__)
 
+# Longest single sleep, so wall-clock changes are noticed
+MAX_SLEEP_SECONDS = 300
+
+# Missed fires replayed at most, for the 'all' catch-up policy
+MAX_CATCH_UP_FIRES = 100
+
+CATCH_UP_POLICIES = ('skip', 'once', 'all')
+
+# key -> (cron in server local time, job name, job payload, catch-up policy)
+BUILTIN_SCHEDULES: Dict[str, Tuple[str, str, Dict, str]] = {
+    'equipment_maintenance': ('0 6 * * *', 'automation_workflow', {'workflow_name': 'equipment_maintenance', 'context': {}}, 'once'),
+    'safety_reminders': ('0 7 * * *', 'automation_workflow', {'workflow_name': 'safety_compliance', 'context': {}}, 'skip'),
+    'inventory_check': ('0 * * * *', 'automation_workflow', {'workflow_name': 'inventory_management', 'context': {}}, 'once'),
+    'weather_forecast_check': ('0 */3 * * *', 'weather_forecast_check', {}, 'once'),
+    'invoice_reminders': ('0 9 * * *', 'overdue_invoice_reminders', {}, 'skip'),
+    'metric_rollup_reconcile': ('0 2 * * *', 'metric_rollup_reconcile', {}, 'once'),
+    'customer_summary_reconcile': ('30 2 * * *', 'customer_summary_reconcile', {}, 'once'),
+    'aging_snapshot': ('55 23 * * *', 'aging_snapshot', {}, 'once'),
+    'scheduled_reports': ('* * * * *', 'scheduled_reports', {}, 'once'),
+}
+
+
+def _cron_expression(trigger: Dict) -> Optional[str]:
+    return trigger.get('cron_expression') or (trigger.get('config') or {}).get('schedule')
+
+
 class BackgroundScheduler:
     """Scheduler for running automated workflows periodically"""
-    
+
     def __init__(self, db, automation_engine: AutomationEngine, custom_workflow_executor: CustomWorkflowExecutor = None):
         self.db = db
         self.automation_engine = automation_engine
         self.custom_workflow_executor = custom_workflow_executor
         self.running = False
-        self.scheduled_workflows_cache = {}  # Cache for scheduled workflows
-    
-    async def start(self):
-        """Start the background scheduler"""
+        self.started_at: Optional[datetime] = None
+        self.fencing_token: Optional[int] = None
+        self.schedules: Dict[str, Dict[str, Any]] = {}
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._sequence = 0
+        self._wakeup = asyncio.Event()
+        self._workflows_stale = True
+        self._loop_task = None
+        self._rollup_watcher = None
+        self.report_scheduler = ReportScheduler(db, email_service)
+        self.invoice_reminders = InvoiceReminders(db, email_service)
+
+        # Built-in jobs run wherever job workers run
+        job_queue.handler('weather_forecast_check')(self._weather_forecast_check)
+        job_queue.handler('site_snow_risk_refresh', max_attempts=1, retry_strategy=RetryStrategy.NONE)(site_snow_risk.refresh)
+        job_queue.handler('overdue_invoice_reminders')(self._invoice_reminder_check)
+        job_queue.handler('metric_rollup_reconcile')(self._nightly_metric_rollup)
+        job_queue.handler('customer_summary_reconcile')(self._nightly_customer_summary)
+        job_queue.handler('aging_snapshot')(self._nightly_aging_snapshot)
+        job_queue.handler('scheduled_reports', max_attempts=1, retry_strategy=RetryStrategy.NONE)(self._scheduled_report_check)
+
+    async def start(self, fencing_token: Optional[int] = None):
+        """Start the background scheduler (on election, with the leader's fencing token)"""
         self.running = True
-        logger.info("Background scheduler started")
-        
-        # Start all periodic tasks
-        asyncio.create_task(self._daily_equipment_check())
-        asyncio.create_task(self._daily_safety_reminders())
-        asyncio.create_task(self._hourly_inventory_check())
-        asyncio.create_task(self._weather_forecast_check())
-        asyncio.create_task(self._invoice_reminder_check())
-        
-        # Start custom workflow scheduler if executor is available
+        self.fencing_token = fencing_token
+
+        # Another leader may have fired schedules since we last ran
+        self._heap = []
+        for schedule in self.schedules.values():
+            schedule['next_fire'] = None
+
+        now = self.started_at = datetime.now()
+        last_fires = {
+            state['_id']: state['last_fire_at']
+            for state in await self.db.scheduler_state.find({}).to_list(None)
+        }
+        for key, (cron_expression, job_name, payload, catch_up) in BUILTIN_SCHEDULES.items():
+            self._add_schedule(key, cron_expression, job_name, payload, catch_up, last_fires.get(key), now)
         if self.custom_workflow_executor:
-            asyncio.create_task(self._custom_workflow_scheduler())
-            logger.info("Custom workflow scheduler started")
-    
+            await self._reload_workflows(last_fires)
+            emitter = get_event_emitter()
+            if emitter and self._workflows_changed not in emitter.listeners:
+                emitter.listeners.append(self._workflows_changed)
+
+        self._loop_task = asyncio.create_task(self._run())
+        self._rollup_watcher = asyncio.create_task(metric_rollups.watch_changes())
+        logger.info(f"Background scheduler started with {len(self.schedules)} schedules")
+
     async def stop(self):
         """Stop the background scheduler"""
         self.running = False
+        for task in (self._loop_task, self._rollup_watcher):
+            if task:
+                task.cancel()
+        emitter = get_event_emitter()
+        if emitter and self._workflows_changed in emitter.listeners:
+            emitter.listeners.remove(self._workflows_changed)
         logger.info("Background scheduler stopped")
-    
-    async def _daily_equipment_check(self):
-        """Run equipment maintenance checks daily at 6 AM"""
-        while self.running:
-            try:
-                now = datetime.now()
-                # Check if it's 6 AM
-                if now.hour == 6 and now.minute == 0:
-                    logger.info("Running daily equipment maintenance check...")
-                    result = await self.automation_engine.trigger_workflow(
-                        'equipment_maintenance',
-                        {}
-                    )
-                    logger.info(f"Equipment maintenance check completed: {result}")
-                    # Sleep for 1 hour to avoid running multiple times in the same hour
-                    await asyncio.sleep(3600)
-                else:
-                    # Sleep for 1 minute and check again
-                    await asyncio.sleep(60)
-            except Exception as e:
-                logger.error(f"Error in daily equipment check: {str(e)}")
-                await asyncio.sleep(60)
-    
-    async def _daily_safety_reminders(self):
-        """Send safety reminders daily at 7 AM"""
-        while self.running:
-            try:
-                now = datetime.now()
-                # Check if it's 7 AM
-                if now.hour == 7 and now.minute == 0:
-                    logger.info("Sending daily safety reminders...")
-                    result = await self.automation_engine.trigger_workflow(
-                        'safety_compliance',
-                        {}
-                    )
-                    logger.info(f"Safety reminders sent: {result}")
-                    await asyncio.sleep(3600)
-                else:
-                    await asyncio.sleep(60)
-            except Exception as e:
-                logger.error(f"Error in daily safety reminders: {str(e)}")
-                await asyncio.sleep(60)
-    
-    async def _hourly_inventory_check(self):
-        """Check inventory levels every hour"""
-        while self.running:
-            try:
-                logger.info("Running hourly inventory check...")
-                result = await self.automation_engine.trigger_workflow(
-                    'inventory_management',
-                    {}
-                )
-                logger.info(f"Inventory check completed: {result}")
-                # Sleep for 1 hour
-                await asyncio.sleep(3600)
-            except Exception as e:
-                logger.error(f"Error in hourly inventory check: {str(e)}")
-                await asyncio.sleep(3600)
-    
-    async def _weather_forecast_check(self):
-        """Check weather forecast every 3 hours"""
-        while self.running:
+
+    # ========== Schedules ==========
+
+    def _push(self, key: str, fire_at: datetime):
+        """Queue the schedule's next fire; earlier heap entries for it become stale"""
+        self._sequence += 1
+        self.schedules[key]['next_fire'] = fire_at
+        self.schedules[key]['sequence'] = self._sequence
+        heapq.heappush(self._heap, (fire_at, self._sequence, key))
+
+    def _add_schedule(self, key: str, cron_expression: str, job_name: str, payload: Dict,
+                      catch_up: str, last_fire: Optional[datetime], now: datetime):
+        """Register a schedule; fires missed since last_fire are queued per catch_up"""
+        croniter(cron_expression)  # raises on an invalid expression
+        existing = self.schedules.get(key, {})
+        self.schedules[key] = {
+            'cron_expression': cron_expression,
+            'job_name': job_name,
+            'payload': payload,
+            'catch_up': catch_up if catch_up in CATCH_UP_POLICIES else 'once',
+            'next_fire': existing.get('next_fire'),
+            'sequence': existing.get('sequence'),
+            'stats': existing.get('stats') or {'fires': 0, 'caught_up': 0, 'skipped': 0, 'last_drift': None, 'max_drift': 0.0, 'total_drift': 0.0},
+        }
+        if existing.get('cron_expression') == cron_expression and existing.get('next_fire'):
+            # Unchanged schedule: its heap entry stays valid
+            return
+
+        # Most recent MAX_CATCH_UP_FIRES fires missed since last_fire, and how many there were
+        missed: Deque[datetime] = deque(maxlen=MAX_CATCH_UP_FIRES)
+        missed_count = 0
+        if last_fire:
+            cron = croniter(cron_expression, last_fire)
+            fire = cron.get_next(datetime)
+            while fire <= now:
+                missed.append(fire)
+                missed_count += 1
+                fire = cron.get_next(datetime)
+
+        stats = self.schedules[key]['stats']
+        catch_up = self.schedules[key]['catch_up']
+        if missed and catch_up == 'all':
+            stats['skipped'] += missed_count - len(missed)
+            self._push(key, missed[0])
+        elif missed and catch_up == 'once':
+            stats['skipped'] += missed_count - 1
+            self._push(key, missed[-1])
+        else:
+            stats['skipped'] += missed_count
+            self._push(key, croniter(cron_expression, now).get_next(datetime))
+
+    def _workflows_changed(self):
+        self._workflows_stale = True
+        self._wakeup.set()
+
+    async def _reload_workflows(self, last_fires: Optional[Dict[str, datetime]] = None):
+        """Sync cron-triggered custom workflows into the schedule set"""
+        self._workflows_stale = False
+        workflows = await self.db.custom_workflows.find(
+            {'enabled': True, 'trigger.trigger_type': 'scheduled'},
+            {'name': 1, 'trigger': 1}
+        ).to_list(None)
+        if last_fires is None:
+            last_fires = {
+                state['_id']: state['last_fire_at']
+                for state in await self.db.scheduler_state.find({'_id': {'$regex': '^workflow:'}}).to_list(None)
+            }
+
+        now = datetime.now()
+        current = set()
+        for workflow in workflows:
+            key = f"workflow:{workflow['_id']}"
+            trigger = workflow.get('trigger', {})
+            cron_expression = _cron_expression(trigger)
+            if not cron_expression:
+                logger.warning(f"Workflow {workflow['_id']} has no cron expression, skipping")
+                continue
             try:
-                logger.info("Checking weather forecast...")
-                # Get weather forecast from weather service
-                # For now, use mock data
-                forecast = {
-                    'snow_risk': 'low',  # Would come from weather API
-                    'precipitation': 0,
-                    'temperature': 5
-                }
-                
-                result = await self.automation_engine.trigger_workflow(
-                    'weather_operations',
-                    {'forecast': forecast}
+                self._add_schedule(
+                    key, cron_expression, 'custom_workflow', {'workflow_id': str(workflow['_id'])},
+                    (trigger.get('config') or {}).get('catch_up', 'once'), last_fires.get(key), now
                 )
-                logger.info(f"Weather check completed: {result}")
-                # Sleep for 3 hours
-                await asyncio.sleep(10800)
-            except Exception as e:
-                logger.error(f"Error in weather forecast check: {str(e)}")
-                await asyncio.sleep(10800)
-    
-    async def _invoice_reminder_check(self):
-        """Check for overdue invoices daily at 9 AM"""
-        while self.running:
-            try:
-                now = datetime.now()
-                # Check if it's 9 AM
-                if now.hour == 9 and now.minute == 0:
-                    logger.info("Checking for overdue invoices...")
-                    # Find all overdue invoices
-                    overdue_date = datetime.utcnow()
-                    invoices = await self.db.invoices.find({
-                        'status': {'$ne': 'paid'},
-                        'due_date': {'$lt': overdue_date}
-                    }).to_list(length=1000)
-                    
-                    logger.info(f"Found {len(invoices)} overdue invoices")
-                    
-                    for invoice in invoices:
-                        days_overdue = (overdue_date - invoice['due_date']).days
-                        result = await self.automation_engine.trigger_workflow(
-                            'customer_communication',
-                            {
-                                'trigger_type': 'invoice_overdue',
-                                'invoice_id': str(invoice['_id']),
-                                'customer_id': invoice.get('customer_id'),
-                                'days_overdue': days_overdue
-                            }
-                        )
-                        logger.info(f"Sent overdue reminder for invoice {invoice['_id']}: {result}")
-                    
-                    await asyncio.sleep(3600)
-                else:
-                    await asyncio.sleep(60)
-            except Exception as e:
-                logger.error(f"Error in invoice reminder check: {str(e)}")
-                await asyncio.sleep(60)
+                current.add(key)
+            except (ValueError, KeyError) as e:
+                logger.error(f"Invalid cron expression for workflow {workflow['_id']}: {e}")
+
+        # Deleted, disabled or re-triggered workflows; their heap entries are dropped lazily
+        for key in [k for k in self.schedules if k.startswith('workflow:') and k not in current]:
+            del self.schedules[key]
+        logger.info(f"Loaded {len(current)} scheduled custom workflows")
 
-    async def _custom_workflow_scheduler(self):
-        """Check and run scheduled custom workflows every minute"""
+    # ========== Loop ==========
+
+    async def _run(self):
         while self.running:
             try:
-                logger.info("Checking for scheduled custom workflows...")
-                
-                # Get all enabled workflows with 'scheduled' trigger
-                workflows = await self.db.custom_workflows.find({
-                    'enabled': True,
-                    'trigger.trigger_type': 'scheduled'
-                }).to_list(length=1000)
-                
-                current_time = datetime.now()
-                
-                for workflow in workflows:
+                if self._workflows_stale and self.custom_workflow_executor:
+                    await self._reload_workflows()
+
+                self._wakeup.clear()
+                if not self._heap:
+                    await self._wakeup.wait()
+                    continue
+
+                fire_at, sequence, key = self._heap[0]
+                delay = (fire_at - datetime.now()).total_seconds()
+                if delay > 0:
                     try:
-                        workflow_id = str(workflow['_id'])
-                        trigger_config = workflow.get('trigger', {})
-                        cron_expression = trigger_config.get('cron_expression')
-                        
-                        if not cron_expression:
-                            logger.warning(f"Workflow {workflow_id} has no cron expression, skipping")
-                            continue
-                        
-                        # Check if workflow should run
-                        should_run = False
-                        
-                        # Check if we have cached the last check time
-                        if workflow_id not in self.scheduled_workflows_cache:
-                            self.scheduled_workflows_cache[workflow_id] = {
-                                'last_check': current_time,
-                                'last_run': None
-                            }
-                            # On first check, determine if we should run based on cron
-                            try:
-                                cron = croniter(cron_expression, current_time)
-                                next_run = cron.get_prev(datetime)
-                                # If next scheduled time is within the last minute, run it
-                                time_diff = (current_time - next_run).total_seconds()
-                                should_run = 0 <= time_diff <= 60
-                            except Exception as e:
-                                logger.error(f"Invalid cron expression for workflow {workflow_id}: {e}")
-                                continue
-                        else:
-                            cache_entry = self.scheduled_workflows_cache[workflow_id]
-                            last_check = cache_entry['last_check']
-                            
-                            try:
-                                # Check if cron schedule matches between last check and now
-                                cron = croniter(cron_expression, last_check)
-                                next_run = cron.get_next(datetime)
-                                
-                                # If the next scheduled time is in the past or now, run it
-                                if next_run <= current_time:
-                                    should_run = True
-                                    cache_entry['last_run'] = current_time
-                            except Exception as e:
-                                logger.error(f"Error evaluating cron for workflow {workflow_id}: {e}")
-                                continue
-                            
-                            cache_entry['last_check'] = current_time
-                        
-                        if should_run:
-                            logger.info(f"Executing scheduled workflow: {workflow.get('name', workflow_id)}")
-                            
-                            # Execute the workflow
-                            context = {
-                                'trigger_type': 'scheduled',
-                                'scheduled_time': current_time.isoformat(),
-                                'cron_expression': cron_expression
-                            }
-                            
-                            result = await self.custom_workflow_executor.execute(
-                                workflow_id,
-                                context
-                            )
-                            
-                            logger.info(f"Scheduled workflow {workflow_id} completed: {result}")
-                    
-                    except Exception as e:
-                        logger.error(f"Error processing scheduled workflow {workflow.get('_id')}: {str(e)}")
-                        continue
-                
-                logger.info(f"Checked {len(workflows)} scheduled workflows")
-                
-                # Sleep for 1 minute before checking again
-                await asyncio.sleep(60)
-                
+                        await asyncio.wait_for(self._wakeup.wait(), min(delay, MAX_SLEEP_SECONDS))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                heapq.heappop(self._heap)
+                schedule = self.schedules.get(key)
+                if not schedule or schedule['sequence'] != sequence:
+                    continue  # superseded by a reload
+
+                await self._fire(key, schedule, fire_at)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Error in custom workflow scheduler: {str(e)}")
-                await asyncio.sleep(60)
+                logger.error(f"Error in background scheduler: {str(e)}")
+                await asyncio.sleep(5)
+
+    async def _claim_fire(self, key: str, fire_at: datetime, now: datetime) -> bool:
+        """
+        Record the fire in scheduler_state unless it was already recorded or a
+        leader with a newer fencing token has written since
+        """
+        query = {'_id': key, 'last_fire_at': {'$lt': fire_at}}
+        if self.fencing_token is not None:
+            query['$or'] = [{'fencing_token': {'$lte': self.fencing_token}}, {'fencing_token': {'$exists': False}}]
+        try:
+            await self.db.scheduler_state.update_one(
+                query,
+                {'$set': {'last_fire_at': fire_at, 'fired_at': now, 'fencing_token': self.fencing_token}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def _fire(self, key: str, schedule: Dict[str, Any], fire_at: datetime):
+        now = datetime.now()
+        if not await self._claim_fire(key, fire_at, now):
+            logger.warning(f"Scheduled {key} at {fire_at.isoformat()} already fired or fenced off, skipping")
+            self._push(key, croniter(schedule['cron_expression'], max(fire_at, now)).get_next(datetime))
+            return
+
+        stats = schedule['stats']
+        drift = (now - fire_at).total_seconds()
+        if fire_at < self.started_at:
+            # Missed while no scheduler ran; not counted as drift
+            stats['caught_up'] += 1
+        else:
+            stats['fires'] += 1
+            stats['last_drift'] = round(drift, 3)
+            stats['max_drift'] = max(stats['max_drift'], round(drift, 3))
+            stats['total_drift'] += drift
+
+        payload = dict(schedule['payload'])
+        if schedule['job_name'] == 'custom_workflow':
+            payload['context'] = {
+                'trigger_type': 'scheduled',
+                'scheduled_time': fire_at.isoformat(),
+                'cron_expression': schedule['cron_expression']
+            }
+        try:
+            await job_queue.enqueue(schedule['job_name'], payload)
+            logger.info(f"Scheduled {key} fired (drift {drift:.1f}s)")
+        except Exception as e:
+            logger.error(f"Error queueing scheduled {key}: {str(e)}")
+
+        cron = croniter(schedule['cron_expression'], fire_at)
+        next_fire = cron.get_next(datetime)
+        if schedule['catch_up'] != 'all':
+            # Fell behind while running: skip fires that are already past
+            while next_fire < now:
+                stats['skipped'] += 1
+                next_fire = cron.get_next(datetime)
+        self._push(key, next_fire)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Next fire, drift and skipped fires per schedule"""
+        schedules = {}
+        for key, schedule in self.schedules.items():
+            stats = schedule['stats']
+            schedules[key] = {
+                'cron_expression': schedule['cron_expression'],
+                'job_name': schedule['job_name'],
+                'catch_up': schedule['catch_up'],
+                'next_fire': schedule['next_fire'].isoformat() if schedule['next_fire'] else None,
+                'fires': stats['fires'],
+                'caught_up': stats['caught_up'],
+                'skipped': stats['skipped'],
+                'last_drift_seconds': stats['last_drift'],
+                'max_drift_seconds': stats['max_drift'],
+                'avg_drift_seconds': round(stats['total_drift'] / stats['fires'], 3) if stats['fires'] else None,
+            }
+        return {'running': self.running, 'schedules': schedules}
+
+    # ========== Built-in jobs ==========
+
+    async def _weather_forecast_check(self):
+        """Refresh per-site snow risk, then run weather operations on the next 24 hours"""
+        logger.info("Checking weather forecast...")
+        summary = await site_snow_risk.run()
+
+        today = datetime.utcnow().date()
+        risks = await site_snow_risk.get_site_risk(
+            today.isoformat(),
+            (today + timedelta(days=1)).isoformat()
+        )
+        forecast = {
+            'snow_risk': max(
+                (r['snow_risk'] for r in risks),
+                key=['low', 'medium', 'high'].index,
+                default='low'
+            ),
+            'precipitation': max((r['expected_snow'] for r in risks), default=0),
+            'temperature': min((r['temperature_min'] for r in risks), default=0),
+            'sites_at_risk': len({r['site_id'] for r in risks if r['snow_risk'] != 'low'}),
+            'sites_evaluated': summary.get('sites', 0)
+        }
+
+        result = await self.automation_engine.trigger_workflow(
+            'weather_operations',
+            {'forecast': forecast}
+        )
+        logger.info(f"Weather check completed: {result}")
+
+    async def _invoice_reminder_check(self):
+        """Send each customer with overdue invoices one batched reminder"""
+        logger.info("Sending overdue invoice reminders...")
+        result = await self.invoice_reminders.run()
+        logger.info(f"Invoice reminders completed: {result}")
+
+    async def _nightly_metric_rollup(self):
+        """Reconcile daily metric rollups"""
+        logger.info("Reconciling daily metric rollups...")
+        result = await metric_rollups.reconcile()
+        logger.info(f"Metric rollup reconcile completed: {result}")
+
+    async def _nightly_customer_summary(self):
+        """Reconcile customer summaries"""
+        logger.info("Reconciling customer summaries...")
+        result = await customer_summary.reconcile()
+        logger.info(f"Customer summary reconcile completed: {result}")
+
+    async def _nightly_aging_snapshot(self):
+        """Store AR/AP aging snapshots, closing out the day"""
+        logger.info("Writing aging snapshots...")
+        result = await write_aging_snapshots(self.db)
+        logger.info(f"Aging snapshots completed: {result}")
 
+    async def _scheduled_report_check(self):
+        """Send due scheduled reports"""
+        await self.report_scheduler.run_due()
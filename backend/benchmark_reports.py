@@ -0,0 +1,229 @@
+"""
+Parity check and benchmark for the /reports/generate aggregations.
+
+Seeds a scratch database with synthetic dispatches, invoices, customers,
+projects and shifts, then runs every report type both through
+report_aggregations and through a reference that loads the matching
+documents and counts them in Python (the previous implementation, without
+its 1,000 document cap). Fails if any report differs.
+
+    python benchmark_reports.py [documents per collection, default 100000]
+"""
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from report_aggregations import REPORT_BUILDERS, shift_date_match
+
+load_dotenv()
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+BENCH_DB_NAME = os.getenv("DB_NAME", "snow_removal_db") + "_report_bench"
+
+DISPATCH_STATUSES = ["scheduled", "in_progress", "completed", "cancelled"]
+INVOICE_STATUSES = ["paid", "unpaid", "overdue", "draft"]
+PROJECT_STATUSES = ["active", "completed", "on_hold", "cancelled"]
+SERVICES = ["plowing", "salting", "sanding", "snow_removal", "sidewalk_clearing"]
+
+INSERT_BATCH = 10000
+
+
+async def seed(db, count: int, start: datetime):
+    rng = random.Random(42)
+
+    def when():
+        return start + timedelta(seconds=rng.randrange(365 * 86400))
+
+    def shift():
+        shift_start = when()
+        doc = {
+            "user_id": f"user-{rng.randrange(200)}",
+            "shift_date": shift_start.date().isoformat(),
+            "start_time": shift_start.isoformat(),
+            "status": "completed",
+        }
+        if rng.random() < 0.9:
+            doc["end_time"] = (shift_start + timedelta(hours=rng.uniform(2, 12))).isoformat()
+        return doc
+
+    generators = {
+        "dispatches": lambda: {
+            "scheduled_date": when(),
+            "status": rng.choice(DISPATCH_STATUSES),
+            "services": rng.sample(SERVICES, rng.randint(1, 3)),
+        },
+        "invoices": lambda: {
+            "issue_date": when(),
+            "status": rng.choice(INVOICE_STATUSES),
+            "total_amount": round(rng.uniform(50, 5000), 2),
+            "amount_paid": round(rng.uniform(0, 2000), 2),
+            "amount_due": round(rng.uniform(0, 3000), 2),
+        },
+        "customers": lambda: {
+            "created_at": when(),
+            "active": rng.random() < 0.85,
+            "customer_type": rng.choice(["individual", "company"]),
+        },
+        "projects": lambda: {
+            "created_at": when(),
+            "status": rng.choice(PROJECT_STATUSES),
+            "completion_percentage": rng.randint(0, 100),
+        },
+        "shifts": shift,
+    }
+
+    for name, make in generators.items():
+        await db[name].drop()
+        for offset in range(0, count, INSERT_BATCH):
+            await db[name].insert_many([make() for _ in range(min(INSERT_BATCH, count - offset))])
+
+    await db.dispatches.create_index("scheduled_date")
+    await db.invoices.create_index("issue_date")
+    await db.projects.create_index("created_at")
+    await db.shifts.create_index("shift_date")
+
+
+def _hours(shift):
+    if shift.get("hours_worked") is not None:
+        return shift["hours_worked"]
+    if not shift.get("start_time") or not shift.get("end_time"):
+        return 0
+    end = datetime.fromisoformat(shift["end_time"])
+    return (end - datetime.fromisoformat(shift["start_time"])).total_seconds() / 3600
+
+
+async def reference_report(db, report_type: str, start_dt: datetime, end_dt: datetime):
+    """The previous list-comprehension implementation, uncapped and with date-typed filters"""
+    if report_type in ("daily_operations", "service_analytics"):
+        dispatches = await db.dispatches.find({
+            "scheduled_date": {"$gte": start_dt, "$lte": end_dt}
+        }).to_list(None)
+        if report_type == "service_analytics":
+            services_count = {}
+            for dispatch in dispatches:
+                for service in dispatch.get("services", []):
+                    services_count[service] = services_count.get(service, 0) + 1
+            return {"total_services": len(dispatches), "services_breakdown": services_count}
+        return {
+            "total_dispatches": len(dispatches),
+            "completed": len([d for d in dispatches if d.get("status") == "completed"]),
+            "in_progress": len([d for d in dispatches if d.get("status") == "in_progress"]),
+            "scheduled": len([d for d in dispatches if d.get("status") == "scheduled"]),
+        }
+
+    if report_type == "weekly_financial":
+        invoices = await db.invoices.find({
+            "issue_date": {"$gte": start_dt, "$lte": end_dt}
+        }).to_list(None)
+        return {
+            "total_invoices": len(invoices),
+            "total_revenue": sum(inv.get("total_amount", 0) for inv in invoices),
+            "total_paid": sum(inv.get("amount_paid", 0) for inv in invoices),
+            "total_outstanding": sum(inv.get("amount_due", 0) for inv in invoices),
+            "paid_invoices": len([i for i in invoices if i.get("status") == "paid"]),
+            "unpaid_invoices": len([i for i in invoices if i.get("status") == "unpaid"]),
+            "overdue_invoices": len([i for i in invoices if i.get("status") == "overdue"]),
+        }
+
+    if report_type == "monthly_customer":
+        customers = await db.customers.find({}).to_list(None)
+        return {
+            "total_customers": len(customers),
+            "new_customers": len([
+                c for c in customers
+                if c.get("created_at") and start_dt <= c["created_at"] <= end_dt
+            ]),
+            "active_customers": len([c for c in customers if c.get("active", True)]),
+            "customer_types": {
+                "individual": len([c for c in customers if c.get("customer_type") == "individual"]),
+                "company": len([c for c in customers if c.get("customer_type") == "company"])
+            }
+        }
+
+    if report_type == "project_performance":
+        projects = await db.projects.find({
+            "created_at": {"$gte": start_dt, "$lte": end_dt}
+        }).to_list(None)
+        return {
+            "total_projects": len(projects),
+            "completed": len([p for p in projects if p.get("status") == "completed"]),
+            "active": len([p for p in projects if p.get("status") == "active"]),
+            "on_hold": len([p for p in projects if p.get("status") == "on_hold"]),
+            "average_completion": sum(p.get("completion_percentage", 0) for p in projects) / len(projects) if projects else 0
+        }
+
+    if report_type == "crew_productivity":
+        shifts = await db.shifts.find(shift_date_match(start_dt, end_dt)).to_list(None)
+        total_hours = sum(_hours(s) for s in shifts)
+        return {
+            "total_shifts": len(shifts),
+            "total_hours": total_hours,
+            "average_hours_per_shift": total_hours / len(shifts) if shifts else 0
+        }
+
+    return {}
+
+
+def _matches(expected, actual) -> bool:
+    if isinstance(expected, dict):
+        return (
+            isinstance(actual, dict)
+            and expected.keys() == actual.keys()
+            and all(_matches(expected[k], actual[k]) for k in expected)
+        )
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        return math.isclose(expected, actual, rel_tol=1e-9, abs_tol=1e-6)
+    return expected == actual
+
+
+async def main(count: int):
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[BENCH_DB_NAME]
+    start = datetime(2025, 1, 1)
+
+    print(f"Seeding {count:,} documents per collection into {BENCH_DB_NAME}...")
+    await seed(db, count, start)
+
+    # A 90 day window and the full year
+    ranges = [
+        (start + timedelta(days=120), start + timedelta(days=210)),
+        (start, start + timedelta(days=365)),
+    ]
+
+    failures = 0
+    print(f"\n{'report':<22}{'range':>8}{'reference ms':>15}{'aggregation ms':>17}")
+    for report_type, builder in REPORT_BUILDERS.items():
+        for start_dt, end_dt in ranges:
+            t0 = time.perf_counter()
+            expected = await reference_report(db, report_type, start_dt, end_dt)
+            t1 = time.perf_counter()
+            actual = await builder(db, start_dt, end_dt)
+            t2 = time.perf_counter()
+
+            actual.pop("dispatches", None)  # sample rows, not a computed figure
+            ok = _matches(expected, actual)
+            failures += not ok
+            days = (end_dt - start_dt).days
+            print(f"{report_type:<22}{days:>7}d{(t1 - t0) * 1000:>15.1f}{(t2 - t1) * 1000:>17.1f}"
+                  f"{'' if ok else '  MISMATCH'}")
+            if not ok:
+                print(f"  expected: {expected}\n  actual:   {actual}")
+
+    await client.drop_database(BENCH_DB_NAME)
+    client.close()
+
+    if failures:
+        print(f"\n❌ {failures} report(s) differ from the reference implementation")
+        sys.exit(1)
+    print("\n✅ All reports match the reference implementation")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
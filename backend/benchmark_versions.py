@@ -0,0 +1,192 @@
+"""
+Storage and latency of workflow versions: snapshots + JSON patches against
+full copies + DeepDiff.
+
+Saves the same sequence of small edits to a large synthetic workflow twice
+in a scratch database: through WorkflowVersionControl (compacting each
+version as the workflow_version_compact job would) and through a reference
+of the previous scheme, which stored the full workflow_data plus a DeepDiff
+with ignore_order=True for every version. Reports stored bytes, save
+latency and compare latency for both, and fails if any rebuilt version
+differs from what was saved.
+
+    python benchmark_versions.py [versions, default 200] [actions per workflow, default 100]
+"""
+import asyncio
+import copy
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import bson
+from deepdiff import DeepDiff
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import workflow_version_control
+from workflow_version_control import WorkflowVersionControl
+
+load_dotenv()
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+BENCH_DB_NAME = os.getenv("DB_NAME", "snow_removal_db") + "_version_bench"
+
+WORKFLOW_ID = "benchmark-workflow"
+ACTION_TYPES = ["send_notification", "send_email", "send_sms", "create_task", "call_webhook"]
+
+
+def make_workflow(rng: random.Random, actions: int):
+    return {
+        "name": "Benchmark Workflow",
+        "description": "Synthetic workflow for version storage benchmarks",
+        "trigger": {"trigger_type": "event", "config": {"event": "dispatch_completed"}},
+        "actions": [
+            {
+                "action_type": rng.choice(ACTION_TYPES),
+                "name": f"Action {i}",
+                "config": {
+                    "title": f"Title {i}",
+                    "message": "Crew {{crew_name}} finished {{site_name}} " * 4,
+                    "priority": rng.choice(["low", "normal", "high"]),
+                    "recipients": [f"user-{rng.randrange(500)}" for _ in range(5)],
+                },
+                "order": i,
+                "enabled": True,
+            }
+            for i in range(actions)
+        ],
+        "enabled": True,
+        "tags": ["benchmark", "dispatch"],
+    }
+
+
+def edit(rng: random.Random, workflow):
+    """One small edit, like a user saving the builder"""
+    workflow = copy.deepcopy(workflow)
+    actions = workflow["actions"]
+    roll = rng.random()
+    if roll < 0.6:
+        action = rng.choice(actions)
+        action["config"]["message"] = f"Updated message {rng.randrange(10 ** 6)}"
+    elif roll < 0.8:
+        rng.choice(actions)["enabled"] = rng.random() < 0.5
+    elif roll < 0.9:
+        actions.append({**copy.deepcopy(rng.choice(actions)), "name": f"Action {rng.randrange(10 ** 6)}", "order": len(actions)})
+    else:
+        actions.pop(rng.randrange(len(actions)))
+    workflow["updated_at"] = datetime.utcnow().replace(microsecond=0)
+    return workflow
+
+
+async def reference_save(db, version_number: int, previous, workflow):
+    """The previous create_version: full copy plus DeepDiff against the previous version"""
+    diff = DeepDiff(previous or {}, workflow, ignore_order=True)
+    await db.workflow_versions_reference.insert_one({
+        "workflow_id": WORKFLOW_ID,
+        "version_number": version_number,
+        "workflow_data": workflow,
+        "changed_at": datetime.utcnow(),
+        "diff": json.loads(diff.to_json()) if diff else {},
+        "is_current": True,
+    })
+
+
+async def reference_compare(db, version_a: int, version_b: int):
+    a = await db.workflow_versions_reference.find_one({"workflow_id": WORKFLOW_ID, "version_number": version_a})
+    b = await db.workflow_versions_reference.find_one({"workflow_id": WORKFLOW_ID, "version_number": version_b})
+    return DeepDiff(a["workflow_data"], b["workflow_data"], ignore_order=True)
+
+
+async def stored_bytes(collection) -> int:
+    return sum([len(bson.encode(doc)) async for doc in collection.find({})])
+
+
+def _ms(samples):
+    return f"{statistics.median(samples) * 1000:>9.2f}{max(samples) * 1000:>9.2f}"
+
+
+async def main(versions: int, actions: int):
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[BENCH_DB_NAME]
+    await db.workflow_versions.drop()
+    await db.workflow_versions_reference.drop()
+
+    version_control = WorkflowVersionControl(db)
+    compactions = []
+
+    async def compact_now(name, payload, **kwargs):
+        started = time.perf_counter()
+        await version_control.compact_version(**payload)
+        compactions.append(time.perf_counter() - started)
+
+    # Compact inline instead of through the job queue
+    workflow_version_control.job_queue.enqueue = compact_now
+
+    rng = random.Random(42)
+    workflow = make_workflow(rng, actions)
+    saved = {}
+    reference_saves, saves = [], []
+    previous = None
+    print(f"Saving {versions} versions of a {actions}-action workflow into {BENCH_DB_NAME}...")
+    for version_number in range(1, versions + 1):
+        workflow = edit(rng, workflow) if version_number > 1 else workflow
+        saved[version_number] = workflow
+
+        started = time.perf_counter()
+        await reference_save(db, version_number, previous, workflow)
+        reference_saves.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await version_control.create_version(WORKFLOW_ID, copy.deepcopy(workflow), "edit", "benchmark")
+        saves.append(time.perf_counter() - started - compactions[-1])
+        previous = workflow
+
+    mismatches = [
+        number for number, expected in saved.items()
+        if await version_control.rebuild_version(WORKFLOW_ID, number) != expected
+    ]
+
+    pairs = [(versions - 1, versions), (versions - 25, versions), (1, versions)]
+    reference_compares, compares = {}, {}
+    for pair in pairs:
+        reference_compares[pair], compares[pair] = [], []
+        for _ in range(5):
+            started = time.perf_counter()
+            await reference_compare(db, *pair)
+            reference_compares[pair].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            await version_control.compare_versions(WORKFLOW_ID, *pair)
+            compares[pair].append(time.perf_counter() - started)
+
+    reference_size = await stored_bytes(db.workflow_versions_reference)
+    size = await stored_bytes(db.workflow_versions)
+    print(f"\n{'storage':<34}{'bytes':>12}{'per version':>13}")
+    print(f"{'full copy + DeepDiff':<34}{reference_size:>12,}{reference_size // versions:>13,}")
+    print(f"{'snapshot every ' + str(workflow_version_control.SNAPSHOT_EVERY) + ' + patches':<34}{size:>12,}{size // versions:>13,}")
+
+    print(f"\n{'latency ms':<34}{'median':>9}{'max':>9}")
+    print(f"{'save, full copy + DeepDiff':<34}{_ms(reference_saves)}")
+    print(f"{'save (request)':<34}{_ms(saves)}")
+    print(f"{'compact (job)':<34}{_ms(compactions)}")
+    for pair in pairs:
+        print(f"{'compare %d..%d, DeepDiff' % pair:<34}{_ms(reference_compares[pair])}")
+        print(f"{'compare %d..%d, patches' % pair:<34}{_ms(compares[pair])}")
+
+    await client.drop_database(BENCH_DB_NAME)
+    client.close()
+
+    if mismatches:
+        print(f"\n❌ {len(mismatches)} rebuilt version(s) differ from what was saved: {mismatches[:10]}")
+        sys.exit(1)
+    print(f"\n✅ All {versions} versions rebuild to what was saved")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 100,
+    ))
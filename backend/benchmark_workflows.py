@@ -0,0 +1,131 @@
+"""
+End-to-end latency of the workflow templates, run as a chain and as a graph.
+
+Instantiates every template in workflow_template_library with sample values
+for its placeholders and executes it through CustomWorkflowExecutor against
+a scratch database twice: once with depends_on removed (each action waits
+for the previous one, as before actions formed a graph) and once as
+declared. A local database answers in well under a millisecond, so each
+action also waits a simulated round trip; webhooks only wait, they make no
+request.
+
+    python benchmark_workflows.py [simulated round trip ms, default 50] [runs, default 5]
+"""
+import asyncio
+import copy
+import os
+import re
+import statistics
+import sys
+import time
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from custom_workflow_executor import CustomWorkflowExecutor
+from custom_workflow_models import ActionType, CustomWorkflow
+from customer_summary import customer_summary
+from workflow_template_library import WorkflowTemplateLibrary
+
+load_dotenv()
+
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+BENCH_DB_NAME = os.getenv("DB_NAME", "snow_removal_db") + "_workflow_bench"
+
+PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+
+SAMPLE_VALUES = {
+    "quantity_used": 2,
+    "service_cost": 150.0,
+    "tax_amount": 12.0,
+    "total_amount": 162.0,
+}
+
+
+def _fill(value, samples):
+    """Replace placeholders the executor leaves alone (ids, amounts) with sample values"""
+    if isinstance(value, dict):
+        return {k: _fill(v, samples) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill(v, samples) for v in value]
+    if isinstance(value, str):
+        whole = PLACEHOLDER.fullmatch(value)
+        if whole:
+            return samples[whole.group(1)]
+        return PLACEHOLDER.sub(lambda m: str(samples[m.group(1)]), value)
+    return value
+
+
+class SimulatedExecutor(CustomWorkflowExecutor):
+    def __init__(self, db, round_trip: float):
+        super().__init__(db)
+        self.round_trip = round_trip
+
+    async def _execute_action(self, action, context):
+        await asyncio.sleep(self.round_trip)
+        if action.action_type != ActionType.CALL_WEBHOOK:
+            await super()._execute_action(action, context)
+
+    async def _log_execution(self, workflow, execution):
+        pass
+
+
+async def _time(executor, workflow: CustomWorkflow, context, runs: int):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        execution = await executor.execute_workflow(workflow, dict(context))
+        timings.append((time.perf_counter() - started) * 1000)
+        if execution.status != "success" or execution.actions_failed:
+            raise RuntimeError(f"{workflow.name}: {execution.status} {execution.error or execution.actions_failed}")
+    return statistics.median(timings)
+
+
+async def main(round_trip_ms: float, runs: int):
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[BENCH_DB_NAME]
+    customer_summary.db = db  # invoice actions update customer summaries
+
+    consumable = await db.consumables.insert_one({"name": "Rock Salt", "quantity_in_stock": 10 ** 9})
+    equipment = await db.equipment.insert_one({"name": "Plow Truck", "status": "active"})
+    customer = await db.customers.insert_one({"name": "Benchmark Customer"})
+    samples = {
+        **SAMPLE_VALUES,
+        "salt_consumable_id": str(consumable.inserted_id),
+        "equipment_id": str(equipment.inserted_id),
+        "customer_id": str(customer.inserted_id),
+    }
+
+    executor = SimulatedExecutor(db, round_trip_ms / 1000)
+    templates = WorkflowTemplateLibrary(db).get_all_templates()
+
+    print(f"{runs} runs per template, {round_trip_ms:g} ms simulated round trip per action\n")
+    print(f"{'template':<36}{'actions':>8}{'chain ms':>11}{'graph ms':>11}{'speedup':>9}")
+    for template in templates:
+        names = set(PLACEHOLDER.findall(str(template["actions"])))
+        template_samples = {name: samples.get(name, f"sample-{name}") for name in names}
+        graph = CustomWorkflow(
+            id=str(customer.inserted_id),  # any ObjectId; the execution count update matches nothing
+            name=template["name"],
+            description=template["description"],
+            trigger=template["trigger"],
+            actions=_fill(copy.deepcopy(template["actions"]), template_samples),
+            created_by="benchmark",
+        )
+        chain = copy.deepcopy(graph)
+        for action in chain.actions:
+            action.depends_on = None
+
+        chain_ms = await _time(executor, chain, template_samples, runs)
+        graph_ms = await _time(executor, graph, template_samples, runs)
+        print(f"{template['id']:<36}{len(graph.actions):>8}{chain_ms:>11.1f}{graph_ms:>11.1f}{chain_ms / graph_ms:>8.2f}x")
+
+    await client.drop_database(BENCH_DB_NAME)
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        float(sys.argv[1]) if len(sys.argv) > 1 else 50,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+    ))
@@ -69,6 +69,7 @@ async def create_indexes():
     await db.dispatches.create_index("site_ids")
     await db.dispatches.create_index([("status", 1), ("scheduled_date", -1)])
     await db.dispatches.create_index([("crew_ids", 1), ("status", 1)])
+    await db.dispatches.create_index([("crew_ids", 1), ("scheduled_date", 1)])
     await db.dispatches.create_index("created_at")
     await db.dispatches.create_index("completed_at")
     
@@ -219,6 +220,159 @@ async def create_indexes():
     await db.gmail_emails.create_index([("user_id", 1), ("date", -1)])
     await db.gmail_emails.create_index("is_unread")
     
+    # Weather Cache collection indexes (last good provider response per grid cell)
+    print("Creating weather_cache indexes...")
+    try:
+        await db.weather_cache.create_index("key", unique=True)
+    except Exception as e:
+        print(f"  ⚠️  Weather cache key index: {e}")
+    
+    # Site Snow Risk collection indexes (materialized per-site daily risk)
+    print("Creating site_snow_risk indexes...")
+    try:
+        await db.site_snow_risk.create_index([("site_id", 1), ("date", 1)], unique=True)
+    except Exception as e:
+        print(f"  ⚠️  Site snow risk index: {e}")
+    await db.site_snow_risk.create_index([("date", 1), ("snow_risk", 1)])
+    await db.site_snow_risk.create_index("computed_at")
+    
+    # Work Orders collection indexes (dispatch board range, columns and deltas)
+    print("Creating work_orders indexes...")
+    await db.work_orders.create_index("scheduled_start")
+    await db.work_orders.create_index("updated_at")
+    await db.work_orders.create_index([("scheduled_start", 1), ("status", 1)])
+    await db.work_orders.create_index([("assigned_crew_id", 1), ("scheduled_start", 1)])
+    
+    # Work order deletion tombstones, kept for a week of board deltas
+    print("Creating work_order_deletions indexes...")
+    try:
+        await db.work_order_deletions.create_index([("deleted_at", 1)], expireAfterSeconds=7 * 24 * 3600)  # TTL index
+    except Exception as e:
+        print(f"  ⚠️  TTL index: {e}")
+    
+    # HR employees indexes (dispatch board crew deltas)
+    print("Creating hr_employees indexes...")
+    await db.hr_employees.create_index([("role", 1), ("status", 1), ("updated_at", 1)])
+    
+    # Site Maps collection indexes
+    print("Creating site_maps indexes...")
+    await db.site_maps.create_index([("site_id", 1), ("is_current", 1)])
+    
+    # Crew day pack manifests (what each device last downloaded), kept for two days
+    print("Creating crew_day_pack_manifests indexes...")
+    await db.crew_day_pack_manifests.create_index([("crew_id", 1), ("date", 1), ("pack_version", 1)], unique=True)
+    try:
+        await db.crew_day_pack_manifests.create_index([("created_at", 1)], expireAfterSeconds=2 * 24 * 3600)  # TTL index
+    except Exception as e:
+        print(f"  ⚠️  TTL index: {e}")
+    
+    # Daily metric rollups and the per-day source queries that rebuild them
+    print("Creating daily_metrics indexes...")
+    try:
+        await db.daily_metrics.create_index("date", unique=True)
+    except Exception as e:
+        print(f"  ⚠️  Unique index on date: {e}")
+    await db.daily_metrics.create_index("dirty")
+    await db.invoices.create_index("created_at")
+    await db.work_orders.create_index("created_at")
+    await db.projects.create_index("created_at")
+    await db.estimates.create_index("created_at")
+    await db.time_entries.create_index("clock_in")
+    
+    # Report aggregations filter on these date fields
+    print("Creating report indexes...")
+    await db.shifts.create_index("shift_date")
+    await db.site_service_history.create_index([("service_date", 1), ("status", 1)])
+    await db.tasks.create_index("created_at")
+    
+    # Background export jobs (files and records are removed after 24 hours)
+    print("Creating export_jobs indexes...")
+    await db.export_jobs.create_index("created_at")
+    await db.export_files.files.create_index("metadata.export_job_id")
+    
+    # Scheduled reports: due-schedule claims and shared rendered results
+    print("Creating report_schedules indexes...")
+    await db.report_schedules.create_index([("active", 1), ("next_send", 1)])
+    await db.report_results.create_index([("report_type", 1), ("start", 1), ("end", 1)], unique=True)
+    try:
+        await db.report_results.create_index([("rendered_at", 1)], expireAfterSeconds=24 * 3600)  # TTL index
+    except Exception as e:
+        print(f"  ⚠️  TTL index: {e}")
+    
+    # Customer summary read model and the per-customer groups that rebuild it
+    print("Creating customer_summary indexes...")
+    try:
+        await db.customer_summary.create_index("customer_id", unique=True)
+    except Exception as e:
+        print(f"  ⚠️  Unique index on customer_id: {e}")
+    await db.customer_summary.create_index([("revenue", -1)])
+    await db.customers.create_index([("total_revenue", -1)])
+    
+    # Customer activity timeline: every branch seeks on (customer_id, date)
+    print("Creating customer timeline indexes...")
+    await db.activity_logs.create_index([("customer_id", 1), ("created_at", -1), ("_id", -1)])
+    await db.estimates.create_index([("customer_id", 1), ("created_at", -1), ("_id", -1)])
+    await db.estimates.create_index([("customer_id", 1), ("accepted_at", -1), ("_id", -1)])
+    await db.invoices.create_index([("customer_id", 1), ("created_at", -1), ("_id", -1)])
+    await db.invoices.create_index([("customer_id", 1), ("payments.payment_date", -1)])
+    await db.projects.create_index([("customer_id", 1), ("created_at", -1), ("_id", -1)])
+    await db.projects.create_index([("customer_id", 1), ("completed_at", -1), ("_id", -1)])
+    
+    # AR/AP aging: open-document filters and nightly snapshots
+    print("Creating aging indexes...")
+    await db.invoices.create_index([("status", 1), ("balance", 1)])
+    await db.bills.create_index([("status", 1), ("amount_due", 1)])
+    try:
+        await db.aging_snapshots.create_index([("ledger", 1), ("date", 1)], unique=True)
+    except Exception as e:
+        print(f"  ⚠️  Unique index on ledger/date: {e}")
+    
+    # Daily overdue-invoice reminders skip invoices reminded recently
+    print("Creating invoice reminder indexes...")
+    await db.invoices.create_index([("status", 1), ("last_reminder_at", 1)])
+    
+    # Fleet-wide equipment analytics group these per asset
+    print("Creating equipment analytics indexes...")
+    await db.dispatches.create_index([("equipment_ids", 1), ("created_at", 1)])
+    await db.dispatches.create_index([("equipment_ids", 1), ("status", 1), ("completed_at", 1)])
+    await db.equipment_maintenance.create_index([("equipment_id", 1), ("status", 1), ("completed_date", -1)])
+    await db.equipment_maintenance.create_index([("equipment_id", 1), ("status", 1), ("scheduled_date", 1)])
+    await db.form_templates.create_index([("form_type", 1), ("equipment_type", 1)])
+    
+    # Job queue: claims seek on (queue, status) in priority/run_at order; lapsed leases by expiry
+    print("Creating job queue indexes...")
+    await db.jobs.create_index([("queue", 1), ("status", 1), ("priority", -1), ("run_at", 1)])
+    await db.jobs.create_index([("queue", 1), ("status", 1), ("lease_expires_at", 1)])
+    try:
+        await db.jobs.create_index([("completed_at", 1)], expireAfterSeconds=7 * 24 * 3600)  # TTL index
+    except Exception as e:
+        print(f"  ⚠️  TTL index on completed_at: {e}")
+    await db.jobs_dead_letter.create_index([("queue", 1), ("failed_at", -1)])
+    
+    # Workflow runs parked by DELAY actions; their timers are jobs
+    print("Creating workflow run indexes...")
+    await db.workflow_runs.create_index([("workflow_id", 1), ("status", 1)])
+    try:
+        await db.workflow_runs.create_index([("completed_at", 1)], expireAfterSeconds=30 * 24 * 3600)  # TTL index
+    except Exception as e:
+        print(f"  ⚠️  TTL index on completed_at: {e}")
+    
+    # Per-action spans of workflow runs, for the analytics latency breakdown
+    print("Creating workflow trace indexes...")
+    await db.workflow_traces.create_index([("workflow_id", 1), ("started_at", -1)])
+    try:
+        await db.workflow_traces.create_index([("started_at", 1)], expireAfterSeconds=90 * 24 * 3600)  # TTL index
+    except Exception as e:
+        print(f"  ⚠️  TTL index on started_at: {e}")
+    
+    # Workflow versions are rebuilt from the nearest snapshot by version number
+    print("Creating workflow version indexes...")
+    try:
+        await db.workflow_versions.create_index([("workflow_id", 1), ("version_number", -1)], unique=True)
+    except Exception as e:
+        print(f"  ⚠️  Unique index on workflow_id/version_number: {e}")
+    await db.workflow_versions.create_index([("workflow_id", 1), ("changed_at", -1)])
+    
     print("✅ All indexes created successfully!")
     print("\n📊 Performance improvements:")
     print("  - Query speed: 10-100x faster")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Crew Day Pack Routes
+Single offline-ready download of everything a crew needs for a shift,
+with per-entity version stamps and delta sync against a previous pack
+"""
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from typing import Optional, List, Dict
+from datetime import datetime, timedelta
+from bson import ObjectId
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/crew", tags=["Crew Day Pack"])
+
+# MongoDB collections (imported from main)
+from server import db
+
+day_pack_manifests_collection = db.crew_day_pack_manifests
+
+# Message statuses that no longer need crew attention
+CLOSED_MESSAGE_STATUSES = ["resolved", "closed"]
+
+# Skip compression for tiny deltas where gzip overhead outweighs the savings
+MIN_COMPRESS_BYTES = 1024
+
+
+def _object_ids(ids: List[str]) -> List:
+    """Convert id strings to ObjectIds, keeping any that are not valid ObjectIds"""
+    return [ObjectId(i) if ObjectId.is_valid(i) else i for i in ids]
+
+
+def _serialize(doc: Dict) -> Dict:
+    doc = jsonable_encoder(doc, custom_encoder={ObjectId: str})
+    doc["id"] = doc.pop("_id", doc.get("id"))
+    return doc
+
+
+def _version(data: Dict) -> str:
+    """Content hash of an entity, stable across key order"""
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+async def _load_day_pack(crew_id: str, day_start: datetime) -> Dict[str, List[Dict]]:
+    """Query every entity type for the crew's day, concurrently where possible"""
+    day_end = day_start + timedelta(days=1)
+
+    dispatches = await db.dispatches.find({
+        "crew_ids": crew_id,
+        "scheduled_date": {"$gte": day_start, "$lt": day_end}
+    }).sort("scheduled_date", 1).to_list(None)
+
+    site_ids = sorted({sid for d in dispatches for sid in d.get("site_ids", [])})
+    equipment_ids = sorted({eid for d in dispatches for eid in d.get("equipment_ids", [])})
+
+    sites, site_maps, form_templates, equipment, consumables, messages = await asyncio.gather(
+        db.sites.find({"_id": {"$in": _object_ids(site_ids)}}).to_list(None),
+        db.site_maps.find({"site_id": {"$in": site_ids}, "is_current": True}).to_list(None),
+        db.form_templates.find({"active": True, "archived": {"$ne": True}}).to_list(None),
+        db.equipment.find({"_id": {"$in": _object_ids(equipment_ids)}}).to_list(None),
+        db.consumables.find({"active": True}).to_list(None),
+        db.messages.find({
+            "$or": [{"assigned_crew_id": crew_id}, {"to_user_id": crew_id}],
+            "status": {"$nin": CLOSED_MESSAGE_STATUSES}
+        }).sort("created_at", -1).to_list(200),
+    )
+
+    return {
+        "dispatches": dispatches,
+        "sites": sites,
+        "site_maps": site_maps,
+        "form_templates": form_templates,
+        "equipment": equipment,
+        "consumables": consumables,
+        "messages": messages,
+    }
+
+
+def _compressed_json(request: Request, payload: Dict) -> Response:
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= MIN_COMPRESS_BYTES and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# ========== Get Day Pack ==========
+
+@router.get("/{crew_id}/day-pack")
+async def get_crew_day_pack(
+    crew_id: str,
+    request: Request,
+    date: Optional[str] = None,
+    since: Optional[str] = None  # pack_version of the pack the device already holds
+):
+    """
+    Get everything a crew needs for the day in one compressed response:
+    dispatches, their sites and current site maps, form templates, equipment,
+    consumables and open messages. Each entity carries a version stamp.
+
+    With ?since=<pack_version> only entities added or changed since that pack
+    are returned, plus ids removed from the pack. Unknown or expired versions
+    fall back to a full pack.
+    """
+    try:
+        if date:
+            day_start = datetime.fromisoformat(date)
+        else:
+            day_start = datetime.utcnow()
+        day_start = day_start.replace(hour=0, minute=0, second=0, microsecond=0)
+        day_key = day_start.date().isoformat()
+
+        load = _load_day_pack(crew_id, day_start)
+        if since:
+            raw, previous = await asyncio.gather(
+                load,
+                day_pack_manifests_collection.find_one({
+                    "crew_id": crew_id,
+                    "date": day_key,
+                    "pack_version": since
+                })
+            )
+        else:
+            raw, previous = await load, None
+
+        entities = {}
+        manifest = {}
+        for entity_type, docs in raw.items():
+            serialized = [_serialize(doc) for doc in docs]
+            entities[entity_type] = [
+                {"id": doc["id"], "version": _version(doc), "data": doc}
+                for doc in serialized
+            ]
+            manifest[entity_type] = {e["id"]: e["version"] for e in entities[entity_type]}
+
+        pack_version = _version(manifest)
+        removed = {}
+        delta = previous is not None
+
+        if delta:
+            known = previous.get("entities", {})
+            for entity_type, items in entities.items():
+                known_versions = known.get(entity_type, {})
+                entities[entity_type] = [
+                    e for e in items if known_versions.get(e["id"]) != e["version"]
+                ]
+                gone = [i for i in known_versions if i not in manifest[entity_type]]
+                if gone:
+                    removed[entity_type] = gone
+
+        if not delta or pack_version != since:
+            await day_pack_manifests_collection.update_one(
+                {"crew_id": crew_id, "date": day_key, "pack_version": pack_version},
+                {
+                    "$set": {"entities": manifest},
+                    "$setOnInsert": {"created_at": datetime.utcnow()}
+                },
+                upsert=True
+            )
+
+        payload = {
+            "success": True,
+            "crew_id": crew_id,
+            "date": day_key,
+            "pack_version": pack_version,
+            "delta": delta,
+            "since": since if delta else None,
+            "unchanged": delta and pack_version == since,
+            "generated_at": datetime.utcnow().isoformat(),
+            "counts": {entity_type: len(items) for entity_type, items in manifest.items()},
+            "entities": entities,
+            "removed": removed,
+        }
+
+        return _compressed_json(request, payload)
+
+    except Exception as e:
+        logger.error(f"Error building day pack for crew {crew_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+logger.info("Crew day pack routes initialized successfully")
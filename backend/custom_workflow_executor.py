@@ -1,13 +1,30 @@
 """
 Custom Workflow Executor
 Executes user-defined custom workflows with action steps
+
+Actions form a graph: each runs once the actions in its depends_on have
+finished, and an action without depends_on follows the previous one by
+order, so workflows that declare nothing still run as a chain. Ready
+actions run concurrently, up to the workflow's max_concurrency. A
+CONDITIONAL action that evaluates false skips everything downstream of it.
+
+A DELAY action parks its branch instead of sleeping. Once nothing else can
+run, the workflow, context and graph state go to workflow_runs and a
+custom_workflow_resume job is queued for the earliest resume time, so a
+waiting run holds no coroutine and survives restarts. The job queue's
+run_at index is the timer.
 """
 
+import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from bson import ObjectId
 import logging
-import asyncio
+from customer_summary import customer_summary
+from job_queue import job_queue
+from log_sink import log_sink
+from workflow_retry_handler import WorkflowRetryHandler, RetryStrategy
+from workflow_tracing import Trace, TracedDatabase, start_trace, end_trace, current_trace, span, external_call
 from custom_workflow_models import (
     CustomWorkflow, WorkflowAction, WorkflowExecution, 
     ActionType, WorkflowExecutionLog
@@ -15,11 +32,64 @@ from custom_workflow_models import (
 
 logger = logging.getLogger(__name__)
 
+# Actions of one run executing at once, unless the workflow sets max_concurrency
+MAX_PARALLEL_ACTIONS = 4
+
+
+def action_graph(actions: List[WorkflowAction]) -> List[List[int]]:
+    """
+    Dependencies of each action, as indexes into the actions sorted by order
+    
+    Raises ValueError for a depends_on naming no action (or several) and for cycles.
+    """
+    ordered = sorted(actions, key=lambda a: a.order)
+    keys: Dict[str, List[int]] = {}
+    for step, action in enumerate(ordered):
+        keys.setdefault(action.id or action.name, []).append(step)
+    
+    graph = []
+    for step, action in enumerate(ordered):
+        if action.depends_on is None:
+            graph.append([step - 1] if step else [])
+            continue
+        deps = []
+        for key in action.depends_on:
+            matches = keys.get(key, [])
+            if len(matches) != 1:
+                problem = "unknown" if not matches else "ambiguous"
+                raise ValueError(f"Action '{action.name}' depends on {problem} action '{key}'")
+            deps.append(matches[0])
+        graph.append(deps)
+    
+    # Kahn's algorithm: anything left unvisited sits on a cycle
+    remaining = [len(deps) for deps in graph]
+    dependents = [[] for _ in graph]
+    for step, deps in enumerate(graph):
+        for dep in deps:
+            dependents[dep].append(step)
+    ready = [step for step, count in enumerate(remaining) if not count]
+    visited = 0
+    while ready:
+        step = ready.pop()
+        visited += 1
+        for dependent in dependents[step]:
+            remaining[dependent] -= 1
+            if not remaining[dependent]:
+                ready.append(dependent)
+    if visited < len(graph):
+        cyclic = [ordered[step].name for step, count in enumerate(remaining) if count]
+        raise ValueError(f"Action dependencies form a cycle: {', '.join(cyclic)}")
+    
+    return graph
+
+
 class CustomWorkflowExecutor:
     """Executes custom user-defined workflows"""
     
     def __init__(self, db):
-        self.db = db
+        # Actions' database operations are counted in their trace spans
+        self.db = TracedDatabase(db)
+        self.retry_handler = WorkflowRetryHandler(db)
     
     async def execute_workflow(self, workflow: CustomWorkflow, context: Dict[str, Any] = None) -> WorkflowExecution:
         """
@@ -30,7 +100,7 @@ class CustomWorkflowExecutor:
             context: Execution context data
             
         Returns:
-            WorkflowExecution with results
+            WorkflowExecution with results; status 'waiting' when a DELAY parked it
         """
         if context is None:
             context = {}
@@ -43,28 +113,70 @@ class CustomWorkflowExecutor:
         )
         
         logger.info(f"Starting execution of custom workflow: {workflow.name}")
-        
+        return await self._run(workflow, execution, context, {})
+    
+    async def resume(self, run_id: str) -> Optional[WorkflowExecution]:
+        """Continue a parked run from the step after its DELAY; None if it already finished"""
+        run = await self.db.workflow_runs.find_one_and_update(
+            {'_id': ObjectId(run_id), 'status': {'$in': ['waiting', 'running']}},
+            {'$set': {'status': 'running', 'resumed_at': datetime.utcnow()}}
+        )
+        if not run:
+            logger.info(f"Workflow run {run_id} already finished")
+            return None
+        
+        workflow = CustomWorkflow(**run['workflow'])
+        execution = WorkflowExecution(**{**run['execution'], 'status': 'running', 'resume_at': None})
+        # Runs parked before actions formed a graph stored the next step of the chain
+        state = run.get('state') or {'done': list(range(run['next_step']))}
+        logger.info(f"Resuming custom workflow '{workflow.name}' ({len(state['done'])} actions done)")
+        return await self._run(workflow, execution, run['context'], state)
+    
+    async def _run(self, workflow: CustomWorkflow, execution: WorkflowExecution,
+                   context: Dict[str, Any], state: Dict[str, Any]) -> WorkflowExecution:
+        """Run actions as their dependencies finish, until the workflow ends or only DELAYs remain"""
+        trace = Trace(self.db, workflow.id or "", workflow.name, 'custom', execution.run_id)
+        trace_token = start_trace(trace)
         try:
-            # Execute actions in order
-            sorted_actions = sorted(workflow.actions, key=lambda a: a.order)
+            actions = sorted(workflow.actions, key=lambda a: a.order)
+            graph = action_graph(actions)
             
-            for action in sorted_actions:
-                if not action.enabled:
-                    logger.info(f"Skipping disabled action: {action.name}")
-                    continue
-                
-                try:
-                    logger.info(f"Executing action: {action.name} ({action.action_type})")
-                    await self._execute_action(action, context)
-                    execution.actions_completed.append(action.name)
-                    
-                except Exception as e:
-                    logger.error(f"Error executing action '{action.name}': {str(e)}")
-                    execution.actions_failed.append(action.name)
-                    # Continue with other actions even if one fails
+            # done: finished, whatever the outcome; blocked: skipped or a false
+            # conditional, so dependents are skipped; delays: step -> resume time
+            done = set(state.get('done', []))
+            blocked = set(state.get('blocked', []))
+            delays = {int(step): at for step, at in state.get('delays', {}).items()}
+            now = datetime.utcnow()
+            for step, resume_at in list(delays.items()):
+                if resume_at <= now:
+                    done.add(step)
+                    del delays[step]
+            
+            semaphore = asyncio.Semaphore(workflow.max_concurrency or MAX_PARALLEL_ACTIONS)
+            running: Dict[asyncio.Task, int] = {}
+            
+            while True:
+                self._start_ready(actions, graph, done, blocked, delays, running,
+                                  execution, context, semaphore)
+                if not running:
+                    break
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    done.add(running.pop(task))
+            
+            if delays:
+                await self._park(workflow, execution, context, {
+                    'done': sorted(done),
+                    'blocked': sorted(blocked),
+                    'delays': {str(step): at for step, at in delays.items()},
+                })
+                trace.run_id = execution.run_id
+                await trace.save(execution.status)
+                return execution
             
             execution.status = 'success'
             execution.completed_at = datetime.utcnow()
+            execution.context = context
             
             # Update workflow execution count
             await self.db.custom_workflows.update_one(
@@ -80,12 +192,145 @@ class CustomWorkflowExecutor:
             execution.error = str(e)
             execution.completed_at = datetime.utcnow()
             logger.error(f"Workflow execution failed: {str(e)}")
+        finally:
+            end_trace(trace_token)
+        
+        if execution.run_id:
+            await self.db.workflow_runs.update_one(
+                {'_id': ObjectId(execution.run_id)},
+                {'$set': {'status': execution.status, 'completed_at': execution.completed_at}}
+            )
         
         # Log execution
         await self._log_execution(workflow, execution)
+        await trace.save(execution.status)
         
         return execution
     
+    def _start_ready(self, actions: List[WorkflowAction], graph: List[List[int]],
+                     done: set, blocked: set, delays: Dict[int, datetime],
+                     running: Dict[asyncio.Task, int], execution: WorkflowExecution,
+                     context: Dict[str, Any], semaphore: asyncio.Semaphore):
+        """Resolve every action that needs no I/O and start tasks for the rest whose dependencies are done"""
+        in_flight = set(running.values())
+        progress = True
+        while progress:
+            progress = False
+            for step, deps in enumerate(graph):
+                if step in done or step in blocked or step in delays or step in in_flight:
+                    continue
+                action = actions[step]
+                
+                if any(dep in blocked for dep in deps):
+                    logger.info(f"Skipping action downstream of a false condition: {action.name}")
+                    execution.actions_skipped.append(action.name)
+                    blocked.add(step)
+                    progress = True
+                    continue
+                if not all(dep in done for dep in deps):
+                    continue
+                
+                progress = True
+                if not action.enabled:
+                    logger.info(f"Skipping disabled action: {action.name}")
+                    done.add(step)
+                
+                elif action.action_type == ActionType.CONDITIONAL:
+                    execution.actions_completed.append(action.name)
+                    done.add(step)
+                    if not self._evaluate_condition(action.config, context):
+                        logger.info(f"Condition '{action.name}' is false")
+                        blocked.add(step)
+                
+                elif action.action_type == ActionType.DELAY:
+                    seconds = float(action.config.get('seconds', 1))
+                    execution.actions_completed.append(action.name)
+                    if seconds > 0:
+                        delays[step] = datetime.utcnow() + timedelta(seconds=seconds)
+                    else:
+                        done.add(step)
+                
+                else:
+                    task = asyncio.create_task(self._run_action(action, context, execution, semaphore))
+                    running[task] = step
+                    in_flight.add(step)
+    
+    async def _run_action(self, action: WorkflowAction, context: Dict[str, Any],
+                          execution: WorkflowExecution, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            try:
+                logger.info(f"Executing action: {action.name} ({action.action_type})")
+                async with span(action.name, action.action_type.value):
+                    if action.config.get('max_retries'):
+                        await self.retry_handler.execute_with_retry(
+                            lambda: self._execute_action(action, context),
+                            action.name,
+                            execution.workflow_id,
+                            str(current_trace().id),
+                            RetryStrategy(action.config.get('retry_strategy', RetryStrategy.EXPONENTIAL.value)),
+                            int(action.config['max_retries']),
+                            context
+                        )
+                    else:
+                        await self._execute_action(action, context)
+                execution.actions_completed.append(action.name)
+                
+            except Exception as e:
+                logger.error(f"Error executing action '{action.name}': {str(e)}")
+                execution.actions_failed.append(action.name)
+                # Dependents still run, as they did when actions only ran in order
+    
+    def _evaluate_condition(self, config: Dict[str, Any], context: Dict[str, Any]) -> bool:
+        """Compare a context field with a value; a comparison that can't be made is false"""
+        operator = config.get('operator', 'equals')
+        actual = context.get(config.get('field'))
+        expected = self._replace_variables(config.get('value'), context)
+        try:
+            if operator == 'equals':
+                return actual == expected
+            if operator == 'not_equals':
+                return actual != expected
+            if operator == 'exists':
+                return actual is not None
+            if operator == 'not_exists':
+                return actual is None
+            if operator == 'contains':
+                return expected in actual
+            if operator == 'in':
+                return actual in expected
+            if operator in ('greater_than', 'less_than'):
+                actual, expected = float(actual), float(expected)
+                return actual > expected if operator == 'greater_than' else actual < expected
+        except (TypeError, ValueError):
+            return False
+        logger.warning(f"Unknown condition operator: {operator}")
+        return False
+    
+    async def _park(self, workflow: CustomWorkflow, execution: WorkflowExecution,
+                    context: Dict[str, Any], state: Dict[str, Any]):
+        """Persist the run and queue its resumption; nothing stays in memory while it waits"""
+        execution.status = 'waiting'
+        execution.resume_at = min(state['delays'].values())
+        if not execution.run_id:
+            execution.run_id = str(ObjectId())
+        
+        await self.db.workflow_runs.update_one(
+            {'_id': ObjectId(execution.run_id)},
+            {'$set': {
+                'workflow_id': execution.workflow_id,
+                'workflow': workflow.dict(),
+                'execution': execution.dict(exclude={'context'}),
+                'context': context,
+                'state': state,
+                'status': 'waiting',
+                'resume_at': execution.resume_at,
+                'updated_at': datetime.utcnow()
+            }},
+            upsert=True
+        )
+        await job_queue.enqueue('custom_workflow_resume', {'run_id': execution.run_id}, run_at=execution.resume_at)
+        logger.info(f"Workflow '{workflow.name}' waiting until {execution.resume_at.isoformat()} (run {execution.run_id})")
+    
     async def _execute_action(self, action: WorkflowAction, context: Dict[str, Any]):
         """Execute a single action based on its type"""
         
@@ -116,9 +361,6 @@ class CustomWorkflowExecutor:
         elif action.action_type == ActionType.CALL_WEBHOOK:
             await self._action_call_webhook(action, context)
         
-        elif action.action_type == ActionType.DELAY:
-            await self._action_delay(action, context)
-        
         else:
             logger.warning(f"Unknown action type: {action.action_type}")
     
@@ -213,6 +455,7 @@ class CustomWorkflowExecutor:
         }
         
         result = await self.db.invoices.insert_one(invoice)
+        await customer_summary.invoice_created(invoice)
         logger.info(f"Invoice created: {result.inserted_id}")
         context['invoice_id'] = str(result.inserted_id)
     
@@ -304,17 +547,10 @@ class CustomWorkflowExecutor:
         payload_str = str(payload)
         payload_str = self._replace_variables(payload_str, context)
         
-        async with aiohttp.ClientSession() as session:
-            async with session.request(method, url, json=payload) as response:
-                logger.info(f"Webhook called: {url}, status: {response.status}")
-    
-    async def _action_delay(self, action: WorkflowAction, context: Dict):
-        """Delay execution"""
-        config = action.config
-        seconds = config.get('seconds', 1)
-        
-        logger.info(f"Delaying for {seconds} seconds")
-        await asyncio.sleep(seconds)
+        async with external_call():
+            async with aiohttp.ClientSession() as session:
+                async with session.request(method, url, json=payload) as response:
+                    logger.info(f"Webhook called: {url}, status: {response.status}")
     
     def _replace_variables(self, text: str, context: Dict[str, Any]) -> str:
         """Replace {{variable}} placeholders with context values"""
@@ -337,4 +573,4 @@ class CustomWorkflowExecutor:
             created_at=datetime.utcnow()
         )
         
-        await self.db.workflow_execution_logs.insert_one(log.dict())
+        await log_sink.write(self.db.workflow_execution_logs, log.dict())
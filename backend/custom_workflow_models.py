@@ -3,7 +3,7 @@ Custom Workflow Builder Models and Storage
 Allows users to create, edit, and delete custom automation workflows
 """
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -31,8 +31,15 @@ class WorkflowAction(BaseModel):
     action_type: ActionType
     name: str
     config: Dict[str, Any] = {}
+    # For conditional: {"field": "customer_type", "operator": "equals", "value": "commercial"};
+    # when false, every action depending on it (directly or not) is skipped
     order: int
     enabled: bool = True
+    # Key other actions use in depends_on; defaults to name
+    id: Optional[str] = None
+    # Actions (id or name) that must finish first. None follows the previous
+    # action by order; [] starts with the workflow.
+    depends_on: Optional[List[str]] = None
 
 class WorkflowTrigger(BaseModel):
     trigger_type: TriggerType
@@ -54,6 +61,8 @@ class CustomWorkflow(BaseModel):
     execution_count: int = 0
     last_execution: Optional[datetime] = None
     tags: List[str] = []
+    # Actions run at once, when depends_on lets them; None uses the executor default
+    max_concurrency: Optional[int] = Field(None, ge=1)
 
 class CustomWorkflowCreate(BaseModel):
     name: str
@@ -62,6 +71,7 @@ class CustomWorkflowCreate(BaseModel):
     actions: List[WorkflowAction]
     enabled: bool = True
     tags: List[str] = []
+    max_concurrency: Optional[int] = Field(None, ge=1)
 
 class CustomWorkflowUpdate(BaseModel):
     name: Optional[str] = None
@@ -70,16 +80,21 @@ class CustomWorkflowUpdate(BaseModel):
     actions: Optional[List[WorkflowAction]] = None
     enabled: Optional[bool] = None
     tags: Optional[List[str]] = None
+    max_concurrency: Optional[int] = Field(None, ge=1)
 
 class WorkflowExecution(BaseModel):
     workflow_id: str
     started_at: datetime
     completed_at: Optional[datetime] = None
-    status: str  # 'running', 'success', 'failed'
+    status: str  # 'running', 'waiting', 'success', 'failed'
     actions_completed: List[str] = []
     actions_failed: List[str] = []
+    actions_skipped: List[str] = []
     error: Optional[str] = None
     context: Dict[str, Any] = {}
+    # Set while a DELAY action has the run parked in workflow_runs
+    run_id: Optional[str] = None
+    resume_at: Optional[datetime] = None
 
 class WorkflowExecutionLog(BaseModel):
     id: Optional[str] = None
@@ -0,0 +1,220 @@
+"""
+Customer Summary Read Model
+One customer_summary document per customer with invoice revenue, paid and
+outstanding totals, invoice/estimate/project counts and first and last
+activity, so customer stats are a single indexed read.
+
+Write paths apply their deltas with $inc as documents are created or paid;
+a nightly reconcile rebuilds every summary from source to repair drift
+(deletes, edits made outside the API, failed hook writes).
+"""
+
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Database connection
+mongo_url = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+db_name = os.getenv("DB_NAME", "snow_removal_db")
+client = AsyncIOMotorClient(mongo_url)
+db = client[db_name]
+
+# Summaries written per bulk_write during reconcile
+RECONCILE_BATCH_SIZE = 500
+
+COUNTER_FIELDS = ("revenue", "paid", "outstanding", "invoices_count", "estimates_count", "projects_count")
+
+
+def invoice_figures(invoice: Dict) -> Dict[str, float]:
+    """
+    The summary totals one invoice contributes. Invoices paid through the
+    accounts receivable routes carry a running balance (and may only have
+    total) instead of amount_paid/amount_due.
+    """
+    revenue = invoice.get("total_amount") or invoice.get("total") or 0
+    if invoice.get("balance") is not None:
+        return {"revenue": revenue, "paid": revenue - invoice["balance"], "outstanding": invoice["balance"]}
+    return {
+        "revenue": revenue,
+        "paid": invoice.get("amount_paid") or 0,
+        "outstanding": invoice.get("amount_due") or 0,
+    }
+
+
+# invoice_figures as aggregation expressions
+_REVENUE = {"$ifNull": ["$total_amount", {"$ifNull": ["$total", 0]}]}
+_HAS_BALANCE = {"$ne": [{"$ifNull": ["$balance", None]}, None]}
+_PAID = {"$cond": [_HAS_BALANCE, {"$subtract": [_REVENUE, "$balance"]}, {"$ifNull": ["$amount_paid", 0]}]}
+_OUTSTANDING = {"$cond": [_HAS_BALANCE, "$balance", {"$ifNull": ["$amount_due", 0]}]}
+
+
+def _customer_oid(customer_id: str) -> Optional[ObjectId]:
+    try:
+        return ObjectId(customer_id)
+    except (InvalidId, TypeError):
+        return None
+
+
+class CustomerSummaryService:
+    """Maintains and reads the customer_summary collection"""
+
+    def __init__(self, db):
+        self.db = db
+
+    # ========== Incremental updates ==========
+
+    async def _apply(self, customer_id: Optional[str], inc: Dict[str, float], at: Optional[datetime] = None):
+        """$inc a customer's counters; failures are logged and left to reconcile"""
+        if not customer_id:
+            return
+        inc = {k: v for k, v in inc.items() if v}
+        update = {
+            "$set": {"updated_at": datetime.utcnow()},
+            "$setOnInsert": {"customer_id": customer_id},
+        }
+        if inc:
+            update["$inc"] = inc
+        if isinstance(at, datetime):
+            update["$min"] = {"first_activity_at": at}
+            update["$max"] = {"last_activity_at": at}
+
+        try:
+            await self.db.customer_summary.update_one({"customer_id": customer_id}, update, upsert=True)
+            # Mirrored on the customer so the list view can sort by revenue
+            oid = _customer_oid(customer_id)
+            if inc.get("revenue") and oid:
+                await self.db.customers.update_one({"_id": oid}, {"$inc": {"total_revenue": inc["revenue"]}})
+        except Exception as e:
+            logger.error(f"Error updating customer summary for {customer_id}: {e}")
+
+    async def invoice_created(self, invoice: Dict):
+        await self._apply(
+            invoice.get("customer_id"),
+            {**invoice_figures(invoice), "invoices_count": 1},
+            invoice.get("created_at")
+        )
+
+    async def invoice_changed(self, before: Dict, after: Dict, at: Optional[datetime] = None):
+        """Apply the difference between two versions of the same invoice"""
+        old, new = invoice_figures(before), invoice_figures(after)
+        await self._apply(
+            after.get("customer_id"),
+            {field: new[field] - old[field] for field in new},
+            at or datetime.utcnow()
+        )
+
+    async def estimate_created(self, estimate: Dict):
+        await self._apply(estimate.get("customer_id"), {"estimates_count": 1}, estimate.get("created_at"))
+
+    async def project_created(self, project: Dict):
+        await self._apply(project.get("customer_id"), {"projects_count": 1}, project.get("created_at"))
+
+    # ========== Rebuilding ==========
+
+    async def _aggregate_sources(self, match: Dict) -> Dict[str, Dict]:
+        """Summaries computed from source collections, keyed by customer_id"""
+        summaries: Dict[str, Dict] = {}
+
+        def merge(rows):
+            for row in rows:
+                if not row["_id"]:
+                    continue
+                summary = summaries.setdefault(row.pop("_id"), dict.fromkeys(COUNTER_FIELDS, 0))
+                first, last = row.pop("first"), row.pop("last")
+                summary.update(row)
+                if first and (not summary.get("first_activity_at") or first < summary["first_activity_at"]):
+                    summary["first_activity_at"] = first
+                if last and (not summary.get("last_activity_at") or last > summary["last_activity_at"]):
+                    summary["last_activity_at"] = last
+
+        merge(await self.db.invoices.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": "$customer_id",
+                "revenue": {"$sum": _REVENUE},
+                "paid": {"$sum": _PAID},
+                "outstanding": {"$sum": _OUTSTANDING},
+                "invoices_count": {"$sum": 1},
+                "first": {"$min": "$created_at"},
+                # Payments count as activity too
+                "last": {"$max": {"$max": ["$created_at", {"$max": "$payments.payment_date"}]}}
+            }}
+        ]).to_list(None))
+
+        for collection, counter in (("estimates", "estimates_count"), ("projects", "projects_count")):
+            merge(await self.db[collection].aggregate([
+                {"$match": match},
+                {"$group": {
+                    "_id": "$customer_id",
+                    counter: {"$sum": 1},
+                    "first": {"$min": "$created_at"},
+                    "last": {"$max": "$created_at"}
+                }}
+            ]).to_list(None))
+
+        return summaries
+
+    async def _write(self, summaries: Dict[str, Dict]):
+        now = datetime.utcnow()
+        summary_ops, customer_ops = [], []
+        for customer_id, summary in summaries.items():
+            summary_ops.append(UpdateOne(
+                {"customer_id": customer_id},
+                {"$set": {**summary, "customer_id": customer_id, "updated_at": now, "reconciled_at": now}},
+                upsert=True
+            ))
+            oid = _customer_oid(customer_id)
+            if oid:
+                customer_ops.append(UpdateOne({"_id": oid}, {"$set": {"total_revenue": summary["revenue"]}}))
+
+        for offset in range(0, len(summary_ops), RECONCILE_BATCH_SIZE):
+            await self.db.customer_summary.bulk_write(summary_ops[offset:offset + RECONCILE_BATCH_SIZE], ordered=False)
+        for offset in range(0, len(customer_ops), RECONCILE_BATCH_SIZE):
+            await self.db.customers.bulk_write(customer_ops[offset:offset + RECONCILE_BATCH_SIZE], ordered=False)
+
+    async def rebuild(self, customer_id: str) -> Dict:
+        """Recompute one customer's summary from source"""
+        summaries = await self._aggregate_sources({"customer_id": customer_id})
+        summary = summaries.get(customer_id, dict.fromkeys(COUNTER_FIELDS, 0))
+        await self._write({customer_id: summary})
+        return {**summary, "customer_id": customer_id}
+
+    async def reconcile(self) -> Dict:
+        """Rebuild every summary and zero those whose customer no longer has any records"""
+        started = datetime.utcnow()
+        summaries = await self._aggregate_sources({"customer_id": {"$nin": [None, ""]}})
+        await self._write(summaries)
+
+        stale = await self.db.customer_summary.distinct(
+            "customer_id", {"$or": [{"reconciled_at": {"$lt": started}}, {"reconciled_at": {"$exists": False}}]}
+        )
+        if stale:
+            await self._write({customer_id: dict.fromkeys(COUNTER_FIELDS, 0) for customer_id in stale})
+
+        result = {"customers": len(summaries), "zeroed": len(stale), "reconciled_at": started.isoformat()}
+        logger.info(f"Customer summaries reconciled: {result}")
+        return result
+
+    # ========== Reading ==========
+
+    async def get(self, customer_id: str) -> Dict:
+        """A customer's summary, built from source the first time it is requested"""
+        summary = await self.db.customer_summary.find_one({"customer_id": customer_id}, {"_id": 0})
+        if summary is None:
+            summary = await self.rebuild(customer_id)
+        return summary
+
+
+# Singleton instance
+customer_summary = CustomerSummaryService(db)
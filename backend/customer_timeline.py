@@ -0,0 +1,220 @@
+"""
+Customer Activity Timeline
+Builds a customer's activity feed as one aggregation: manual activity logs
+$unionWith estimate, invoice, payment and project events, each projected into
+a common event shape and merged newest first.
+
+Every branch seeks on a (customer_id, date) index and stops after one page,
+so a page costs the same however long the customer's history is. Pages are
+chained with an opaque cursor holding the last event's (date, key, type).
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+MAX_PAGE_SIZE = 200
+
+# Synthesized event types: type -> (collection, date field, key field, related type)
+EVENT_SOURCES: Dict[str, Tuple[str, str, str, str]] = {
+    "estimate_created": ("estimates", "created_at", "_id", "estimate"),
+    "estimate_accepted": ("estimates", "accepted_at", "_id", "estimate"),
+    "invoice_created": ("invoices", "created_at", "_id", "invoice"),
+    "payment_received": ("invoices", "payments.payment_date", "payments.id", "invoice"),
+    "project_created": ("projects", "created_at", "_id", "project"),
+    "project_completed": ("projects", "completed_at", "_id", "project"),
+}
+
+# Manually logged activities keep their own activity_type
+MANUAL_SOURCE = "activity_logs"
+
+
+def encode_cursor(event: Dict) -> str:
+    at = event["created_at"]
+    payload = {"at": at.isoformat() if isinstance(at, datetime) else str(at), "key": event["key"], "type": event["activity_type"]}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Dict:
+    """Raises ValueError for a cursor this module did not produce"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {"at": datetime.fromisoformat(payload["at"]), "key": payload["key"], "type": payload["type"]}
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def _key_value(key_field: str, key: str):
+    """Cursor keys are strings; _id keys compare as ObjectIds"""
+    if key_field == "_id":
+        try:
+            return ObjectId(key)
+        except (InvalidId, TypeError):
+            return key
+    return key
+
+
+def _before_cursor(date_field: str, key_field: str, activity_type: Optional[str], cursor: Optional[Dict]) -> Dict:
+    """
+    Events strictly after the cursor in (date desc, key desc, type desc) order.
+    Keys are document ids, so only two events of one document (e.g. an estimate
+    created and accepted at the same instant) can tie on (date, key).
+    """
+    if not cursor:
+        return {date_field: {"$ne": None}}
+    key = _key_value(key_field, cursor["key"])
+    clauses = [
+        {date_field: {"$lt": cursor["at"]}},
+        {date_field: cursor["at"], key_field: {"$lt": key}},
+    ]
+    if activity_type is not None and activity_type < cursor["type"]:
+        clauses.append({date_field: cursor["at"], key_field: key})
+    return {"$or": clauses}
+
+
+def _shape(activity_type: str, related_type: str, date_field: str, key_field: str) -> Dict:
+    """Project a source document into the common event shape"""
+    shape = {
+        "_id": 0,
+        "activity_type": {"$literal": activity_type},
+        "created_at": f"${date_field}",
+        "key": {"$toString": f"${key_field}"},
+        "related_id": {"$toString": "$_id"},
+        "related_type": {"$literal": related_type},
+        "number": {"$ifNull": ["$estimate_number", {"$ifNull": ["$invoice_number", "$project_number"]}]},
+    }
+    if related_type == "project":
+        shape["name"] = "$name"
+    elif activity_type == "payment_received":
+        shape["amount"] = "$payments.amount"
+        shape["payment_method"] = "$payments.payment_method"
+    else:
+        shape["amount"] = "$total_amount"
+    return shape
+
+
+def _event_pipeline(activity_type: str, customer_id: str, cursor: Optional[Dict], limit: int) -> List[Dict]:
+    collection, date_field, key_field, related_type = EVENT_SOURCES[activity_type]
+    page_filter = _before_cursor(date_field, key_field, activity_type, cursor)
+    sort = {date_field: -1, key_field: -1}
+
+    if activity_type == "payment_received":
+        # Narrow to invoices with a qualifying payment before unwinding
+        bound = {"$lte": cursor["at"]} if cursor else {"$ne": None}
+        return [
+            {"$match": {"customer_id": customer_id, date_field: bound}},
+            {"$unwind": "$payments"},
+            {"$match": page_filter},
+            {"$sort": sort},
+            {"$limit": limit},
+            {"$project": _shape(activity_type, related_type, date_field, key_field)},
+        ]
+
+    return [
+        {"$match": {"customer_id": customer_id, **page_filter}},
+        {"$sort": sort},
+        {"$limit": limit},
+        {"$project": _shape(activity_type, related_type, date_field, key_field)},
+    ]
+
+
+def _manual_pipeline(customer_id: str, types: Optional[List[str]], cursor: Optional[Dict], limit: int) -> List[Dict]:
+    match = {"customer_id": customer_id}
+    if types is not None:
+        match["activity_type"] = {"$in": types}
+    # One event per log, so nothing can tie with the cursor on (date, key)
+    page_filter = _before_cursor("created_at", "_id", None, cursor)
+    return [
+        {"$match": {**match, **page_filter}},
+        {"$sort": {"created_at": -1, "_id": -1}},
+        {"$limit": limit},
+        {"$addFields": {"key": {"$toString": "$_id"}, "manual": True}},
+    ]
+
+
+def build_timeline_pipeline(
+    customer_id: str,
+    types: Optional[List[str]] = None,
+    cursor: Optional[Dict] = None,
+    limit: int = 50,
+) -> Tuple[str, List[Dict]]:
+    """
+    (base collection, pipeline) returning the `limit` newest events after the cursor.
+    `types` filters by activity_type; unknown types match manual activity logs.
+    """
+    if not types:
+        types = None
+    event_types = [t for t in EVENT_SOURCES if types is None or t in types]
+    manual_types = None if types is None else [t for t in types if t not in EVENT_SOURCES]
+
+    branches: List[Tuple[str, List[Dict]]] = []
+    if manual_types is None or manual_types:
+        branches.append((MANUAL_SOURCE, _manual_pipeline(customer_id, manual_types, cursor, limit)))
+    for activity_type in event_types:
+        branches.append((EVENT_SOURCES[activity_type][0], _event_pipeline(activity_type, customer_id, cursor, limit)))
+
+    base_collection, pipeline = branches[0]
+    pipeline = list(pipeline)
+    for collection, branch in branches[1:]:
+        pipeline.append({"$unionWith": {"coll": collection, "pipeline": branch}})
+    pipeline += [
+        {"$sort": {"created_at": -1, "key": -1, "activity_type": -1}},
+        {"$limit": limit},
+    ]
+    return base_collection, pipeline
+
+
+def describe(event: Dict) -> Dict:
+    """Title and description for a synthesized event, in the timeline's display format"""
+    if event.pop("manual", False):
+        event["id"] = event.pop("key")
+        event.pop("_id", None)
+        return event
+
+    number = event.pop("number", None)
+    activity_type = event["activity_type"]
+    amount = event.get("amount") or 0
+    if activity_type == "estimate_created":
+        event.update(title=f"Estimate {number} created", description=f"Amount: ${amount:.2f}")
+    elif activity_type == "estimate_accepted":
+        event["title"] = f"Estimate {number} accepted"
+    elif activity_type == "invoice_created":
+        event.update(title=f"Invoice {number} created", description=f"Amount: ${amount:.2f}")
+    elif activity_type == "payment_received":
+        method = event.pop("payment_method", None) or "unknown"
+        event.update(title=f"Payment received for {number}", description=f"${amount:.2f} via {method}")
+    elif activity_type == "project_created":
+        event.update(title=f"Project {number} created", description=event.pop("name", None))
+    elif activity_type == "project_completed":
+        event.pop("name", None)
+        event["title"] = f"Project {number} completed"
+    event.pop("key", None)
+    return event
+
+
+async def get_customer_timeline(
+    db,
+    customer_id: str,
+    types: Optional[List[str]] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+) -> Dict:
+    """One page of a customer's timeline, newest first, with the cursor for the next page"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    position = decode_cursor(cursor) if cursor else None
+
+    # One extra event tells us whether there is another page
+    base_collection, pipeline = build_timeline_pipeline(customer_id, types, position, limit + 1)
+    rows = await db[base_collection].aggregate(pipeline).to_list(None)
+
+    page, more = rows[:limit], len(rows) > limit
+    next_cursor = encode_cursor(page[-1]) if more and page else None
+    return {
+        "activities": [describe(row) for row in page],
+        "next_cursor": next_cursor,
+        "has_more": more,
+    }
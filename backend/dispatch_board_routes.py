@@ -4,13 +4,16 @@ Dispatch Planning Board Backend
 Visual dispatch management with real-time updates
 """
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 from datetime import datetime, timedelta
 from bson import ObjectId
+import asyncio
+import calendar
 import logging
 
+from metric_rollups import metric_rollups
 from realtime_service import realtime_service
 
 logger = logging.getLogger(__name__)
@@ -23,6 +26,7 @@ from server import db
 work_orders_collection = db.work_orders
 crews_collection = db.hr_employees
 sites_collection = db.sites
+work_order_deletions_collection = db.work_order_deletions
 
 # ========== Request Models ==========
 
@@ -47,16 +51,138 @@ class BatchAssignRequest(BaseModel):
 
 # ========== Get Dispatch Board ==========
 
+# Board columns and the work order filter behind each one
+STATUS_COLUMNS = {
+    "unassigned": {"assigned_crew_id": {"$in": [None, ""]}},
+    "assigned": {"assigned_crew_id": {"$nin": [None, ""]}, "status": {"$in": ["pending", "scheduled"]}},
+    "in_progress": {"status": "in_progress"},
+    "completed": {"status": "completed"},
+}
+
+ACTIVE_CREW_QUERY = {
+    "role": "crew",
+    "status": {"$in": ["active", "available"]}
+}
+
+# Overlap applied to ?since= so writes racing the previous read are not missed
+VERSION_SKEW = timedelta(seconds=5)
+
+
+def _make_version_token(version_time: datetime) -> str:
+    # version_time is naive UTC; timegm reads it as UTC whatever the server's timezone
+    return str(calendar.timegm(version_time.utctimetuple()) * 1000 + version_time.microsecond // 1000)
+
+
+def _parse_version_token(token: str) -> datetime:
+    try:
+        return datetime.utcfromtimestamp(int(token) / 1000) - VERSION_SKEW
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid version token")
+
+
+def _board_columns(wo: Dict) -> List[str]:
+    """Columns a work order appears in (mirrors STATUS_COLUMNS)"""
+    columns = []
+    if not wo.get("assigned_crew_id"):
+        columns.append("unassigned")
+    elif wo.get("status") in ["pending", "scheduled"]:
+        columns.append("assigned")
+    if wo.get("status") == "in_progress":
+        columns.append("in_progress")
+    if wo.get("status") == "completed":
+        columns.append("completed")
+    return columns
+
+
+def _format_work_order(wo: Dict) -> Dict:
+    return {
+        "id": str(wo["_id"]),
+        "customer_id": wo.get("customer_id"),
+        "customer_name": wo.get("customer_name"),
+        "site_id": wo.get("site_id"),
+        "site_address": wo.get("site_address"),
+        "service_type": wo.get("service_type"),
+        "status": wo.get("status"),
+        "priority": wo.get("priority", "normal"),
+        "assigned_crew_id": wo.get("assigned_crew_id"),
+        "assigned_crew_name": wo.get("assigned_crew_name"),
+        "scheduled_start": wo.get("scheduled_start").isoformat() if wo.get("scheduled_start") else None,
+        "scheduled_end": wo.get("scheduled_end").isoformat() if wo.get("scheduled_end") else None,
+        "estimated_duration_hours": wo.get("estimated_duration_hours", 2.0),
+        "weather_triggered": wo.get("weather_triggered", False),
+        "notes": wo.get("notes"),
+        "created_at": wo.get("created_at").isoformat() if wo.get("created_at") else None,
+        "updated_at": wo.get("updated_at").isoformat() if wo.get("updated_at") else None,
+    }
+
+
+def _format_crew(crew: Dict, assigned_count: int) -> Dict:
+    return {
+        "id": str(crew["_id"]),
+        "name": crew.get("name"),
+        "role": crew.get("role"),
+        "status": crew.get("status"),
+        "skills": crew.get("skills", []),
+        "current_location": crew.get("current_location"),
+        "assigned_work_orders": assigned_count,
+        "availability": "available" if assigned_count == 0 else "busy",
+    }
+
+
+async def _board_stats(range_query: Dict) -> Dict:
+    """Column totals and per-crew assignment counts in a single aggregation"""
+    facets = {
+        name: [{"$match": column_filter}, {"$count": "count"}]
+        for name, column_filter in STATUS_COLUMNS.items()
+    }
+    facets["total"] = [{"$count": "count"}]
+    facets["crew_counts"] = [
+        {"$match": {"assigned_crew_id": {"$nin": [None, ""]}}},
+        {"$group": {"_id": "$assigned_crew_id", "count": {"$sum": 1}}}
+    ]
+
+    result = await work_orders_collection.aggregate([
+        {"$match": range_query},
+        {"$facet": facets}
+    ]).to_list(1)
+    result = result[0] if result else {}
+
+    def count(name):
+        rows = result.get(name) or []
+        return rows[0]["count"] if rows else 0
+
+    return {
+        "columns": {name: count(name) for name in STATUS_COLUMNS},
+        "total": count("total"),
+        "crew_counts": {row["_id"]: row["count"] for row in result.get("crew_counts", [])},
+    }
+
+
 @router.get("/board")
 async def get_dispatch_board(
     date: Optional[str] = None,
-    view: str = "day"  # day, week, month
+    view: str = "day",  # day, week, month
+    since: Optional[str] = None,  # version token from a previous response
+    column: Optional[str] = None,  # load more of one status column
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=500)
 ):
     """
     Get dispatch board with all work orders and crew availability
-    Returns structured data for visual board
+    Returns structured data for visual board.
+    
+    Every response carries a version token; pass it back as ?since= to get only
+    work orders and crews changed after it. A delta also lists every active crew
+    id, so crews no longer active can be removed. Week and month views are paginated
+    per status column.
     """
     try:
+        # Taken before any reads so the next delta covers writes made during this one
+        version_time = datetime.utcnow()
+        
+        if column and column not in STATUS_COLUMNS:
+            raise HTTPException(status_code=400, detail=f"Unknown column: {column}")
+        
         # Parse date or use today
         if date:
             target_date = datetime.fromisoformat(date)
@@ -79,96 +205,123 @@ async def get_dispatch_board(
             else:
                 end_date = start_date.replace(month=target_date.month + 1)
         
-        # Get work orders for date range
-        work_orders_cursor = work_orders_collection.find({
+        range_query = {
             "scheduled_start": {
                 "$gte": start_date,
                 "$lt": end_date
             }
-        }).sort("scheduled_start", 1)
-        
-        work_orders = await work_orders_cursor.to_list(None)
-        
-        # Get all active crews
-        crews_cursor = crews_collection.find({
-            "role": "crew",
-            "status": {"$in": ["active", "available"]}
-        })
-        crews = await crews_cursor.to_list(None)
+        }
+        columns = [column] if column else list(STATUS_COLUMNS)
+        board = {name: [] for name in columns}
+        pagination = None
+        removed_work_order_ids = []
+        
+        if since:
+            # Delta: only documents written after the token
+            since_time = _parse_version_token(since)
+            
+            changed, deleted, crews, active_crew_ids, stats = await asyncio.gather(
+                work_orders_collection.find({"updated_at": {"$gt": since_time}}).sort("updated_at", 1).to_list(None),
+                work_order_deletions_collection.find({"deleted_at": {"$gt": since_time}}).to_list(None),
+                crews_collection.find({**ACTIVE_CREW_QUERY, "updated_at": {"$gt": since_time}}).to_list(None),
+                crews_collection.distinct("_id", ACTIVE_CREW_QUERY),
+                _board_stats(range_query)
+            )
+            
+            for wo in changed:
+                in_range = start_date <= (wo.get("scheduled_start") or datetime.min) < end_date
+                wo_columns = [name for name in _board_columns(wo) if name in board] if in_range else []
+                if not wo_columns:
+                    # Moved out of this board's range or columns, e.g. cancelled or on hold
+                    removed_work_order_ids.append(str(wo["_id"]))
+                    continue
+                formatted = _format_work_order(wo)
+                for name in wo_columns:
+                    board[name].append(formatted)
+            
+            removed_work_order_ids.extend(d["work_order_id"] for d in deleted)
         
-        # Format work orders
-        formatted_work_orders = []
-        for wo in work_orders:
-            formatted_work_orders.append({
-                "id": str(wo["_id"]),
-                "customer_id": wo.get("customer_id"),
-                "customer_name": wo.get("customer_name"),
-                "site_id": wo.get("site_id"),
-                "site_address": wo.get("site_address"),
-                "service_type": wo.get("service_type"),
-                "status": wo.get("status"),
-                "priority": wo.get("priority", "normal"),
-                "assigned_crew_id": wo.get("assigned_crew_id"),
-                "assigned_crew_name": wo.get("assigned_crew_name"),
-                "scheduled_start": wo.get("scheduled_start").isoformat() if wo.get("scheduled_start") else None,
-                "scheduled_end": wo.get("scheduled_end").isoformat() if wo.get("scheduled_end") else None,
-                "estimated_duration_hours": wo.get("estimated_duration_hours", 2.0),
-                "weather_triggered": wo.get("weather_triggered", False),
-                "notes": wo.get("notes"),
-                "created_at": wo.get("created_at").isoformat() if wo.get("created_at") else None,
-            })
+        elif view == "day":
+            work_orders, crews, stats = await asyncio.gather(
+                work_orders_collection.find(range_query).sort("scheduled_start", 1).to_list(None),
+                crews_collection.find(ACTIVE_CREW_QUERY).to_list(None),
+                _board_stats(range_query)
+            )
+            
+            for wo in work_orders:
+                formatted = _format_work_order(wo)
+                for name in _board_columns(wo):
+                    if name in board:
+                        board[name].append(formatted)
         
-        # Format crews with availability
-        formatted_crews = []
-        for crew in crews:
-            # Count assigned work orders
-            assigned_count = sum(
-                1 for wo in formatted_work_orders
-                if wo.get("assigned_crew_id") == str(crew["_id"])
+        else:
+            # Week/month: one page per status column
+            skip = (page - 1) * page_size
+            
+            pages = await asyncio.gather(*(
+                work_orders_collection.find({**range_query, **STATUS_COLUMNS[name]})
+                .sort("scheduled_start", 1).skip(skip).limit(page_size).to_list(page_size)
+                for name in columns
+            ))
+            crews, stats = await asyncio.gather(
+                crews_collection.find(ACTIVE_CREW_QUERY).to_list(None),
+                _board_stats(range_query)
             )
             
-            formatted_crews.append({
-                "id": str(crew["_id"]),
-                "name": crew.get("name"),
-                "role": crew.get("role"),
-                "status": crew.get("status"),
-                "skills": crew.get("skills", []),
-                "current_location": crew.get("current_location"),
-                "assigned_work_orders": assigned_count,
-                "availability": "available" if assigned_count == 0 else "busy",
-            })
+            pagination = {}
+            for name, work_orders in zip(columns, pages):
+                board[name] = [_format_work_order(wo) for wo in work_orders]
+                total = stats["columns"][name]
+                pagination[name] = {
+                    "page": page,
+                    "page_size": page_size,
+                    "total": total,
+                    "has_more": skip + len(work_orders) < total,
+                }
         
-        # Group work orders by status
-        unassigned = [wo for wo in formatted_work_orders if not wo.get("assigned_crew_id")]
-        assigned = [wo for wo in formatted_work_orders if wo.get("assigned_crew_id") and wo.get("status") in ["pending", "scheduled"]]
-        in_progress = [wo for wo in formatted_work_orders if wo.get("status") == "in_progress"]
-        completed = [wo for wo in formatted_work_orders if wo.get("status") == "completed"]
+        crew_counts = stats["crew_counts"]
+        formatted_crews = [
+            _format_crew(crew, crew_counts.get(str(crew["_id"]), 0))
+            for crew in crews
+        ]
         
-        return {
+        if not since:
+            active_crew_ids = [crew["_id"] for crew in crews]
+        available_crews = sum(1 for crew_id in active_crew_ids if not crew_counts.get(str(crew_id)))
+        
+        response = {
             "success": True,
             "view": view,
+            "version": _make_version_token(version_time),
             "date_range": {
                 "start": start_date.isoformat(),
                 "end": end_date.isoformat(),
             },
             "summary": {
-                "total_work_orders": len(formatted_work_orders),
-                "unassigned": len(unassigned),
-                "assigned": len(assigned),
-                "in_progress": len(in_progress),
-                "completed": len(completed),
-                "total_crews": len(formatted_crews),
-                "available_crews": sum(1 for c in formatted_crews if c["availability"] == "available"),
-            },
-            "work_orders": {
-                "unassigned": unassigned,
-                "assigned": assigned,
-                "in_progress": in_progress,
-                "completed": completed,
+                "total_work_orders": stats["total"],
+                **stats["columns"],
+                "total_crews": len(active_crew_ids),
+                "available_crews": available_crews,
             },
+            "work_orders": board,
             "crews": formatted_crews,
         }
         
+        if since:
+            response["delta"] = True
+            response["since"] = since
+            response["removed_work_order_ids"] = removed_work_order_ids
+            # Crews are not stamped when they leave the active roster; drop any not listed here
+            response["active_crew_ids"] = [str(crew_id) for crew_id in active_crew_ids]
+            # Crew documents can be unchanged while their workload moved
+            response["crew_assignment_counts"] = crew_counts
+        if pagination is not None:
+            response["pagination"] = pagination
+        
+        return response
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting dispatch board: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -230,6 +383,7 @@ async def assign_crew_to_work_order(request: AssignCrewRequest):
         
         if result.modified_count == 0:
             raise HTTPException(status_code=500, detail="Failed to assign crew")
+        await metric_rollups.source_changed("work_orders", request.work_order_id)
         
         # Send real-time notification
         await realtime_service.emit_event({
@@ -285,6 +439,7 @@ async def unassign_crew(work_order_id: str):
         )
         
         if result.modified_count > 0:
+            await metric_rollups.source_changed("work_orders", work_order)
             # Send real-time notification
             await realtime_service.emit_event({
                 "type": "work_order_unassigned",
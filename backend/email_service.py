@@ -1,9 +1,10 @@
+import asyncio
 import smtplib
 import os
 import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -279,6 +280,13 @@ For support, contact your supervisor or use the contact information above.
         
         return self._send_email(new_member_email, subject, body)
     
+    async def send_email(self, to_email: str, subject: str, body: str) -> bool:
+        """Send one email without blocking the event loop"""
+        if not self.enabled:
+            logger.warning(f"Email service not configured. Skipping email to {to_email}.")
+            return False
+        return await asyncio.to_thread(self._send_email, to_email, subject, body)
+    
     def _send_email(self, recipient: str, subject: str, body: str) -> bool:
         """Send an email using SMTP"""
         try:
@@ -308,6 +316,46 @@ For support, contact your supervisor or use the contact information above.
             logger.error(f"Failed to send email to {recipient}: {str(e)}")
             return False
     
+    def send_batch(self, messages: List[Dict[str, str]]) -> List[bool]:
+        """
+        Send several emails over one SMTP session.
+        Each message is a dict with recipient, subject and body; returns per-message success.
+        """
+        if not self.enabled:
+            logger.warning(f"Email service not configured, skipping batch of {len(messages)}")
+            return [False] * len(messages)
+        
+        results = []
+        try:
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+            server.starttls()
+            server.login(self.sender_email, self.sender_password)
+        except Exception as e:
+            logger.error(f"Failed to open SMTP session for batch: {str(e)}")
+            return [False] * len(messages)
+        
+        try:
+            for message in messages:
+                try:
+                    msg = MIMEMultipart()
+                    msg['From'] = self.sender_email
+                    msg['To'] = message['recipient']
+                    msg['Subject'] = message['subject']
+                    msg.attach(MIMEText(message['body'], 'plain'))
+                    server.sendmail(self.sender_email, message['recipient'], msg.as_string())
+                    results.append(True)
+                except Exception as e:
+                    logger.error(f"Failed to send email to {message.get('recipient')}: {str(e)}")
+                    results.append(False)
+        finally:
+            try:
+                server.quit()
+            except Exception:
+                pass
+        
+        logger.info(f"Email batch sent: {sum(results)}/{len(messages)} delivered")
+        return results
+    
     def send_credentials_email(self, to_email: str, name: str, username: str, password: str, 
                                access_web: bool, access_inapp: bool, role: str) -> bool:
         """Send welcome email with login credentials using database template"""
@@ -0,0 +1,280 @@
+"""
+Equipment Analytics
+Fleet-wide equipment usage, inspection and maintenance figures computed
+with one grouped aggregation per source collection, run concurrently,
+instead of several queries per asset. Round trips stay constant as the
+fleet grows.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+# Days since last inspection -> status
+INSPECTION_CURRENT_DAYS = 7
+INSPECTION_DUE_SOON_DAYS = 30
+
+# Completed dispatches since last maintenance -> alert level
+MAINTENANCE_CRITICAL_DISPATCHES = 75
+MAINTENANCE_WARNING_DISPATCHES = 50
+MAINTENANCE_INFO_DISPATCHES = 30
+
+
+def _parse_date(value) -> Optional[datetime]:
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    return value if isinstance(value, datetime) else None
+
+
+def inspection_status(last_inspection, now: datetime) -> Tuple[Optional[datetime], Optional[int], str]:
+    """(last inspection date, days since, status) for a submitted_at value"""
+    last_date = _parse_date(last_inspection)
+    if not last_date:
+        return None, None, "never_inspected"
+    days_since = (now - last_date).days
+    if days_since <= INSPECTION_CURRENT_DAYS:
+        return last_date, days_since, "current"
+    if days_since <= INSPECTION_DUE_SOON_DAYS:
+        return last_date, days_since, "due_soon"
+    return last_date, days_since, "overdue"
+
+
+async def _active_equipment(db) -> List[Dict]:
+    equipment = await db.equipment.find(
+        {"active": True},
+        {"name": 1, "equipment_type": 1, "status": 1}
+    ).to_list(None)
+    for doc in equipment:
+        doc["id"] = str(doc.pop("_id"))
+    return equipment
+
+
+async def _last_inspections(db, equipment_ids: List[str]) -> Dict[str, object]:
+    """Latest form response per equipment, via the (equipment_id, submitted_at) index"""
+    rows = await db.form_responses.aggregate([
+        {"$match": {"equipment_id": {"$in": equipment_ids}}},
+        {"$sort": {"equipment_id": 1, "submitted_at": -1}},
+        {"$group": {"_id": "$equipment_id", "submitted_at": {"$first": "$submitted_at"}}}
+    ]).to_list(None)
+    return {row["_id"]: row["submitted_at"] for row in rows}
+
+
+async def _counts_by(db, collection: str, match: Dict, field: str, unwind: bool = False) -> Dict[str, int]:
+    pipeline = [{"$match": match}]
+    if unwind:
+        pipeline.append({"$unwind": f"${field}"})
+        pipeline.append({"$match": {field: match[field]}})
+    pipeline.append({"$group": {"_id": f"${field}", "count": {"$sum": 1}}})
+    rows = await db[collection].aggregate(pipeline).to_list(None)
+    return {row["_id"]: row["count"] for row in rows}
+
+
+# ========== Usage & inspection analytics ==========
+
+async def equipment_usage_analytics(db, days: int = 30) -> Dict:
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=days)
+
+    equipment = await _active_equipment(db)
+    ids = [e["id"] for e in equipment]
+
+    dispatch_counts, inspection_counts, last_inspections = await asyncio.gather(
+        _counts_by(db, "dispatches", {
+            "equipment_ids": {"$in": ids},
+            "created_at": {"$gte": start_date, "$lte": end_date}
+        }, "equipment_ids", unwind=True),
+        _counts_by(db, "form_responses", {
+            "equipment_id": {"$in": ids},
+            "submitted_at": {"$gte": start_date, "$lte": end_date}
+        }, "equipment_id"),
+        _last_inspections(db, ids),
+    )
+
+    now = datetime.utcnow()
+    equipment_list = []
+    for doc in equipment:
+        last_date, days_since, status = inspection_status(last_inspections.get(doc["id"]), now)
+        equipment_list.append({
+            "equipment_id": doc["id"],
+            "name": doc.get("name", "Unknown"),
+            "equipment_type": doc.get("equipment_type", "unknown"),
+            "status": doc.get("status", "available"),
+            "dispatch_count": dispatch_counts.get(doc["id"], 0),
+            "inspection_count": inspection_counts.get(doc["id"], 0),
+            "last_inspection_date": last_date.isoformat() if last_date else None,
+            "days_since_inspection": days_since,
+            "inspection_status": status
+        })
+
+    inspection_status_counts = {
+        status: sum(1 for e in equipment_list if e["inspection_status"] == status)
+        for status in ("current", "due_soon", "overdue", "never_inspected")
+    }
+
+    most_used = sorted(equipment_list, key=lambda x: x["dispatch_count"], reverse=True)[:5]
+    needs_inspection = [e for e in equipment_list if e["inspection_status"] in ["overdue", "never_inspected"]]
+    needs_inspection.sort(key=lambda x: x["days_since_inspection"] if x["days_since_inspection"] is not None else 999999, reverse=True)
+
+    return {
+        "period_days": days,
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "summary": {
+            "total_equipment": len(equipment_list),
+            "total_dispatches": sum(e["dispatch_count"] for e in equipment_list),
+            "total_inspections": sum(e["inspection_count"] for e in equipment_list),
+            "inspection_status": inspection_status_counts
+        },
+        "most_used_equipment": most_used,
+        "needs_inspection": needs_inspection[:5],
+        "all_equipment": equipment_list
+    }
+
+
+async def equipment_inspection_status(db) -> Dict:
+    equipment = await _active_equipment(db)
+    ids = [e["id"] for e in equipment]
+
+    templates, last_inspections = await asyncio.gather(
+        db.form_templates.find(
+            {"form_type": "equipment_form", "archived": {"$ne": True}},
+            {"name": 1, "equipment_type": 1}
+        ).to_list(None),
+        _last_inspections(db, ids),
+    )
+    templates_by_type: Dict[str, List[Dict]] = {}
+    for template in templates:
+        templates_by_type.setdefault(template.get("equipment_type"), []).append(template)
+
+    now = datetime.utcnow()
+    equipment_list = []
+    for doc in equipment:
+        equipment_type = doc.get("equipment_type", "unknown")
+        # Per type, capped as the per-asset query was
+        form_templates = templates_by_type.get(equipment_type, [])[:100]
+        if not form_templates:
+            continue
+
+        last_date, days_since, status = inspection_status(last_inspections.get(doc["id"]), now)
+        equipment_list.append({
+            "equipment_id": doc["id"],
+            "equipment_name": doc.get("name", "Unknown"),
+            "equipment_type": equipment_type,
+            "last_inspection_date": last_date.isoformat() if last_date else None,
+            "days_since_inspection": days_since,
+            "status": status,
+            "available_forms": len(form_templates),
+            "form_templates": [
+                {"id": str(template["_id"]), "name": template.get("name", "Unknown")}
+                for template in form_templates
+            ]
+        })
+
+    status_order = {"overdue": 0, "due_soon": 1, "never_inspected": 2, "current": 3}
+    equipment_list.sort(key=lambda x: status_order.get(x["status"], 4))
+
+    return {
+        "equipment": equipment_list,
+        "summary": {
+            "total_equipment": len(equipment_list),
+            **{
+                status: sum(1 for e in equipment_list if e["status"] == status)
+                for status in ("overdue", "due_soon", "current", "never_inspected")
+            }
+        }
+    }
+
+
+# ========== Maintenance alerts ==========
+
+async def _first_maintenance(db, equipment_ids: List[str], match: Dict, sort_field: str, direction: int) -> Dict[str, Dict]:
+    """First maintenance record per equipment in sort_field order"""
+    rows = await db.equipment_maintenance.aggregate([
+        {"$match": {"equipment_id": {"$in": equipment_ids}, **match}},
+        {"$sort": {"equipment_id": 1, sort_field: direction}},
+        {"$group": {"_id": "$equipment_id", "record": {"$first": "$$ROOT"}}}
+    ]).to_list(None)
+    records = {}
+    for row in rows:
+        record = row["record"]
+        record["id"] = str(record.pop("_id"))
+        records[row["_id"]] = record
+    return records
+
+
+async def _dispatches_since(db, cutoffs: Dict[str, Optional[datetime]]) -> Dict[str, int]:
+    """Completed dispatches per equipment on or after its cutoff (all of them when it has none)"""
+    if not cutoffs:
+        return {}
+    uncut = [equipment_id for equipment_id, cutoff in cutoffs.items() if cutoff is None]
+    clauses = [
+        {"equipment_ids": equipment_id, "completed_at": {"$gte": cutoff}}
+        for equipment_id, cutoff in cutoffs.items() if cutoff is not None
+    ]
+    if uncut:
+        clauses.append({"equipment_ids": {"$in": uncut}})
+
+    rows = await db.dispatches.aggregate([
+        {"$match": {"status": "completed", "$or": clauses}},
+        {"$unwind": "$equipment_ids"},
+        # Re-apply per equipment: a dispatch may carry several assets with different cutoffs
+        {"$match": {"$or": clauses}},
+        {"$group": {"_id": "$equipment_ids", "count": {"$sum": 1}}}
+    ]).to_list(None)
+    return {row["_id"]: row["count"] for row in rows}
+
+
+async def maintenance_alerts(db) -> Dict:
+    equipment = await _active_equipment(db)
+    ids = [e["id"] for e in equipment]
+    now = datetime.utcnow()
+
+    last_maintenance, upcoming_maintenance = await asyncio.gather(
+        _first_maintenance(db, ids, {"status": "completed"}, "completed_date", -1),
+        _first_maintenance(db, ids, {"status": "scheduled", "scheduled_date": {"$gte": now}}, "scheduled_date", 1),
+    )
+    cutoffs = {
+        equipment_id: (last_maintenance[equipment_id].get("completed_date") or now) if equipment_id in last_maintenance else None
+        for equipment_id in ids
+    }
+    dispatch_counts = await _dispatches_since(db, cutoffs)
+
+    equipment_list = []
+    for doc in equipment:
+        equipment_id = doc["id"]
+        dispatches_since = dispatch_counts.get(equipment_id, 0)
+        upcoming = upcoming_maintenance.get(equipment_id)
+
+        if dispatches_since >= MAINTENANCE_CRITICAL_DISPATCHES:
+            alert_level, message = "critical", f"{dispatches_since} dispatches since last maintenance - URGENT"
+        elif dispatches_since >= MAINTENANCE_WARNING_DISPATCHES:
+            alert_level, message = "warning", f"{dispatches_since} dispatches since last maintenance"
+        elif dispatches_since >= MAINTENANCE_INFO_DISPATCHES and not upcoming:
+            alert_level, message = "info", f"{dispatches_since} dispatches - Consider scheduling maintenance"
+        else:
+            continue
+
+        last = last_maintenance.get(equipment_id)
+        equipment_list.append({
+            "equipment_id": equipment_id,
+            "equipment_name": doc.get("name", "Unknown"),
+            "equipment_type": doc.get("equipment_type", "unknown"),
+            "dispatches_since_maintenance": dispatches_since,
+            "last_maintenance_date": last.get("completed_date") if last else None,
+            "upcoming_maintenance": upcoming,
+            "alert_level": alert_level,
+            "message": message
+        })
+
+    priority_order = {"critical": 0, "warning": 1, "info": 2}
+    equipment_list.sort(key=lambda x: (priority_order[x["alert_level"]], -x["dispatches_since_maintenance"]))
+
+    return {
+        "total_alerts": len(equipment_list),
+        "critical_count": sum(1 for e in equipment_list if e["alert_level"] == "critical"),
+        "warning_count": sum(1 for e in equipment_list if e["alert_level"] == "warning"),
+        "alerts": equipment_list
+    }
@@ -1,78 +1,178 @@
 """
 Event Emitter System for Workflow Automation
 Allows various parts of the application to emit events that trigger custom workflows
+
+Enabled event-triggered workflows are held in memory, indexed by event type,
+so emitting is a dictionary lookup plus one insert of custom_workflow jobs.
+Workflows run on job queue workers, outside the request that emitted the
+event. The index
+is rebuilt after workflow create/update/delete and, across workers, when a
+change stream reports a custom_workflows write.
 """
 
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional
 from datetime import datetime
 
+from pymongo.errors import OperationFailure, PyMongoError
+
+from custom_workflow_models import CustomWorkflow
+from job_queue import job_queue
+
 logger = logging.getLogger(__name__)
 
+CHANGE_STREAM_RETRY = 30
+
+# Fields the executor writes after every run; they don't change subscriptions
+EXECUTION_FIELDS = {'execution_count', 'last_execution'}
+
+
 class EventEmitter:
     """
     Centralized event emitter that triggers custom workflows based on system events
     """
-    
+
     def __init__(self, db, custom_workflow_executor):
         self.db = db
         self.custom_workflow_executor = custom_workflow_executor
-        
+        self.subscriptions: Dict[str, List[CustomWorkflow]] = {}
+        self._version = 1
+        self._loaded_version = 0
+        self._lock = asyncio.Lock()
+        self._watcher: Optional[asyncio.Task] = None
+        # Called whenever custom_workflows changes, e.g. to reload cron schedules
+        self.listeners: List[Callable[[], None]] = []
+
+    # ========== Lifecycle ==========
+
+    async def start(self):
+        """Build the subscription index and start the change stream watcher"""
+        await self._ensure_index()
+        self._watcher = asyncio.create_task(self.watch_changes())
+
+    async def stop(self):
+        if self._watcher:
+            self._watcher.cancel()
+            self._watcher = None
+
+    # ========== Subscription index ==========
+
+    def invalidate(self):
+        """Mark the index stale; it is rebuilt before the next event is dispatched"""
+        self._version += 1
+        for listener in self.listeners:
+            listener()
+
+    async def _load(self) -> Dict[str, List[CustomWorkflow]]:
+        workflows = await self.db.custom_workflows.find({
+            'enabled': True,
+            'trigger.trigger_type': 'event',
+            'trigger.event_type': {'$exists': True}
+        }).to_list(None)
+
+        subscriptions: Dict[str, List[CustomWorkflow]] = {}
+        for workflow_data in workflows:
+            workflow_data['id'] = str(workflow_data.pop('_id'))
+            if workflow_data.get('created_by') is not None:
+                workflow_data['created_by'] = str(workflow_data['created_by'])
+            try:
+                workflow = CustomWorkflow(**workflow_data)
+            except Exception as e:
+                logger.error(f"Skipping invalid workflow {workflow_data['id']}: {str(e)}")
+                continue
+            subscriptions.setdefault(workflow_data['trigger']['event_type'], []).append(workflow)
+        return subscriptions
+
+    async def _ensure_index(self):
+        if self._loaded_version == self._version:
+            return
+        async with self._lock:
+            # Invalidations that arrive while loading trigger another pass
+            while self._loaded_version != self._version:
+                version = self._version
+                self.subscriptions = await self._load()
+                self._loaded_version = version
+                logger.info(
+                    f"Event subscriptions loaded: {sum(len(w) for w in self.subscriptions.values())} "
+                    f"workflow(s) across {len(self.subscriptions)} event type(s)"
+                )
+
+    async def watch_changes(self):
+        """
+        Invalidate the index when any worker writes a custom workflow.
+        Requires a replica set; without one only this worker's writes invalidate.
+        """
+        pipeline = [{"$match": {
+            "ns.coll": "custom_workflows",
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+        }}]
+
+        while True:
+            try:
+                async with self.db.watch(pipeline) as stream:
+                    logger.info("Event subscription change stream started")
+                    async for change in stream:
+                        if change["operationType"] == "update":
+                            fields = change.get("updateDescription", {}).get("updatedFields", {})
+                            if set(fields) <= EXECUTION_FIELDS:
+                                continue
+                        self.invalidate()
+            except OperationFailure as e:
+                logger.info(f"Change streams unavailable, event subscriptions refresh on local writes only: {e}")
+                return
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.error(f"Event subscription change stream error: {e}")
+                # Anything written while disconnected would otherwise be missed
+                self.invalidate()
+                await asyncio.sleep(CHANGE_STREAM_RETRY)
+
+    # ========== Dispatch ==========
+
     async def emit(self, event_type: str, context: Dict[str, Any]):
         """
-        Emit an event and trigger all workflows listening for that event type
-        
+        Emit an event and queue every workflow listening for that event type
+
         Args:
             event_type: The type of event (e.g., 'dispatch_completed', 'invoice_sent')
             context: Context data to pass to the workflow execution
         """
         try:
             logger.info(f"Event emitted: {event_type}")
-            
-            # Find all enabled workflows with event trigger matching this event type
-            workflows = await self.db.custom_workflows.find({
-                'enabled': True,
-                'trigger.trigger_type': 'event',
-                'trigger.event_type': event_type
-            }).to_list(length=100)
-            
+            await self._ensure_index()
+
+            workflows = self.subscriptions.get(event_type)
             if not workflows:
                 logger.debug(f"No workflows listening for event: {event_type}")
                 return
-            
+
             logger.info(f"Found {len(workflows)} workflow(s) listening for event: {event_type}")
-            
-            # Execute each matching workflow
-            for workflow in workflows:
-                try:
-                    workflow_id = str(workflow['_id'])
-                    workflow_name = workflow.get('name', 'Unnamed Workflow')
-                    
-                    logger.info(f"Triggering workflow '{workflow_name}' (ID: {workflow_id}) for event: {event_type}")
-                    
-                    # Add event metadata to context
-                    execution_context = {
-                        **context,
-                        'trigger_type': 'event',
-                        'event_type': event_type,
-                        'event_timestamp': datetime.utcnow().isoformat(),
-                    }
-                    
-                    # Execute the workflow asynchronously
-                    result = await self.custom_workflow_executor.execute(
-                        workflow_id,
-                        execution_context
-                    )
-                    
-                    logger.info(f"Workflow '{workflow_name}' completed with result: {result.get('status')}")
-                    
-                except Exception as e:
-                    logger.error(f"Error executing workflow {workflow.get('_id')} for event {event_type}: {str(e)}")
-                    continue
-            
+
+            # Add event metadata to context
+            execution_context = {
+                **context,
+                'trigger_type': 'event',
+                'event_type': event_type,
+                'event_timestamp': datetime.utcnow().isoformat(),
+            }
+
+            await job_queue.enqueue_many('custom_workflow', [
+                {'workflow_id': workflow.id, 'context': execution_context}
+                for workflow in workflows
+            ])
+
         except Exception as e:
             logger.error(f"Error in event emitter for event {event_type}: {str(e)}")
 
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'event_types': len(self.subscriptions),
+            'workflows': sum(len(w) for w in self.subscriptions.values()),
+            'index_stale': self._loaded_version != self._version,
+        }
+
 # Global event emitter instance (will be initialized in server.py)
 event_emitter: Optional[EventEmitter] = None
 
@@ -84,3 +184,8 @@ def set_event_emitter(emitter: EventEmitter):
     """Set the global event emitter instance"""
     global event_emitter
     event_emitter = emitter
+
+def invalidate_subscriptions():
+    """Call after writing custom_workflows so this worker sees the change immediately"""
+    if event_emitter:
+        event_emitter.invalidate()
@@ -0,0 +1,456 @@
+"""
+Export Engine
+Streams documents from a MongoDB cursor into CSV, NDJSON or XLSX with
+bounded memory. Small exports are sent chunked in the response; exports
+over the row limit run as an export_file job on the job queue, which writes
+a downloadable file to GridFS.
+"""
+
+import csv
+import io
+import json
+import logging
+import math
+import os
+import re
+import zipfile
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from xml.sax.saxutils import escape
+
+from bson import ObjectId, json_util
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from job_queue import job_queue
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Exports with more rows than this are written to a file by a background job
+MAX_STREAMED_ROWS = int(os.getenv("EXPORT_MAX_STREAMED_ROWS", "50000"))
+
+EXPORT_BUCKET = "export_files"
+EXPORT_RETENTION = timedelta(hours=24)
+EXPORT_MAX_ATTEMPTS = 2
+
+# Documents fetched per cursor round trip, and rows encoded per yielded chunk
+CURSOR_BATCH_SIZE = 1000
+ROWS_PER_CHUNK = 500
+
+# Characters XML 1.0 does not allow, which would corrupt an XLSX sheet
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def to_cell(value: Any) -> Any:
+    """Flatten a BSON value into something every export format can hold"""
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return json.dumps(value, default=str, separators=(",", ":"))
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+async def iter_rows(
+    collection,
+    query: Dict,
+    sort: Optional[List] = None,
+    projection: Optional[Dict] = None,
+    transform: Optional[Callable[[Dict], Dict]] = None,
+) -> AsyncIterator[Dict]:
+    """Yield documents from a cursor without materializing the result, with _id exposed as id"""
+    cursor = collection.find(query, projection).batch_size(CURSOR_BATCH_SIZE)
+    if sort:
+        cursor = cursor.sort(sort)
+    async for doc in cursor:
+        if transform:
+            doc = transform(doc)
+        if "_id" in doc:
+            doc = {"id": doc.pop("_id"), **doc}
+        yield doc
+
+
+# ========== Encoders ==========
+
+async def _encode_csv(rows: AsyncIterator[Dict], columns: List[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    writer.writeheader()
+    pending = 0
+    async for row in rows:
+        writer.writerow({c: to_cell(row.get(c)) for c in columns})
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode("utf-8")
+
+
+async def _encode_ndjson(rows: AsyncIterator[Dict], columns: Optional[List[str]]) -> AsyncIterator[bytes]:
+    lines = []
+    async for row in rows:
+        if columns:
+            row = {c: row.get(c) for c in columns}
+        lines.append(json.dumps(row, default=_json_default))
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable file object that collects zip output until it is drained"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_cell(value: Any) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, int) or (isinstance(value, float) and math.isfinite(value)):
+        return f"<c><v>{value}</v></c>"
+    text = escape(_XML_ILLEGAL.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values: List[Any]) -> str:
+    return "<row>" + "".join(_xlsx_cell(v) for v in values) + "</row>"
+
+
+async def _encode_xlsx(rows: AsyncIterator[Dict], columns: List[str]) -> AsyncIterator[bytes]:
+    """Single-sheet workbook with inline strings, zipped as it is written"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<sheetData>'
+            )
+            sheet.write(_xlsx_row(columns).encode("utf-8"))
+            pending = 0
+            async for row in rows:
+                sheet.write(_xlsx_row([to_cell(row.get(c)) for c in columns]).encode("utf-8"))
+                pending += 1
+                if pending >= ROWS_PER_CHUNK:
+                    pending = 0
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+            sheet.write(b"</sheetData></worksheet>")
+
+    yield sink.drain()
+
+
+async def encode_rows(
+    rows: AsyncIterator[Dict],
+    format: str,
+    columns: Optional[List[str]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Encode rows as byte chunks. CSV and XLSX need a header up front, so
+    without explicit columns the first row's fields are used.
+    """
+    if format == "ndjson":
+        async for chunk in _encode_ndjson(rows, columns):
+            yield chunk
+        return
+
+    if columns is None:
+        first = None
+        async for row in rows:
+            first = row
+            break
+        columns = list(first) if first else []
+        rows = _prepend(first, rows)
+
+    encoder = _encode_csv if format == "csv" else _encode_xlsx
+    async for chunk in encoder(rows, columns):
+        yield chunk
+
+
+async def _prepend(first: Optional[Dict], rows: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+    if first is not None:
+        yield first
+    async for row in rows:
+        yield row
+
+
+def _check_format(format: str):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported export format '{format}', use one of: {', '.join(EXPORT_FORMATS)}"
+        )
+
+
+# ========== Background Export Jobs ==========
+
+class ExportJobService:
+    """
+    Runs large exports as export_file jobs on the job queue and tracks them in
+    export_jobs. Files go to GridFS (the export_files bucket), so any worker
+    can serve a download.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._files = None
+        job_queue.handler("export_file", max_attempts=EXPORT_MAX_ATTEMPTS)(self.run)
+
+    @property
+    def files(self) -> AsyncIOMotorGridFSBucket:
+        if self._files is None:
+            self._files = AsyncIOMotorGridFSBucket(self.db, bucket_name=EXPORT_BUCKET)
+        return self._files
+
+    async def start(
+        self,
+        collection,
+        query: Dict,
+        format: str,
+        filename: str,
+        sort: Optional[List] = None,
+        projection: Optional[Dict] = None,
+        columns: Optional[List[str]] = None,
+        estimated_rows: Optional[int] = None,
+    ) -> Dict:
+        job = {
+            "status": "pending",
+            "format": format,
+            "filename": f"{filename}.{format}",
+            "collection": collection.name,
+            # Extended JSON keeps dates and ObjectIds in the query, and its operators out of field names
+            "spec": json_util.dumps({"query": query, "sort": sort, "projection": projection, "columns": columns}),
+            "estimated_rows": estimated_rows,
+            "rows": 0,
+            "created_at": datetime.utcnow(),
+        }
+        result = await self.db.export_jobs.insert_one(job)
+        job_id = str(result.inserted_id)
+        queue_job_id = await job_queue.enqueue("export_file", {"job_id": job_id})
+        await self._update(job_id, {"queue_job_id": queue_job_id})
+
+        return {"job_id": job_id, **self.serialize({**job, "_id": result.inserted_id})}
+
+    async def run(self, job_id: str):
+        """export_file job handler: write the export into GridFS"""
+        job = await self.get(job_id)
+        if not job:
+            logger.warning(f"Export job {job_id} no longer exists")
+            return
+        spec = json_util.loads(job["spec"])
+        rows = iter_rows(self.db[job["collection"]], spec["query"], spec["sort"], spec["projection"])
+        await self._update(job_id, {"status": "running", "started_at": datetime.utcnow()})
+
+        count = 0
+
+        async def counted():
+            nonlocal count
+            async for row in rows:
+                count += 1
+                yield row
+
+        # A retry replaces whatever an earlier attempt wrote
+        await self._delete_file(job)
+        upload = self.files.open_upload_stream(
+            job["filename"], metadata={"export_job_id": job_id, "content_type": EXPORT_FORMATS[job["format"]]}
+        )
+        try:
+            async for chunk in encode_rows(counted(), job["format"], spec["columns"]):
+                await upload.write(chunk)
+            await upload.close()
+        except Exception as e:
+            await upload.abort()
+            logger.error(f"Export job {job_id} failed: {e}")
+            await self._update(job_id, {"status": "failed", "error": str(e), "rows": count})
+            raise
+
+        await self._update(job_id, {
+            "status": "completed",
+            "rows": count,
+            "file_id": upload._id,
+            "file_size": upload.length,
+            "completed_at": datetime.utcnow(),
+        })
+        logger.info(f"Export job {job_id} wrote {count} rows")
+
+        await self.cleanup_expired()
+
+    async def _update(self, job_id: str, fields: Dict):
+        await self.db.export_jobs.update_one({"_id": ObjectId(job_id)}, {"$set": fields})
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        if not ObjectId.is_valid(job_id):
+            return None
+        job = await self.db.export_jobs.find_one({"_id": ObjectId(job_id)})
+        if job and job.get("status") in ("pending", "running") and not await self._queued(job):
+            # Its queue job is gone (dead-lettered) or it ran in-process before a restart
+            job.update(status="failed", error="Export was interrupted")
+            await self._update(job_id, {"status": "failed", "error": job["error"]})
+        return job
+
+    async def _queued(self, job: Dict) -> bool:
+        queue_job_id = job.get("queue_job_id")
+        if not queue_job_id:
+            # Enqueued a moment ago and not yet linked
+            return datetime.utcnow() - job["created_at"] < timedelta(minutes=1)
+        queue_job = await job_queue.get_job(queue_job_id)
+        return bool(queue_job) and queue_job["status"] in ("queued", "running")
+
+    async def open_file(self, job: Dict):
+        """GridFS stream of a completed export, or None once the file is gone"""
+        if not job.get("file_id"):
+            return None
+        try:
+            return await self.files.open_download_stream(job["file_id"])
+        except NoFile:
+            return None
+
+    @staticmethod
+    async def iter_file(stream) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await stream.readchunk()
+            if not chunk:
+                break
+            yield chunk
+
+    async def _delete_file(self, job: Dict):
+        async for file in self.files.find({"metadata.export_job_id": str(job["_id"])}):
+            try:
+                await self.files.delete(file._id)
+            except NoFile:
+                pass
+
+    async def cleanup_expired(self):
+        """Delete export files and job records past EXPORT_RETENTION"""
+        cutoff = datetime.utcnow() - EXPORT_RETENTION
+        async for job in self.db.export_jobs.find({"created_at": {"$lt": cutoff}}, {"_id": 1}):
+            await self._delete_file(job)
+        await self.db.export_jobs.delete_many({"created_at": {"$lt": cutoff}})
+
+    @staticmethod
+    def serialize(job: Dict) -> Dict:
+        job_id = str(job["_id"])
+        data = {k: to_cell(v) for k, v in job.items() if k not in ("_id", "file_id", "spec", "queue_job_id")}
+        data["job_id"] = job_id
+        data["status_url"] = f"/api/exports/{job_id}"
+        if job.get("status") == "completed":
+            data["download_url"] = f"/api/exports/{job_id}/download"
+        return data
+
+
+# ========== Responses ==========
+
+async def export_response(
+    jobs: ExportJobService,
+    collection,
+    query: Dict,
+    format: str,
+    filename: str,
+    sort: Optional[List] = None,
+    projection: Optional[Dict] = None,
+    columns: Optional[List[str]] = None,
+    transform: Optional[Callable[[Dict], Dict]] = None,
+    background: bool = False,
+):
+    """
+    Stream an export of the documents matching query, or hand it to a
+    background job (202 with a job id) when it exceeds MAX_STREAMED_ROWS.
+    A transform can't be carried by a queued job, so those exports always stream.
+    """
+    _check_format(format)
+
+    row_count = await collection.count_documents(query)
+    if transform is None and (background or row_count > MAX_STREAMED_ROWS):
+        job = await jobs.start(
+            collection, query, format, filename,
+            sort=sort, projection=projection, columns=columns,
+            estimated_rows=row_count
+        )
+        return JSONResponse(status_code=202, content={"success": True, **job})
+
+    rows = iter_rows(collection, query, sort, projection, transform)
+    return StreamingResponse(
+        encode_rows(rows, format, columns),
+        media_type=EXPORT_FORMATS[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{format}"',
+            "X-Export-Rows": str(row_count),
+        }
+    )
+
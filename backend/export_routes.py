@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Export Job Routes
+Status and download for exports too large to stream in a single request
+"""
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+import logging
+
+from export_engine import EXPORT_FORMATS, ExportJobService
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/exports", tags=["Exports"])
+
+# MongoDB collections (imported from main)
+from server import export_jobs
+
+
+@router.get("/{job_id}")
+async def get_export_job(job_id: str):
+    """Get the status of a background export job"""
+    job = await export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return {"success": True, **ExportJobService.serialize(job)}
+
+
+@router.get("/{job_id}/download")
+async def download_export(job_id: str):
+    """Download the file written by a completed export job"""
+    job = await export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job.get("status") != "completed":
+        raise HTTPException(status_code=409, detail=f"Export job is {job.get('status')}")
+    stream = await export_jobs.open_file(job)
+    if stream is None:
+        raise HTTPException(status_code=410, detail="Export file has expired")
+
+    return StreamingResponse(
+        ExportJobService.iter_file(stream),
+        media_type=EXPORT_FORMATS[job["format"]],
+        headers={
+            "Content-Disposition": f'attachment; filename="{job["filename"]}"',
+            "Content-Length": str(stream.length),
+        }
+    )
+
+
+logger.info("Export routes initialized successfully")
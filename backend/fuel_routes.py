@@ -7,6 +7,7 @@ from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
 from server import db
+from result_cache import cached
 
 router = APIRouter()
 
@@ -49,6 +50,7 @@ async def get_fuel_entries():
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/fuel/stats/summary")
+@cached(["fuel_entries"], ttl=300)
 async def get_fuel_stats():
     """Get fuel consumption statistics"""
     try:
@@ -199,6 +201,7 @@ async def delete_fuel_entry(entry_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/fuel/stats/summary")
+@cached(["fuel_entries"], ttl=300)
 async def get_fuel_stats():
     """Get fuel consumption statistics"""
     try:
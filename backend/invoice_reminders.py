@@ -0,0 +1,180 @@
+"""
+Overdue Invoice Reminders
+One batched run per day: overdue invoices are grouped per customer, each
+customer gets a single reminder listing all of them (in-app notification,
+plus email sent over pooled SMTP sessions), and the run is recorded as one
+workflow_executions document with per-customer results.
+
+Each reminded invoice gets last_reminder_at and reminder_count; an invoice
+is not reminded again until REMINDER_INTERVAL has passed.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from aging_reports import _as_date
+
+logger = logging.getLogger(__name__)
+
+# Minimum time between reminders for the same invoice
+REMINDER_INTERVAL = timedelta(days=7)
+
+MAX_INVOICES_PER_RUN = 5000
+
+# Emails per SMTP session, and sessions open at once
+EMAIL_BATCH_SIZE = 20
+EMAIL_WORKERS = 4
+
+
+def _customer_oid(customer_id):
+    try:
+        return ObjectId(customer_id)
+    except (InvalidId, TypeError):
+        return None
+
+
+def format_reminder(name: str, invoices: List[Dict], now: datetime):
+    """Subject and plain-text body listing every overdue invoice of one customer"""
+    total = sum(invoice.get("amount") or 0 for invoice in invoices)
+    lines = [f"Hello {name or 'there'},", "", "The following invoices are past due:", ""]
+    for invoice in invoices:
+        days = (now - invoice["due"]).days
+        lines.append(f"  Invoice {invoice.get('invoice_number') or invoice['id']}: "
+                     f"${invoice.get('amount') or 0:.2f}, {days} days overdue")
+    lines += ["", f"Total due: ${total:.2f}", "", "Please submit payment at your earliest convenience.",
+              "", "Thank you,", "CAF Property Services"]
+    subject = "Payment reminder" if len(invoices) == 1 else f"Payment reminder: {len(invoices)} overdue invoices"
+    return subject, "\n".join(lines)
+
+
+class InvoiceReminders:
+    """Sends the daily batched overdue-invoice reminders"""
+
+    def __init__(self, db, email_service, workers: int = EMAIL_WORKERS):
+        self.db = db
+        self.email_service = email_service
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reminder-email")
+
+    async def _overdue_by_customer(self, now: datetime) -> List[Dict]:
+        """Unpaid invoices past due and not reminded within REMINDER_INTERVAL, grouped per customer"""
+        return await self.db.invoices.aggregate([
+            {"$match": {
+                "status": {"$ne": "paid"},
+                "customer_id": {"$nin": [None, ""]},
+                "due_date": {"$ne": None},
+                "$or": [
+                    {"last_reminder_at": {"$exists": False}},
+                    {"last_reminder_at": {"$lt": now - REMINDER_INTERVAL}},
+                ],
+            }},
+            # Due dates are stored both as dates and as ISO strings
+            {"$addFields": {"due": _as_date("$due_date")}},
+            {"$match": {"due": {"$lt": now}}},
+            {"$sort": {"customer_id": 1, "due": 1}},
+            {"$limit": MAX_INVOICES_PER_RUN},
+            {"$group": {
+                "_id": "$customer_id",
+                "customer_name": {"$first": "$customer_name"},
+                "customer_email": {"$first": "$customer_email"},
+                "invoices": {"$push": {
+                    "id": {"$toString": "$_id"},
+                    "invoice_number": "$invoice_number",
+                    "due": "$due",
+                    "amount": {"$ifNull": ["$balance", {"$ifNull": ["$amount_due", "$total_amount"]}]},
+                }},
+            }},
+        ]).to_list(None)
+
+    async def _send_emails(self, messages: List[Dict]) -> List[bool]:
+        """send_batch per EMAIL_BATCH_SIZE messages, at most EMAIL_WORKERS sessions at a time"""
+        loop = asyncio.get_running_loop()
+        batches = [messages[i:i + EMAIL_BATCH_SIZE] for i in range(0, len(messages), EMAIL_BATCH_SIZE)]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, self.email_service.send_batch, batch)
+            for batch in batches
+        ))
+        return [ok for batch in results for ok in batch]
+
+    async def run(self) -> Dict:
+        now = datetime.utcnow()
+        groups = await self._overdue_by_customer(now)
+
+        oids = [oid for oid in (_customer_oid(group["_id"]) for group in groups) if oid]
+        customers = {
+            str(customer["_id"]): customer
+            for customer in await self.db.customers.find(
+                {"_id": {"$in": oids}}, {"name": 1, "email": 1}
+            ).to_list(None)
+        } if oids else {}
+
+        notifications, messages, items = [], [], []
+        for group in groups:
+            customer_id = group["_id"]
+            customer = customers.get(customer_id, {})
+            invoices = group["invoices"]
+            max_days = max((now - invoice["due"]).days for invoice in invoices)
+            notifications.append({
+                "customer_id": customer_id,
+                "invoice_ids": [invoice["id"] for invoice in invoices],
+                "type": "invoice_overdue",
+                "title": "Payment Reminder",
+                "message": (f"Your invoice is {max_days} days overdue. Please submit payment." if len(invoices) == 1
+                            else f"You have {len(invoices)} overdue invoices, up to {max_days} days. Please submit payment."),
+                "priority": "high",
+                "created_at": now,
+                "read": False,
+            })
+
+            email = customer.get("email") or group.get("customer_email")
+            item = {"customer_id": customer_id, "invoice_ids": [invoice["id"] for invoice in invoices],
+                    "days_overdue": max_days, "notified": True, "emailed": False}
+            if email:
+                subject, body = format_reminder(customer.get("name") or group.get("customer_name"), invoices, now)
+                messages.append({"recipient": email, "subject": subject, "body": body})
+                item["email_index"] = len(messages) - 1
+            items.append(item)
+
+        if notifications:
+            await self.db.notifications.insert_many(notifications, ordered=False)
+        sent = await self._send_emails(messages) if messages else []
+        for item in items:
+            index = item.pop("email_index", None)
+            if index is not None:
+                item["emailed"] = sent[index]
+
+        invoice_oids = [ObjectId(invoice_id) for item in items for invoice_id in item["invoice_ids"]]
+        if invoice_oids:
+            await self.db.invoices.update_many(
+                {"_id": {"$in": invoice_oids}},
+                {"$set": {"last_reminder_at": now}, "$inc": {"reminder_count": 1}}
+            )
+
+        completed_at = datetime.utcnow()
+        result = {
+            "customers": len(items),
+            "invoices": len(invoice_oids),
+            "emails_sent": sum(sent),
+            "emails_failed": len(sent) - sum(sent),
+            "no_email": len(items) - len(messages),
+            "truncated": len(invoice_oids) >= MAX_INVOICES_PER_RUN,
+        }
+        await self.db.workflow_executions.insert_one({
+            "workflow_id": "invoice_reminders",
+            "workflow_name": "Invoice Reminders",
+            "status": "success",
+            "started_at": now,
+            "completed_at": completed_at,
+            "duration": (completed_at - now).total_seconds(),
+            "trigger": "scheduled",
+            "context": {"reminder_interval_days": REMINDER_INTERVAL.days},
+            "result": {**result, "items": items},
+            "created_at": now,
+        })
+        logger.info(f"Invoice reminders run: {result}")
+        return result
@@ -0,0 +1,392 @@
+"""
+Job Queue
+Durable background jobs stored in the jobs collection, for workflow runs and
+side effects (email, SMS, QuickBooks sync) that used to run inline or as
+FastAPI BackgroundTasks and were lost on restart.
+
+Jobs are claimed atomically with find_one_and_update and held under a lease
+that the running worker keeps extending; a job whose worker dies is claimed
+again once its lease lapses. Failed jobs are retried with
+WorkflowRetryHandler's backoff strategies and moved to jobs_dead_letter when
+their attempts run out, as are jobs whose last attempt lost its lease.
+
+Workers run in the API process (JOB_WORKERS_IN_PROCESS, on by default) or on
+their own with `python -m job_worker`.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+from workflow_retry_handler import RetryStrategy, WorkflowRetryHandler
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Database connection
+mongo_url = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+db_name = os.getenv("DB_NAME", "snow_removal_db")
+client = AsyncIOMotorClient(mongo_url)
+db = client[db_name]
+
+# Queue -> jobs run concurrently per worker process
+JOB_QUEUES: Dict[str, int] = {
+    "workflows": 4,
+    "notifications": 8,
+    "default": 4,
+}
+
+JOB_WORKERS_IN_PROCESS = os.getenv("JOB_WORKERS_IN_PROCESS", "true").lower() not in ("0", "false", "no")
+
+LEASE_SECONDS = 60
+HEARTBEAT_SECONDS = 20
+
+# Idle workers poll this often; local enqueues wake them immediately
+POLL_INTERVAL = 2.0
+
+DEFAULT_MAX_ATTEMPTS = 4
+
+# Recent (wait, run) samples kept per queue for latency percentiles
+LATENCY_SAMPLES = 500
+
+
+def _job_oid(job_id: str) -> Optional[ObjectId]:
+    try:
+        return ObjectId(job_id)
+    except (InvalidId, TypeError):
+        return None
+
+
+def _percentile(samples: Iterable[float], fraction: float) -> Optional[float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 3)
+
+
+class JobQueue:
+    """Mongo-backed job queue with leased, prioritized claims and a worker pool"""
+
+    def __init__(self, db):
+        self.db = db
+        self.handlers: Dict[str, Dict[str, Any]] = {}
+        self.retry_handler = WorkflowRetryHandler(db)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.running = False
+        self._tasks: List[asyncio.Task] = []
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._latency: Dict[str, Deque[Tuple[float, float]]] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    # ========== Registration & enqueueing ==========
+
+    def handler(
+        self,
+        name: str,
+        queue: str = "default",
+        priority: int = 0,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        retry_strategy: RetryStrategy = RetryStrategy.EXPONENTIAL,
+    ) -> Callable:
+        """Register a coroutine function as the handler for jobs named `name`; it is called with the payload as keyword arguments"""
+        if queue not in JOB_QUEUES:
+            raise ValueError(f"Unknown job queue: {queue}")
+
+        def register(func: Callable) -> Callable:
+            self.handlers[name] = {
+                "func": func,
+                "queue": queue,
+                "priority": priority,
+                "max_attempts": max_attempts,
+                "retry_strategy": retry_strategy,
+            }
+            return func
+
+        return register
+
+    def _job_document(self, name: str, payload: Optional[Dict], priority: Optional[int],
+                      run_at: Optional[datetime], max_attempts: Optional[int]) -> Dict:
+        spec = self.handlers.get(name)
+        if spec is None:
+            raise ValueError(f"No handler registered for job: {name}")
+        now = datetime.utcnow()
+        return {
+            "name": name,
+            "queue": spec["queue"],
+            "payload": payload or {},
+            "priority": spec["priority"] if priority is None else priority,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts or spec["max_attempts"],
+            "retry_strategy": spec["retry_strategy"].value,
+            "run_at": run_at or now,
+            "enqueued_at": now,
+        }
+
+    async def enqueue(
+        self,
+        name: str,
+        payload: Optional[Dict] = None,
+        priority: Optional[int] = None,
+        run_at: Optional[datetime] = None,
+        max_attempts: Optional[int] = None,
+    ) -> str:
+        """Store a job and return its id; `run_at` delays it"""
+        job = self._job_document(name, payload, priority, run_at, max_attempts)
+        result = await self.db.jobs.insert_one(job)
+        self._wake(job["queue"])
+        return str(result.inserted_id)
+
+    async def enqueue_many(self, name: str, payloads: List[Dict], priority: Optional[int] = None) -> List[str]:
+        """Store one job per payload in a single write"""
+        if not payloads:
+            return []
+        jobs = [self._job_document(name, payload, priority, None, None) for payload in payloads]
+        result = await self.db.jobs.insert_many(jobs, ordered=False)
+        self._wake(jobs[0]["queue"])
+        return [str(job_id) for job_id in result.inserted_ids]
+
+    def _wake(self, queue: str):
+        event = self._wakeups.get(queue)
+        if event:
+            event.set()
+
+    # ========== Workers ==========
+
+    async def start(self, queues: Optional[Iterable[str]] = None):
+        """Start JOB_QUEUES[queue] worker slots for each queue (all queues by default)"""
+        self.running = True
+        for queue in queues or JOB_QUEUES:
+            if queue not in JOB_QUEUES:
+                raise ValueError(f"Unknown job queue: {queue}")
+            self._wakeups[queue] = asyncio.Event()
+            for _ in range(JOB_QUEUES[queue]):
+                self._tasks.append(asyncio.create_task(self._work(queue)))
+        logger.info(f"Job workers started ({self.worker_id}): {', '.join(self._wakeups)}")
+
+    async def stop(self):
+        """Stop claiming; jobs cut off mid-run are claimed again when their lease lapses"""
+        self.running = False
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._wakeups = {}
+
+    async def _claim(self, queue: str) -> Optional[Dict]:
+        now = datetime.utcnow()
+        return await self.db.jobs.find_one_and_update(
+            {
+                "queue": queue,
+                "$or": [
+                    {"status": "queued", "run_at": {"$lte": now}},
+                    # Lease lapsed: the worker running it died or stalled
+                    {"status": "running", "lease_expires_at": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "worker_id": self.worker_id,
+                    "started_at": now,
+                    "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", -1), ("run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _work(self, queue: str):
+        wakeup = self._wakeups[queue]
+        while self.running:
+            try:
+                job = await self._claim(queue)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error claiming job from {queue}: {e}")
+                job = None
+
+            if job is None:
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Recording the outcome failed; the lease lapses and the job is claimed again
+                logger.error(f"Error finishing job {job['name']} ({job['_id']}): {e}")
+
+    def _owned(self, job: Dict) -> Dict:
+        """Filter matching the job only while this claim still holds it"""
+        return {"_id": job["_id"], "worker_id": self.worker_id, "attempts": job["attempts"]}
+
+    async def _heartbeat(self, job: Dict):
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                await self.db.jobs.update_one(
+                    self._owned(job),
+                    {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)}}
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error extending lease of job {job['name']} ({job['_id']}): {e}")
+
+    async def _run(self, job: Dict):
+        queue = job["queue"]
+        counters = self._counters.setdefault(queue, {"completed": 0, "retried": 0, "dead_lettered": 0})
+        spec = self.handlers.get(job["name"])
+        started = datetime.utcnow()
+        if job["attempts"] > job["max_attempts"]:
+            # Reclaimed after its last attempt's lease lapsed: that attempt crashed or hung its worker
+            logger.error(f"Job {job['name']} ({job['_id']}) lease lapsed on its last attempt")
+            await self._fail(job, "Lease expired: worker stopped or stalled", counters)
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            if spec is None:
+                raise RuntimeError(f"No handler registered for job: {job['name']}")
+            await spec["func"](**job["payload"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job {job['name']} ({job['_id']}) failed on attempt {job['attempts']}: {e}")
+            await self._fail(job, str(e), counters)
+        else:
+            finished = datetime.utcnow()
+            await self.db.jobs.update_one(self._owned(job), {
+                "$set": {"status": "completed", "completed_at": finished},
+                "$unset": {"lease_expires_at": ""},
+            })
+            counters["completed"] += 1
+            self._latency.setdefault(queue, deque(maxlen=LATENCY_SAMPLES)).append((
+                (started - job["run_at"]).total_seconds(),
+                (finished - started).total_seconds(),
+            ))
+        finally:
+            heartbeat.cancel()
+
+    async def _fail(self, job: Dict, error: str, counters: Dict[str, int]):
+        strategy = RetryStrategy(job.get("retry_strategy", RetryStrategy.EXPONENTIAL.value))
+        if job["attempts"] < job["max_attempts"] and strategy != RetryStrategy.NONE:
+            delay = self.retry_handler.calculate_delay(strategy, job["attempts"] - 1)
+            await self.db.jobs.update_one(self._owned(job), {
+                "$set": {
+                    "status": "queued",
+                    "run_at": datetime.utcnow() + timedelta(seconds=delay),
+                    "last_error": error,
+                },
+                "$unset": {"lease_expires_at": "", "worker_id": ""},
+            })
+            counters["retried"] += 1
+            return
+
+        job = {**job, "status": "dead", "last_error": error, "failed_at": datetime.utcnow()}
+        job.pop("lease_expires_at", None)
+        await self.db.jobs_dead_letter.replace_one({"_id": job["_id"]}, job, upsert=True)
+        await self.db.jobs.delete_one(self._owned(job))
+        counters["dead_lettered"] += 1
+        logger.error(f"Job {job['name']} ({job['_id']}) moved to dead letter after {job['attempts']} attempts")
+
+    # ========== Inspection ==========
+
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        oid = _job_oid(job_id)
+        if oid is None:
+            return None
+        job = await self.db.jobs.find_one({"_id": oid}) or await self.db.jobs_dead_letter.find_one({"_id": oid})
+        if job:
+            job["id"] = str(job.pop("_id"))
+        return job
+
+    async def list_dead_letters(self, queue: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        query = {"queue": queue} if queue else {}
+        jobs = await self.db.jobs_dead_letter.find(query).sort("failed_at", -1).limit(limit).to_list(limit)
+        for job in jobs:
+            job["id"] = str(job.pop("_id"))
+        return jobs
+
+    async def retry_dead_letter(self, job_id: str) -> bool:
+        """Queue a dead-lettered job again with a fresh set of attempts"""
+        oid = _job_oid(job_id)
+        job = await self.db.jobs_dead_letter.find_one({"_id": oid}) if oid else None
+        if not job:
+            return False
+        now = datetime.utcnow()
+        job.update(status="queued", attempts=0, run_at=now, enqueued_at=now)
+        for field in ("failed_at", "worker_id", "started_at"):
+            job.pop(field, None)
+        await self.db.jobs.replace_one({"_id": oid}, job, upsert=True)
+        await self.db.jobs_dead_letter.delete_one({"_id": oid})
+        self._wake(job["queue"])
+        return True
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Depth and oldest due job per queue from the database; latency from this process's recent runs"""
+        now = datetime.utcnow()
+        rows, dead = await asyncio.gather(
+            self.db.jobs.aggregate([
+                {"$match": {"status": {"$in": ["queued", "running"]}}},
+                {"$group": {
+                    "_id": {"queue": "$queue", "status": "$status"},
+                    "count": {"$sum": 1},
+                    "due": {"$sum": {"$cond": [{"$lte": ["$run_at", now]}, 1, 0]}},
+                    "oldest_due": {"$min": {"$cond": [{"$lte": ["$run_at", now]}, "$run_at", None]}},
+                }}
+            ]).to_list(None),
+            self.db.jobs_dead_letter.aggregate([
+                {"$group": {"_id": "$queue", "count": {"$sum": 1}}}
+            ]).to_list(None),
+        )
+
+        queues = {
+            queue: {"concurrency": concurrency, "queued": 0, "due": 0, "running": 0, "dead_letter": 0, "oldest_due_seconds": None}
+            for queue, concurrency in JOB_QUEUES.items()
+        }
+        for row in rows:
+            stats = queues.setdefault(row["_id"]["queue"], {"queued": 0, "due": 0, "running": 0, "dead_letter": 0, "oldest_due_seconds": None})
+            if row["_id"]["status"] == "running":
+                stats["running"] = row["count"]
+            else:
+                stats["queued"] = row["count"]
+                stats["due"] = row["due"]
+                if row["oldest_due"]:
+                    stats["oldest_due_seconds"] = round((now - row["oldest_due"]).total_seconds(), 1)
+        for row in dead:
+            queues.setdefault(row["_id"], {}).update(dead_letter=row["count"])
+
+        for queue, samples in self._latency.items():
+            queues.setdefault(queue, {}).update(
+                wait_p50=_percentile((s[0] for s in samples), 0.5),
+                wait_p95=_percentile((s[0] for s in samples), 0.95),
+                run_p50=_percentile((s[1] for s in samples), 0.5),
+                run_p95=_percentile((s[1] for s in samples), 0.95),
+            )
+        for queue, counters in self._counters.items():
+            queues.setdefault(queue, {}).update(counters)
+
+        return {"worker_id": self.worker_id, "running": self.running, "queues": queues}
+
+
+# Singleton instance
+job_queue = JobQueue(db)
@@ -0,0 +1,38 @@
+"""
+Job Worker
+Runs job queue workers outside the API process:
+
+    python -m job_worker                       # every queue
+    python -m job_worker workflows notifications
+
+Importing server registers the job handlers. Set JOB_WORKERS_IN_PROCESS=false
+on the API when these processes should run all jobs.
+"""
+
+import asyncio
+import logging
+import signal
+import sys
+
+import server  # noqa: F401  (registers job handlers)
+from job_queue import job_queue
+from log_sink import log_sink
+
+logger = logging.getLogger(__name__)
+
+
+async def main(queues):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await job_queue.start(queues or None)
+    await stop.wait()
+    await job_queue.stop()
+    await log_sink.stop()
+    logger.info("Job worker stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
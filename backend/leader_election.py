@@ -0,0 +1,166 @@
+"""
+Leader Election
+Lease-based election in the leader_leases collection, so singleton work such
+as the background scheduler runs in one API worker process at a time.
+
+The leader renews its lease every HEARTBEAT_SECONDS. When the lease lapses
+(the process died or lost the database), the next worker to try takes it
+over. Each takeover increments a fencing token, handed to on_elected, which
+the leader stamps on its writes so a deposed leader's late writes can be
+refused.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 30
+HEARTBEAT_SECONDS = 10
+
+
+class LeaderElection:
+    """Campaigns for one named lease and runs callbacks on election and demotion"""
+
+    def __init__(
+        self,
+        db,
+        name: str,
+        on_elected: Callable[[int], Awaitable[Any]],
+        on_demoted: Callable[[], Awaitable[Any]],
+        lease_seconds: int = LEASE_SECONDS,
+        heartbeat_seconds: int = HEARTBEAT_SECONDS,
+    ):
+        self.db = db
+        self.name = name
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self.fencing_token: Optional[int] = None
+        self.elected_at: Optional[datetime] = None
+        # Monotonic time until which our last successful renewal is known to hold
+        self._valid_until = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._campaign())
+
+    async def stop(self):
+        """Step down and release the lease so another worker takes over without waiting"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self.is_leader:
+            await self._demote("shutting down")
+            await self._release()
+
+    # ========== Lease ==========
+
+    async def _acquire(self) -> Optional[int]:
+        """Take the lease if it is free or lapsed; returns the new fencing token"""
+        now = datetime.utcnow()
+        try:
+            lease = await self.db.leader_leases.find_one_and_update(
+                {"_id": self.name, "expires_at": {"$lt": now}},
+                {
+                    "$set": {
+                        "holder": self.identity,
+                        "acquired_at": now,
+                        "expires_at": now + timedelta(seconds=self.lease_seconds),
+                    },
+                    "$inc": {"token": 1},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Held by a live leader: the filter missed and the upsert collided
+            return None
+        self._valid_until = time.monotonic() + self.lease_seconds
+        return lease["token"]
+
+    async def _release(self):
+        """Let the lease lapse now instead of at expires_at"""
+        try:
+            await self.db.leader_leases.update_one(
+                {"_id": self.name, "holder": self.identity},
+                {"$set": {"expires_at": datetime.utcnow()}}
+            )
+        except PyMongoError as e:
+            logger.error(f"Error releasing {self.name} lease: {e}")
+
+    async def _renew(self) -> bool:
+        started = time.monotonic()
+        result = await self.db.leader_leases.update_one(
+            {"_id": self.name, "holder": self.identity, "token": self.fencing_token},
+            {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+        )
+        if result.matched_count:
+            self._valid_until = started + self.lease_seconds
+        return bool(result.matched_count)
+
+    # ========== Campaign ==========
+
+    async def _elect(self, token: int):
+        self.is_leader = True
+        self.fencing_token = token
+        self.elected_at = datetime.utcnow()
+        logger.info(f"{self.identity} elected {self.name} leader (token {token})")
+        try:
+            await self.on_elected(token)
+        except Exception as e:
+            # Holding the lease without running would keep every other worker from taking over
+            logger.error(f"Error starting {self.name} as leader: {e}")
+            await self._demote("failed to start")
+            await self._release()
+
+    async def _demote(self, reason: str):
+        self.is_leader = False
+        logger.warning(f"{self.identity} is no longer {self.name} leader: {reason}")
+        try:
+            await self.on_demoted()
+        except Exception as e:
+            logger.error(f"Error stopping {self.name} after demotion: {e}")
+
+    async def _campaign(self):
+        while True:
+            try:
+                if self.is_leader:
+                    if not await self._renew():
+                        await self._demote("lease taken over")
+                else:
+                    token = await self._acquire()
+                    if token is not None:
+                        await self._elect(token)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.error(f"{self.name} lease error: {e}")
+                # Without a renewal we can't know the lease is still ours once it would have lapsed
+                if self.is_leader and time.monotonic() >= self._valid_until - self.heartbeat_seconds:
+                    await self._demote("lease could not be renewed")
+            await asyncio.sleep(self.heartbeat_seconds)
+
+    async def get_status(self) -> Dict[str, Any]:
+        lease = await self.db.leader_leases.find_one({"_id": self.name})
+        return {
+            "name": self.name,
+            "identity": self.identity,
+            "is_leader": self.is_leader,
+            "fencing_token": self.fencing_token,
+            "elected_at": self.elected_at,
+            "holder": lease.get("holder") if lease else None,
+            "lease_expires_at": lease.get("expires_at") if lease else None,
+        }
@@ -0,0 +1,164 @@
+"""
+Log Sink
+Buffers audit and execution log documents and writes them with insert_many,
+one batch per collection, when BATCH_SIZE documents are waiting or every
+FLUSH_INTERVAL seconds, so a busy workflow run costs a few batched writes
+instead of a round trip per event.
+
+Documents get their _id when they are buffered, so callers can still return
+it. When writes fall behind (Mongo slow or unreachable) and MAX_BUFFERED
+documents are waiting, writers wait for room, for at most MAX_WAIT_SECONDS;
+after that the document is dropped and counted, as a failed insert_one used
+to be. The buffer is flushed on shutdown.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+MAX_BUFFERED = 10000
+MAX_WAIT_SECONDS = 5.0
+
+# Pause after a failed flush before trying again
+RETRY_DELAY = 2.0
+
+DUPLICATE_KEY = 11000
+
+
+class LogSink:
+    """Batches log inserts across every collection written through it"""
+
+    def __init__(self, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                 max_buffered: int = MAX_BUFFERED, max_wait: float = MAX_WAIT_SECONDS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.max_wait = max_wait
+        # collection full name -> (collection, waiting documents)
+        self._buffers: Dict[str, Tuple[Any, Deque[Dict]]] = {}
+        self._buffered = 0
+        self._batch_ready = asyncio.Event()
+        self._room = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"written": 0, "batches": 0, "dropped": 0, "failed_flushes": 0, "waits": 0}
+        self._last_flush_ms = 0.0
+
+    async def write(self, collection, document: Dict) -> ObjectId:
+        """Buffer a document for collection; returns its _id"""
+        document.setdefault("_id", ObjectId())
+        if self._task is None or self._task.done():
+            # A fresh context, so the loop doesn't inherit the first writer's trace span
+            self._task = asyncio.create_task(self._flush_loop(), context=contextvars.Context())
+
+        if self._buffered >= self.max_buffered:
+            self._stats["waits"] += 1
+            self._batch_ready.set()
+            try:
+                async with self._room:
+                    await asyncio.wait_for(
+                        self._room.wait_for(lambda: self._buffered < self.max_buffered),
+                        self.max_wait
+                    )
+            except asyncio.TimeoutError:
+                self._stats["dropped"] += 1
+                logger.error(f"Log sink full, dropping {collection.name} document")
+                return document["_id"]
+
+        _, buffer = self._buffers.setdefault(collection.full_name, (collection, deque()))
+        buffer.append(document)
+        self._buffered += 1
+        if len(buffer) >= self.batch_size:
+            self._batch_ready.set()
+        return document["_id"]
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            if not await self.flush():
+                await asyncio.sleep(RETRY_DELAY)
+
+    async def flush(self) -> bool:
+        """Write everything buffered; False if a batch couldn't be written and was kept for the next flush"""
+        ok = True
+        async with self._flush_lock:
+            started = time.perf_counter()
+            for collection, buffer in list(self._buffers.values()):
+                while buffer:
+                    batch = [buffer.popleft() for _ in range(min(self.batch_size, len(buffer)))]
+                    try:
+                        written = await self._insert(collection, batch)
+                    except asyncio.CancelledError:
+                        # Stopped mid-write: keep the batch for the final flush
+                        buffer.extendleft(reversed(batch))
+                        raise
+                    if written is None:
+                        # Keep the batch, in order, for the next flush
+                        buffer.extendleft(reversed(batch))
+                        ok = False
+                        break
+                    self._buffered -= len(batch)
+                    self._stats["written"] += written
+                    self._stats["batches"] += 1
+            self._last_flush_ms = (time.perf_counter() - started) * 1000
+
+        async with self._room:
+            self._room.notify_all()
+        return ok
+
+    async def _insert(self, collection, batch: List[Dict]) -> Optional[int]:
+        """Documents written, or None when the batch should be retried"""
+        try:
+            await collection.insert_many(batch, ordered=False)
+            return len(batch)
+        except BulkWriteError as e:
+            # Duplicate keys are documents a failed attempt already wrote
+            errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY]
+            if errors:
+                self._stats["dropped"] += len(errors)
+                logger.error(f"Dropped {len(errors)} {collection.name} log documents: {errors[0].get('errmsg')}")
+            return len(batch) - len(errors)
+        except PyMongoError as e:
+            self._stats["failed_flushes"] += 1
+            logger.error(f"Error writing {len(batch)} {collection.name} log documents, will retry: {e}")
+            return None
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still buffered"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._buffered and not await self.flush():
+            logger.error(f"Log sink stopped with {self._buffered} documents unwritten")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "buffered": self._buffered,
+            "buffered_by_collection": {name: len(buffer) for name, (_, buffer) in self._buffers.items() if buffer},
+            "last_flush_ms": round(self._last_flush_ms, 1),
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "max_buffered": self.max_buffered,
+        }
+
+
+log_sink = LogSink()
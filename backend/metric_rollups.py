@@ -0,0 +1,436 @@
+"""
+Daily Metric Rollups
+Materializes one document per day in daily_metrics with the invoice, work
+order, customer, crew hour, project and estimate figures the analytics
+dashboard and reports need, so any date range costs O(days) to read.
+
+Days are marked dirty as source documents are written, by the MongoDB change
+stream where there is a replica set and by source_changed at the write sites
+that change older days (payments, status changes, deletes), and recomputed
+lazily on the next read. A nightly reconcile pass rebuilds recent history to
+catch anything both missed. Whether the change stream is running is recorded
+in metric_rollup_state and reported by get_status.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure, PyMongoError
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Database connection
+mongo_url = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+db_name = os.getenv("DB_NAME", "snow_removal_db")
+client = AsyncIOMotorClient(mongo_url)
+db = client[db_name]
+
+# Source collections and the field that assigns a document to a day
+ROLLUP_SOURCES = {
+    "invoices": "created_at",
+    "work_orders": "created_at",
+    "customers": "created_at",
+    "time_entries": "clock_in",
+    "projects": "created_at",
+    "estimates": "created_at",
+}
+
+# Today and yesterday still take writes constantly, so without a change
+# stream their rollups are recomputed once they are older than this
+RECENT_DAYS = 2
+RECENT_MAX_AGE = timedelta(minutes=5)
+
+# Days rebuilt by the nightly reconcile pass
+RECONCILE_DAYS = 120
+
+MAX_CONCURRENT_RECOMPUTES = 8
+
+# Seconds between change stream reconnect attempts
+CHANGE_STREAM_RETRY = 60
+
+
+def day_key(value) -> Optional[str]:
+    """YYYY-MM-DD key for a datetime, date or ISO string"""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str) and len(value) >= 10:
+        try:
+            return date.fromisoformat(value[:10]).isoformat()
+        except ValueError:
+            return None
+    return None
+
+
+def day_keys(start_date: datetime, end_date: datetime) -> List[str]:
+    """Every day key from start_date to end_date inclusive"""
+    current, end = start_date.date(), end_date.date()
+    keys = []
+    while current <= end:
+        keys.append(current.isoformat())
+        current += timedelta(days=1)
+    return keys
+
+
+def _is_date(field: str) -> Dict:
+    return {"$eq": [{"$type": field}, "date"]}
+
+
+def _hours_between(end_field: str, start_field: str) -> Dict:
+    """Aggregation expression for hours between two date fields, 0 if either is not a date"""
+    return {"$cond": [
+        {"$and": [_is_date(end_field), _is_date(start_field)]},
+        {"$divide": [{"$subtract": [end_field, start_field]}, 3600000]},
+        0
+    ]}
+
+
+def _status_counts(rows: List[Dict]) -> Dict[str, int]:
+    return {str(row["_id"] or "unknown"): row["count"] for row in rows}
+
+
+def _empty_day(key: str) -> Dict:
+    return {
+        "date": key,
+        "invoices": {
+            "count": 0, "total": 0.0, "paid_count": 0, "paid_total": 0.0,
+            "amount_paid": 0.0, "amount_due": 0.0, "overdue_count": 0,
+            "customer_ids": []
+        },
+        "work_orders": {
+            "total": 0, "by_status": {}, "completion_hours": 0.0,
+            "completed_with_times": 0, "customer_ids": []
+        },
+        "customers": {"new": 0},
+        "crew": {"hours": 0.0, "time_entries": 0},
+        "projects": {
+            "total": 0, "by_status": {}, "budget": 0.0,
+            "total_spent": 0.0, "total_amount": 0.0
+        },
+        "estimates": {"count": 0, "accepted": 0},
+    }
+
+
+class MetricRollupService:
+    """Maintains and serves per-day metric rollups"""
+
+    def __init__(self, db):
+        self.db = db
+        self.change_stream_active = False
+
+    # ========== Computing ==========
+
+    async def compute_day(self, key: str) -> Dict:
+        """Aggregate every source collection for one day"""
+        start = datetime.fromisoformat(key)
+        end = start + timedelta(days=1)
+        created = {"created_at": {"$gte": start, "$lt": end}}
+
+        invoices, work_orders, new_customers, crew, projects, estimates = await asyncio.gather(
+            self.db.invoices.aggregate([
+                {"$match": created},
+                {"$group": {
+                    "_id": None,
+                    "count": {"$sum": 1},
+                    "total": {"$sum": {"$ifNull": ["$total_amount", 0]}},
+                    "paid_count": {"$sum": {"$cond": [{"$eq": ["$status", "paid"]}, 1, 0]}},
+                    "paid_total": {"$sum": {"$cond": [
+                        {"$eq": ["$status", "paid"]}, {"$ifNull": ["$total_amount", 0]}, 0
+                    ]}},
+                    "amount_paid": {"$sum": {"$ifNull": ["$amount_paid", 0]}},
+                    "amount_due": {"$sum": {"$ifNull": ["$amount_due", 0]}},
+                    "overdue_count": {"$sum": {"$cond": [{"$eq": ["$status", "overdue"]}, 1, 0]}},
+                    "customer_ids": {"$addToSet": "$customer_id"}
+                }}
+            ]).to_list(1),
+            self.db.work_orders.aggregate([
+                {"$match": created},
+                {"$facet": {
+                    "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+                    "totals": [{"$group": {
+                        "_id": None,
+                        "customer_ids": {"$addToSet": "$customer_id"},
+                        "completion_hours": {"$sum": {"$cond": [
+                            {"$eq": ["$status", "completed"]},
+                            _hours_between("$completed_at", "$created_at"),
+                            0
+                        ]}},
+                        "completed_with_times": {"$sum": {"$cond": [
+                            {"$and": [
+                                {"$eq": ["$status", "completed"]},
+                                _is_date("$completed_at")
+                            ]},
+                            1,
+                            0
+                        ]}}
+                    }}]
+                }}
+            ]).to_list(1),
+            self.db.customers.count_documents(created),
+            self.db.time_entries.aggregate([
+                {"$match": {"clock_in": {"$gte": start, "$lt": end}}},
+                {"$group": {
+                    "_id": None,
+                    "entries": {"$sum": 1},
+                    "hours": {"$sum": _hours_between("$clock_out", "$clock_in")}
+                }}
+            ]).to_list(1),
+            self.db.projects.aggregate([
+                {"$match": created},
+                {"$group": {
+                    "_id": "$status",
+                    "count": {"$sum": 1},
+                    "budget": {"$sum": {"$ifNull": ["$budget", 0]}},
+                    "total_spent": {"$sum": {"$ifNull": ["$total_spent", 0]}},
+                    "total_amount": {"$sum": {"$ifNull": ["$total_amount", 0]}}
+                }}
+            ]).to_list(None),
+            self.db.estimates.aggregate([
+                {"$match": created},
+                {"$group": {
+                    "_id": None,
+                    "count": {"$sum": 1},
+                    "accepted": {"$sum": {"$cond": [{"$eq": ["$status", "accepted"]}, 1, 0]}}
+                }}
+            ]).to_list(1),
+        )
+
+        rollup = _empty_day(key)
+
+        if invoices:
+            row = invoices[0]
+            rollup["invoices"] = {
+                field: row[field] for field in rollup["invoices"] if field != "customer_ids"
+            }
+            rollup["invoices"]["customer_ids"] = [c for c in row["customer_ids"] if c is not None]
+
+        facets = work_orders[0] if work_orders else {}
+        if facets.get("totals"):
+            totals = facets["totals"][0]
+            by_status = _status_counts(facets["by_status"])
+            rollup["work_orders"] = {
+                "total": sum(by_status.values()),
+                "by_status": by_status,
+                "completion_hours": totals["completion_hours"],
+                "completed_with_times": totals["completed_with_times"],
+                "customer_ids": [c for c in totals["customer_ids"] if c is not None],
+            }
+
+        rollup["customers"]["new"] = new_customers
+
+        if crew:
+            rollup["crew"] = {"hours": crew[0]["hours"], "time_entries": crew[0]["entries"]}
+
+        if projects:
+            rollup["projects"] = {
+                "total": sum(p["count"] for p in projects),
+                "by_status": _status_counts(projects),
+                "budget": sum(p["budget"] for p in projects),
+                "total_spent": sum(p["total_spent"] for p in projects),
+                "total_amount": sum(p["total_amount"] for p in projects),
+            }
+
+        if estimates:
+            rollup["estimates"] = {"count": estimates[0]["count"], "accepted": estimates[0]["accepted"]}
+
+        return rollup
+
+    async def refresh_day(self, key: str) -> Dict:
+        """Recompute one day and store it"""
+        rollup = await self.compute_day(key)
+        rollup["dirty"] = False
+        rollup["computed_at"] = datetime.utcnow()
+        await self.db.daily_metrics.replace_one({"date": key}, rollup, upsert=True)
+        return rollup
+
+    async def refresh_days(self, keys: Iterable[str]) -> List[Dict]:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_RECOMPUTES)
+
+        async def refresh(key):
+            async with semaphore:
+                return await self.refresh_day(key)
+
+        return await asyncio.gather(*(refresh(key) for key in keys))
+
+    # ========== Invalidation ==========
+
+    async def mark_dirty(self, keys: Iterable[str]):
+        """Flag days for recomputation on their next read"""
+        keys = sorted({k for k in keys if k})
+        if not keys:
+            return
+        await self.db.daily_metrics.update_many(
+            {"date": {"$in": keys}},
+            {"$set": {"dirty": True}}
+        )
+
+    async def source_changed(self, collection: str, document: Union[Dict, ObjectId, str]):
+        """
+        Mark the day a source document belongs to dirty. Pass the document (before
+        a delete, or whenever it already holds its day field) or its id.
+        Failures are logged and left to reconcile.
+        """
+        field = ROLLUP_SOURCES[collection]
+        try:
+            if not isinstance(document, dict) or field not in document:
+                oid = document.get("_id") if isinstance(document, dict) else document
+                document = await self.db[collection].find_one({"_id": ObjectId(oid)}, {field: 1}) or {}
+            await self.mark_dirty([day_key(document.get(field))])
+        except (InvalidId, TypeError, PyMongoError) as e:
+            logger.error(f"Error marking {collection} rollup day dirty: {e}")
+
+    async def _set_change_stream_state(self, active: bool, error: Optional[str] = None):
+        self.change_stream_active = active
+        try:
+            await self.db.metric_rollup_state.update_one(
+                {"_id": "change_stream"},
+                {"$set": {"active": active, "error": error, "updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except PyMongoError as e:
+            logger.error(f"Error recording metric rollup change stream state: {e}")
+
+    async def watch_changes(self):
+        """
+        Mark days dirty as source documents change. Requires a replica set;
+        without one the recent-day freshness window and nightly reconcile apply.
+        """
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(ROLLUP_SOURCES)},
+            "operationType": {"$in": ["insert", "update", "replace"]}
+        }}]
+
+        while True:
+            try:
+                async with self.db.watch(pipeline, full_document="updateLookup") as stream:
+                    await self._set_change_stream_state(True)
+                    logger.info("Metric rollup change stream started")
+                    async for change in stream:
+                        document = change.get("fullDocument") or {}
+                        field = ROLLUP_SOURCES[change["ns"]["coll"]]
+                        await self.mark_dirty([day_key(document.get(field))])
+            except OperationFailure as e:
+                await self._set_change_stream_state(False, str(e))
+                logger.warning(
+                    f"Change streams unavailable, metric rollups older than {RECENT_DAYS} days only see "
+                    f"writes hooked through source_changed until the nightly reconcile: {e}"
+                )
+                return
+            except asyncio.CancelledError:
+                self.change_stream_active = False
+                raise
+            except PyMongoError as e:
+                await self._set_change_stream_state(False, str(e))
+                logger.error(f"Metric rollup change stream error: {e}")
+                await asyncio.sleep(CHANGE_STREAM_RETRY)
+
+    async def reconcile(self, days: int = RECONCILE_DAYS) -> Dict:
+        """Rebuild the last `days` days plus any dirty day outside that window"""
+        today = datetime.utcnow()
+        keys = set(day_keys(today - timedelta(days=days - 1), today))
+        dirty = await self.db.daily_metrics.distinct("date", {"dirty": True})
+        keys.update(dirty)
+
+        await self.refresh_days(sorted(keys))
+        summary = {"days": len(keys), "dirty": len(dirty), "reconciled_at": today.isoformat()}
+        logger.info(f"Metric rollups reconciled: {summary}")
+        return summary
+
+    # ========== Reading ==========
+
+    async def get_days(self, start_date: datetime, end_date: datetime) -> List[Dict]:
+        """Rollups for every day in the range, computing missing or stale days first"""
+        keys = day_keys(start_date, end_date)
+        if not keys:
+            return []
+
+        now = datetime.utcnow()
+        today = now.date().isoformat()
+        recent = (now.date() - timedelta(days=RECENT_DAYS - 1)).isoformat()
+
+        stored = await self.db.daily_metrics.find(
+            {"date": {"$gte": keys[0], "$lte": keys[-1]}},
+            {"_id": 0}
+        ).to_list(None)
+        by_date = {doc["date"]: doc for doc in stored}
+
+        def stale(key):
+            doc = by_date.get(key)
+            if doc is None or doc.get("dirty") or "computed_at" not in doc:
+                return True
+            return (
+                not self.change_stream_active
+                and key >= recent
+                and now - doc["computed_at"] > RECENT_MAX_AGE
+            )
+
+        # Future days have nothing to roll up yet
+        refresh = [k for k in keys if k <= today and stale(k)]
+        for rollup in await self.refresh_days(refresh):
+            by_date[rollup["date"]] = rollup
+
+        return [by_date.get(k) or _empty_day(k) for k in keys]
+
+    async def get_status(self) -> Dict[str, Any]:
+        """Change stream state (as recorded by the scheduler leader) and rollup freshness"""
+        state, dirty, last = await asyncio.gather(
+            self.db.metric_rollup_state.find_one({"_id": "change_stream"}),
+            self.db.daily_metrics.count_documents({"dirty": True}),
+            self.db.daily_metrics.find_one({}, {"computed_at": 1}, sort=[("computed_at", -1)]),
+        )
+        active = bool(state and state.get("active"))
+        return {
+            "change_stream_active": active,
+            "mode": "change_stream" if active else "write_hooks_and_reconcile",
+            "change_stream_error": state.get("error") if state else None,
+            "change_stream_updated_at": state.get("updated_at") if state else None,
+            "dirty_days": dirty,
+            "last_computed_at": last.get("computed_at") if last else None,
+            "recent_days": RECENT_DAYS,
+            "reconcile_days": RECONCILE_DAYS,
+        }
+
+    async def get_totals(self, start_date: datetime, end_date: datetime) -> Dict:
+        """Sum rollups over a date range"""
+        return self.sum_days(await self.get_days(start_date, end_date))
+
+    @staticmethod
+    def sum_days(days: List[Dict]) -> Dict:
+        """Add daily rollups together; customer id lists become distinct counts"""
+        totals = _empty_day("")
+        del totals["date"]
+        distinct = {"invoices": set(), "work_orders": set()}
+
+        for day in days:
+            for section, values in totals.items():
+                for field, value in day.get(section, {}).items():
+                    if field == "customer_ids":
+                        distinct[section].update(value)
+                    elif field == "by_status":
+                        for status, count in value.items():
+                            values[field][status] = values[field].get(status, 0) + count
+                    else:
+                        values[field] += value
+
+        for section, ids in distinct.items():
+            del totals[section]["customer_ids"]
+            totals[section]["distinct_customers"] = len(ids)
+
+        totals["days"] = len(days)
+        return totals
+
+
+# Global rollup service instance
+metric_rollups = MetricRollupService(db)
+
+logger.info("Metric rollup service initialized successfully")
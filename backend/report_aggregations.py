@@ -0,0 +1,223 @@
+"""
+Report Aggregations
+Each /reports/generate report type as a single MongoDB aggregation, so
+counts and totals are computed in the database over the full date range
+instead of over the first 1,000 documents loaded into Python.
+"""
+
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Dispatches returned with the daily operations report
+DISPATCH_SAMPLE_SIZE = 50
+
+
+def _count_if(condition: Dict) -> Dict:
+    return {"$sum": {"$cond": [condition, 1, 0]}}
+
+
+def _status_is(status: str) -> Dict:
+    return _count_if({"$eq": ["$status", status]})
+
+
+def _as_date(field: str) -> Dict:
+    """Date stored as either a BSON date or an ISO string, null if neither"""
+    return {"$convert": {"input": field, "to": "date", "onError": None, "onNull": None}}
+
+
+def shift_hours_expression() -> Dict:
+    """Hours for a shift: hours_worked if recorded, otherwise start_time to end_time"""
+    return {"$ifNull": [
+        "$hours_worked",
+        {"$divide": [
+            {"$subtract": [_as_date("$end_time"), _as_date("$start_time")]},
+            3600000
+        ]}
+    ]}
+
+
+def shift_date_match(start_date: datetime, end_date: datetime) -> Dict:
+    """shift_date is stored as a YYYY-MM-DD string"""
+    return {"shift_date": {
+        "$gte": start_date.date().isoformat(),
+        "$lte": end_date.date().isoformat()
+    }}
+
+
+def _first(rows: List[Dict]) -> Dict:
+    return rows[0] if rows else {}
+
+
+async def daily_operations(db, start_date: datetime, end_date: datetime) -> Dict:
+    rows = await db.dispatches.aggregate([
+        {"$match": {"scheduled_date": {"$gte": start_date, "$lte": end_date}}},
+        {"$facet": {
+            "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            "sample": [
+                {"$sort": {"scheduled_date": 1}},
+                {"$limit": DISPATCH_SAMPLE_SIZE}
+            ]
+        }}
+    ]).to_list(1)
+
+    facets = _first(rows)
+    by_status = {row["_id"]: row["count"] for row in facets.get("by_status", [])}
+    dispatches = facets.get("sample", [])
+    for dispatch in dispatches:
+        dispatch["id"] = str(dispatch.pop("_id"))
+
+    return {
+        "total_dispatches": sum(by_status.values()),
+        "completed": by_status.get("completed", 0),
+        "in_progress": by_status.get("in_progress", 0),
+        "scheduled": by_status.get("scheduled", 0),
+        "dispatches": dispatches
+    }
+
+
+async def weekly_financial(db, start_date: datetime, end_date: datetime) -> Dict:
+    totals = _first(await db.invoices.aggregate([
+        {"$match": {"issue_date": {"$gte": start_date, "$lte": end_date}}},
+        {"$group": {
+            "_id": None,
+            "total_invoices": {"$sum": 1},
+            "total_revenue": {"$sum": {"$ifNull": ["$total_amount", 0]}},
+            "total_paid": {"$sum": {"$ifNull": ["$amount_paid", 0]}},
+            "total_outstanding": {"$sum": {"$ifNull": ["$amount_due", 0]}},
+            "paid_invoices": _status_is("paid"),
+            "unpaid_invoices": _status_is("unpaid"),
+            "overdue_invoices": _status_is("overdue")
+        }}
+    ]).to_list(1))
+
+    return {
+        "total_invoices": totals.get("total_invoices", 0),
+        "total_revenue": totals.get("total_revenue", 0),
+        "total_paid": totals.get("total_paid", 0),
+        "total_outstanding": totals.get("total_outstanding", 0),
+        "paid_invoices": totals.get("paid_invoices", 0),
+        "unpaid_invoices": totals.get("unpaid_invoices", 0),
+        "overdue_invoices": totals.get("overdue_invoices", 0),
+    }
+
+
+async def monthly_customer(db, start_date: datetime, end_date: datetime) -> Dict:
+    totals = _first(await db.customers.aggregate([
+        {"$group": {
+            "_id": None,
+            "total_customers": {"$sum": 1},
+            "new_customers": _count_if({"$and": [
+                {"$gte": ["$created_at", start_date]},
+                {"$lte": ["$created_at", end_date]}
+            ]}),
+            "active_customers": _count_if({"$ifNull": ["$active", True]}),
+            "individual": _count_if({"$eq": ["$customer_type", "individual"]}),
+            "company": _count_if({"$eq": ["$customer_type", "company"]})
+        }}
+    ]).to_list(1))
+
+    return {
+        "total_customers": totals.get("total_customers", 0),
+        "new_customers": totals.get("new_customers", 0),
+        "active_customers": totals.get("active_customers", 0),
+        "customer_types": {
+            "individual": totals.get("individual", 0),
+            "company": totals.get("company", 0)
+        }
+    }
+
+
+async def project_performance(db, start_date: datetime, end_date: datetime) -> Dict:
+    totals = _first(await db.projects.aggregate([
+        {"$match": {"created_at": {"$gte": start_date, "$lte": end_date}}},
+        {"$group": {
+            "_id": None,
+            "total_projects": {"$sum": 1},
+            "completed": _status_is("completed"),
+            "active": _status_is("active"),
+            "on_hold": _status_is("on_hold"),
+            "average_completion": {"$avg": {"$ifNull": ["$completion_percentage", 0]}}
+        }}
+    ]).to_list(1))
+
+    return {
+        "total_projects": totals.get("total_projects", 0),
+        "completed": totals.get("completed", 0),
+        "active": totals.get("active", 0),
+        "on_hold": totals.get("on_hold", 0),
+        "average_completion": totals.get("average_completion") or 0
+    }
+
+
+async def service_analytics(db, start_date: datetime, end_date: datetime) -> Dict:
+    facets = _first(await db.dispatches.aggregate([
+        {"$match": {"scheduled_date": {"$gte": start_date, "$lte": end_date}}},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "services": [
+                {"$unwind": "$services"},
+                {"$group": {"_id": "$services", "count": {"$sum": 1}}}
+            ]
+        }}
+    ]).to_list(1))
+
+    return {
+        "total_services": _first(facets.get("total", [])).get("count", 0),
+        "services_breakdown": {row["_id"]: row["count"] for row in facets.get("services", [])}
+    }
+
+
+async def crew_productivity(db, start_date: datetime, end_date: datetime) -> Dict:
+    totals = _first(await db.shifts.aggregate([
+        {"$match": shift_date_match(start_date, end_date)},
+        {"$group": {
+            "_id": None,
+            "total_shifts": {"$sum": 1},
+            "total_hours": {"$sum": shift_hours_expression()}
+        }}
+    ]).to_list(1))
+
+    total_shifts = totals.get("total_shifts", 0)
+    total_hours = totals.get("total_hours", 0)
+    return {
+        "total_shifts": total_shifts,
+        "total_hours": total_hours,
+        "average_hours_per_shift": total_hours / total_shifts if total_shifts else 0
+    }
+
+
+REPORT_BUILDERS: Dict[str, Callable] = {
+    "daily_operations": daily_operations,
+    "weekly_financial": weekly_financial,
+    "monthly_customer": monthly_customer,
+    "project_performance": project_performance,
+    "service_analytics": service_analytics,
+    "crew_productivity": crew_productivity,
+}
+
+
+def _date_range(field: str) -> Callable[[datetime, datetime], Dict]:
+    return lambda start_date, end_date: {field: {"$gte": start_date, "$lte": end_date}}
+
+
+# Source documents behind each report type, for row-level exports:
+# report type -> (collection, match builder, sort field)
+REPORT_SOURCES: Dict[str, tuple] = {
+    "daily_operations": ("dispatches", _date_range("scheduled_date"), "scheduled_date"),
+    "weekly_financial": ("invoices", _date_range("issue_date"), "issue_date"),
+    "monthly_customer": ("customers", _date_range("created_at"), "created_at"),
+    "project_performance": ("projects", _date_range("created_at"), "created_at"),
+    "service_analytics": ("dispatches", _date_range("scheduled_date"), "scheduled_date"),
+    "crew_productivity": ("shifts", shift_date_match, "shift_date"),
+}
+
+
+async def build_report_data(db, report_type: str, start_date: datetime, end_date: datetime) -> Dict:
+    """Run the aggregation for a report type; unknown types return an empty dict"""
+    builder = REPORT_BUILDERS.get(report_type)
+    if builder is None:
+        return {}
+    return await builder(db, start_date, end_date)
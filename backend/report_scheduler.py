@@ -0,0 +1,225 @@
+"""
+Scheduled Report Execution
+Picks up due report_schedules, renders each distinct report once in a
+bounded worker pool, emails them in batches and advances each schedule.
+
+Schedules are claimed with a lease (find_one_and_update on next_send), and
+only the lease holder can advance them, so several API workers running the
+scheduler never send the same report twice.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from pymongo import ReturnDocument
+
+from report_aggregations import REPORT_BUILDERS, build_report_data
+
+logger = logging.getLogger(__name__)
+
+FREQUENCY_PERIODS = {
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+    "monthly": timedelta(days=30),
+}
+
+# Schedules claimed per run, and rendered/sent concurrently
+MAX_SCHEDULES_PER_RUN = 200
+RENDER_WORKERS = 4
+EMAIL_BATCH_SIZE = 20
+
+# A claimed schedule is released if its worker dies before advancing it
+CLAIM_LEASE = timedelta(minutes=10)
+
+# Failed deliveries are retried after this delay
+RETRY_DELAY = timedelta(hours=1)
+
+# Rendered reports are shared across schedules and workers for this long
+RESULT_TTL = timedelta(hours=6)
+
+
+def advance_schedule(next_send: datetime, frequency: str, now: datetime) -> datetime:
+    """Next send time after now, keeping the schedule's original time of day"""
+    period = FREQUENCY_PERIODS.get(frequency, FREQUENCY_PERIODS["daily"])
+    if next_send is None:
+        return now + period
+    missed = max((now - next_send) // period, 0)
+    return next_send + period * (missed + 1)
+
+
+def report_window(frequency: str, now: datetime) -> Tuple[datetime, datetime]:
+    """The whole days covered by a report sent now"""
+    end = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    period = FREQUENCY_PERIODS.get(frequency, FREQUENCY_PERIODS["daily"])
+    return end - period, end - timedelta(microseconds=1)
+
+
+def format_report(report_type: str, start: datetime, end: datetime, data: Dict) -> Tuple[str, str]:
+    """Plain-text email subject and body for a rendered report"""
+    title = report_type.replace("_", " ").title()
+    subject = f"{title} Report: {start.date().isoformat()} to {end.date().isoformat()}"
+
+    lines = [subject, ""]
+
+    def add(key, value, indent=0):
+        label = "  " * indent + str(key).replace("_", " ").capitalize()
+        if isinstance(value, dict):
+            lines.append(f"{label}:")
+            for k, v in value.items():
+                add(k, v, indent + 1)
+        elif isinstance(value, float):
+            lines.append(f"{label}: {value:,.2f}")
+        else:
+            lines.append(f"{label}: {value}")
+
+    for key, value in data.items():
+        if isinstance(value, list):
+            continue  # sample rows, not summary figures
+        add(key, value)
+
+    lines += ["", f"Generated {datetime.utcnow().strftime('%Y-%m-%d %H:%M')} UTC"]
+    return subject, "\n".join(lines)
+
+
+class ReportScheduler:
+    """Runs due report schedules"""
+
+    def __init__(self, db, email_service, workers: int = RENDER_WORKERS):
+        self.db = db
+        self.email_service = email_service
+        self.workers = workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-email")
+        self._run_lock = asyncio.Lock()
+
+    async def _claim_due(self, now: datetime) -> List[Dict]:
+        claimed = []
+        while len(claimed) < MAX_SCHEDULES_PER_RUN:
+            schedule = await self.db.report_schedules.find_one_and_update(
+                {
+                    "active": True,
+                    "next_send": {"$lte": now},
+                    "$or": [
+                        {"locked_until": {"$exists": False}},
+                        {"locked_until": None},
+                        {"locked_until": {"$lt": now}}
+                    ]
+                },
+                {"$set": {"locked_by": self.worker_id, "locked_until": now + CLAIM_LEASE}},
+                sort=[("next_send", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if not schedule:
+                break
+            claimed.append(schedule)
+        return claimed
+
+    async def _render(self, report_type: str, start: datetime, end: datetime) -> Dict:
+        """Render a report, reusing a result another schedule or worker already produced"""
+        key = {"report_type": report_type, "start": start, "end": end}
+        cached = await self.db.report_results.find_one(key)
+        if cached and datetime.utcnow() - cached["rendered_at"] < RESULT_TTL:
+            return cached["data"]
+
+        data = await build_report_data(self.db, report_type, start, end)
+        await self.db.report_results.update_one(
+            key,
+            {"$set": {**key, "data": data, "rendered_at": datetime.utcnow()}},
+            upsert=True
+        )
+        return data
+
+    async def _finish(self, schedule: Dict, now: datetime, sent: bool, status: str):
+        """Advance (or retry) a schedule and release its claim, if we still hold it"""
+        update = {"last_status": status, "last_attempt": now}
+        if sent:
+            update["last_sent"] = now
+            update["next_send"] = advance_schedule(schedule.get("next_send"), schedule.get("frequency"), now)
+            update["failures"] = 0
+            increment = {}
+        else:
+            update["next_send"] = now + RETRY_DELAY
+            increment = {"failures": 1}
+
+        operation = {"$set": update, "$unset": {"locked_by": "", "locked_until": ""}}
+        if increment:
+            operation["$inc"] = increment
+
+        await self.db.report_schedules.update_one(
+            {"_id": schedule["_id"], "locked_by": self.worker_id},
+            operation
+        )
+
+    async def run_due(self) -> Dict:
+        """Claim, render, send and advance every due schedule"""
+        async with self._run_lock:
+            now = datetime.utcnow()
+            schedules = await self._claim_due(now)
+            if not schedules:
+                return {"claimed": 0, "sent": 0, "failed": 0}
+
+            sent = failed = 0
+
+            # Unknown report types can never render; switch them off
+            valid = []
+            for schedule in schedules:
+                if schedule.get("report_type") in REPORT_BUILDERS:
+                    valid.append(schedule)
+                else:
+                    await self._finish(schedule, now, False, "invalid_report_type")
+                    await self.db.report_schedules.update_one(
+                        {"_id": schedule["_id"]}, {"$set": {"active": False}}
+                    )
+                    failed += 1
+
+            # Render each distinct report once, at most `workers` at a time
+            windows = {
+                str(s["_id"]): (s["report_type"], *report_window(s.get("frequency"), now))
+                for s in valid
+            }
+            semaphore = asyncio.Semaphore(self.workers)
+
+            async def render(spec):
+                async with semaphore:
+                    try:
+                        return spec, await self._render(*spec)
+                    except Exception as e:
+                        logger.error(f"Error rendering scheduled report {spec[0]}: {e}")
+                        return spec, None
+
+            rendered = dict(await asyncio.gather(*(render(spec) for spec in set(windows.values()))))
+
+            for offset in range(0, len(valid), EMAIL_BATCH_SIZE):
+                batch = valid[offset:offset + EMAIL_BATCH_SIZE]
+                deliverable, messages = [], []
+                for schedule in batch:
+                    spec = windows[str(schedule["_id"])]
+                    data = rendered.get(spec)
+                    if data is None or not schedule.get("email"):
+                        await self._finish(schedule, now, False, "render_failed" if data is None else "no_recipient")
+                        failed += 1
+                        continue
+                    subject, body = format_report(spec[0], spec[1], spec[2], data)
+                    deliverable.append(schedule)
+                    messages.append({"recipient": schedule["email"], "subject": subject, "body": body})
+
+                if not messages:
+                    continue
+
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.email_service.send_batch, messages
+                )
+                for schedule, ok in zip(deliverable, results):
+                    await self._finish(schedule, now, ok, "sent" if ok else "send_failed")
+                    sent += ok
+                    failed += not ok
+
+            summary = {"claimed": len(schedules), "reports_rendered": len(rendered), "sent": sent, "failed": failed}
+            logger.info(f"Scheduled reports run: {summary}")
+            return summary
+
@@ -1,12 +1,15 @@
 """
 Reports Routes - Generate various business reports and analytics
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, timedelta
 from bson import ObjectId
-from server import db
+from server import db, export_jobs
+from metric_rollups import metric_rollups
+from report_aggregations import REPORT_SOURCES, shift_date_match, shift_hours_expression
+from export_engine import export_response
 import logging
 
 logger = logging.getLogger(__name__)
@@ -66,6 +69,10 @@ async def generate_report(request: ReportRequest):
         logger.error(f"Error generating report: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def service_date_range(start_date: datetime, end_date: datetime) -> dict:
+    """site_service_history.service_date is stored as a YYYY-MM-DD string"""
+    return {"$gte": start_date.date().isoformat(), "$lte": end_date.date().isoformat()}
+
 async def generate_daily_operations_report(start_date: datetime, end_date: datetime):
     """Generate daily operations summary"""
     # Get dispatches
@@ -73,28 +80,28 @@ async def generate_daily_operations_report(start_date: datetime, end_date: datet
         "created_at": {"$gte": start_date, "$lte": end_date}
     })
     
-    # Get completed services
+    # Get completed services (service_date is stored as a date string)
     completed_services = await db.site_service_history.count_documents({
-        "service_date": {"$gte": start_date.isoformat(), "$lte": end_date.isoformat()},
+        "service_date": service_date_range(start_date, end_date),
         "status": "completed"
     })
     
-    # Get work orders
-    work_orders = await db.work_orders.count_documents({
-        "created_at": {"$gte": start_date, "$lte": end_date}
-    })
-    
-    completed_work_orders = await db.work_orders.count_documents({
-        "created_at": {"$gte": start_date, "$lte": end_date},
-        "status": "completed"
-    })
+    # Get work orders from the daily rollups
+    totals = await metric_rollups.get_totals(start_date, end_date)
+    work_orders = totals["work_orders"]["total"]
+    completed_work_orders = totals["work_orders"]["by_status"].get("completed", 0)
     
     # Get crew shifts
-    shifts = await db.shifts.find({
-        "start_time": {"$gte": start_date, "$lte": end_date}
-    }).to_list(1000)
+    shifts = (await db.shifts.aggregate([
+        {"$match": shift_date_match(start_date, end_date)},
+        {"$group": {
+            "_id": None,
+            "total_hours": {"$sum": shift_hours_expression()},
+            "crews": {"$addToSet": {"$ifNull": ["$crew_id", "$user_id"]}}
+        }}
+    ]).to_list(1)) or [{"total_hours": 0, "crews": []}]
     
-    total_hours = sum(shift.get('duration_hours', 0) for shift in shifts)
+    total_hours = shifts[0]["total_hours"]
     
     return {
         "total_dispatches": dispatches,
@@ -103,37 +110,25 @@ async def generate_daily_operations_report(start_date: datetime, end_date: datet
         "work_orders_completed": completed_work_orders,
         "completion_rate": round((completed_work_orders / work_orders * 100) if work_orders > 0 else 0, 2),
         "crew_hours_logged": round(total_hours, 2),
-        "active_crews": len(set(shift.get('crew_id') for shift in shifts if shift.get('crew_id')))
+        "active_crews": len([crew for crew in shifts[0]["crews"] if crew])
     }
 
 async def generate_financial_report(start_date: datetime, end_date: datetime):
     """Generate financial report"""
-    # Get invoices
-    invoices = await db.invoices.find({
-        "created_at": {"$gte": start_date, "$lte": end_date}
-    }).to_list(10000)
-    
-    total_revenue = sum(inv.get('total_amount', 0) for inv in invoices)
-    total_paid = sum(inv.get('amount_paid', 0) for inv in invoices)
-    total_outstanding = sum(inv.get('amount_due', 0) for inv in invoices)
+    totals = await metric_rollups.get_totals(start_date, end_date)
+    invoices = totals["invoices"]
     
     # Get estimates
-    estimates = await db.estimates.count_documents({
-        "created_at": {"$gte": start_date, "$lte": end_date}
-    })
-    
-    accepted_estimates = await db.estimates.count_documents({
-        "created_at": {"$gte": start_date, "$lte": end_date},
-        "status": "accepted"
-    })
+    estimates = totals["estimates"]["count"]
+    accepted_estimates = totals["estimates"]["accepted"]
     
     return {
-        "total_revenue": round(total_revenue, 2),
-        "amount_collected": round(total_paid, 2),
-        "outstanding_balance": round(total_outstanding, 2),
-        "total_invoices": len(invoices),
-        "paid_invoices": len([inv for inv in invoices if inv.get('status') == 'paid']),
-        "overdue_invoices": len([inv for inv in invoices if inv.get('status') == 'overdue']),
+        "total_revenue": round(invoices["total"], 2),
+        "amount_collected": round(invoices["amount_paid"], 2),
+        "outstanding_balance": round(invoices["amount_due"], 2),
+        "total_invoices": invoices["count"],
+        "paid_invoices": invoices["paid_count"],
+        "overdue_invoices": invoices["overdue_count"],
         "estimates_sent": estimates,
         "estimates_accepted": accepted_estimates,
         "conversion_rate": round((accepted_estimates / estimates * 100) if estimates > 0 else 0, 2)
@@ -142,18 +137,22 @@ async def generate_financial_report(start_date: datetime, end_date: datetime):
 async def generate_customer_analytics_report(start_date: datetime, end_date: datetime):
     """Generate customer analytics report"""
     # New customers
-    new_customers = await db.customers.count_documents({
-        "created_at": {"$gte": start_date, "$lte": end_date}
-    })
-    
-    # Total active customers
-    total_customers = await db.customers.count_documents({"active": True})
+    totals = await metric_rollups.get_totals(start_date, end_date)
+    new_customers = totals["customers"]["new"]
     
-    # Get all customers for revenue analysis
-    customers = await db.customers.find().to_list(10000)
-    customers_with_revenue = [c for c in customers if c.get('total_revenue', 0) > 0]
+    # Active customers and revenue per customer in one pass
+    customers = (await db.customers.aggregate([
+        {"$group": {
+            "_id": None,
+            "total_active": {"$sum": {"$cond": [{"$eq": ["$active", True]}, 1, 0]}},
+            "avg_customer_value": {"$avg": {"$cond": [
+                {"$gt": ["$total_revenue", 0]}, "$total_revenue", None
+            ]}}
+        }}
+    ]).to_list(1)) or [{}]
     
-    avg_customer_value = sum(c.get('total_revenue', 0) for c in customers_with_revenue) / len(customers_with_revenue) if customers_with_revenue else 0
+    total_customers = customers[0].get("total_active", 0)
+    avg_customer_value = customers[0].get("avg_customer_value") or 0
     
     # Service requests
     service_requests = await db.service_requests.count_documents({
@@ -170,81 +169,120 @@ async def generate_customer_analytics_report(start_date: datetime, end_date: dat
 
 async def generate_project_performance_report(start_date: datetime, end_date: datetime):
     """Generate project performance report"""
-    projects = await db.projects.find({
-        "created_at": {"$gte": start_date, "$lte": end_date}
-    }).to_list(10000)
+    totals = await metric_rollups.get_totals(start_date, end_date)
+    projects = totals["projects"]
     
-    completed_projects = [p for p in projects if p.get('status') == 'completed']
-    in_progress_projects = [p for p in projects if p.get('status') == 'in_progress']
+    total_projects = projects["total"]
+    completed_projects = projects["by_status"].get("completed", 0)
+    in_progress_projects = projects["by_status"].get("in_progress", 0)
     
-    total_project_value = sum(p.get('total_amount', 0) for p in projects)
+    total_project_value = projects["total_amount"]
     
     return {
-        "total_projects": len(projects),
-        "completed_projects": len(completed_projects),
-        "in_progress_projects": len(in_progress_projects),
-        "completion_rate": round((len(completed_projects) / len(projects) * 100) if projects else 0, 2),
+        "total_projects": total_projects,
+        "completed_projects": completed_projects,
+        "in_progress_projects": in_progress_projects,
+        "completion_rate": round((completed_projects / total_projects * 100) if total_projects else 0, 2),
         "total_project_value": round(total_project_value, 2),
-        "avg_project_value": round(total_project_value / len(projects), 2) if projects else 0
+        "avg_project_value": round(total_project_value / total_projects, 2) if total_projects else 0
     }
 
 async def generate_service_analytics_report(start_date: datetime, end_date: datetime):
     """Generate service analytics report"""
-    services = await db.site_service_history.find({
-        "service_date": {"$gte": start_date.isoformat(), "$lte": end_date.isoformat()}
-    }).to_list(10000)
-    
     # Group by service type
-    service_breakdown = {}
-    for service in services:
-        service_type = service.get('service_type', 'Unknown')
-        if service_type not in service_breakdown:
-            service_breakdown[service_type] = {
-                "count": 0,
-                "total_hours": 0
-            }
-        service_breakdown[service_type]["count"] += 1
-        service_breakdown[service_type]["total_hours"] += service.get('duration_hours', 0)
+    rows = await db.site_service_history.aggregate([
+        {"$match": {"service_date": service_date_range(start_date, end_date)}},
+        {"$group": {
+            "_id": {"$ifNull": ["$service_type", "Unknown"]},
+            "count": {"$sum": 1},
+            "total_hours": {"$sum": {"$ifNull": ["$duration_hours", 0]}}
+        }}
+    ]).to_list(None)
+    
+    service_breakdown = {
+        row["_id"]: {"count": row["count"], "total_hours": row["total_hours"]}
+        for row in rows
+    }
+    total_services = sum(row["count"] for row in rows)
+    total_hours = sum(row["total_hours"] for row in rows)
     
     return {
-        "total_services": len(services),
+        "total_services": total_services,
         "service_breakdown": service_breakdown,
-        "avg_service_duration": round(sum(s.get('duration_hours', 0) for s in services) / len(services), 2) if services else 0
+        "avg_service_duration": round(total_hours / total_services, 2) if total_services else 0
     }
 
 async def generate_crew_productivity_report(start_date: datetime, end_date: datetime):
     """Generate crew productivity report"""
-    # Get time entries
-    time_entries = await db.time_entries.find({
-        "date": {"$gte": start_date.isoformat(), "$lte": end_date.isoformat()}
-    }).to_list(10000)
-    
-    total_hours = sum(entry.get('hours_worked', 0) for entry in time_entries)
+    # Hours logged from the daily rollups of time entries
+    totals = await metric_rollups.get_totals(start_date, end_date)
+    total_hours = totals["crew"]["hours"]
     
     # Get shifts
-    shifts = await db.shifts.find({
-        "start_time": {"$gte": start_date, "$lte": end_date}
-    }).to_list(10000)
+    shifts = await db.shifts.count_documents(shift_date_match(start_date, end_date))
     
     # Get tasks
-    tasks = await db.tasks.count_documents({
-        "created_at": {"$gte": start_date, "$lte": end_date}
-    })
+    tasks = (await db.tasks.aggregate([
+        {"$match": {"created_at": {"$gte": start_date, "$lte": end_date}}},
+        {"$group": {
+            "_id": None,
+            "assigned": {"$sum": 1},
+            "completed": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}}
+        }}
+    ]).to_list(1)) or [{"assigned": 0, "completed": 0}]
     
-    completed_tasks = await db.tasks.count_documents({
-        "created_at": {"$gte": start_date, "$lte": end_date},
-        "status": "completed"
-    })
+    assigned_tasks = tasks[0]["assigned"]
+    completed_tasks = tasks[0]["completed"]
     
     return {
         "total_hours_logged": round(total_hours, 2),
-        "total_shifts": len(shifts),
-        "tasks_assigned": tasks,
+        "total_shifts": shifts,
+        "tasks_assigned": assigned_tasks,
         "tasks_completed": completed_tasks,
-        "completion_rate": round((completed_tasks / tasks * 100) if tasks > 0 else 0, 2),
-        "avg_hours_per_shift": round(total_hours / len(shifts), 2) if shifts else 0
+        "completion_rate": round((completed_tasks / assigned_tasks * 100) if assigned_tasks > 0 else 0, 2),
+        "avg_hours_per_shift": round(total_hours / shifts, 2) if shifts else 0
     }
 
+@router.get("/reports/export/{report_type}")
+async def export_report_rows(
+    report_type: str,
+    start_date: str,
+    end_date: str,
+    format: str = Query("csv"),
+    background: bool = False
+):
+    """
+    Stream the documents behind a report (dispatches, invoices, customers,
+    projects or shifts in the date range) as CSV, NDJSON or XLSX.
+    Exports too large to stream return 202 with an export job id.
+    """
+    if report_type not in REPORT_SOURCES:
+        raise HTTPException(status_code=400, detail="Invalid report type")
+    try:
+        start = datetime.fromisoformat(start_date)
+        end = datetime.fromisoformat(end_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format")
+    if len(end_date) == 10:
+        end += timedelta(days=1, microseconds=-1)
+    
+    collection, build_match, sort_field = REPORT_SOURCES[report_type]
+    try:
+        return await export_response(
+            export_jobs,
+            db[collection],
+            build_match(start, end),
+            format,
+            f"{report_type}_{start.date().isoformat()}_{end.date().isoformat()}",
+            sort=[(sort_field, 1)],
+            background=background
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error exporting report {report_type}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/reports/schedule")
 async def schedule_report(request: ScheduleReportRequest):
     """Schedule a recurring report"""
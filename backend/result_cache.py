@@ -0,0 +1,215 @@
+"""
+Result Cache
+In-process cache for expensive dashboard endpoints.
+
+Each cached function is tagged with the collections it reads. Entries are
+served fresh for `ttl` seconds, then served stale for up to `stale_ttl` more
+while one background refresh recomputes them. Concurrent misses for the same
+key share a single computation.
+
+Writes to a tagged collection drop its entries. Invalidation is driven by a
+MongoDB change stream so it reaches every API worker; without a replica set
+the TTL alone bounds how stale a result can be.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 60
+DEFAULT_STALE_TTL = 240
+
+# Seconds to wait before reopening a failed change stream
+CHANGE_STREAM_RETRY = 30
+
+STAT_FIELDS = ("hits", "stale_hits", "misses", "coalesced", "refreshes", "invalidations", "errors")
+
+
+class ResultCache:
+    """TTL cache with stale-while-revalidate, single-flight and collection tags"""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[float, Any, Tuple[str, ...]]] = {}  # key -> (stored at, value, tags)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._tags: Dict[str, Set[str]] = {}  # collection -> keys
+        self._generations: Dict[str, int] = {}  # collection -> invalidation count
+        self._functions: Dict[str, Tuple[str, ...]] = {}  # function name -> tags
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.change_stream_active = False
+
+    @staticmethod
+    def make_key(name: str, args: tuple, kwargs: dict) -> str:
+        parts = [repr(a) for a in args] + [f"{k}={kwargs[k]!r}" for k in sorted(kwargs)]
+        return f"{name}({', '.join(parts)})"
+
+    def _count(self, name: str, field: str):
+        self.stats[name][field] += 1
+
+    # ========== Decorator ==========
+
+    def cached(
+        self,
+        collections: Iterable[str],
+        ttl: int = DEFAULT_TTL,
+        stale_ttl: int = DEFAULT_STALE_TTL,
+    ) -> Callable:
+        """
+        Cache an async function's result, keyed by its arguments and invalidated
+        by writes to `collections`. Exceptions are never cached.
+
+        Place it below the route decorator so FastAPI registers the cached wrapper;
+        functools.wraps keeps the original signature for parameter parsing.
+        """
+        tags = tuple(collections)
+
+        def decorator(func: Callable) -> Callable:
+            name = f"{func.__module__}.{func.__qualname__}"
+            self._functions[name] = tags
+            self.stats.setdefault(name, dict.fromkeys(STAT_FIELDS, 0))
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                key = self.make_key(name, args, kwargs)
+                entry = self._entries.get(key)
+                age = time.monotonic() - entry[0] if entry else None
+
+                if entry and age < ttl:
+                    self._count(name, "hits")
+                    return entry[1]
+
+                if entry and age < ttl + stale_ttl:
+                    self._count(name, "stale_hits")
+                    self._start_refresh(name, key, tags, func, args, kwargs)
+                    return entry[1]
+
+                if key in self._inflight:
+                    self._count(name, "coalesced")
+                else:
+                    self._count(name, "misses")
+                task = self._start_refresh(name, key, tags, func, args, kwargs)
+                # Shield so a cancelled request doesn't cancel the computation other callers wait on
+                return await asyncio.shield(task)
+
+            return wrapper
+
+        return decorator
+
+    def _start_refresh(self, name, key, tags, func, args, kwargs) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(name, key, tags, func, args, kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._refresh_done(key, done))
+        return task
+
+    def _refresh_done(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Background refreshes have no awaiting caller to surface their error
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Result cache refresh failed for {key}: {task.exception()}")
+
+    async def _refresh(self, name, key, tags, func, args, kwargs) -> Any:
+        generations = tuple(self._generations.get(tag, 0) for tag in tags)
+        self._count(name, "refreshes")
+        try:
+            value = await func(*args, **kwargs)
+        except Exception:
+            self._count(name, "errors")
+            raise
+
+        # A write landed while we were computing; the result may already be out of date
+        if generations == tuple(self._generations.get(tag, 0) for tag in tags):
+            self._entries[key] = (time.monotonic(), value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+        return value
+
+    # ========== Invalidation ==========
+
+    def invalidate(self, *collections: str) -> int:
+        """Drop every entry tagged with any of the collections; returns the number dropped"""
+        dropped = 0
+        for collection in collections:
+            self._generations[collection] = self._generations.get(collection, 0) + 1
+            for key in self._tags.pop(collection, set()):
+                entry = self._entries.pop(key, None)
+                if entry is None:
+                    continue
+                dropped += 1
+                for tag in entry[2]:
+                    if tag != collection:
+                        self._tags.get(tag, set()).discard(key)
+                self._count(key.split("(", 1)[0], "invalidations")
+        return dropped
+
+    def clear(self) -> int:
+        return self.invalidate(*self.tagged_collections())
+
+    def tagged_collections(self) -> Set[str]:
+        return {tag for tags in self._functions.values() for tag in tags}
+
+    async def watch_changes(self, db):
+        """
+        Invalidate entries as their collections are written, in every worker.
+        Requires a replica set; without one entries simply expire by TTL.
+        """
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": sorted(self.tagged_collections())},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+        }}]
+
+        while True:
+            try:
+                async with db.watch(pipeline) as stream:
+                    self.change_stream_active = True
+                    logger.info("Result cache change stream started")
+                    async for change in stream:
+                        self.invalidate(change["ns"]["coll"])
+            except OperationFailure as e:
+                self.change_stream_active = False
+                logger.info(f"Change streams unavailable, result cache relies on TTL: {e}")
+                return
+            except asyncio.CancelledError:
+                self.change_stream_active = False
+                raise
+            except PyMongoError as e:
+                self.change_stream_active = False
+                logger.error(f"Result cache change stream error: {e}")
+                # Anything written while disconnected would otherwise be missed
+                self.clear()
+                await asyncio.sleep(CHANGE_STREAM_RETRY)
+
+    # ========== Metrics ==========
+
+    def get_stats(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """Return per-function counters, hit ratios and current cache size"""
+        functions = {}
+        for func_name, counters in self.stats.items():
+            if name and name not in func_name:
+                continue
+            served = counters["hits"] + counters["stale_hits"]
+            requests = served + counters["misses"] + counters["coalesced"]
+            functions[func_name] = {
+                **counters,
+                "hit_ratio": round(served / requests, 4) if requests else None,
+                "entries": sum(1 for key in self._entries if key.split("(", 1)[0] == func_name),
+                "collections": list(self._functions.get(func_name, ())),
+            }
+
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "change_stream_active": self.change_stream_active,
+            "functions": functions,
+        }
+
+
+# Singleton instance
+result_cache = ResultCache()
+cached = result_cache.cached
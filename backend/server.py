@@ -1,8 +1,9 @@
-from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Request, Response, Depends, Body, File, UploadFile, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends, Body, File, UploadFile, Form, Query
 from fastapi.responses import StreamingResponse, RedirectResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
 import os
 import io
 import base64
@@ -104,9 +105,19 @@ from google_tasks_service import google_tasks_service
 from ringcentral_service import ringcentral_service
 from webhook_handler import init_webhook_handler
 from automation_engine import AutomationEngine
-from custom_workflow_executor import CustomWorkflowExecutor
-from event_emitter import EventEmitter, set_event_emitter
+from custom_workflow_executor import CustomWorkflowExecutor, action_graph
+from event_emitter import EventEmitter, set_event_emitter, get_event_emitter, invalidate_subscriptions
 from background_scheduler import BackgroundScheduler
+from leader_election import LeaderElection
+from report_aggregations import build_report_data
+from export_engine import ExportJobService, export_response
+from result_cache import cached, result_cache
+from customer_summary import customer_summary
+from metric_rollups import metric_rollups
+from job_queue import job_queue, JOB_WORKERS_IN_PROCESS
+from log_sink import log_sink
+from customer_timeline import get_customer_timeline
+from equipment_analytics import equipment_inspection_status, equipment_usage_analytics, maintenance_alerts
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -136,7 +147,7 @@ async def root():
 
 # ==================== USER ENDPOINTS ====================
 @api_router.post("/users", response_model=User)
-async def create_user(user: UserCreate, background_tasks: BackgroundTasks):
+async def create_user(user: UserCreate):
     user_dict = user.dict()
     user_dict["created_at"] = datetime.utcnow()
     
@@ -151,17 +162,17 @@ async def create_user(user: UserCreate, background_tasks: BackgroundTasks):
     
     # Send onboarding email for crew members and subcontractors
     if user_dict.get("role") in ["crew", "subcontractor", "admin"] and user_dict.get("email"):
-        background_tasks.add_task(
-            send_onboarding_email_task,
-            user_dict["email"],
-            user_dict["name"],
-            user_dict["email"],  # Using email as username
-            user_dict.get("password", "ChangeMe123!"),  # Default temp password if not provided
-            user_dict["role"]
-        )
+        await job_queue.enqueue("onboarding_email", {
+            "email": user_dict["email"],
+            "name": user_dict["name"],
+            "username": user_dict["email"],  # Using email as username
+            "password": user_dict.get("password", "ChangeMe123!"),  # Default temp password if not provided
+            "role": user_dict["role"]
+        })
     
     return User(**user_dict)
 
+@job_queue.handler("onboarding_email", queue="notifications")
 async def send_onboarding_email_task(
     email: str,
     name: str,
@@ -169,21 +180,18 @@ async def send_onboarding_email_task(
     password: str,
     role: str
 ):
-    """Background task to send onboarding email"""
-    try:
-        success = email_service.send_onboarding_email(
-            email,
-            name,
-            username,
-            password,
-            role
-        )
-        if success:
-            logger.info(f"Onboarding email sent successfully to {email}")
-        else:
-            logger.warning(f"Failed to send onboarding email to {email}")
-    except Exception as e:
-        logger.error(f"Error sending onboarding email to {email}: {str(e)}")
+    """Background task to send onboarding email; failures are retried by the job queue"""
+    success = await asyncio.to_thread(
+        email_service.send_onboarding_email,
+        email,
+        name,
+        username,
+        password,
+        role
+    )
+    if not success:
+        raise RuntimeError(f"Failed to send onboarding email to {email}")
+    logger.info(f"Onboarding email sent successfully to {email}")
 
 @api_router.get("/users", response_model=List[User])
 async def get_users(role: str = None):
@@ -698,27 +706,24 @@ def sync_customer_to_quickbooks(customer_data: dict):
         # If no event loop, run in new loop
         asyncio.run(async_sync())
 
+@job_queue.handler("quickbooks_invoice_sync")
 async def sync_invoice_to_quickbooks(invoice_data: dict):
-    """Background task to sync invoice to QuickBooks"""
-    try:
-        connections = await db.quickbooks_connections.find({"is_active": True}).to_list(100)
+    """Background task to sync invoice to QuickBooks; failures are retried by the job queue"""
+    connections = await db.quickbooks_connections.find({"is_active": True}).to_list(100)
+    
+    for connection in connections:
+        if not connection.get("sync_settings", {}).get("auto_sync_invoices", True):
+            continue
         
-        for connection in connections:
-            if not connection.get("sync_settings", {}).get("auto_sync_invoices", True):
-                continue
-            
-            # Get customer ID from invoice
-            customer_id = invoice_data.get("customer_id")
-            if not customer_id:
-                logger.error("Invoice missing customer_id, cannot sync")
-                continue
-            
-            # TODO: Need to map customer to QuickBooks customer ID
-            # For now, we'll skip this and let manual sync handle it
-            logger.info(f"Invoice {invoice_data.get('invoice_number')} created but requires manual QuickBooks mapping")
-            
-    except Exception as e:
-        logger.error(f"Error in sync_invoice_to_quickbooks: {e}")
+        # Get customer ID from invoice
+        customer_id = invoice_data.get("customer_id")
+        if not customer_id:
+            logger.error("Invoice missing customer_id, cannot sync")
+            continue
+        
+        # TODO: Need to map customer to QuickBooks customer ID
+        # For now, we'll skip this and let manual sync handle it
+        logger.info(f"Invoice {invoice_data.get('invoice_number')} created but requires manual QuickBooks mapping")
 
 async def sync_payment_to_quickbooks(payment_data: dict, invoice_id: str):
     """Background task to sync payment to QuickBooks"""
@@ -740,19 +745,16 @@ async def sync_payment_to_quickbooks(payment_data: dict, invoice_id: str):
     except Exception as e:
         logger.error(f"Error in sync_payment_to_quickbooks: {e}")
 
+@job_queue.handler("quickbooks_estimate_sync")
 async def sync_estimate_to_quickbooks(estimate_data: dict):
-    """Background task to sync estimate to QuickBooks"""
-    try:
-        connections = await db.quickbooks_connections.find({"is_active": True}).to_list(100)
+    """Background task to sync estimate to QuickBooks; failures are retried by the job queue"""
+    connections = await db.quickbooks_connections.find({"is_active": True}).to_list(100)
+    
+    for connection in connections:
+        if not connection.get("sync_settings", {}).get("auto_sync_estimates", True):
+            continue
         
-        for connection in connections:
-            if not connection.get("sync_settings", {}).get("auto_sync_estimates", True):
-                continue
-            
-            logger.info(f"Estimate {estimate_data.get('estimate_number')} created but requires manual QuickBooks mapping")
-            
-    except Exception as e:
-        logger.error(f"Error in sync_estimate_to_quickbooks: {e}")
+        logger.info(f"Estimate {estimate_data.get('estimate_number')} created but requires manual QuickBooks mapping")
 
 # ==================== CUSTOMER ENDPOINTS ====================
 @api_router.post("/customers", response_model=Customer)
@@ -909,11 +911,15 @@ async def check_duplicate_customer(data: Dict[str, Any]):
     }
 
 @api_router.get("/customers", response_model=List[Customer])
-async def get_customers(active: bool = None):
+async def get_customers(active: bool = None, sort_by: Optional[str] = None):
     query = {}
     if active is not None:
         query["active"] = active
-    customers = await db.customers.find(query).to_list(1000)
+    cursor = db.customers.find(query)
+    if sort_by == "revenue":
+        # total_revenue is kept current by customer_summary
+        cursor = cursor.sort("total_revenue", -1)
+    customers = await cursor.to_list(1000)
     
     # Filter out customers with invalid data (like invalid emails)
     valid_customers = []
@@ -952,97 +958,29 @@ async def update_customer(customer_id: str, customer_update: CustomerUpdate):
 
 @api_router.delete("/customers/{customer_id}")
 async def delete_customer(customer_id: str):
-    result = await db.customers.delete_one({"_id": ObjectId(customer_id)})
-    if result.deleted_count == 0:
+    customer = await db.customers.find_one_and_delete({"_id": ObjectId(customer_id)}, {"created_at": 1})
+    if customer is None:
         raise HTTPException(status_code=404, detail="Customer not found")
+    await metric_rollups.source_changed("customers", customer)
     return {"message": "Customer deleted successfully"}
 
 # ==================== CUSTOMER ACTIVITY & STATS ENDPOINTS ====================
 @api_router.get("/customers/{customer_id}/activity")
-async def get_customer_activity(customer_id: str, limit: int = 50):
-    """Get activity timeline for a customer"""
+async def get_customer_activity(
+    customer_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    types: Optional[str] = None
+):
+    """
+    Get activity timeline for a customer, newest first.
+    Pass next_cursor back as `cursor` for the next page; `types` is a comma-separated activity_type filter.
+    """
     try:
-        # Get activity logs
-        activity_logs = await db.activity_logs.find({"customer_id": customer_id}).sort("created_at", -1).limit(limit).to_list(limit)
-        
-        # Auto-generate activities from estimates, invoices, projects
-        activities = []
-        
-        # Get estimates
-        estimates = await db.estimates.find({"customer_id": customer_id}).to_list(100)
-        for est in estimates:
-            activities.append({
-                "activity_type": "estimate_created",
-                "title": f"Estimate {est.get('estimate_number')} created",
-                "description": f"Amount: ${est.get('total_amount', 0):.2f}",
-                "amount": est.get('total_amount'),
-                "related_id": str(est.get('_id')),
-                "related_type": "estimate",
-                "created_at": est.get('created_at')
-            })
-            if est.get('accepted_at'):
-                activities.append({
-                    "activity_type": "estimate_accepted",
-                    "title": f"Estimate {est.get('estimate_number')} accepted",
-                    "amount": est.get('total_amount'),
-                    "related_id": str(est.get('_id')),
-                    "related_type": "estimate",
-                    "created_at": est.get('accepted_at')
-                })
-        
-        # Get invoices
-        invoices = await db.invoices.find({"customer_id": customer_id}).to_list(100)
-        for inv in invoices:
-            activities.append({
-                "activity_type": "invoice_created",
-                "title": f"Invoice {inv.get('invoice_number')} created",
-                "description": f"Amount: ${inv.get('total_amount', 0):.2f}",
-                "amount": inv.get('total_amount'),
-                "related_id": str(inv.get('_id')),
-                "related_type": "invoice",
-                "created_at": inv.get('created_at')
-            })
-            
-            # Add payment activities
-            for payment in inv.get('payments', []):
-                activities.append({
-                    "activity_type": "payment_received",
-                    "title": f"Payment received for {inv.get('invoice_number')}",
-                    "description": f"${payment.get('amount', 0):.2f} via {payment.get('payment_method', 'unknown')}",
-                    "amount": payment.get('amount'),
-                    "related_id": str(inv.get('_id')),
-                    "related_type": "invoice",
-                    "created_at": payment.get('payment_date')
-                })
-        
-        # Get projects
-        projects = await db.projects.find({"customer_id": customer_id}).to_list(100)
-        for proj in projects:
-            activities.append({
-                "activity_type": "project_created",
-                "title": f"Project {proj.get('project_number')} created",
-                "description": proj.get('name'),
-                "related_id": str(proj.get('_id')),
-                "related_type": "project",
-                "created_at": proj.get('created_at')
-            })
-            if proj.get('completed_at'):
-                activities.append({
-                    "activity_type": "project_completed",
-                    "title": f"Project {proj.get('project_number')} completed",
-                    "related_id": str(proj.get('_id')),
-                    "related_type": "project",
-                    "created_at": proj.get('completed_at')
-                })
-        
-        # Add manual activity logs
-        for log in activity_logs:
-            activities.append(serialize_doc(log))
-        
-        # Sort by date
-        activities.sort(key=lambda x: x.get('created_at') or datetime.min, reverse=True)
-        
-        return activities[:limit]
+        type_filter = [t.strip() for t in types.split(",") if t.strip()] if types else None
+        return await get_customer_timeline(db, customer_id, type_filter, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting customer activity: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get customer activity")
@@ -1072,40 +1010,23 @@ async def create_activity_log(customer_id: str, activity: dict):
 async def get_customer_stats(customer_id: str):
     """Get customer statistics and metrics"""
     try:
-        # Calculate total revenue
-        invoices = await db.invoices.find({"customer_id": customer_id}).to_list(1000)
-        total_revenue = sum(inv.get('total_amount', 0) for inv in invoices)
-        total_paid = sum(inv.get('amount_paid', 0) for inv in invoices)
-        total_outstanding = sum(inv.get('amount_due', 0) for inv in invoices)
-        
-        # Count records
-        estimates_count = await db.estimates.count_documents({"customer_id": customer_id})
-        projects_count = await db.projects.count_documents({"customer_id": customer_id})
-        invoices_count = len(invoices)
+        summary = await customer_summary.get(customer_id)
+        customer = await db.customers.find_one({"_id": ObjectId(customer_id)}, {"created_at": 1})
         
-        # Calculate average project value
-        avg_project_value = total_revenue / projects_count if projects_count > 0 else 0
-        
-        # Get first interaction date
-        customer = await db.customers.find_one({"_id": ObjectId(customer_id)})
-        customer_since = customer.get('created_at') if customer else None
-        
-        # Update customer total_revenue
-        if customer:
-            await db.customers.update_one(
-                {"_id": ObjectId(customer_id)},
-                {"$set": {"total_revenue": total_revenue}}
-            )
+        total_revenue = summary.get("revenue", 0)
+        projects_count = summary.get("projects_count", 0)
         
         return {
             "total_revenue": total_revenue,
-            "total_paid": total_paid,
-            "total_outstanding": total_outstanding,
-            "estimates_count": estimates_count,
+            "total_paid": summary.get("paid", 0),
+            "total_outstanding": summary.get("outstanding", 0),
+            "estimates_count": summary.get("estimates_count", 0),
             "projects_count": projects_count,
-            "invoices_count": invoices_count,
-            "avg_project_value": avg_project_value,
-            "customer_since": customer_since
+            "invoices_count": summary.get("invoices_count", 0),
+            "avg_project_value": total_revenue / projects_count if projects_count > 0 else 0,
+            "customer_since": customer.get('created_at') if customer else None,
+            "first_activity_at": summary.get("first_activity_at"),
+            "last_activity_at": summary.get("last_activity_at")
         }
     except Exception as e:
         logger.error(f"Error getting customer stats: {str(e)}")
@@ -1608,7 +1529,7 @@ async def get_all_communications(
         raise HTTPException(status_code=500, detail="Failed to fetch communications")
 
 @api_router.post("/customers/{customer_id}/communications", response_model=Communication)
-async def create_communication(customer_id: str, communication: CommunicationCreate, background_tasks: BackgroundTasks):
+async def create_communication(customer_id: str, communication: CommunicationCreate):
     """Send a new communication to a customer"""
     try:
         # Get customer details
@@ -1643,18 +1564,16 @@ async def create_communication(customer_id: str, communication: CommunicationCre
         
         # Send actual message based on type
         if communication.type == CommunicationType.EMAIL:
-            background_tasks.add_task(
-                send_email_communication,
-                customer.get("email"),
-                communication.subject or "Message from CAF Property Services",
-                communication.content
-            )
+            await job_queue.enqueue("customer_email", {
+                "email": customer.get("email"),
+                "subject": communication.subject or "Message from CAF Property Services",
+                "body": communication.content
+            })
         elif communication.type == CommunicationType.SMS:
-            background_tasks.add_task(
-                send_sms_communication,
-                customer.get("phone"),
-                communication.content
-            )
+            await job_queue.enqueue("customer_sms", {
+                "phone": customer.get("phone"),
+                "message": communication.content
+            })
         # APP_MESSAGE type doesn't need external sending
         
         return Communication(**comm_dict)
@@ -1664,23 +1583,22 @@ async def create_communication(customer_id: str, communication: CommunicationCre
         logger.error(f"Error creating communication: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to create communication")
 
+@job_queue.handler("customer_email", queue="notifications")
 async def send_email_communication(email: str, subject: str, body: str):
-    """Background task to send email"""
-    try:
-        if email:
-            await email_service.send_email(to_email=email, subject=subject, body=body)
-            logger.info(f"Email sent successfully to {email}")
-    except Exception as e:
-        logger.error(f"Error sending email: {str(e)}")
+    """Background task to send email; failures are retried by the job queue"""
+    if email:
+        if not await email_service.send_email(to_email=email, subject=subject, body=body):
+            raise RuntimeError(f"Failed to send email to {email}")
+        logger.info(f"Email sent successfully to {email}")
 
+@job_queue.handler("customer_sms", queue="notifications")
 async def send_sms_communication(phone: str, message: str):
-    """Background task to send SMS"""
-    try:
-        if phone:
-            await sms_service.send_sms(to_number=phone, message=message)
-            logger.info(f"SMS sent successfully to {phone}")
-    except Exception as e:
-        logger.error(f"Error sending SMS: {str(e)}")
+    """Background task to send SMS; failures are retried by the job queue"""
+    if phone:
+        result = await sms_service.send_sms(to_number=phone, message=message)
+        if not result.get("success"):
+            raise RuntimeError(f"Failed to send SMS to {phone}: {result.get('error')}")
+        logger.info(f"SMS sent successfully to {phone}")
 
 @api_router.patch("/communications/{communication_id}/read")
 async def mark_communication_read(communication_id: str, read: bool = True):
@@ -2499,84 +2417,7 @@ async def update_maintenance(maintenance_id: str, maintenance_update: Maintenanc
 async def get_maintenance_alerts():
     """Get equipment that needs maintenance soon"""
     try:
-        # Get all active equipment
-        equipment_list = []
-        
-        async for equipment in db.equipment.find({"active": True}):
-            equipment_doc = serialize_doc(equipment)
-            equipment_id = equipment_doc["id"]
-            
-            # Count completed dispatches since last maintenance
-            last_maintenance = await db.equipment_maintenance.find_one(
-                {
-                    "equipment_id": equipment_id,
-                    "status": "completed"
-                },
-                sort=[("completed_date", -1)]
-            )
-            
-            # Count dispatches since last maintenance
-            if last_maintenance:
-                dispatches_since = await db.dispatches.count_documents({
-                    "equipment_ids": equipment_id,
-                    "status": "completed",
-                    "completed_at": {"$gte": last_maintenance.get("completed_date", datetime.utcnow())}
-                })
-            else:
-                dispatches_since = await db.dispatches.count_documents({
-                    "equipment_ids": equipment_id,
-                    "status": "completed"
-                })
-            
-            # Check for scheduled maintenance
-            upcoming_maintenance = await db.equipment_maintenance.find_one(
-                {
-                    "equipment_id": equipment_id,
-                    "status": "scheduled",
-                    "scheduled_date": {"$gte": datetime.utcnow()}
-                },
-                sort=[("scheduled_date", 1)]
-            )
-            
-            # Alert if:
-            # 1. More than 50 dispatches since last maintenance
-            # 2. No scheduled maintenance
-            alert_level = "ok"
-            message = ""
-            
-            if dispatches_since >= 75:
-                alert_level = "critical"
-                message = f"{dispatches_since} dispatches since last maintenance - URGENT"
-            elif dispatches_since >= 50:
-                alert_level = "warning"
-                message = f"{dispatches_since} dispatches since last maintenance"
-            elif dispatches_since >= 30 and not upcoming_maintenance:
-                alert_level = "info"
-                message = f"{dispatches_since} dispatches - Consider scheduling maintenance"
-            
-            if alert_level != "ok":
-                equipment_list.append({
-                    "equipment_id": equipment_id,
-                    "equipment_name": equipment_doc.get("name", "Unknown"),
-                    "equipment_type": equipment_doc.get("equipment_type", "unknown"),
-                    "dispatches_since_maintenance": dispatches_since,
-                    "last_maintenance_date": serialize_doc(last_maintenance).get("completed_date") if last_maintenance else None,
-                    "upcoming_maintenance": serialize_doc(upcoming_maintenance) if upcoming_maintenance else None,
-                    "alert_level": alert_level,
-                    "message": message
-                })
-        
-        # Sort by alert level and dispatches
-        priority_order = {"critical": 0, "warning": 1, "info": 2}
-        equipment_list.sort(key=lambda x: (priority_order[x["alert_level"]], -x["dispatches_since_maintenance"]))
-        
-        return {
-            "total_alerts": len(equipment_list),
-            "critical_count": sum(1 for e in equipment_list if e["alert_level"] == "critical"),
-            "warning_count": sum(1 for e in equipment_list if e["alert_level"] == "warning"),
-            "alerts": equipment_list
-        }
-        
+        return await maintenance_alerts(db)
     except Exception as e:
         print(f"Error getting maintenance alerts: {e}")
         raise HTTPException(status_code=500, detail=f"Error getting alerts: {str(e)}")
@@ -2585,85 +2426,7 @@ async def get_maintenance_alerts():
 @api_router.get("/equipment/inspection-status")
 async def get_equipment_inspection_status():
     """Get inspection status for all equipment with forms"""
-    equipment_list = []
-    
-    # Get all active equipment
-    async for equipment in db.equipment.find({"active": True}):
-        equipment_doc = serialize_doc(equipment)
-        equipment_id = equipment_doc["id"]
-        equipment_type = equipment_doc.get("equipment_type", "unknown")
-        
-        # Get equipment forms for this type
-        form_templates = await db.form_templates.find({
-            "form_type": "equipment_form",
-            "equipment_type": equipment_type,
-            "archived": {"$ne": True}
-        }).to_list(100)
-        
-        if not form_templates:
-            continue
-        
-        # Get last inspection for this equipment
-        last_response = await db.form_responses.find_one(
-            {"equipment_id": equipment_id},
-            sort=[("submitted_at", -1)]
-        )
-        
-        last_inspection_date = None
-        days_since_inspection = None
-        status = "never_inspected"
-        
-        if last_response:
-            last_inspection_date = last_response.get("submitted_at")
-            if last_inspection_date:
-                if isinstance(last_inspection_date, str):
-                    try:
-                        last_inspection_date = datetime.fromisoformat(last_inspection_date.replace('Z', '+00:00'))
-                    except:
-                        last_inspection_date = None
-                
-                if last_inspection_date:
-                    days_since_inspection = (datetime.utcnow() - last_inspection_date).days
-                    
-                    # Determine status (customize these thresholds as needed)
-                    if days_since_inspection <= 7:
-                        status = "current"
-                    elif days_since_inspection <= 30:
-                        status = "due_soon"
-                    else:
-                        status = "overdue"
-        
-        equipment_list.append({
-            "equipment_id": equipment_id,
-            "equipment_name": equipment_doc.get("name", "Unknown"),
-            "equipment_type": equipment_type,
-            "last_inspection_date": last_inspection_date.isoformat() if last_inspection_date else None,
-            "days_since_inspection": days_since_inspection,
-            "status": status,
-            "available_forms": len(form_templates),
-            "form_templates": [
-                {
-                    "id": str(template["_id"]),
-                    "name": template.get("name", "Unknown")
-                }
-                for template in form_templates
-            ]
-        })
-    
-    # Sort by status (overdue first, then due_soon, then never_inspected, then current)
-    status_order = {"overdue": 0, "due_soon": 1, "never_inspected": 2, "current": 3}
-    equipment_list.sort(key=lambda x: status_order.get(x["status"], 4))
-    
-    return {
-        "equipment": equipment_list,
-        "summary": {
-            "total_equipment": len(equipment_list),
-            "overdue": sum(1 for e in equipment_list if e["status"] == "overdue"),
-            "due_soon": sum(1 for e in equipment_list if e["status"] == "due_soon"),
-            "current": sum(1 for e in equipment_list if e["status"] == "current"),
-            "never_inspected": sum(1 for e in equipment_list if e["status"] == "never_inspected")
-        }
-    }
+    return await equipment_inspection_status(db)
 
 @api_router.get("/equipment/{equipment_id}/inspection-history")
 async def get_equipment_inspection_history(equipment_id: str):
@@ -2718,103 +2481,7 @@ async def get_equipment_inspection_history(equipment_id: str):
 @api_router.get("/equipment/analytics")
 async def get_equipment_analytics(days: int = 30):
     """Get equipment usage and inspection analytics"""
-    # Calculate date range
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=days)
-    
-    # Get all active equipment
-    equipment_list = []
-    async for equipment in db.equipment.find({"active": True}):
-        equipment_doc = serialize_doc(equipment)
-        equipment_id = equipment_doc["id"]
-        
-        # Count dispatches this equipment was used in
-        dispatch_count = await db.dispatches.count_documents({
-            "equipment_ids": equipment_id,
-            "created_at": {"$gte": start_date, "$lte": end_date}
-        })
-        
-        # Count inspections
-        inspection_count = await db.form_responses.count_documents({
-            "equipment_id": equipment_id,
-            "submitted_at": {"$gte": start_date, "$lte": end_date}
-        })
-        
-        # Get last inspection
-        last_inspection = await db.form_responses.find_one(
-            {"equipment_id": equipment_id},
-            sort=[("submitted_at", -1)]
-        )
-        
-        last_inspection_date = None
-        days_since_inspection = None
-        inspection_status = "never_inspected"
-        
-        if last_inspection:
-            last_inspection_date = last_inspection.get("submitted_at")
-            if last_inspection_date:
-                if isinstance(last_inspection_date, str):
-                    try:
-                        last_inspection_date = datetime.fromisoformat(last_inspection_date.replace('Z', '+00:00'))
-                    except:
-                        last_inspection_date = None
-                
-                if last_inspection_date:
-                    days_since_inspection = (datetime.utcnow() - last_inspection_date).days
-                    
-                    if days_since_inspection <= 7:
-                        inspection_status = "current"
-                    elif days_since_inspection <= 30:
-                        inspection_status = "due_soon"
-                    else:
-                        inspection_status = "overdue"
-        
-        equipment_list.append({
-            "equipment_id": equipment_id,
-            "name": equipment_doc.get("name", "Unknown"),
-            "equipment_type": equipment_doc.get("equipment_type", "unknown"),
-            "status": equipment_doc.get("status", "available"),
-            "dispatch_count": dispatch_count,
-            "inspection_count": inspection_count,
-            "last_inspection_date": last_inspection_date.isoformat() if last_inspection_date else None,
-            "days_since_inspection": days_since_inspection,
-            "inspection_status": inspection_status
-        })
-    
-    # Calculate totals
-    total_equipment = len(equipment_list)
-    total_dispatches = sum(e["dispatch_count"] for e in equipment_list)
-    total_inspections = sum(e["inspection_count"] for e in equipment_list)
-    
-    # Status breakdown
-    inspection_status_counts = {
-        "current": sum(1 for e in equipment_list if e["inspection_status"] == "current"),
-        "due_soon": sum(1 for e in equipment_list if e["inspection_status"] == "due_soon"),
-        "overdue": sum(1 for e in equipment_list if e["inspection_status"] == "overdue"),
-        "never_inspected": sum(1 for e in equipment_list if e["inspection_status"] == "never_inspected")
-    }
-    
-    # Most used equipment
-    most_used = sorted(equipment_list, key=lambda x: x["dispatch_count"], reverse=True)[:5]
-    
-    # Least inspected equipment
-    needs_inspection = [e for e in equipment_list if e["inspection_status"] in ["overdue", "never_inspected"]]
-    needs_inspection.sort(key=lambda x: x["days_since_inspection"] if x["days_since_inspection"] is not None else 999999, reverse=True)
-    
-    return {
-        "period_days": days,
-        "start_date": start_date.isoformat(),
-        "end_date": end_date.isoformat(),
-        "summary": {
-            "total_equipment": total_equipment,
-            "total_dispatches": total_dispatches,
-            "total_inspections": total_inspections,
-            "inspection_status": inspection_status_counts
-        },
-        "most_used_equipment": most_used[:5],
-        "needs_inspection": needs_inspection[:5],
-        "all_equipment": equipment_list
-    }
+    return await equipment_usage_analytics(db, days)
 
 @api_router.get("/equipment/{equipment_id}", response_model=Equipment)
 async def get_equipment_by_id(equipment_id: str):
@@ -3161,6 +2828,7 @@ async def handle_inspection_completion(schedule_id: str, inspection: dict):
         logger.error(f"Error handling inspection completion: {e}")
 
 @api_router.get("/equipment-inspections/dashboard/overview")
+@cached(["equipment_inspections", "inspection_schedules"])
 async def get_inspections_dashboard():
     """Get inspection dashboard overview"""
     try:
@@ -3313,40 +2981,47 @@ async def delete_route(route_id: str):
     return {"message": "Route deleted successfully"}
 
 # ==================== DISPATCH ENDPOINTS ====================
+@job_queue.handler("dispatch_crew_sms", queue="notifications")
 async def send_dispatch_sms(dispatch_id: str, crew_ids: List[str], route_name: str, scheduled_date: str, scheduled_time: str):
-    """Background task to send SMS notifications to crew members"""
-    try:
-        # Fetch crew member phone numbers
-        crew_phones = []
-        for crew_id in crew_ids:
-            crew = await db.users.find_one({"_id": ObjectId(crew_id)})
-            if crew and crew.get("phone"):
-                crew_phones.append(crew["phone"])
-        
-        if not crew_phones:
+    """
+    Background task to send SMS notifications to crew members. Numbers already
+    reached are kept in sms_sent_to, so a retry by the job queue only texts the rest.
+    """
+    dispatch = await db.dispatches.find_one({"_id": ObjectId(dispatch_id)}, {"sms_sent_to": 1})
+    already_sent = set((dispatch or {}).get("sms_sent_to", []))
+    
+    # Fetch crew member phone numbers
+    crew_phones = []
+    for crew_id in crew_ids:
+        crew = await db.users.find_one({"_id": ObjectId(crew_id)})
+        if crew and crew.get("phone") and crew["phone"] not in already_sent:
+            crew_phones.append(crew["phone"])
+    
+    if not crew_phones:
+        if not already_sent:
             logger.warning(f"No phone numbers found for crew members in dispatch {dispatch_id}")
-            return
-        
-        # Format message
-        message = f"New Dispatch: {route_name}\nDate: {scheduled_date[:10]}\nTime: {scheduled_time}\nDispatch ID: {dispatch_id}\nPlease check the app for full details."
-        
-        # Send SMS to all crew members
-        results = await sms_service.send_bulk_sms(crew_phones, message)
-        
-        # Update dispatch with SMS sent status
-        sms_success = all(r.get("success", False) for r in results)
-        await db.dispatches.update_one(
-            {"_id": ObjectId(dispatch_id)},
-            {"$set": {"sms_sent": sms_success}}
-        )
-        
-        logger.info(f"SMS notifications sent for dispatch {dispatch_id}. Success: {sms_success}")
-        
-    except Exception as e:
-        logger.error(f"Error sending SMS for dispatch {dispatch_id}: {e}")
+        return
+    
+    # Format message
+    message = f"New Dispatch: {route_name}\nDate: {scheduled_date[:10]}\nTime: {scheduled_time}\nDispatch ID: {dispatch_id}\nPlease check the app for full details."
+    
+    # Send SMS to all crew members
+    results = await sms_service.send_bulk_sms(crew_phones, message)
+    
+    # Update dispatch with SMS sent status
+    sent = [phone for phone, r in zip(crew_phones, results) if r.get("success", False)]
+    sms_success = len(sent) == len(crew_phones)
+    await db.dispatches.update_one(
+        {"_id": ObjectId(dispatch_id)},
+        {"$set": {"sms_sent": sms_success}, "$addToSet": {"sms_sent_to": {"$each": sent}}}
+    )
+    
+    if not sms_success:
+        raise RuntimeError(f"SMS failed for {len(crew_phones) - len(sent)} of {len(crew_phones)} crew members in dispatch {dispatch_id}")
+    logger.info(f"SMS notifications sent for dispatch {dispatch_id}")
 
 @api_router.post("/dispatches", response_model=Dispatch)
-async def create_dispatch(dispatch: DispatchCreate, background_tasks: BackgroundTasks):
+async def create_dispatch(dispatch: DispatchCreate):
     dispatch_dict = dispatch.dict()
     dispatch_dict["created_at"] = datetime.utcnow()
     dispatch_dict["status"] = "scheduled"
@@ -3354,15 +3029,14 @@ async def create_dispatch(dispatch: DispatchCreate, background_tasks: Background
     result = await db.dispatches.insert_one(dispatch_dict)
     dispatch_dict["id"] = str(result.inserted_id)
     
-    # Schedule SMS notification in background
-    background_tasks.add_task(
-        send_dispatch_sms,
-        dispatch_dict["id"],
-        dispatch.crew_ids,
-        dispatch.route_name,
-        dispatch.scheduled_date.isoformat() if hasattr(dispatch.scheduled_date, 'isoformat') else str(dispatch.scheduled_date),
-        dispatch.scheduled_time
-    )
+    # Queue SMS notification to the crew
+    await job_queue.enqueue("dispatch_crew_sms", {
+        "dispatch_id": dispatch_dict["id"],
+        "crew_ids": dispatch.crew_ids,
+        "route_name": dispatch.route_name,
+        "scheduled_date": dispatch.scheduled_date.isoformat() if hasattr(dispatch.scheduled_date, 'isoformat') else str(dispatch.scheduled_date),
+        "scheduled_time": dispatch.scheduled_time
+    })
     
     return Dispatch(**dispatch_dict)
 
@@ -3423,8 +3097,8 @@ async def update_dispatch(dispatch_id: str, dispatch_update: DispatchUpdate):
                             'dispatch_id': dispatch_id,
                             'crew_id': crew_id
                         }
-                        automation_result = await automation_engine.trigger_workflow('service_completion', workflow_context)
-                        logger.info(f"Service completion workflow triggered for dispatch {dispatch_id}: {automation_result}")
+                        job_id = await job_queue.enqueue('automation_workflow', {'workflow_name': 'service_completion', 'context': workflow_context})
+                        logger.info(f"Service completion workflow queued for dispatch {dispatch_id}: job {job_id}")
                     except Exception as e:
                         logger.error(f"Error triggering service completion workflow: {str(e)}")
                         # Don't fail the dispatch update if automation fails
@@ -3860,6 +3534,9 @@ async def generate_report(request: dict = Body(...)):
         # Parse dates
         start_dt = datetime.fromisoformat(start_date) if start_date else datetime.now() - timedelta(days=30)
         end_dt = datetime.fromisoformat(end_date) if end_date else datetime.now()
+        if end_date and len(end_date) == 10:
+            # A bare end date includes that whole day
+            end_dt += timedelta(days=1, microseconds=-1)
         
         report_data = {
             "report_type": report_type,
@@ -3871,119 +3548,8 @@ async def generate_report(request: dict = Body(...)):
             "data": {}
         }
         
-        # Generate report based on type
-        if report_type == "daily_operations":
-            # Get dispatches, services, crew performance
-            dispatches = await db.dispatches.find({
-                "scheduled_date": {
-                    "$gte": start_dt.isoformat(),
-                    "$lte": end_dt.isoformat()
-                }
-            }).to_list(1000)
-            
-            report_data["data"] = {
-                "total_dispatches": len(dispatches),
-                "completed": len([d for d in dispatches if d.get("status") == "completed"]),
-                "in_progress": len([d for d in dispatches if d.get("status") == "in_progress"]),
-                "scheduled": len([d for d in dispatches if d.get("status") == "scheduled"]),
-                "dispatches": dispatches[:50]  # Limit to 50 for JSON size
-            }
-            
-        elif report_type == "weekly_financial":
-            # Get invoices and payments
-            invoices = await db.invoices.find({
-                "issue_date": {
-                    "$gte": start_dt.isoformat(),
-                    "$lte": end_dt.isoformat()
-                }
-            }).to_list(1000)
-            
-            total_revenue = sum(inv.get("total_amount", 0) for inv in invoices)
-            total_paid = sum(inv.get("amount_paid", 0) for inv in invoices)
-            total_outstanding = sum(inv.get("amount_due", 0) for inv in invoices)
-            
-            report_data["data"] = {
-                "total_invoices": len(invoices),
-                "total_revenue": total_revenue,
-                "total_paid": total_paid,
-                "total_outstanding": total_outstanding,
-                "paid_invoices": len([i for i in invoices if i.get("status") == "paid"]),
-                "unpaid_invoices": len([i for i in invoices if i.get("status") == "unpaid"]),
-                "overdue_invoices": len([i for i in invoices if i.get("status") == "overdue"]),
-            }
-            
-        elif report_type == "monthly_customer":
-            # Get customer analytics
-            customers = await db.customers.find({}).to_list(1000)
-            new_customers = await db.customers.find({
-                "created_at": {
-                    "$gte": start_dt.isoformat(),
-                    "$lte": end_dt.isoformat()
-                }
-            }).to_list(1000)
-            
-            report_data["data"] = {
-                "total_customers": len(customers),
-                "new_customers": len(new_customers),
-                "active_customers": len([c for c in customers if c.get("active", True)]),
-                "customer_types": {
-                    "individual": len([c for c in customers if c.get("customer_type") == "individual"]),
-                    "company": len([c for c in customers if c.get("customer_type") == "company"])
-                }
-            }
-            
-        elif report_type == "project_performance":
-            # Get project metrics
-            projects = await db.projects.find({
-                "created_at": {
-                    "$gte": start_dt.isoformat(),
-                    "$lte": end_dt.isoformat()
-                }
-            }).to_list(1000)
-            
-            report_data["data"] = {
-                "total_projects": len(projects),
-                "completed": len([p for p in projects if p.get("status") == "completed"]),
-                "active": len([p for p in projects if p.get("status") == "active"]),
-                "on_hold": len([p for p in projects if p.get("status") == "on_hold"]),
-                "average_completion": sum(p.get("completion_percentage", 0) for p in projects) / len(projects) if projects else 0
-            }
-            
-        elif report_type == "service_analytics":
-            # Get service breakdown
-            dispatches = await db.dispatches.find({
-                "scheduled_date": {
-                    "$gte": start_dt.isoformat(),
-                    "$lte": end_dt.isoformat()
-                }
-            }).to_list(1000)
-            
-            services_count = {}
-            for dispatch in dispatches:
-                for service in dispatch.get("services", []):
-                    services_count[service] = services_count.get(service, 0) + 1
-            
-            report_data["data"] = {
-                "total_services": len(dispatches),
-                "services_breakdown": services_count
-            }
-            
-        elif report_type == "crew_productivity":
-            # Get crew performance
-            shifts = await db.shifts.find({
-                "date": {
-                    "$gte": start_dt.isoformat(),
-                    "$lte": end_dt.isoformat()
-                }
-            }).to_list(1000)
-            
-            total_hours = sum(s.get("hours_worked", 0) for s in shifts)
-            
-            report_data["data"] = {
-                "total_shifts": len(shifts),
-                "total_hours": total_hours,
-                "average_hours_per_shift": total_hours / len(shifts) if shifts else 0
-            }
+        # Each report type is a single aggregation over the full date range
+        report_data["data"] = await build_report_data(db, report_type, start_dt, end_dt)
         
         return report_data
         
@@ -4259,6 +3825,7 @@ async def delete_user(user_id: str):
 # ==================== AUTOMATION ANALYTICS ENDPOINTS ====================
 
 @api_router.get("/automation/analytics/metrics")
+@cached(["workflow_executions"])
 async def get_automation_metrics(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -5117,8 +4684,8 @@ async def create_geofence_log(log_data: GeofenceLogCreate):
                         'customer_id': dispatch.get("customer_id"),
                         'eta_minutes': 0  # Already arrived
                     }
-                    automation_result = await automation_engine.trigger_workflow('customer_communication', automation_context)
-                    logger.info(f"Geofence arrival automation triggered: {automation_result}")
+                    job_id = await job_queue.enqueue('automation_workflow', {'workflow_name': 'customer_communication', 'context': automation_context})
+                    logger.info(f"Geofence arrival automation queued: job {job_id}")
         except Exception as e:
             logger.error(f"Error triggering geofence automation: {str(e)}")
             # Don't fail the geofence log if automation fails
@@ -5980,13 +5547,11 @@ async def get_weather_dispatch_recommendations():
     """Generate dispatch recommendations based on weather forecast"""
     try:
         from weather_service import weather_service
+        from site_snow_risk import site_snow_risk
         
         # Get 3-day forecast
         forecast = await weather_service.get_forecast(days=3)
         
-        # Get all active sites
-        sites = await db.sites.find({"active": True}).to_list(1000)
-        
         # Get existing dispatches for the next 3 days
         today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
         three_days_later = today + timedelta(days=3)
@@ -6005,68 +5570,71 @@ async def get_weather_dispatch_recommendations():
                 key = f"{date}_{site_id}"
                 existing_map[key] = True
         
+        # Per-site risk for the forecast window, precomputed by the snow risk batch job
+        site_risks = await site_snow_risk.get_site_risk(
+            today.strftime("%Y-%m-%d"),
+            (today + timedelta(days=2)).strftime("%Y-%m-%d"),
+            risk_levels=['medium', 'high']
+        )
+        
         # Generate recommendations
         recommendations = []
         
-        for day in forecast:
-            if day['snow_risk'] in ['medium', 'high']:
-                date_str = day['date']
-                
-                for site in sites:
-                    site_id = str(site['_id'])
-                    key = f"{date_str}_{site_id}"
-                    
-                    # Skip if dispatch already exists
-                    if key in existing_map:
-                        continue
-                    
-                    # Calculate priority based on multiple factors
-                    priority_score = 0
-                    
-                    # Weather risk factor
-                    if day['snow_risk'] == 'high':
-                        priority_score += 10
-                        recommended_services = ["plowing", "sanding"]
-                    elif day['snow_risk'] == 'medium':
-                        priority_score += 5
-                        recommended_services = ["plowing"]
-                    
-                    # Site priority factor
-                    site_priority = site.get('priority', 5)
-                    priority_score += site_priority
-                    
-                    # Temperature factor (ice risk)
-                    if day['temperature_min'] <= -5:
-                        recommended_services.append("brining")
-                        priority_score += 3
-                    
-                    # Calculate estimated duration (basic calculation)
-                    site_area = site.get('area', 1000)  # default 1000 sqm
-                    base_duration = (site_area / 500) * 30  # 30 min per 500 sqm
-                    
-                    if day['precipitation']['snow'] > 5:
-                        estimated_duration = base_duration * 1.5
-                    else:
-                        estimated_duration = base_duration
-                    
-                    recommendations.append({
-                        "date": date_str,
-                        "day_name": day['day_name'],
-                        "site_id": site_id,
-                        "site_name": site.get("name", "Unknown"),
-                        "site_address": site.get("location", {}).get("address", ""),
-                        "priority": min(priority_score, 20),  # Cap at 20
-                        "priority_level": "high" if priority_score >= 15 else "medium" if priority_score >= 10 else "normal",
-                        "recommended_services": recommended_services,
-                        "estimated_duration_minutes": round(estimated_duration),
-                        "weather_conditions": {
-                            "snow_amount": day['precipitation']['snow'],
-                            "temp_min": day['temperature_min'],
-                            "temp_max": day['temperature_max'],
-                            "risk_level": day['snow_risk']
-                        },
-                        "reason": f"{day['snow_risk'].capitalize()} snow risk - {day['precipitation']['snow']}cm expected"
-                    })
+        for risk in site_risks:
+            date_str = risk['date']
+            site_id = risk['site_id']
+            key = f"{date_str}_{site_id}"
+            
+            # Skip if dispatch already exists
+            if key in existing_map:
+                continue
+            
+            # Calculate priority based on multiple factors
+            priority_score = 0
+            
+            # Weather risk factor
+            if risk['snow_risk'] == 'high':
+                priority_score += 10
+                recommended_services = ["plowing", "sanding"]
+            else:
+                priority_score += 5
+                recommended_services = ["plowing"]
+            
+            # Site priority factor
+            priority_score += risk.get('site_priority', 5)
+            
+            # Temperature factor (ice risk)
+            if risk['temperature_min'] <= -5:
+                recommended_services.append("brining")
+                priority_score += 3
+            
+            # Calculate estimated duration (basic calculation)
+            site_area = risk.get('site_area', 1000)  # default 1000 sqm
+            base_duration = (site_area / 500) * 30  # 30 min per 500 sqm
+            
+            if risk['expected_snow'] > 5:
+                estimated_duration = base_duration * 1.5
+            else:
+                estimated_duration = base_duration
+            
+            recommendations.append({
+                "date": date_str,
+                "day_name": risk['day_name'],
+                "site_id": site_id,
+                "site_name": risk.get("site_name", "Unknown"),
+                "site_address": risk.get("site_address", ""),
+                "priority": min(priority_score, 20),  # Cap at 20
+                "priority_level": "high" if priority_score >= 15 else "medium" if priority_score >= 10 else "normal",
+                "recommended_services": recommended_services,
+                "estimated_duration_minutes": round(estimated_duration),
+                "weather_conditions": {
+                    "snow_amount": risk['expected_snow'],
+                    "temp_min": risk['temperature_min'],
+                    "temp_max": risk['temperature_max'],
+                    "risk_level": risk['snow_risk']
+                },
+                "reason": f"{risk['snow_risk'].capitalize()} snow risk - {risk['expected_snow']}cm expected"
+            })
         
         # Sort by priority (highest first), then by date
         recommendations.sort(key=lambda x: (-x['priority'], x['date']))
@@ -6377,6 +5945,7 @@ async def google_places_details(place_id: str):
         return {"result": None}
 
 # ==================== CUSTOMER FEEDBACK ENDPOINTS ====================
+@job_queue.handler("negative_feedback_email", queue="notifications")
 async def send_negative_feedback_notification(
     customer_feedback: str,
     customer_email: str = None,
@@ -6384,30 +5953,27 @@ async def send_negative_feedback_notification(
     rating: int = None,
     feedback_id: str = None
 ):
-    """Background task to send email notification for negative feedback"""
-    try:
-        success = email_service.send_feedback_notification(
-            customer_feedback=customer_feedback,
-            customer_email=customer_email,
-            customer_name=customer_name,
-            rating=rating
+    """Background task to send email notification for negative feedback; failures are retried by the job queue"""
+    success = await asyncio.to_thread(
+        email_service.send_feedback_notification,
+        customer_feedback=customer_feedback,
+        customer_email=customer_email,
+        customer_name=customer_name,
+        rating=rating
+    )
+    if not success:
+        raise RuntimeError(f"Failed to send feedback notification for feedback {feedback_id}")
+    
+    # Update the feedback record to mark notification as sent
+    if feedback_id:
+        await db.customer_feedback.update_one(
+            {"_id": ObjectId(feedback_id)},
+            {"$set": {"notification_sent": True}}
         )
-        
-        # Update the feedback record to mark notification as sent
-        if success and feedback_id:
-            await db.customer_feedback.update_one(
-                {"_id": ObjectId(feedback_id)},
-                {"$set": {"notification_sent": True}}
-            )
-            logging.info(f"Feedback notification sent successfully for feedback {feedback_id}")
-        else:
-            logging.warning(f"Failed to send feedback notification for feedback {feedback_id}")
-            
-    except Exception as e:
-        logging.error(f"Error sending feedback notification: {str(e)}")
+    logging.info(f"Feedback notification sent successfully for feedback {feedback_id}")
 
 @api_router.post("/feedback", response_model=CustomerFeedback)
-async def submit_feedback(feedback: CustomerFeedbackCreate, background_tasks: BackgroundTasks):
+async def submit_feedback(feedback: CustomerFeedbackCreate):
     # Create feedback document
     feedback_doc = feedback.dict()
     feedback_doc["submitted_at"] = datetime.now().isoformat()
@@ -6421,14 +5987,13 @@ async def submit_feedback(feedback: CustomerFeedbackCreate, background_tasks: Ba
     
     # Send email notification for negative feedback (rating <= 2)
     if feedback.rating <= 2:
-        background_tasks.add_task(
-            send_negative_feedback_notification,
-            feedback.feedback,
-            feedback.customer_email,
-            feedback.customer_name,
-            feedback.rating,
-            str(result.inserted_id)
-        )
+        await job_queue.enqueue("negative_feedback_email", {
+            "customer_feedback": feedback.feedback,
+            "customer_email": feedback.customer_email,
+            "customer_name": feedback.customer_name,
+            "rating": feedback.rating,
+            "feedback_id": str(result.inserted_id)
+        })
     
     return CustomerFeedback(**response_feedback)
 
@@ -7603,6 +7168,7 @@ async def increment_view_count(document_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/documents/stats/summary")
+@cached(["learning_documents"], ttl=300)
 async def get_document_stats():
     """Get document statistics (Admin only)"""
     try:
@@ -9507,15 +9073,33 @@ async def startup_event():
     from event_emitter import EventEmitter, set_event_emitter
     event_emitter_instance = EventEmitter(db, custom_workflow_executor)
     set_event_emitter(event_emitter_instance)
+    await event_emitter_instance.start()
     logger.info("Event emitter initialized")
     
-    # Start background scheduler for automation workflows
-    await background_scheduler.start()
-    logger.info("Background scheduler started")
+    # Run queued jobs here unless dedicated `python -m job_worker` processes do
+    if JOB_WORKERS_IN_PROCESS:
+        await job_queue.start()
+    
+    # Every worker drops its own cached results on writes
+    global result_cache_watcher
+    result_cache_watcher = asyncio.create_task(result_cache.watch_changes(db))
+    
+    # Only the elected worker runs the background scheduler
+    await scheduler_leader.start()
+    logger.info("Background scheduler election started")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    await background_scheduler.stop()
+    await scheduler_leader.stop()
+    if result_cache_watcher:
+        result_cache_watcher.cancel()
+    event_emitter_instance = get_event_emitter()
+    if event_emitter_instance:
+        await event_emitter_instance.stop()
+    await job_queue.stop()
+    # After the job workers, so their last logs are in the final batch
+    await log_sink.stop()
+    await weather_service.close()
     client.close()
 
 
@@ -10487,7 +10071,7 @@ def generate_estimate_number():
     return f"EST-{timestamp}"
 
 @api_router.post("/estimates", response_model=Estimate)
-async def create_estimate(estimate: EstimateCreate, background_tasks: BackgroundTasks):
+async def create_estimate(estimate: EstimateCreate):
     """Create a new estimate"""
     try:
         # Get customer details
@@ -10542,9 +10126,10 @@ async def create_estimate(estimate: EstimateCreate, background_tasks: Background
         
         result = await db.estimates.insert_one(estimate_dict)
         estimate_dict["id"] = str(result.inserted_id)
+        await customer_summary.estimate_created(estimate_dict)
         
         # Auto-sync to QuickBooks if enabled
-        background_tasks.add_task(sync_estimate_to_quickbooks, estimate_dict)
+        await job_queue.enqueue("quickbooks_estimate_sync", {"estimate_data": {k: v for k, v in estimate_dict.items() if k != "_id"}})
         
         return Estimate(**estimate_dict)
     except HTTPException:
@@ -10643,6 +10228,7 @@ async def update_estimate(estimate_id: str, estimate_update: EstimateUpdate):
             {"_id": ObjectId(estimate_id)},
             {"$set": update_data}
         )
+        await metric_rollups.source_changed("estimates", estimate)
         
         estimate = await db.estimates.find_one({"_id": ObjectId(estimate_id)})
         return Estimate(**serialize_doc(estimate))
@@ -10653,7 +10239,7 @@ async def update_estimate(estimate_id: str, estimate_update: EstimateUpdate):
         raise HTTPException(status_code=500, detail="Failed to update estimate")
 
 @api_router.post("/estimates/{estimate_id}/send")
-async def send_estimate(estimate_id: str, background_tasks: BackgroundTasks):
+async def send_estimate(estimate_id: str):
     """Send estimate to customer"""
     try:
         estimate = await db.estimates.find_one({"_id": ObjectId(estimate_id)})
@@ -10665,17 +10251,17 @@ async def send_estimate(estimate_id: str, background_tasks: BackgroundTasks):
             {"_id": ObjectId(estimate_id)},
             {"$set": {"status": EstimateStatus.SENT, "sent_at": datetime.utcnow()}}
         )
+        await metric_rollups.source_changed("estimates", estimate)
         
-        # Send email to customer (background task)
+        # Queue email to customer
         customer_email = estimate.get("customer_email")
         if customer_email:
-            background_tasks.add_task(
-                send_estimate_email,
-                customer_email,
-                estimate.get("customer_name"),
-                estimate.get("estimate_number"),
-                estimate_id
-            )
+            await job_queue.enqueue("estimate_email", {
+                "email": customer_email,
+                "name": estimate.get("customer_name"),
+                "estimate_number": estimate.get("estimate_number"),
+                "estimate_id": estimate_id
+            })
         
         return {"success": True, "message": "Estimate sent successfully"}
     except HTTPException:
@@ -10684,24 +10270,23 @@ async def send_estimate(estimate_id: str, background_tasks: BackgroundTasks):
         logger.error(f"Error sending estimate: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to send estimate")
 
+@job_queue.handler("estimate_email", queue="notifications")
 async def send_estimate_email(email: str, name: str, estimate_number: str, estimate_id: str):
-    """Background task to send estimate email"""
-    try:
-        # TODO: Generate PDF and attach
-        subject = f"Estimate {estimate_number} from CAF Property Services"
-        body = f"""
-        Dear {name},
-        
-        Please review your estimate {estimate_number}.
-        
-        View and accept estimate: https://snow-gmail-sync.ngrok.io/customer-portal/estimates/{estimate_id}
-        
-        Thank you for your business!
-        CAF Property Services
-        """
-        await email_service.send_email(to_email=email, subject=subject, body=body)
-    except Exception as e:
-        logger.error(f"Error sending estimate email: {str(e)}")
+    """Background task to send estimate email; failures are retried by the job queue"""
+    # TODO: Generate PDF and attach
+    subject = f"Estimate {estimate_number} from CAF Property Services"
+    body = f"""
+    Dear {name},
+    
+    Please review your estimate {estimate_number}.
+    
+    View and accept estimate: https://snow-gmail-sync.ngrok.io/customer-portal/estimates/{estimate_id}
+    
+    Thank you for your business!
+    CAF Property Services
+    """
+    if not await email_service.send_email(to_email=email, subject=subject, body=body):
+        raise RuntimeError(f"Failed to send estimate {estimate_number} to {email}")
 
 @api_router.post("/estimates/{estimate_id}/sign")
 async def sign_estimate(estimate_id: str, signature: CustomerSignature):
@@ -10720,6 +10305,7 @@ async def sign_estimate(estimate_id: str, signature: CustomerSignature):
                 "accepted_at": datetime.utcnow()
             }}
         )
+        await metric_rollups.source_changed("estimates", estimate)
         
         return {"success": True, "message": "Estimate accepted successfully"}
     except HTTPException:
@@ -10740,6 +10326,7 @@ async def decline_estimate(estimate_id: str, reason: Optional[str] = None):
                 "decline_reason": reason
             }}
         )
+        await metric_rollups.source_changed("estimates", estimate_id)
         return {"success": True, "message": "Estimate declined"}
     except Exception as e:
         logger.error(f"Error declining estimate: {str(e)}")
@@ -10777,12 +10364,14 @@ async def convert_estimate_to_project(estimate_id: str):
         result = await db.projects.insert_one(project_dict)
         project_id = str(result.inserted_id)
         project_dict["id"] = project_id
+        await customer_summary.project_created(project_dict)
         
         # Update estimate with project link
         await db.estimates.update_one(
             {"_id": ObjectId(estimate_id)},
             {"$set": {"project_id": project_id, "status": EstimateStatus.CONVERTED}}
         )
+        await metric_rollups.source_changed("estimates", estimate_id)
         
         return Project(**project_dict)
     except HTTPException:
@@ -10881,12 +10470,14 @@ async def create_project(project_create: ProjectCreate):
         result = await db.projects.insert_one(project_dict)
         project_id = str(result.inserted_id)
         project_dict["id"] = project_id
+        await customer_summary.project_created(project_dict)
         
         # Update estimate with project link
         await db.estimates.update_one(
             {"_id": ObjectId(project_create.estimate_id)},
             {"$set": {"project_id": project_id, "status": EstimateStatus.CONVERTED}}
         )
+        await metric_rollups.source_changed("estimates", project_create.estimate_id)
         
         return Project(**project_dict)
     except HTTPException:
@@ -10950,6 +10541,7 @@ async def update_project(project_id: str, project_update: ProjectUpdate):
             raise HTTPException(status_code=404, detail="Project not found")
         
         project = await db.projects.find_one({"_id": ObjectId(project_id)})
+        await metric_rollups.source_changed("projects", project)
         return Project(**serialize_doc(project))
     except HTTPException:
         raise
@@ -11223,7 +10815,7 @@ def calculate_due_date(payment_terms: PaymentTerms) -> datetime:
         return now
 
 @api_router.post("/invoices", response_model=EnhancedInvoice)
-async def create_invoice(invoice: EnhancedInvoiceCreate, background_tasks: BackgroundTasks):
+async def create_invoice(invoice: EnhancedInvoiceCreate):
     """Create a new invoice"""
     try:
         # Get customer details
@@ -11278,9 +10870,10 @@ async def create_invoice(invoice: EnhancedInvoiceCreate, background_tasks: Backg
         
         result = await db.invoices.insert_one(invoice_dict)
         invoice_dict["id"] = str(result.inserted_id)
+        await customer_summary.invoice_created(invoice_dict)
         
         # Auto-sync to QuickBooks if enabled
-        background_tasks.add_task(sync_invoice_to_quickbooks, invoice_dict)
+        await job_queue.enqueue("quickbooks_invoice_sync", {"invoice_data": {k: v for k, v in invoice_dict.items() if k != "_id"}})
         
         return EnhancedInvoice(**invoice_dict)
     except HTTPException:
@@ -11360,6 +10953,8 @@ async def add_payment(invoice_id: str, payment: InvoicePaymentCreate):
             {"_id": ObjectId(invoice_id)},
             updates
         )
+        await customer_summary.invoice_changed(invoice, {**invoice, **updates["$set"]}, payment_dict["payment_date"])
+        await metric_rollups.source_changed("invoices", invoice)
         
         invoice = await db.invoices.find_one({"_id": ObjectId(invoice_id)})
         return EnhancedInvoice(**serialize_doc(invoice))
@@ -11595,7 +11190,7 @@ async def update_contract(contract_id: str, contract_update: ContractUpdate):
         raise HTTPException(status_code=500, detail="Failed to update contract")
 
 @api_router.post("/contracts/{contract_id}/send")
-async def send_contract(contract_id: str, background_tasks: BackgroundTasks):
+async def send_contract(contract_id: str):
     """Send contract to customer for review"""
     try:
         contract = await db.contracts.find_one({"_id": ObjectId(contract_id)})
@@ -11608,16 +11203,15 @@ async def send_contract(contract_id: str, background_tasks: BackgroundTasks):
             {"$set": {"status": ContractStatus.SENT, "sent_at": datetime.utcnow(), "updated_at": datetime.utcnow()}}
         )
         
-        # Send email to customer (background task)
+        # Queue email to customer
         customer_email = contract.get("customer_email")
         if customer_email:
-            background_tasks.add_task(
-                send_contract_email,
-                customer_email,
-                contract.get("customer_name"),
-                contract.get("contract_number"),
-                contract_id
-            )
+            await job_queue.enqueue("contract_email", {
+                "email": customer_email,
+                "name": contract.get("customer_name"),
+                "contract_number": contract.get("contract_number"),
+                "contract_id": contract_id
+            })
         
         return {"success": True, "message": "Contract sent successfully"}
     except HTTPException:
@@ -11626,23 +11220,22 @@ async def send_contract(contract_id: str, background_tasks: BackgroundTasks):
         logger.error(f"Error sending contract: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to send contract")
 
+@job_queue.handler("contract_email", queue="notifications")
 async def send_contract_email(email: str, name: str, contract_number: str, contract_id: str):
-    """Background task to send contract email"""
-    try:
-        subject = f"Service Agreement {contract_number} from CAF Property Services"
-        body = f"""
-        Dear {name},
-        
-        Please review and sign your service agreement {contract_number}.
-        
-        View and sign agreement: https://snow-gmail-sync.ngrok.io/customer-portal/contracts/{contract_id}
-        
-        Thank you for your business!
-        CAF Property Services
-        """
-        await email_service.send_email(to_email=email, subject=subject, body=body)
-    except Exception as e:
-        logger.error(f"Error sending contract email: {str(e)}")
+    """Background task to send contract email; failures are retried by the job queue"""
+    subject = f"Service Agreement {contract_number} from CAF Property Services"
+    body = f"""
+    Dear {name},
+    
+    Please review and sign your service agreement {contract_number}.
+    
+    View and sign agreement: https://snow-gmail-sync.ngrok.io/customer-portal/contracts/{contract_id}
+    
+    Thank you for your business!
+    CAF Property Services
+    """
+    if not await email_service.send_email(to_email=email, subject=subject, body=body):
+        raise RuntimeError(f"Failed to send contract {contract_number} to {email}")
 
 @api_router.post("/contracts/{contract_id}/sign")
 async def sign_contract(contract_id: str, signature: CustomerSignature):
@@ -12168,18 +11761,51 @@ logger.info("Messaging system endpoints registered successfully")
 automation_engine = AutomationEngine(db)
 custom_workflow_executor = CustomWorkflowExecutor(db)
 background_scheduler = BackgroundScheduler(db, automation_engine, custom_workflow_executor)
+scheduler_leader = LeaderElection(db, "background_scheduler", background_scheduler.start, background_scheduler.stop)
+result_cache_watcher: Optional[asyncio.Task] = None
 
 # Initialize enterprise workflow features
 from workflow_retry_handler import WorkflowRetryHandler, RetryStrategy
 from workflow_version_control import WorkflowVersionControl
 from workflow_audit_logger import WorkflowAuditLogger, AuditEventType
 from workflow_template_library import WorkflowTemplateLibrary
+from workflow_tracing import action_latency
 
 retry_handler = WorkflowRetryHandler(db)
 version_control = WorkflowVersionControl(db)
 audit_logger = WorkflowAuditLogger(db)
+export_jobs = ExportJobService(db)
 template_library = WorkflowTemplateLibrary(db)
 
+@job_queue.handler("workflow_version_compact")
+async def compact_workflow_version_job(workflow_id: str, version_number: int):
+    await version_control.compact_version(workflow_id, version_number)
+
+@job_queue.handler("automation_workflow", queue="workflows")
+async def run_automation_workflow_job(workflow_name: str, context: Dict):
+    result = await automation_engine.trigger_workflow(workflow_name, context)
+    if not result['success']:
+        raise RuntimeError(result.get('error', 'Workflow execution failed'))
+
+@job_queue.handler("custom_workflow", queue="workflows", max_attempts=3)
+async def run_custom_workflow_job(workflow_id: str, context: Dict = None):
+    workflow_data = await db.custom_workflows.find_one({'_id': ObjectId(workflow_id)})
+    if not workflow_data or not workflow_data.get('enabled', True):
+        logger.info(f"Skipping queued run of missing or disabled workflow {workflow_id}")
+        return
+
+    workflow_data['id'] = str(workflow_data.pop('_id'))
+    if workflow_data.get('created_by') is not None:
+        workflow_data['created_by'] = str(workflow_data['created_by'])
+    execution = await custom_workflow_executor.execute_workflow(CustomWorkflow(**workflow_data), context or {})
+    if execution.status == 'failed':
+        raise RuntimeError(execution.error or 'Workflow execution failed')
+
+@job_queue.handler("custom_workflow_resume", queue="workflows")
+async def resume_custom_workflow_job(run_id: str):
+    # Failures are recorded on the run itself; a retry would find it finished
+    await custom_workflow_executor.resume(run_id)
+
 @api_router.post("/automation/trigger/{workflow_name}", tags=["Automation"])
 async def trigger_workflow(workflow_name: str, context: Dict):
     """
@@ -12200,11 +11826,13 @@ async def trigger_workflow(workflow_name: str, context: Dict):
         "crew_id": "68e8929ff0f6291c7d863497"
     }
     ```
+
+    The workflow runs on the job queue; poll /system/jobs/{job_id} for its status.
     """
-    result = await automation_engine.trigger_workflow(workflow_name, context)
-    if not result['success']:
-        raise HTTPException(status_code=400, detail=result.get('error', 'Workflow execution failed'))
-    return result
+    if workflow_name not in automation_engine.workflows:
+        raise HTTPException(status_code=400, detail=f"Workflow '{workflow_name}' not found")
+    job_id = await job_queue.enqueue("automation_workflow", {'workflow_name': workflow_name, 'context': context})
+    return {'success': True, 'status': 'queued', 'job_id': job_id}
 
 @api_router.get("/automation/workflows", tags=["Automation"])
 async def list_workflows():
@@ -12339,6 +11967,11 @@ async def get_custom_workflow(workflow_id: str):
 @api_router.post("/custom-workflows", tags=["Custom Workflows"])
 async def create_custom_workflow(workflow_data: CustomWorkflowCreate, current_user: dict = Depends(get_current_user)):
     """Create a new custom workflow"""
+    try:
+        action_graph(workflow_data.actions)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     workflow_dict = workflow_data.dict()
     workflow_dict['created_by'] = current_user.get('_id') or current_user.get('id')
     workflow_dict['created_at'] = datetime.utcnow()
@@ -12348,6 +11981,7 @@ async def create_custom_workflow(workflow_data: CustomWorkflowCreate, current_us
     
     result = await db.custom_workflows.insert_one(workflow_dict)
     workflow_dict['id'] = str(result.inserted_id)
+    invalidate_subscriptions()
     
     logger.info(f"Custom workflow created: {workflow_dict['name']} by user {workflow_dict['created_by']}")
     
@@ -12360,6 +11994,11 @@ async def update_custom_workflow(workflow_id: str, workflow_update: CustomWorkfl
     existing = await db.custom_workflows.find_one({'_id': ObjectId(workflow_id)})
     if not existing:
         raise HTTPException(status_code=404, detail="Workflow not found")
+    if workflow_update.actions is not None:
+        try:
+            action_graph(workflow_update.actions)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
     # Prepare update data (only include non-None values)
     update_data = {k: v for k, v in workflow_update.dict().items() if v is not None}
@@ -12369,6 +12008,7 @@ async def update_custom_workflow(workflow_id: str, workflow_update: CustomWorkfl
         {'_id': ObjectId(workflow_id)},
         {'$set': update_data}
     )
+    invalidate_subscriptions()
     
     # Get updated workflow
     updated = await db.custom_workflows.find_one({'_id': ObjectId(workflow_id)})
@@ -12386,6 +12026,7 @@ async def delete_custom_workflow(workflow_id: str):
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Workflow not found")
+    invalidate_subscriptions()
     
     logger.info(f"Custom workflow deleted: {workflow_id}")
     
@@ -12403,22 +12044,13 @@ async def execute_custom_workflow(workflow_id: str, context: Dict[str, Any] = No
     if not workflow_data.get('enabled', True):
         raise HTTPException(status_code=400, detail="Workflow is disabled")
     
-    # Convert to CustomWorkflow model
-    workflow_data['id'] = str(workflow_data['_id'])
-    del workflow_data['_id']
-    
-    workflow = CustomWorkflow(**workflow_data)
-    
-    # Execute
-    try:
-        execution = await custom_workflow_executor.execute_workflow(workflow, context or {})
-        return {
-            'success': True,
-            'execution': execution.dict()
-        }
-    except Exception as e:
-        logger.error(f"Error executing custom workflow {workflow_id}: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    # Run on the job queue; poll /system/jobs/{job_id} for its status
+    job_id = await job_queue.enqueue('custom_workflow', {'workflow_id': workflow_id, 'context': context or {}})
+    return {
+        'success': True,
+        'status': 'queued',
+        'job_id': job_id
+    }
 
 @api_router.get("/custom-workflows/{workflow_id}/executions", tags=["Custom Workflows"])
 async def get_workflow_executions(workflow_id: str, limit: int = 50):
@@ -12582,9 +12214,10 @@ logger.info("Custom workflow management endpoints registered successfully")
 
 @api_router.get("/custom-workflows/{workflow_id}/error-stats", tags=["Workflow Analytics"])
 async def get_workflow_error_stats(workflow_id: str, days: int = 30):
-    """Get comprehensive error statistics for a workflow"""
+    """Get comprehensive error statistics for a workflow, with per-action latency from traces"""
     try:
         stats = await retry_handler.get_workflow_error_summary(workflow_id, days)
+        stats['action_latency'] = (await action_latency(db, workflow_id, days))['actions']
         return stats
     except Exception as e:
         logger.error(f"Error getting workflow error stats: {str(e)}")
@@ -12805,20 +12438,40 @@ async def get_system_audit_stats(days: int = 30):
         logger.error(f"Error getting system audit stats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+AUDIT_EXPORT_COLUMNS = [
+    "id", "timestamp", "event_type", "workflow_id", "user_id",
+    "ip_address", "user_agent", "details", "metadata"
+]
+
 @api_router.get("/audit/export", tags=["Audit & Compliance"])
 async def export_audit_logs(
     workflow_id: Optional[str] = None,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    format: Optional[str] = None,
+    background: bool = False
 ):
     """
     Export audit logs for compliance or reporting
-    Returns downloadable JSON file
+    Returns downloadable JSON file, or with format=csv|ndjson|xlsx a streamed
+    file (202 with an export job id when too large to stream)
     """
     try:
         start = datetime.fromisoformat(start_date) if start_date else None
         end = datetime.fromisoformat(end_date) if end_date else None
         
+        if format:
+            return await export_response(
+                export_jobs,
+                db.workflow_audit_logs,
+                audit_logger.build_export_query(workflow_id, start, end),
+                format,
+                f"audit_logs_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}",
+                sort=[("timestamp", 1)],
+                columns=AUDIT_EXPORT_COLUMNS,
+                background=background
+            )
+        
         logs = await audit_logger.export_audit_logs(
             workflow_id=workflow_id,
             start_date=start,
@@ -12832,6 +12485,8 @@ async def export_audit_logs(
             'logs': logs,
             'exported_at': datetime.utcnow().isoformat()
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error exporting audit logs: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -12839,6 +12494,7 @@ async def export_audit_logs(
 # ===== Workflow Analytics Dashboard Endpoints =====
 
 @api_router.get("/analytics/workflows/overview", tags=["Workflow Analytics"])
+@cached(["custom_workflows", "workflow_execution_logs"])
 async def get_workflows_overview(days: int = 30):
     """Get overview of all workflows with key metrics"""
     try:
@@ -12907,6 +12563,9 @@ async def get_workflow_performance(workflow_id: str, days: int = 30):
                 'message': 'No executions found in the specified period'
             }
         
+        # Per-action p50/p95/p99 from execution traces
+        latency = await action_latency(db, workflow_id, days)
+        
         # Calculate performance metrics
         total_executions = len(logs)
         successful = len([log for log in logs if log['execution']['status'] == 'success'])
@@ -12942,7 +12601,10 @@ async def get_workflow_performance(workflow_id: str, days: int = 30):
             'failed_executions': failed,
             'success_rate': round((successful / total_executions * 100) if total_executions > 0 else 0, 2),
             'avg_execution_time_seconds': round(avg_execution_time, 2),
-            'executions_by_day': executions_by_day
+            'executions_by_day': executions_by_day,
+            'traced_runs': latency['traced_runs'],
+            'run_duration_ms': latency['run_duration_ms'],
+            'action_latency': latency['actions']
         }
     except Exception as e:
         logger.error(f"Error getting workflow performance: {str(e)}")
@@ -13204,6 +12866,21 @@ from dispatch_board_routes import router as dispatch_board_router
 api_router.include_router(dispatch_board_router)
 logger.info("Dispatch board endpoints registered successfully")
 
+# Include Storm Simulation router
+from storm_simulation_routes import router as storm_simulation_router
+api_router.include_router(storm_simulation_router)
+logger.info("Storm simulation endpoints registered successfully")
+
+# Include Crew Day Pack router
+from crew_day_pack_routes import router as crew_day_pack_router
+api_router.include_router(crew_day_pack_router)
+logger.info("Crew day pack endpoints registered successfully")
+
+# Include Export Jobs router
+from export_routes import router as export_router
+api_router.include_router(export_router)
+logger.info("Export job endpoints registered successfully")
+
 # Include Smart Equipment router
 from smart_equipment_routes import router as smart_equipment_router
 api_router.include_router(smart_equipment_router)
@@ -13397,6 +13074,58 @@ async def get_system_health():
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
 
+@api_router.get("/system/cache")
+async def get_result_cache_stats(function: Optional[str] = None):
+    """Hit/miss counters for cached dashboard endpoints in this worker"""
+    return result_cache.get_stats(function)
+
+@api_router.post("/system/cache/invalidate")
+async def invalidate_result_cache(collections: Optional[List[str]] = Query(None)):
+    """Drop cached results for the given collections, or everything"""
+    if collections:
+        return {"dropped": result_cache.invalidate(*collections)}
+    return {"dropped": result_cache.clear()}
+
+@api_router.get("/system/jobs")
+async def get_job_queue_stats():
+    """Queue depth and oldest due job per queue, plus this worker's recent wait/run latency"""
+    return await job_queue.get_stats()
+
+@api_router.get("/system/log-sink")
+async def get_log_sink_stats():
+    """Buffered, written and dropped log documents in this worker"""
+    return log_sink.get_stats()
+
+@api_router.get("/system/metric-rollups")
+async def get_metric_rollup_status():
+    """Whether daily metric rollups are kept fresh by a change stream or by write hooks and the nightly reconcile"""
+    return await metric_rollups.get_status()
+
+@api_router.get("/system/scheduler")
+async def get_scheduler_stats():
+    """Next fire time, fire-time drift and skipped fires per schedule in this worker"""
+    return {**background_scheduler.get_stats(), "leader": await scheduler_leader.get_status()}
+
+@api_router.get("/system/jobs/dead-letter")
+async def get_dead_letter_jobs(queue: Optional[str] = None, limit: int = 50):
+    """Jobs that exhausted their retries, most recent first"""
+    return await job_queue.list_dead_letters(queue, min(limit, 500))
+
+@api_router.post("/system/jobs/dead-letter/{job_id}/retry")
+async def retry_dead_letter_job(job_id: str):
+    """Queue a dead-lettered job again"""
+    if not await job_queue.retry_dead_letter(job_id):
+        raise HTTPException(status_code=404, detail="Dead-letter job not found")
+    return {"success": True, "job_id": job_id}
+
+@api_router.get("/system/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, attempts and last error of a queued job"""
+    job = await job_queue.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 
 # Include the router with all endpoints
 app.include_router(api_router)
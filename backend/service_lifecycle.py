@@ -12,6 +12,8 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
 from realtime_service import realtime_service, EventType
+from customer_summary import customer_summary
+from metric_rollups import metric_rollups
 
 load_dotenv()
 
@@ -377,6 +379,7 @@ class ServiceLifecycleAutomation:
                     }
                 }
             )
+            await metric_rollups.source_changed("work_orders", work_order)
             
             logger.info(f"Work order completed: {work_order_id}")
             
@@ -450,6 +453,7 @@ class ServiceLifecycleAutomation:
         
         result = await invoices_collection.insert_one(invoice)
         invoice["_id"] = result.inserted_id
+        await customer_summary.invoice_created(invoice)
         
         logger.info(f"Invoice generated: {result.inserted_id}")
         
@@ -0,0 +1,274 @@
+"""
+Per-Site Snow Risk Forecasting
+Batch job that pulls one forecast per grid cell covering active sites, scores
+daily snow risk for every site in a single NumPy pass, and materializes the
+results in the site_snow_risk collection for dispatch planning to read.
+Rows are keyed by UTC date, like the rest of the dispatch and rollup data.
+"""
+
+import asyncio
+import calendar
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from pymongo import UpdateOne
+
+from job_queue import job_queue
+from weather_cache import grid_cell
+from weather_service import weather_service, score_snow_risk
+
+logger = logging.getLogger(__name__)
+
+FORECAST_DAYS = 5
+MAX_CONCURRENT_FETCHES = 8
+BULK_WRITE_BATCH = 1000
+
+# The weather_forecast_check schedule recomputes risk every 3 hours; rows
+# older than MAX_RISK_AGE are still served, and a refresh job is queued
+MAX_RISK_AGE = timedelta(hours=6)
+
+# Minimum time between refresh jobs queued by reads
+REFRESH_REQUEST_INTERVAL = timedelta(minutes=10)
+
+
+class SiteSnowRiskService:
+    """Computes and serves materialized per-site snow risk"""
+
+    def __init__(self, db, weather):
+        self.db = db
+        self.weather = weather
+        self.last_run: Optional[datetime] = None
+        self._refresh_queued_at: Optional[datetime] = None
+        self._run_lock = asyncio.Lock()
+
+    async def run(self) -> Dict:
+        """Recompute snow risk for every active site and replace site_snow_risk"""
+        async with self._run_lock:
+            started = datetime.utcnow()
+
+            sites = await self.db.sites.find(
+                {
+                    'active': True,
+                    'location.latitude': {'$ne': None},
+                    'location.longitude': {'$ne': None}
+                },
+                {'name': 1, 'location': 1, 'priority': 1, 'area': 1}
+            ).to_list(length=None)
+
+            if not sites:
+                await self.db.site_snow_risk.delete_many({})
+                self.last_run = started
+                return {'sites': 0, 'grid_cells': 0, 'rows': 0}
+
+            # Group sites by grid cell so each cell is fetched once
+            cells: Dict[tuple, int] = {}
+            site_cell = np.empty(len(sites), dtype=np.intp)
+            for i, site in enumerate(sites):
+                cell = grid_cell(
+                    site['location']['latitude'],
+                    site['location']['longitude'],
+                    self.weather.cache.grid_size
+                )
+                site_cell[i] = cells.setdefault(cell, len(cells))
+            cell_list = list(cells)
+
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+
+            async def fetch(cell):
+                async with semaphore:
+                    return await self.weather.get_forecast_series(*cell)
+
+            series = await asyncio.gather(*(fetch(cell) for cell in cell_list))
+
+            start_of_today = started.replace(hour=0, minute=0, second=0, microsecond=0)
+            daily = self._daily_aggregates(series, calendar.timegm(start_of_today.utctimetuple()))
+
+            risk_score, risk_level = score_snow_risk(
+                daily['temperature_min'],
+                daily['temperature_max'],
+                daily['snow'],
+                daily['wind_speed']
+            )
+
+            # Broadcast cell results onto sites: (sites, days)
+            has_data = daily['has_data'][site_cell]
+            site_snow = np.round(daily['snow'][site_cell], 1)
+            site_tmin = np.round(daily['temperature_min'][site_cell])
+            site_tmax = np.round(daily['temperature_max'][site_cell])
+            site_wind = np.round(daily['wind_speed'][site_cell], 1)
+            site_score = risk_score[site_cell]
+            site_level = risk_level[site_cell]
+
+            dates = [(start_of_today + timedelta(days=d)).date() for d in range(FORECAST_DAYS)]
+
+            operations = []
+            for i, d in zip(*np.nonzero(has_data)):
+                site = sites[i]
+                cell_lat, cell_lon = cell_list[site_cell[i]]
+                operations.append(UpdateOne(
+                    {'site_id': str(site['_id']), 'date': dates[d].isoformat()},
+                    {'$set': {
+                        'site_id': str(site['_id']),
+                        'site_name': site.get('name', 'Unknown'),
+                        'site_address': site['location'].get('address', ''),
+                        'site_priority': site.get('priority', 5),
+                        'site_area': site.get('area', 1000),
+                        'date': dates[d].isoformat(),
+                        'day_name': dates[d].strftime('%A'),
+                        'grid_cell': {'latitude': cell_lat, 'longitude': cell_lon},
+                        'expected_snow': float(site_snow[i, d]),
+                        'temperature_min': float(site_tmin[i, d]),
+                        'temperature_max': float(site_tmax[i, d]),
+                        'wind_speed': float(site_wind[i, d]),
+                        'risk_score': int(site_score[i, d]),
+                        'snow_risk': str(site_level[i, d]),
+                        'computed_at': started
+                    }},
+                    upsert=True
+                ))
+
+            for offset in range(0, len(operations), BULK_WRITE_BATCH):
+                await self.db.site_snow_risk.bulk_write(
+                    operations[offset:offset + BULK_WRITE_BATCH],
+                    ordered=False
+                )
+
+            # Drop rows for past days and sites that are no longer active
+            await self.db.site_snow_risk.delete_many({'computed_at': {'$lt': started}})
+
+            self.last_run = started
+            summary = {
+                'sites': len(sites),
+                'grid_cells': len(cell_list),
+                'rows': len(operations),
+                'high_risk_rows': int(np.count_nonzero((site_level == 'high') & has_data)),
+                'computed_at': started.isoformat()
+            }
+            logger.info(f"Site snow risk computed: {summary}")
+            return summary
+
+    @staticmethod
+    def _daily_aggregates(series: List[Dict[str, List]], day_zero: float) -> Dict[str, np.ndarray]:
+        """
+        Reduce 3-hourly forecast arrays of shape (cells, steps) into daily
+        arrays of shape (cells, FORECAST_DAYS)
+        """
+        n_cells = len(series)
+        n_steps = max((len(s['timestamps']) for s in series), default=0)
+
+        def stack(field):
+            out = np.full((n_cells, n_steps), np.nan)
+            for row, s in enumerate(series):
+                out[row, :len(s[field])] = s[field]
+            return out
+
+        timestamps = stack('timestamps')
+        temperature = stack('temperature')
+        snow = stack('snow')
+        wind = stack('wind_speed')
+
+        day_index = np.floor((timestamps - day_zero) / 86400)
+        valid = ~np.isnan(timestamps) & (day_index >= 0) & (day_index < FORECAST_DAYS)
+        rows = np.broadcast_to(np.arange(n_cells)[:, None], valid.shape)[valid]
+        cols = day_index[valid].astype(np.intp)
+        idx = (rows, cols)
+
+        shape = (n_cells, FORECAST_DAYS)
+        snow_total = np.zeros(shape)
+        temp_min = np.full(shape, np.inf)
+        temp_max = np.full(shape, -np.inf)
+        wind_total = np.zeros(shape)
+        counts = np.zeros(shape)
+
+        np.add.at(snow_total, idx, np.nan_to_num(snow[valid]))
+        np.minimum.at(temp_min, idx, temperature[valid])
+        np.maximum.at(temp_max, idx, temperature[valid])
+        np.add.at(wind_total, idx, np.nan_to_num(wind[valid]))
+        np.add.at(counts, idx, 1)
+
+        has_data = counts > 0
+        return {
+            'snow': snow_total,
+            'temperature_min': np.where(has_data, temp_min, 0.0),
+            'temperature_max': np.where(has_data, temp_max, 0.0),
+            'wind_speed': wind_total / np.maximum(counts, 1),
+            'has_data': has_data,
+        }
+
+    async def _latest_run(self) -> Optional[datetime]:
+        latest = await self.db.site_snow_risk.find_one({}, {'computed_at': 1}, sort=[('computed_at', -1)])
+        return latest['computed_at'] if latest else None
+
+    async def ensure_fresh(self):
+        """
+        Compute inline only when there is no materialized risk at all; rows older
+        than MAX_RISK_AGE are served as they are while a refresh job runs
+        """
+        now = datetime.utcnow()
+        if self.last_run and now - self.last_run < MAX_RISK_AGE:
+            return
+
+        latest = await self._latest_run()
+        if latest is None:
+            await self.run()
+            return
+        self.last_run = latest
+        if now - latest < MAX_RISK_AGE:
+            return
+
+        if self._refresh_queued_at and now - self._refresh_queued_at < REFRESH_REQUEST_INTERVAL:
+            return
+        self._refresh_queued_at = now
+        logger.warning(f"Site snow risk is {now - latest} old, queueing a refresh")
+        await job_queue.enqueue('site_snow_risk_refresh')
+
+    async def refresh(self):
+        """Job handler: recompute unless a run finished since the job was queued"""
+        latest = await self._latest_run()
+        if latest and datetime.utcnow() - latest < MAX_RISK_AGE:
+            return
+        await self.run()
+
+    async def get_site_risk(
+        self,
+        start_date: str,
+        end_date: str,
+        risk_levels: Optional[List[str]] = None
+    ) -> List[Dict]:
+        """Get materialized site risk rows for a date range (YYYY-MM-DD, inclusive)"""
+        await self.ensure_fresh()
+
+        query = {'date': {'$gte': start_date, '$lte': end_date}}
+        if risk_levels:
+            query['snow_risk'] = {'$in': risk_levels}
+
+        return await self.db.site_snow_risk.find(query, {'_id': 0}).to_list(length=None)
+
+    async def get_max_expected_snow(
+        self,
+        start_date: str,
+        end_date: str,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None
+    ) -> float:
+        """Largest expected snowfall across sites (optionally one grid cell) in a date range"""
+        await self.ensure_fresh()
+
+        match = {'date': {'$gte': start_date, '$lte': end_date}}
+        if latitude is not None and longitude is not None:
+            cell_lat, cell_lon = grid_cell(latitude, longitude, self.weather.cache.grid_size)
+            match['grid_cell.latitude'] = cell_lat
+            match['grid_cell.longitude'] = cell_lon
+
+        result = await self.db.site_snow_risk.aggregate([
+            {'$match': match},
+            {'$group': {'_id': None, 'max_snow': {'$max': '$expected_snow'}}}
+        ]).to_list(1)
+
+        return result[0]['max_snow'] if result else 0.0
+
+
+# Global site snow risk instance
+site_snow_risk = SiteSnowRiskService(weather_service.db, weather_service)
@@ -12,6 +12,7 @@ from bson import ObjectId
 import logging
 
 from realtime_service import realtime_service
+from result_cache import cached
 
 logger = logging.getLogger(__name__)
 
@@ -483,6 +484,7 @@ async def get_equipment_health(equipment_id: str) -> float:
 # ========== Equipment Dashboard ==========
 
 @router.get("/dashboard/stats")
+@cached(["equipment"])
 async def get_equipment_dashboard():
     """Get equipment dashboard statistics"""
     try:
@@ -1,5 +1,6 @@
 import os
 import logging
+from typing import List
 from twilio.rest import Client
 from dotenv import load_dotenv
 
@@ -74,6 +75,13 @@ class TwilioSMSService:
                 "to": to_number
             }
     
+    async def send_bulk_sms(self, phone_numbers: List[str], message: str) -> List[dict]:
+        """Send the same message to several recipients; one result dict per number"""
+        results = []
+        for phone in phone_numbers:
+            results.append(await self.send_sms(phone, message))
+        return results
+    
     async def send_dispatch_notification(self, crew_phone: str, site_name: str, dispatch_time: str) -> dict:
         """Send dispatch assignment notification"""
         message = f"New Dispatch Assignment: {site_name} at {dispatch_time}. Check the app for details."
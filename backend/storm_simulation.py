@@ -0,0 +1,223 @@
+"""
+Storm Capacity Simulation
+Monte Carlo discrete-event simulation of crews clearing contracted sites
+during a storm. All replications advance together as NumPy arrays, so a
+1,000-site scenario with a few hundred replications runs in well under a second.
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Default clearing SLA in hours after snowfall ends, by site priority tier
+DEFAULT_SLA_HOURS = {
+    "high": 4.0,
+    "medium": 8.0,
+    "low": 12.0,
+}
+
+# Fallback clearing rate when a site has no service history (30 min per 500 sqm)
+DEFAULT_MINUTES_PER_SQM = 30 / 500
+DEFAULT_SITE_AREA_SQM = 1000.0
+
+# Spread of actual vs expected service time when history is too thin to estimate it
+DEFAULT_DURATION_CV = 0.25
+
+
+def priority_tier(priority) -> str:
+    """Map a site priority (numeric 1-10 or label) to an SLA tier"""
+    if isinstance(priority, str):
+        label = priority.lower()
+        if label in ("high", "urgent", "critical"):
+            return "high"
+        if label in ("low",):
+            return "low"
+        return "medium"
+    try:
+        value = float(priority)
+    except (TypeError, ValueError):
+        return "medium"
+    if value >= 8:
+        return "high"
+    if value >= 5:
+        return "medium"
+    return "low"
+
+
+def snow_depth_factor(snow_cm: float) -> float:
+    """Service time multiplier for storm depth; history reflects typical (~5 cm) events"""
+    return float(min(1.0 + max(snow_cm - 5.0, 0.0) * 0.1, 2.5))
+
+
+class StormSimulator:
+    """
+    Simulates crews working a priority-ordered site queue.
+
+    Each site is released once accumulation reaches its trigger depth; the next
+    site in the queue goes to whichever crew frees up first (list scheduling).
+    Service times are drawn per replication from a lognormal around each
+    site's expected duration.
+    """
+
+    def __init__(
+        self,
+        sites: List[Dict],
+        snow_cm: float,
+        storm_duration_hours: float,
+        trigger_depth_cm: float = 2.5,
+        travel_minutes: float = 15.0,
+        sla_hours: Optional[Dict[str, float]] = None,
+        replications: int = 200,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            sites: dicts with site_id, name, priority, expected_minutes, duration_cv
+            snow_cm: total forecast accumulation
+            storm_duration_hours: hours from first flake to end of snowfall
+        """
+        self.sites = sites
+        self.snow_cm = snow_cm
+        self.storm_duration_hours = max(storm_duration_hours, 0.0)
+        self.trigger_depth_cm = trigger_depth_cm
+        self.travel_hours = travel_minutes / 60
+        self.sla_hours = {**DEFAULT_SLA_HOURS, **(sla_hours or {})}
+        self.replications = max(int(replications), 1)
+        self.rng = np.random.default_rng(seed)
+
+        self.tiers = np.array([priority_tier(s.get("priority")) for s in sites], dtype=str).reshape(-1)
+        tier_rank = np.select([self.tiers == "high", self.tiers == "medium"], [0, 1], default=2)
+
+        # Release time in hours from storm start, assuming uniform snowfall rate
+        if snow_cm > 0:
+            release = self.storm_duration_hours * min(trigger_depth_cm / snow_cm, 1.0)
+        else:
+            release = self.storm_duration_hours
+        self.release = np.full(len(sites), release)
+
+        # SLA deadline in hours from storm start
+        self.deadline = self.storm_duration_hours + np.array(
+            [self.sla_hours[t] for t in self.tiers], dtype=float
+        ).reshape(-1)
+
+        # Work highest tier first, then tightest deadline, then longest job
+        expected = np.array([s["expected_minutes"] for s in sites], dtype=float).reshape(-1) / 60
+        self.order = np.lexsort((-expected, self.deadline, tier_rank))
+
+        # Draw all service times up front so every crew count sees the same storm
+        cv = np.array([s.get("duration_cv") or DEFAULT_DURATION_CV for s in sites], dtype=float).reshape(-1)
+        sigma = np.sqrt(np.log1p(cv ** 2))
+        mu = np.log(np.maximum(expected * snow_depth_factor(snow_cm), 1e-6)) - sigma ** 2 / 2
+        self.durations = self.rng.lognormal(
+            mean=mu, sigma=sigma, size=(self.replications, len(sites))
+        ) + self.travel_hours
+
+    def run(self, crew_count: int) -> Dict[str, np.ndarray]:
+        """
+        Simulate all replications for a given number of crews.
+        Returns completion times (replications, sites) in hours from storm start.
+        """
+        n_reps, n_sites = self.durations.shape
+        completion = np.zeros((n_reps, n_sites))
+        if n_sites == 0:
+            return {"completion": completion}
+        if crew_count <= 0:
+            completion[:] = np.inf
+            return {"completion": completion}
+
+        crew_free = np.zeros((n_reps, crew_count))
+        rep_index = np.arange(n_reps)
+
+        for site in self.order:
+            crew = np.argmin(crew_free, axis=1)
+            start = np.maximum(crew_free[rep_index, crew], self.release[site])
+            finish = start + self.durations[:, site]
+            crew_free[rep_index, crew] = finish
+            completion[:, site] = finish
+
+        return {"completion": completion}
+
+    def summarize(self, crew_count: int, completion: np.ndarray) -> Dict:
+        """Aggregate replications into SLA and completion statistics"""
+        n_sites = completion.shape[1]
+        if n_sites == 0:
+            return {
+                "crews": crew_count,
+                "expected_breaches": 0.0,
+                "p90_breaches": 0,
+                "makespan_hours": {"p50": 0.0, "p90": 0.0},
+                "breaches_by_tier": {},
+            }
+
+        breached = completion > self.deadline
+        breaches = breached.sum(axis=1)
+        makespan = completion.max(axis=1)
+
+        return {
+            "crews": crew_count,
+            "expected_breaches": round(float(breaches.mean()), 2),
+            "p90_breaches": int(np.percentile(breaches, 90)),
+            "makespan_hours": {
+                "p50": _round_hours(np.percentile(makespan, 50)),
+                "p90": _round_hours(np.percentile(makespan, 90)),
+            },
+            "breaches_by_tier": {
+                tier: round(float(breached[:, self.tiers == tier].sum(axis=1).mean()), 2)
+                for tier in ("high", "medium", "low")
+                if np.any(self.tiers == tier)
+            },
+        }
+
+    def site_results(self, completion: np.ndarray) -> List[Dict]:
+        """Per-site completion percentiles and breach probability"""
+        if completion.shape[1] == 0:
+            return []
+
+        p50 = np.percentile(completion, 50, axis=0)
+        p90 = np.percentile(completion, 90, axis=0)
+        breach_probability = (completion > self.deadline).mean(axis=0)
+
+        return [
+            {
+                "site_id": site["site_id"],
+                "site_name": site.get("name"),
+                "priority_tier": str(self.tiers[i]),
+                "sla_deadline_hours": round(float(self.deadline[i]), 2),
+                "completion_hours": {
+                    "p50": _round_hours(p50[i]),
+                    "p90": _round_hours(p90[i]),
+                },
+                "breach_probability": round(float(breach_probability[i]), 3),
+            }
+            for i, site in enumerate(self.sites)
+        ]
+
+    def simulate(self, crew_count: int, extra_crews: int = 3) -> Dict:
+        """Run the baseline scenario plus the marginal effect of adding crews"""
+        baseline_completion = self.run(crew_count)["completion"]
+        baseline = self.summarize(crew_count, baseline_completion)
+
+        marginal = []
+        previous = baseline
+        for extra in range(1, extra_crews + 1):
+            scenario = self.summarize(crew_count + extra, self.run(crew_count + extra)["completion"])
+            scenario["breaches_avoided"] = round(baseline["expected_breaches"] - scenario["expected_breaches"], 2)
+            scenario["breaches_avoided_vs_previous"] = round(
+                previous["expected_breaches"] - scenario["expected_breaches"], 2
+            )
+            marginal.append(scenario)
+            previous = scenario
+
+        return {
+            "baseline": baseline,
+            "marginal_crews": marginal,
+            "sites": self.site_results(baseline_completion),
+        }
+
+
+def _round_hours(value) -> Optional[float]:
+    value = float(value)
+    return round(value, 2) if np.isfinite(value) else None
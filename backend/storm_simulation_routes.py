@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Storm Capacity Simulation Routes
+Projects whether available crews can clear every contracted site within SLA
+"""
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict
+from datetime import datetime, timedelta
+from bson import ObjectId
+import asyncio
+import logging
+
+import numpy as np
+
+from storm_simulation import (
+    StormSimulator,
+    DEFAULT_MINUTES_PER_SQM,
+    DEFAULT_SITE_AREA_SQM,
+    DEFAULT_DURATION_CV,
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/storm-simulation", tags=["Storm Simulation"])
+
+# MongoDB collections (imported from main)
+from server import db
+
+sites_collection = db.sites
+measurements_collection = db.site_measurements
+service_history_collection = db.site_service_history
+crews_collection = db.hr_employees
+equipment_collection = db.equipment
+
+SQFT_TO_SQM = 0.092903
+
+# ========== Request Models ==========
+
+class StormScenarioRequest(BaseModel):
+    snow_cm: float = Field(..., ge=0)
+    storm_duration_hours: float = Field(6.0, ge=0)
+    storm_start: Optional[str] = None  # ISO timestamp, defaults to now
+    trigger_depth_cm: float = Field(2.5, ge=0)
+    travel_minutes: float = Field(15.0, ge=0)
+    sla_hours: Optional[Dict[str, float]] = None  # {"high": 4, "medium": 8, "low": 12}
+    crew_count: Optional[int] = Field(None, ge=0)  # Override active crew count
+    site_ids: Optional[List[str]] = None  # Limit to these sites
+    replications: int = Field(200, ge=1, le=1000)
+    extra_crews: int = Field(3, ge=0, le=10)
+    seed: Optional[int] = None
+
+
+# ========== Data Loading ==========
+
+async def _load_site_profiles(site_ids: Optional[List[str]]) -> List[Dict]:
+    """Build per-site expected service time from history, measurements and site area"""
+    query = {"active": True}
+    if site_ids:
+        invalid = [sid for sid in site_ids if not ObjectId.is_valid(sid)]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Invalid site_ids: {', '.join(invalid)}")
+        query["_id"] = {"$in": [ObjectId(sid) for sid in site_ids]}
+
+    sites = await sites_collection.find(
+        query, {"name": 1, "priority": 1, "area": 1, "area_size": 1}
+    ).to_list(None)
+    ids = [str(site["_id"]) for site in sites]
+
+    measured_areas, history = await asyncio.gather(
+        measurements_collection.aggregate([
+            {"$match": {"site_id": {"$in": ids}, "measurement_type": "area"}},
+            {"$group": {"_id": "$site_id", "area_sqm": {"$sum": "$area_square_meters"}}}
+        ]).to_list(None),
+        service_history_collection.aggregate([
+            {"$match": {
+                "site_id": {"$in": ids},
+                "status": "completed",
+                "duration_hours": {"$gt": 0}
+            }},
+            {"$group": {
+                "_id": "$site_id",
+                "avg_hours": {"$avg": "$duration_hours"},
+                "std_hours": {"$stdDevPop": "$duration_hours"},
+                "count": {"$sum": 1}
+            }}
+        ]).to_list(None)
+    )
+
+    area_by_site = {row["_id"]: row["area_sqm"] for row in measured_areas if row.get("area_sqm")}
+    history_by_site = {row["_id"]: row for row in history}
+
+    def site_area(site):
+        site_id = str(site["_id"])
+        if site_id in area_by_site:
+            return area_by_site[site_id]
+        if site.get("area_size"):
+            return site["area_size"] * SQFT_TO_SQM  # area_size is stored in square feet
+        return site.get("area") or DEFAULT_SITE_AREA_SQM
+
+    # Calibrate the clearing rate from sites that have both history and an area
+    rates = [
+        history_by_site[str(site["_id"])]["avg_hours"] * 60 / site_area(site)
+        for site in sites
+        if str(site["_id"]) in history_by_site and site_area(site) > 0
+    ]
+    minutes_per_sqm = float(np.median(rates)) if rates else DEFAULT_MINUTES_PER_SQM
+
+    profiles = []
+    for site in sites:
+        site_id = str(site["_id"])
+        stats = history_by_site.get(site_id)
+        if stats:
+            expected_minutes = stats["avg_hours"] * 60
+            duration_cv = (
+                stats["std_hours"] / stats["avg_hours"]
+                if stats["count"] >= 3 and stats["avg_hours"] > 0
+                else DEFAULT_DURATION_CV
+            )
+        else:
+            expected_minutes = site_area(site) * minutes_per_sqm
+            duration_cv = DEFAULT_DURATION_CV
+
+        profiles.append({
+            "site_id": site_id,
+            "name": site.get("name", "Unknown"),
+            "priority": site.get("priority", 5),
+            "expected_minutes": expected_minutes,
+            "duration_cv": duration_cv,
+            "history_samples": stats["count"] if stats else 0,
+        })
+
+    return profiles
+
+
+# ========== Run Simulation ==========
+
+@router.post("/run")
+async def run_storm_simulation(request: StormScenarioRequest):
+    """
+    Simulate a storm scenario against current sites and crews
+    Returns projected completion times, SLA breaches and the value of extra crews
+    """
+    try:
+        storm_start = datetime.fromisoformat(request.storm_start) if request.storm_start else datetime.utcnow()
+
+        profiles, active_crews, available_equipment = await asyncio.gather(
+            _load_site_profiles(request.site_ids),
+            crews_collection.count_documents({
+                "role": "crew",
+                "status": {"$in": ["active", "available"]}
+            }),
+            equipment_collection.count_documents({
+                "active": True,
+                "status": {"$ne": "maintenance"}
+            })
+        )
+
+        crews = request.crew_count if request.crew_count is not None else active_crews
+        # Each crew needs a working unit; equipment only limits us once it is tracked
+        effective_crews = min(crews, available_equipment) if available_equipment else crews
+
+        def simulate():
+            simulator = StormSimulator(
+                profiles,
+                snow_cm=request.snow_cm,
+                storm_duration_hours=request.storm_duration_hours,
+                trigger_depth_cm=request.trigger_depth_cm,
+                travel_minutes=request.travel_minutes,
+                sla_hours=request.sla_hours,
+                replications=request.replications,
+                seed=request.seed,
+            )
+            return simulator.simulate(effective_crews, request.extra_crews)
+
+        # Keep the NumPy work off the event loop
+        started = datetime.utcnow()
+        result = await asyncio.get_running_loop().run_in_executor(None, simulate)
+        elapsed_ms = (datetime.utcnow() - started).total_seconds() * 1000
+
+        makespan_p50 = result["baseline"]["makespan_hours"]["p50"]
+        sites = sorted(result["sites"], key=lambda s: -s["breach_probability"])
+
+        return {
+            "success": True,
+            "scenario": {
+                **request.dict(exclude={"site_ids"}),
+                "storm_start": storm_start.isoformat(),
+                "storm_end": (storm_start + timedelta(hours=request.storm_duration_hours)).isoformat(),
+            },
+            "resources": {
+                "active_crews": active_crews,
+                "available_equipment": available_equipment,
+                "simulated_crews": effective_crews,
+                "equipment_limited": effective_crews < crews,
+            },
+            "summary": {
+                "total_sites": len(profiles),
+                "sites_with_history": sum(1 for p in profiles if p["history_samples"]),
+                **result["baseline"],
+                "projected_completion": (
+                    (storm_start + timedelta(hours=makespan_p50)).isoformat()
+                    if makespan_p50 is not None else None
+                ),
+            },
+            "marginal_crews": result["marginal_crews"],
+            "sites": sites,
+            "simulation_ms": round(elapsed_ms, 1),
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error running storm simulation: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+logger.info("Storm simulation routes initialized successfully")
@@ -0,0 +1,246 @@
+"""
+Trend Engine
+Any tracked metric bucketed by day, week or month in MongoDB ($dateTrunc),
+with empty periods filled in and a short forecast of the next periods:
+seasonal naive and simple exponential smoothing, both in NumPy.
+
+Series are cached per (metric, granularity, range, horizon) in result_cache
+and invalidated when their metric's source collection is written.
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from metric_rollups import _hours_between
+from result_cache import cached
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Database connection
+mongo_url = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+db_name = os.getenv("DB_NAME", "snow_removal_db")
+client = AsyncIOMotorClient(mongo_url)
+db = client[db_name]
+
+# metric -> source collection, date field and the per-document value summed into each period
+TREND_METRICS: Dict[str, Dict] = {
+    "revenue": {
+        "collection": "invoices",
+        "date_field": "created_at",
+        "value": {"$ifNull": ["$total_amount", 0]},
+    },
+    "work_orders": {
+        "collection": "work_orders",
+        "date_field": "created_at",
+        "value": 1,
+    },
+    "hours": {
+        "collection": "time_entries",
+        "date_field": "clock_in",
+        "value": _hours_between("$clock_out", "$clock_in"),
+    },
+    # Workflow deductions only set used_at; manual entries set both
+    "consumables_used": {
+        "collection": "consumable_usage",
+        "date_field": "used_at",
+        "fallback_date_field": "created_at",
+        "value": {"$ifNull": ["$quantity_used", 0]},
+    },
+    "consumables_cost": {
+        "collection": "consumable_usage",
+        "date_field": "used_at",
+        "fallback_date_field": "created_at",
+        "value": {"$ifNull": ["$cost", 0]},
+    },
+}
+
+GRANULARITIES = ("day", "week", "month")
+
+# Periods per seasonal cycle for the seasonal naive forecast
+SEASON_LENGTHS = {"day": 7, "week": 52, "month": 12}
+
+# Smoothing factors tried when fitting exponential smoothing
+SMOOTHING_ALPHAS = np.linspace(0.05, 0.95, 19)
+
+MAX_PERIODS = 730
+MAX_HORIZON = 52
+
+TREND_CACHE_TTL = 300
+
+
+# ========== Periods ==========
+
+def truncate(value: datetime, granularity: str) -> datetime:
+    """Start of the period containing value; weeks start on Monday, as $dateTrunc is asked to"""
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_period(start: datetime, granularity: str) -> datetime:
+    if granularity == "week":
+        return start + timedelta(weeks=1)
+    if granularity == "month":
+        return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return start + timedelta(days=1)
+
+
+def period_starts(start: datetime, count: int, granularity: str) -> List[datetime]:
+    starts = []
+    for _ in range(count):
+        starts.append(start)
+        start = next_period(start, granularity)
+    return starts
+
+
+def range_for(granularity: str, periods: int, end: Optional[datetime] = None):
+    """First and last period starts for `periods` periods ending with the one containing end"""
+    last = truncate(end or datetime.utcnow(), granularity)
+    first = last
+    for _ in range(periods - 1):
+        first = truncate(first - timedelta(days=1), granularity)
+    return first, last
+
+
+# ========== Forecasting ==========
+
+def seasonal_naive(values: np.ndarray, horizon: int, season: int) -> np.ndarray:
+    """Repeat the last full season; falls back to the last value with less history"""
+    if len(values) == 0:
+        return np.zeros(horizon)
+    if len(values) < season:
+        return np.full(horizon, values[-1])
+    last_season = values[-season:]
+    return np.resize(last_season, horizon)
+
+
+def exponential_smoothing(values: np.ndarray, horizon: int):
+    """
+    Simple exponential smoothing with alpha picked by one-step-ahead squared error.
+    Returns (forecast, alpha).
+    """
+    if len(values) == 0:
+        return np.zeros(horizon), None
+    if len(values) < 3:
+        return np.full(horizon, values.mean()), None
+
+    best_alpha, best_error, best_level = None, None, None
+    for alpha in SMOOTHING_ALPHAS:
+        level, error = values[0], 0.0
+        for value in values[1:]:
+            error += (value - level) ** 2
+            level = alpha * value + (1 - alpha) * level
+        if best_error is None or error < best_error:
+            best_alpha, best_error, best_level = alpha, error, level
+
+    return np.full(horizon, best_level), round(float(best_alpha), 2)
+
+
+def forecast(values: List[float], horizon: int, granularity: str) -> Dict:
+    series = np.asarray(values, dtype=float)
+    smoothed, alpha = exponential_smoothing(series, horizon)
+    return {
+        "seasonal_naive": [round(float(v), 2) for v in seasonal_naive(series, horizon, SEASON_LENGTHS[granularity])],
+        "exponential_smoothing": [round(float(v), 2) for v in smoothed],
+        "alpha": alpha,
+    }
+
+
+# ========== Series ==========
+
+async def _bucket(metric: str, granularity: str, start: datetime, end: datetime) -> Dict[datetime, Dict]:
+    spec = TREND_METRICS[metric]
+    in_range = {"$gte": start, "$lt": end}
+    date_field = f"${spec['date_field']}"
+    match = {spec["date_field"]: in_range}
+    fallback = spec.get("fallback_date_field")
+    if fallback:
+        date_field = {"$ifNull": [date_field, f"${fallback}"]}
+        match = {"$or": [match, {spec["date_field"]: None, fallback: in_range}]}
+    rows = await db[spec["collection"]].aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": date_field, "unit": granularity, "startOfWeek": "monday"}},
+            "value": {"$sum": spec["value"]},
+            "count": {"$sum": 1}
+        }}
+    ]).to_list(None)
+    return {row["_id"]: row for row in rows}
+
+
+async def get_trend(metric: str, granularity: str, first: datetime, last: datetime, horizon: int) -> Dict:
+    """
+    Series from the period starting at `first` through the one starting at
+    `last` (the current, still open period when last is now), plus a forecast
+    of `horizon` periods fitted on the closed periods only.
+    """
+    if metric not in TREND_METRICS:
+        raise ValueError(f"Unknown metric: {metric}. Available: {', '.join(TREND_METRICS)}")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}. Available: {', '.join(GRANULARITIES)}")
+    return await _TRENDS[TREND_METRICS[metric]["collection"]](metric, granularity, first, last, horizon)
+
+
+async def _trend(metric: str, granularity: str, first: datetime, last: datetime, horizon: int) -> Dict:
+    end = next_period(last, granularity)
+    buckets = await _bucket(metric, granularity, first, end)
+
+    starts = []
+    start = first
+    while start <= last:
+        starts.append(start)
+        start = next_period(start, granularity)
+
+    now = datetime.utcnow()
+    series = []
+    for start in starts:
+        bucket = buckets.get(start, {})
+        series.append({
+            "period": start.isoformat(),
+            "value": round(bucket.get("value", 0), 2),
+            "count": bucket.get("count", 0),
+            "partial": next_period(start, granularity) > now,
+        })
+
+    closed = [point["value"] for point in series if not point["partial"]]
+    forecast_start = next_period(starts[-1], granularity) if not series[-1]["partial"] else starts[-1]
+    predicted = forecast(closed, horizon, granularity) if horizon else {}
+
+    values = [point["value"] for point in series]
+    return {
+        "metric": metric,
+        "granularity": granularity,
+        "series": series,
+        "summary": {
+            "total": round(sum(values), 2),
+            "average": round(sum(values) / len(values), 2) if values else 0,
+            "periods": len(series),
+        },
+        "forecast": {
+            "periods": [p.isoformat() for p in period_starts(forecast_start, horizon, granularity)],
+            **predicted,
+        } if horizon else None,
+    }
+
+
+def _cached_trend(collection: str):
+    """_trend cached under its own name per source collection, so only that collection's writes drop it"""
+    async def trend(metric: str, granularity: str, first: datetime, last: datetime, horizon: int) -> Dict:
+        return await _trend(metric, granularity, first, last, horizon)
+
+    trend.__qualname__ = f"_trend[{collection}]"
+    return cached([collection], ttl=TREND_CACHE_TTL)(trend)
+
+
+_TRENDS = {collection: _cached_trend(collection) for collection in {spec["collection"] for spec in TREND_METRICS.values()}}
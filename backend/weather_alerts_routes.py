@@ -12,6 +12,7 @@ import logging
 
 from weather_dispatch import weather_dispatch
 from weather_service import weather_service
+from site_snow_risk import site_snow_risk
 from realtime_service import realtime_service
 
 logger = logging.getLogger(__name__)
@@ -109,26 +110,24 @@ async def process_weather_forecast(
     Called by background scheduler or manually by admin
     """
     try:
-        # Get forecast
-        if request.latitude and request.longitude:
-            forecast = await weather_service.get_weather_by_coordinates(
-                request.latitude, 
-                request.longitude
-            )
-        else:
-            forecast = await weather_service.get_weather_by_location(request.location)
-        
-        # Extract snow prediction
-        snow_forecast = forecast.get("snow_accumulation_inches", 0)
+        forecast_time = datetime.utcnow() + timedelta(hours=6)  # 6-hour forecast
+        
+        # Read expected snow from the materialized per-site risk
+        forecast_date = forecast_time.date().isoformat()
+        max_snow_cm = await site_snow_risk.get_max_expected_snow(
+            forecast_date,
+            forecast_date,
+            request.latitude,
+            request.longitude
+        )
+        snow_forecast = round(max_snow_cm / 2.54, 1)
         
         forecast_data = {
             "location": request.location,
             "latitude": request.latitude,
             "longitude": request.longitude,
             "snow_accumulation_inches": snow_forecast,
-            "forecast_time": datetime.utcnow() + timedelta(hours=6),  # 6-hour forecast
-            "temperature": forecast.get("temperature"),
-            "conditions": forecast.get("conditions")
+            "forecast_time": forecast_time
         }
         
         # Process in background
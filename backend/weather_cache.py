@@ -0,0 +1,130 @@
+"""
+Weather Cache
+Grid-cell keyed cache for weather provider responses.
+Coalesces concurrent identical requests into one upstream call and keeps the
+last good response in MongoDB so it can be served when the provider is down.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Grid cell size in degrees (~11 km north-south); every request inside a cell
+# shares one cached provider response
+GRID_CELL_DEGREES = 0.1
+
+# OpenWeatherMap refreshes current conditions about every 10 minutes.
+# The 5 day / 3 hour forecast model runs less often, so an hour is plenty.
+CURRENT_WEATHER_TTL = 600
+FORECAST_TTL = 3600
+
+
+def grid_cell(lat: float, lon: float, size: float = GRID_CELL_DEGREES) -> Tuple[float, float]:
+    """Snap coordinates to the centre of their grid cell"""
+    return (
+        round(round(lat / size) * size, 4),
+        round(round(lon / size) * size, 4),
+    )
+
+
+class WeatherCache:
+    """In-memory TTL cache with single-flight refresh and persisted stale fallback"""
+
+    def __init__(self, db=None, grid_size: float = GRID_CELL_DEGREES):
+        self.db = db
+        self.grid_size = grid_size
+        self._entries: Dict[str, Tuple[float, Any]] = {}  # key -> (monotonic fetch time, data)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'stale_served': 0,
+            'errors': 0,
+        }
+
+    def make_key(self, kind: str, lat: float, lon: float, horizon: int = 0) -> str:
+        """Build a cache key from the data kind, grid cell and forecast horizon"""
+        cell_lat, cell_lon = grid_cell(lat, lon, self.grid_size)
+        return f"{kind}:{cell_lat}:{cell_lon}:{horizon}"
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        ttl: int,
+        fetcher: Callable[[], Awaitable[Any]],
+    ) -> Optional[Any]:
+        """
+        Return fresh cached data for key, or fetch it once for all concurrent callers.
+
+        If the fetch fails, the last good value (from memory or MongoDB) is returned
+        regardless of age. Returns None only when nothing has ever been cached.
+        """
+        entry = self._entries.get(key)
+        if entry and time.monotonic() - entry[0] < ttl:
+            self.stats['hits'] += 1
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats['coalesced'] += 1
+        else:
+            self.stats['misses'] += 1
+            task = asyncio.ensure_future(self._refresh(key, fetcher))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shield so a cancelled caller doesn't cancel the fetch other callers wait on
+        return await asyncio.shield(task)
+
+    async def _refresh(self, key: str, fetcher: Callable[[], Awaitable[Any]]) -> Optional[Any]:
+        try:
+            data = await fetcher()
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.warning(f"Weather provider fetch failed for {key}: {e}")
+            stale = await self._load_stale(key)
+            if stale is not None:
+                self.stats['stale_served'] += 1
+            return stale
+
+        self._entries[key] = (time.monotonic(), data)
+        await self._persist(key, data)
+        return data
+
+    async def _persist(self, key: str, data: Any):
+        if self.db is None:
+            return
+        try:
+            await self.db.weather_cache.update_one(
+                {'key': key},
+                {'$set': {'key': key, 'data': data, 'fetched_at': datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Error persisting weather cache entry {key}: {e}")
+
+    async def _load_stale(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry:
+            return entry[1]
+        if self.db is None:
+            return None
+        try:
+            doc = await self.db.weather_cache.find_one({'key': key})
+        except Exception as e:
+            logger.error(f"Error loading weather cache entry {key}: {e}")
+            return None
+        return doc['data'] if doc else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current cache size"""
+        return {
+            **self.stats,
+            'entries': len(self._entries),
+            'inflight': len(self._inflight),
+        }
@@ -50,10 +50,26 @@ class WeatherDispatchAutomation:
         Called by background scheduler when new forecast received
         """
         try:
-            snow_forecast = forecast_data.get("snow_accumulation_inches", 0)
             forecast_time = forecast_data.get("forecast_time", datetime.utcnow())
             location = forecast_data.get("location", "Unknown")
             
+            if forecast_data.get("snow_accumulation_inches") is None:
+                # Read the materialized per-site risk instead of calling the weather API
+                from site_snow_risk import site_snow_risk
+                forecast_date = forecast_time.date().isoformat()
+                max_snow_cm = await site_snow_risk.get_max_expected_snow(
+                    forecast_date,
+                    forecast_date,
+                    forecast_data.get("latitude"),
+                    forecast_data.get("longitude")
+                )
+                forecast_data = {
+                    **forecast_data,
+                    "snow_accumulation_inches": round(max_snow_cm / 2.54, 1)
+                }
+            
+            snow_forecast = forecast_data.get("snow_accumulation_inches", 0)
+            
             logger.info(f"Processing forecast: {snow_forecast}\" snow at {location}")
             
             # Store forecast
@@ -190,7 +206,8 @@ class WeatherDispatchAutomation:
                             {
                                 "$set": {
                                     "assigned_crew": [nearest_crew["crew_id"]],
-                                    "assigned_at": datetime.utcnow()
+                                    "assigned_at": datetime.utcnow(),
+                                    "updated_at": datetime.utcnow()
                                 }
                             }
                         )
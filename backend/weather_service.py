@@ -6,11 +6,14 @@ Provides weather data for operational planning
 
 import asyncio
 import aiohttp
+import numpy as np
 import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
+from weather_cache import WeatherCache, grid_cell, CURRENT_WEATHER_TTL, FORECAST_TTL
+
 load_dotenv()
 
 # Import weather dispatch automation
@@ -21,6 +24,42 @@ except ImportError:
     print("Weather dispatch automation not available")
     WEATHER_DISPATCH_ENABLED = False
 
+
+def score_snow_risk(min_temp, max_temp, snow_amount, wind_speed):
+    """
+    Score snow operation risk; works on scalars or NumPy arrays of daily values.
+    Returns (risk_score, risk_level) with levels 'low', 'medium' or 'high'.
+    """
+    min_temp = np.asarray(min_temp, dtype=float)
+    max_temp = np.asarray(max_temp, dtype=float)
+    snow_amount = np.asarray(snow_amount, dtype=float)
+    wind_speed = np.asarray(wind_speed, dtype=float)
+    
+    # Temperature factors
+    risk_score = np.select(
+        [min_temp <= -10, min_temp <= 0, max_temp <= 5],
+        [3, 2, 1],
+        default=0
+    )
+    
+    # Snow amount factors
+    risk_score = risk_score + np.select(
+        [snow_amount >= 15, snow_amount >= 8, snow_amount >= 3, snow_amount > 0],
+        [4, 3, 2, 1],
+        default=0
+    )
+    
+    # Wind factors
+    risk_score = risk_score + np.select(
+        [wind_speed >= 50, wind_speed >= 30],
+        [2, 1],
+        default=0
+    )
+    
+    risk_level = np.where(risk_score >= 6, 'high', np.where(risk_score >= 3, 'medium', 'low'))
+    return risk_score, risk_level
+
+
 class WeatherService:
     def __init__(self):
         # Using OpenWeatherMap API (free tier available)
@@ -41,6 +80,32 @@ class WeatherService:
         
         # Tracked locations
         self.locations = []
+        
+        # Shared HTTP session (created lazily inside the running event loop)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.cache = WeatherCache(self.db)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled HTTP session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=10),
+                connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300)
+            )
+        return self._session
+
+    async def close(self):
+        """Close the pooled HTTP session"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _fetch_json(self, endpoint: str, params: Dict) -> Dict:
+        """GET a provider endpoint, raising on any non-200 response"""
+        session = await self._get_session()
+        async with session.get(f"{self.base_url}/{endpoint}", params=params) as response:
+            response.raise_for_status()
+            return await response.json()
 
     async def get_current_weather(self, lat: float = None, lon: float = None) -> Dict:
         """Get current weather conditions"""
@@ -52,21 +117,21 @@ class WeatherService:
             if self.api_key == 'demo_key':
                 return self._get_mock_current_weather()
                 
-            url = f"{self.base_url}/weather"
-            params = {
-                'lat': lat,
-                'lon': lon,
-                'appid': self.api_key,
-                'units': 'metric'
-            }
+            # Request the grid cell centre so every caller in the cell shares one response
+            key = self.cache.make_key('current', lat, lon)
+            cell_lat, cell_lon = grid_cell(lat, lon, self.cache.grid_size)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return self._format_current_weather(data)
-                    else:
-                        return self._get_mock_current_weather()
+            async def fetch():
+                data = await self._fetch_json('weather', {
+                    'lat': cell_lat,
+                    'lon': cell_lon,
+                    'appid': self.api_key,
+                    'units': 'metric'
+                })
+                return self._format_current_weather(data)
+            
+            weather = await self.cache.get_or_fetch(key, CURRENT_WEATHER_TTL, fetch)
+            return weather if weather is not None else self._get_mock_current_weather()
                         
         except Exception as e:
             print(f"Weather API error: {e}")
@@ -82,27 +147,83 @@ class WeatherService:
             if self.api_key == 'demo_key':
                 return self._get_mock_forecast(days)
                 
-            url = f"{self.base_url}/forecast"
-            params = {
-                'lat': lat,
-                'lon': lon,
-                'appid': self.api_key,
-                'units': 'metric',
-                'cnt': days * 8  # 8 forecasts per day (every 3 hours)
-            }
+            key = self.cache.make_key('forecast', lat, lon, days)
+            cell_lat, cell_lon = grid_cell(lat, lon, self.cache.grid_size)
+            
+            async def fetch():
+                data = await self._fetch_json('forecast', {
+                    'lat': cell_lat,
+                    'lon': cell_lon,
+                    'appid': self.api_key,
+                    'units': 'metric',
+                    'cnt': days * 8  # 8 forecasts per day (every 3 hours)
+                })
+                return self._format_forecast(data, days)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return self._format_forecast(data, days)
-                    else:
-                        return self._get_mock_forecast(days)
+            forecast = await self.cache.get_or_fetch(key, FORECAST_TTL, fetch)
+            return forecast if forecast is not None else self._get_mock_forecast(days)
                         
         except Exception as e:
             print(f"Weather forecast API error: {e}")
             return self._get_mock_forecast(days)
 
+    async def get_forecast_series(self, lat: float, lon: float) -> Dict[str, List]:
+        """
+        Get the raw 3-hourly forecast for a location as parallel arrays
+        (timestamps, temperature, snow, wind_speed) for batch processing
+        """
+        try:
+            if self.api_key == 'demo_key':
+                return self._get_mock_forecast_series()
+            
+            key = self.cache.make_key('series', lat, lon, 5)
+            cell_lat, cell_lon = grid_cell(lat, lon, self.cache.grid_size)
+            
+            async def fetch():
+                data = await self._fetch_json('forecast', {
+                    'lat': cell_lat,
+                    'lon': cell_lon,
+                    'appid': self.api_key,
+                    'units': 'metric'
+                })
+                return self._format_forecast_series(data)
+            
+            series = await self.cache.get_or_fetch(key, FORECAST_TTL, fetch)
+            return series if series is not None else self._get_mock_forecast_series()
+        
+        except Exception as e:
+            print(f"Weather forecast series API error: {e}")
+            return self._get_mock_forecast_series()
+
+    def _format_forecast_series(self, data: Dict) -> Dict[str, List]:
+        """Flatten forecast API response into parallel arrays"""
+        items = data['list']
+        return {
+            'timestamps': [item['dt'] for item in items],
+            'temperature': [item['main']['temp'] for item in items],
+            'snow': [item.get('snow', {}).get('3h', 0) for item in items],
+            'wind_speed': [item['wind']['speed'] * 3.6 for item in items],
+        }
+
+    def _get_mock_forecast_series(self) -> Dict[str, List]:
+        """Expand the mock daily forecast into 3-hourly arrays"""
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        series = {'timestamps': [], 'temperature': [], 'snow': [], 'wind_speed': []}
+        
+        for i, day in enumerate(self._get_mock_forecast(5)):
+            for step in range(8):
+                ts = start + timedelta(days=i, hours=step * 3)
+                # Coldest overnight, warmest mid-afternoon
+                warmth = 1 - abs(step - 5) / 5
+                series['timestamps'].append(int(ts.timestamp()))
+                series['temperature'].append(
+                    day['temperature_min'] + (day['temperature_max'] - day['temperature_min']) * warmth
+                )
+                series['snow'].append(day['precipitation']['snow'] / 8)
+                series['wind_speed'].append(day['wind_speed'])
+        
+        return series
+
     def _format_current_weather(self, data: Dict) -> Dict:
         """Format current weather data from API response"""
         return {
@@ -169,45 +290,13 @@ class WeatherService:
 
     def _calculate_snow_risk(self, day_data: Dict) -> str:
         """Calculate snow operation risk level"""
-        min_temp = min(day_data['temps'])
-        max_temp = max(day_data['temps'])
-        snow_amount = day_data['precipitation']['snow']
-        wind_speed = sum(day_data['wind']) / len(day_data['wind'])
-        
-        # Risk calculation logic
-        risk_score = 0
-        
-        # Temperature factors
-        if min_temp <= -10:
-            risk_score += 3
-        elif min_temp <= 0:
-            risk_score += 2
-        elif max_temp <= 5:
-            risk_score += 1
-            
-        # Snow amount factors
-        if snow_amount >= 15:
-            risk_score += 4
-        elif snow_amount >= 8:
-            risk_score += 3
-        elif snow_amount >= 3:
-            risk_score += 2
-        elif snow_amount > 0:
-            risk_score += 1
-            
-        # Wind factors
-        if wind_speed >= 50:
-            risk_score += 2
-        elif wind_speed >= 30:
-            risk_score += 1
-            
-        # Determine risk level
-        if risk_score >= 6:
-            return "high"
-        elif risk_score >= 3:
-            return "medium"
-        else:
-            return "low"
+        _, risk_level = score_snow_risk(
+            min(day_data['temps']),
+            max(day_data['temps']),
+            day_data['precipitation']['snow'],
+            sum(day_data['wind']) / len(day_data['wind'])
+        )
+        return str(risk_level)
 
     def _get_mock_current_weather(self) -> Dict:
         """Return mock current weather data for demo"""
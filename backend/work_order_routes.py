@@ -13,6 +13,8 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
 from event_emitter import get_event_emitter
+from customer_summary import customer_summary
+from metric_rollups import metric_rollups
 
 load_dotenv()
 
@@ -190,6 +192,7 @@ async def update_work_order(work_order_id: str, updates: WorkOrderUpdate):
             raise HTTPException(status_code=404, detail="Work order not found")
         
         updated_wo = await work_orders_collection.find_one({"_id": object_id})
+        await metric_rollups.source_changed("work_orders", updated_wo)
         
         return {"success": True, "work_order": serialize_doc(updated_wo)}
     except HTTPException:
@@ -204,10 +207,17 @@ async def delete_work_order(work_order_id: str):
     try:
         object_id = validate_object_id(work_order_id, "Work Order")
         
-        result = await work_orders_collection.delete_one({"_id": object_id})
+        deleted = await work_orders_collection.find_one_and_delete({"_id": object_id}, {"created_at": 1})
         
-        if result.deleted_count == 0:
+        if deleted is None:
             raise HTTPException(status_code=404, detail="Work order not found")
+        await metric_rollups.source_changed("work_orders", deleted)
+        
+        # Tombstone so incremental dispatch board clients drop it
+        await db.work_order_deletions.insert_one({
+            "work_order_id": work_order_id,
+            "deleted_at": datetime.utcnow()
+        })
         
         return {"success": True, "message": "Work order deleted successfully"}
     except HTTPException:
@@ -450,11 +460,12 @@ async def generate_invoice_from_work_order(work_order_id: str):
         
         result = await invoices_collection.insert_one(invoice_dict)
         invoice_dict["id"] = str(result.inserted_id)
+        await customer_summary.invoice_created(invoice_dict)
         
         # Update work order to mark it as invoiced
         await work_orders_collection.update_one(
             {"_id": object_id},
-            {"$set": {"invoice_id": str(result.inserted_id), "invoiced": True}}
+            {"$set": {"invoice_id": str(result.inserted_id), "invoiced": True, "updated_at": datetime.utcnow()}}
         )
         
         return {
@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 from bson import ObjectId
 from enum import Enum
+from log_sink import log_sink
 
 logger = logging.getLogger(__name__)
 
@@ -71,11 +72,12 @@ class WorkflowAuditLogger:
                 'user_agent': metadata.get('user_agent') if metadata else None
             }
             
-            result = await self.db.workflow_audit_logs.insert_one(audit_entry)
+            # Buffered: written with the next batch
+            audit_id = await log_sink.write(self.db.workflow_audit_logs, audit_entry)
             
             logger.info(f"Audit event logged: {event_type.value} for workflow {workflow_id}")
             
-            return str(result.inserted_id)
+            return str(audit_id)
             
         except Exception as e:
             logger.error(f"Error logging audit event: {str(e)}")
@@ -357,6 +359,28 @@ class WorkflowAuditLogger:
                 'error': str(e)
             }
     
+    def build_export_query(
+        self,
+        workflow_id: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Query selecting the audit logs to export"""
+        query = {}
+        
+        if workflow_id:
+            query['workflow_id'] = workflow_id
+        
+        if start_date or end_date:
+            date_query = {}
+            if start_date:
+                date_query['$gte'] = start_date
+            if end_date:
+                date_query['$lte'] = end_date
+            query['timestamp'] = date_query
+        
+        return query
+    
     async def export_audit_logs(
         self,
         workflow_id: Optional[str] = None,
@@ -377,19 +401,7 @@ class WorkflowAuditLogger:
             Audit logs in requested format
         """
         try:
-            query = {}
-            
-            if workflow_id:
-                query['workflow_id'] = workflow_id
-            
-            if start_date or end_date:
-                date_query = {}
-                if start_date:
-                    date_query['$gte'] = start_date
-                if end_date:
-                    date_query['$lte'] = end_date
-                if date_query:
-                    query['timestamp'] = date_query
+            query = self.build_export_query(workflow_id, start_date, end_date)
             
             logs = await self.db.workflow_audit_logs.find(query).sort(
                 'timestamp', 1
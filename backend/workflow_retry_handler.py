@@ -9,6 +9,8 @@ from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 from enum import Enum
 from bson import ObjectId
+from log_sink import log_sink
+from workflow_tracing import record_retry
 
 logger = logging.getLogger(__name__)
 
@@ -102,17 +104,18 @@ class WorkflowRetryHandler:
                     raise
                 
                 # Calculate delay based on retry strategy
-                delay = self._calculate_delay(retry_strategy, attempt)
+                delay = self.calculate_delay(retry_strategy, attempt)
                 
                 logger.info(f"Retrying action '{action_name}' in {delay} seconds...")
+                record_retry()
                 await asyncio.sleep(delay)
         
         # Should not reach here, but just in case
         if last_error:
             raise last_error
     
-    def _calculate_delay(self, strategy: RetryStrategy, attempt: int) -> float:
-        """Calculate delay before next retry based on strategy"""
+    def calculate_delay(self, strategy: RetryStrategy, attempt: int) -> float:
+        """Calculate delay before next retry based on strategy (attempt counts from 0)"""
         if strategy == RetryStrategy.NONE:
             return 0
         elif strategy == RetryStrategy.IMMEDIATE:
@@ -146,7 +149,7 @@ class WorkflowRetryHandler:
                 'timestamp': datetime.utcnow()
             }
             
-            await self.db.workflow_action_attempts.insert_one(log_entry)
+            await log_sink.write(self.db.workflow_action_attempts, log_entry)
         except Exception as e:
             logger.error(f"Failed to log action attempt: {str(e)}")
     
@@ -6,6 +6,7 @@ Pre-built, production-ready workflow templates for common business scenarios
 import logging
 from typing import List, Dict, Any, Optional
 from datetime import datetime
+from event_emitter import invalidate_subscriptions
 
 logger = logging.getLogger(__name__)
 
@@ -86,6 +87,7 @@ class WorkflowTemplateLibrary:
         from bson import ObjectId
         result = await self.db.custom_workflows.insert_one(workflow_data)
         workflow_data['id'] = str(result.inserted_id)
+        invalidate_subscriptions()
         
         logger.info(f"Instantiated template {template_id} as workflow {workflow_data['id']}")
         
@@ -100,7 +102,7 @@ class WorkflowTemplateLibrary:
                 'name': 'Customer Arrival Notification',
                 'description': 'Automatically notify customers when crew arrives at their site via geofence',
                 'categories': ['customer_communication', 'geofence', 'notifications'],
-                'version': '1.0',
+                'version': '1.1',
                 'trigger': {
                     'trigger_type': 'event',
                     'event_type': 'geofence_entry'
@@ -115,6 +117,7 @@ class WorkflowTemplateLibrary:
                             'notification_type': 'info',
                             'priority': 'normal'
                         },
+                        'depends_on': [],
                         'order': 1,
                         'enabled': True
                     },
@@ -125,6 +128,7 @@ class WorkflowTemplateLibrary:
                             'phone': '{{customer_phone}}',
                             'message': 'Your crew has arrived at {{site_name}}! Service will begin shortly.'
                         },
+                        'depends_on': [],
                         'order': 2,
                         'enabled': True
                     }
@@ -136,7 +140,7 @@ class WorkflowTemplateLibrary:
                 'name': 'Service Completion Workflow',
                 'description': 'Full automation for service completion: deduct consumables, create invoice, notify customer',
                 'categories': ['service_automation', 'invoicing', 'inventory'],
-                'version': '1.0',
+                'version': '1.1',
                 'trigger': {
                     'trigger_type': 'event',
                     'event_type': 'dispatch_completed'
@@ -149,6 +153,7 @@ class WorkflowTemplateLibrary:
                             'consumable_id': '{{salt_consumable_id}}',
                             'quantity': '{{quantity_used}}'
                         },
+                        'depends_on': [],
                         'order': 1,
                         'enabled': True
                     },
@@ -162,6 +167,7 @@ class WorkflowTemplateLibrary:
                             'total': '{{total_amount}}',
                             'line_items': []
                         },
+                        'depends_on': [],
                         'order': 2,
                         'enabled': True
                     },
@@ -173,6 +179,7 @@ class WorkflowTemplateLibrary:
                             'subject': 'Service Complete - Invoice #{{invoice_number}}',
                             'body': 'Thank you for using our services! Your invoice is attached.'
                         },
+                        'depends_on': ['Generate Invoice'],
                         'order': 3,
                         'enabled': True
                     }
@@ -186,7 +193,7 @@ class WorkflowTemplateLibrary:
                 'name': 'Daily Equipment Safety Check',
                 'description': 'Send daily reminder to crew for equipment inspection',
                 'categories': ['equipment', 'safety', 'compliance'],
-                'version': '1.0',
+                'version': '1.1',
                 'trigger': {
                     'trigger_type': 'scheduled',
                     'config': {'schedule': '0 7 * * *'}  # 7 AM daily
@@ -201,6 +208,7 @@ class WorkflowTemplateLibrary:
                             'priority': 'high',
                             'recipient_role': 'crew'
                         },
+                        'depends_on': [],
                         'order': 1,
                         'enabled': True
                     },
@@ -213,6 +221,7 @@ class WorkflowTemplateLibrary:
                             'priority': 'high',
                             'due_date': '{{today}}'
                         },
+                        'depends_on': [],
                         'order': 2,
                         'enabled': True
                     }
@@ -224,7 +233,7 @@ class WorkflowTemplateLibrary:
                 'name': 'Equipment Inspection Alert',
                 'description': 'Alert when equipment inspection is due based on hours or date',
                 'categories': ['equipment', 'maintenance', 'compliance'],
-                'version': '1.0',
+                'version': '1.1',
                 'trigger': {
                     'trigger_type': 'event',
                     'event_type': 'equipment_inspection_due'
@@ -239,6 +248,7 @@ class WorkflowTemplateLibrary:
                             'priority': 'high',
                             'recipient_role': 'admin'
                         },
+                        'depends_on': [],
                         'order': 1,
                         'enabled': True
                     },
@@ -249,6 +259,7 @@ class WorkflowTemplateLibrary:
                             'equipment_id': '{{equipment_id}}',
                             'status': 'inspection_due'
                         },
+                        'depends_on': [],
                         'order': 2,
                         'enabled': True
                     }
@@ -262,7 +273,7 @@ class WorkflowTemplateLibrary:
                 'name': 'Low Stock Alert & Auto-Reorder',
                 'description': 'Alert admins when stock is low and optionally create purchase order',
                 'categories': ['inventory', 'procurement', 'alerts'],
-                'version': '1.0',
+                'version': '1.1',
                 'trigger': {
                     'trigger_type': 'event',
                     'event_type': 'stock_below_threshold'
@@ -277,6 +288,7 @@ class WorkflowTemplateLibrary:
                             'priority': 'high',
                             'recipient_role': 'admin'
                         },
+                        'depends_on': [],
                         'order': 1,
                         'enabled': True
                     },
@@ -288,6 +300,7 @@ class WorkflowTemplateLibrary:
                             'subject': 'Reorder Required: {{item_name}}',
                             'body': 'Stock level for {{item_name}} has fallen below threshold. Current: {{current_stock}}, Reorder level: {{reorder_level}}'
                         },
+                        'depends_on': [],
                         'order': 2,
                         'enabled': True
                     }
@@ -301,7 +314,7 @@ class WorkflowTemplateLibrary:
                 'name': 'Weather Alert & Crew Mobilization',
                 'description': 'Alert crew and prepare for incoming weather event',
                 'categories': ['weather', 'dispatch', 'alerts'],
-                'version': '1.0',
+                'version': '1.1',
                 'trigger': {
                     'trigger_type': 'event',
                     'event_type': 'weather_alert_received'
@@ -316,6 +329,7 @@ class WorkflowTemplateLibrary:
                             'priority': 'high',
                             'recipient_role': 'crew'
                         },
+                        'depends_on': [],
                         'order': 1,
                         'enabled': True
                     },
@@ -326,6 +340,7 @@ class WorkflowTemplateLibrary:
                             'phone': '{{crew_phone}}',
                             'message': 'WEATHER ALERT: {{alert_type}} expected in {{hours}}h. Stand by for dispatch.'
                         },
+                        'depends_on': [],
                         'order': 2,
                         'enabled': True
                     }
@@ -339,7 +354,7 @@ class WorkflowTemplateLibrary:
                 'name': 'Project Kickoff Automation',
                 'description': 'Automate project start: create tasks, notify team, send welcome email',
                 'categories': ['project_management', 'team_coordination'],
-                'version': '1.0',
+                'version': '1.1',
                 'trigger': {
                     'trigger_type': 'event',
                     'event_type': 'project_started'
@@ -354,6 +369,7 @@ class WorkflowTemplateLibrary:
                             'assigned_to': '{{project_manager_id}}',
                             'priority': 'high'
                         },
+                        'depends_on': [],
                         'order': 1,
                         'enabled': True
                     },
@@ -365,6 +381,7 @@ class WorkflowTemplateLibrary:
                             'subject': 'Welcome to {{project_name}}',
                             'body': 'Thank you for choosing our services. Your project manager will contact you shortly.'
                         },
+                        'depends_on': [],
                         'order': 2,
                         'enabled': True
                     },
@@ -376,6 +393,7 @@ class WorkflowTemplateLibrary:
                             'message': '{{project_name}} has been initiated',
                             'recipient_role': 'admin'
                         },
+                        'depends_on': [],
                         'order': 3,
                         'enabled': True
                     }
@@ -389,7 +407,7 @@ class WorkflowTemplateLibrary:
                 'name': 'Overdue Invoice Reminder',
                 'description': 'Automatically send reminders for overdue invoices',
                 'categories': ['finance', 'collections', 'customer_communication'],
-                'version': '1.0',
+                'version': '1.1',
                 'trigger': {
                     'trigger_type': 'scheduled',
                     'config': {'schedule': '0 9 * * *'}  # 9 AM daily
@@ -403,6 +421,7 @@ class WorkflowTemplateLibrary:
                             'subject': 'Payment Reminder - Invoice #{{invoice_number}}',
                             'body': 'This is a friendly reminder that Invoice #{{invoice_number}} for ${{amount}} is now {{days_overdue}} days overdue.'
                         },
+                        'depends_on': [],
                         'order': 1,
                         'enabled': True
                     },
@@ -414,6 +433,7 @@ class WorkflowTemplateLibrary:
                             'message': 'Invoice #{{invoice_number}} is {{days_overdue}} days overdue',
                             'recipient_role': 'admin'
                         },
+                        'depends_on': [],
                         'order': 2,
                         'enabled': True
                     }
@@ -427,7 +447,7 @@ class WorkflowTemplateLibrary:
                 'name': 'External System Webhook Handler',
                 'description': 'Process webhooks from external systems and trigger internal workflows',
                 'categories': ['integration', 'webhooks', 'automation'],
-                'version': '1.0',
+                'version': '1.1',
                 'trigger': {
                     'trigger_type': 'webhook',
                     'config': {
@@ -444,6 +464,7 @@ class WorkflowTemplateLibrary:
                             'message': 'Received webhook from external system',
                             'recipient_role': 'admin'
                         },
+                        'depends_on': [],
                         'order': 1,
                         'enabled': True
                     },
@@ -455,6 +476,7 @@ class WorkflowTemplateLibrary:
                             'method': 'POST',
                             'payload': {}
                         },
+                        'depends_on': [],
                         'order': 2,
                         'enabled': True
                     }
@@ -468,7 +490,7 @@ class WorkflowTemplateLibrary:
                 'name': 'Weekly Compliance Audit Report',
                 'description': 'Generate and email weekly compliance report to management',
                 'categories': ['compliance', 'reporting', 'management'],
-                'version': '1.0',
+                'version': '1.1',
                 'trigger': {
                     'trigger_type': 'scheduled',
                     'config': {'schedule': '0 8 * * 1'}  # Monday 8 AM
@@ -482,6 +504,7 @@ class WorkflowTemplateLibrary:
                             'subject': 'Weekly Compliance Report - {{week_of}}',
                             'body': 'Please find attached the weekly compliance report for your review.'
                         },
+                        'depends_on': [],
                         'order': 1,
                         'enabled': True
                     },
@@ -493,6 +516,7 @@ class WorkflowTemplateLibrary:
                             'message': 'Weekly compliance report has been sent to management',
                             'recipient_role': 'admin'
                         },
+                        'depends_on': [],
                         'order': 2,
                         'enabled': True
                     }
@@ -0,0 +1,279 @@
+"""
+Workflow Tracing
+Span-level timing for custom workflow actions and automation engine steps,
+so a slow workflow shows whether the webhook, the email or a database
+update is responsible.
+
+A span covers one action: its duration, the database operations made
+through a traced database (count and time), external calls (count and
+time) and retries. Each run is stored as one workflow_traces document whose
+spans are fixed-order arrays (SPAN_FIELDS) rather than keyed objects,
+written through the log sink; a run parked on a DELAY action stores one
+document per segment, sharing its run_id. action_latency aggregates them
+into per-action p50/p95/p99 for the workflow analytics endpoints.
+"""
+
+import contextvars
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+from log_sink import log_sink
+
+logger = logging.getLogger(__name__)
+
+# Order of the values in each stored span
+SPAN_FIELDS = (
+    "name", "action_type", "offset_ms", "duration_ms", "failed",
+    "db_ops", "db_ms", "external_calls", "external_ms", "retries",
+)
+_FIELD = {field: index for index, field in enumerate(SPAN_FIELDS)}
+
+# Most recent traces aggregated per analytics request
+MAX_TRACES = 5000
+
+# Collection methods timed as one database round trip each
+TIMED_OPS = {
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "find_one", "find_one_and_update",
+    "find_one_and_replace", "find_one_and_delete", "count_documents", "bulk_write",
+}
+# Methods returning a cursor: counted, not timed
+CURSOR_OPS = {"find", "aggregate"}
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("workflow_trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("workflow_span", default=None)
+
+
+class Span:
+    __slots__ = SPAN_FIELDS
+
+    def __init__(self, name: str, action_type: Optional[str], offset_ms: float):
+        self.name = name
+        self.action_type = action_type
+        self.offset_ms = offset_ms
+        self.duration_ms = 0.0
+        self.failed = 0
+        self.db_ops = 0
+        self.db_ms = 0.0
+        self.external_calls = 0
+        self.external_ms = 0.0
+        self.retries = 0
+
+    def to_list(self) -> List[Any]:
+        values = [getattr(self, field) for field in SPAN_FIELDS]
+        return [round(value, 1) if isinstance(value, float) else value for value in values]
+
+
+class Trace:
+    """Spans of one workflow run, saved as a single document"""
+
+    def __init__(self, db, workflow_id: str, workflow_name: str, source: str, run_id: Optional[str] = None):
+        self.db = db
+        self.id = ObjectId()
+        self.workflow_id = workflow_id
+        self.workflow_name = workflow_name
+        self.source = source
+        self.run_id = run_id
+        self.started_at = datetime.utcnow()
+        self._started = time.perf_counter()
+        self.spans: List[Span] = []
+
+    @asynccontextmanager
+    async def span(self, name: str, action_type: Optional[str] = None):
+        """Time one action; exceptions mark it failed and propagate. A nested span's totals count toward its parent."""
+        started = time.perf_counter()
+        span = Span(name, action_type, (started - self._started) * 1000)
+        parent = _current_span.get()
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception:
+            span.failed = 1
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - started) * 1000
+            _current_span.reset(token)
+            self.spans.append(span)
+            if parent is not None:
+                for field in ("db_ops", "db_ms", "external_calls", "external_ms", "retries"):
+                    setattr(parent, field, getattr(parent, field) + getattr(span, field))
+
+    async def save(self, status: str):
+        if not self.spans:
+            return
+        await log_sink.write(self.db.workflow_traces, {
+            "_id": self.id,
+            "workflow_id": self.workflow_id,
+            "workflow_name": self.workflow_name,
+            "source": self.source,
+            "run_id": self.run_id,
+            "status": status,
+            "started_at": self.started_at,
+            "duration_ms": round((time.perf_counter() - self._started) * 1000, 1),
+            "spans": [span.to_list() for span in sorted(self.spans, key=lambda s: s.offset_ms)],
+        })
+
+
+def start_trace(trace: Trace) -> contextvars.Token:
+    """Make trace the one span() records into, for code that can't be handed it"""
+    return _current_trace.set(trace)
+
+
+def end_trace(token: contextvars.Token):
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@asynccontextmanager
+async def span(name: str, action_type: Optional[str] = None):
+    """A span in the current trace; does nothing outside one"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    async with trace.span(name, action_type) as current:
+        yield current
+
+
+@asynccontextmanager
+async def external_call():
+    """Time a call to an outside service against the current span"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        current = _current_span.get()
+        if current is not None:
+            current.external_calls += 1
+            current.external_ms += (time.perf_counter() - started) * 1000
+
+
+def record_retry():
+    current = _current_span.get()
+    if current is not None:
+        current.retries += 1
+
+
+class _TracedCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in TIMED_OPS:
+            async def timed(*args, **kwargs):
+                current = _current_span.get()
+                if current is None:
+                    return await attr(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return await attr(*args, **kwargs)
+                finally:
+                    current.db_ops += 1
+                    current.db_ms += (time.perf_counter() - started) * 1000
+            return timed
+        if name in CURSOR_OPS:
+            def counted(*args, **kwargs):
+                current = _current_span.get()
+                if current is not None:
+                    current.db_ops += 1
+                return attr(*args, **kwargs)
+            return counted
+        return attr
+
+
+class TracedDatabase:
+    """Database whose collections count their operations against the current span"""
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getattr__(self, name):
+        return self._wrap(getattr(self._db, name))
+
+    def __getitem__(self, name):
+        return self._wrap(self._db[name])
+
+    @staticmethod
+    def _wrap(attr):
+        # Only collections have a string full_name; on a database or client it names a child
+        if isinstance(getattr(attr, "full_name", None), str):
+            return _TracedCollection(attr)
+        return attr
+
+
+def _percentile(samples: Iterable[float], fraction: float) -> Optional[float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 1)
+
+
+def _percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "p50": _percentile(samples, 0.5),
+        "p95": _percentile(samples, 0.95),
+        "p99": _percentile(samples, 0.99),
+        "max": round(max(samples), 1) if samples else None,
+    }
+
+
+def _field(name: str) -> Dict:
+    return {"$arrayElemAt": ["$spans", _FIELD[name]]}
+
+
+async def action_latency(db, workflow_id: str, days: int = 30) -> Dict[str, Any]:
+    """Per-action duration, database and external-call percentiles from the most recent traces"""
+    match = {"workflow_id": workflow_id, "started_at": {"$gte": datetime.utcnow() - timedelta(days=days)}}
+    recent = [{"$match": match}, {"$sort": {"started_at": -1}}, {"$limit": MAX_TRACES}]
+
+    runs = await db.workflow_traces.aggregate(recent + [
+        # Segments of a parked run add up to one run
+        {"$group": {"_id": {"$ifNull": ["$run_id", "$_id"]}, "duration_ms": {"$sum": "$duration_ms"}}},
+        {"$group": {"_id": None, "durations": {"$push": "$duration_ms"}}}
+    ]).to_list(None)
+    rows = await db.workflow_traces.aggregate(recent + [
+        {"$unwind": "$spans"},
+        {"$group": {
+            "_id": _field("name"),
+            "action_type": {"$first": _field("action_type")},
+            "durations": {"$push": _field("duration_ms")},
+            "failed": {"$sum": _field("failed")},
+            "db_ops": {"$avg": _field("db_ops")},
+            "db_ms": {"$push": _field("db_ms")},
+            "external_calls": {"$sum": _field("external_calls")},
+            "external_ms": {"$push": _field("external_ms")},
+            "retries": {"$sum": _field("retries")},
+        }},
+    ]).to_list(None)
+
+    actions = [
+        {
+            "action": row["_id"],
+            "action_type": row["action_type"],
+            "count": len(row["durations"]),
+            "failed": row["failed"],
+            "retries": row["retries"],
+            "duration_ms": _percentiles(row["durations"]),
+            "db_ops_avg": round(row["db_ops"] or 0, 1),
+            "db_ms": _percentiles(row["db_ms"]),
+            "external_calls": row["external_calls"],
+            "external_ms": _percentiles([ms for ms in row["external_ms"] if ms]),
+        }
+        for row in rows
+    ]
+    actions.sort(key=lambda action: action["duration_ms"]["p95"] or 0, reverse=True)
+    durations = runs[0]["durations"] if runs else []
+    return {
+        "traced_runs": len(durations),
+        "run_duration_ms": _percentiles(durations),
+        "actions": actions,
+    }
@@ -1,17 +1,48 @@
 """
 Workflow Version Control System
 Implements versioning, rollback, and change tracking for custom workflows
+
+Versions are stored compactly: every SNAPSHOT_EVERY-th version (1, 11, 21,
+...) keeps its full workflow_data, the rest only an RFC 6902 JSON patch
+from the version before. A version is rebuilt by replaying patches onto the
+nearest snapshot at or before it.
+
+Saving a version is a single insert of the full data; a queued
+workflow_version_compact job then computes its patch and drops the full copy,
+so diffing stays off the request path. Versions saved before compaction
+existed (or not yet compacted) keep workflow_data and read as snapshots.
 """
 
-import logging
 import json
+import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 from bson import ObjectId
-from deepdiff import DeepDiff
+import jsonpatch
+from event_emitter import invalidate_subscriptions
+from job_queue import job_queue
 
 logger = logging.getLogger(__name__)
 
+# Versions between full snapshots; caps the patches replayed per read
+SNAPSHOT_EVERY = 10
+
+
+def make_patch(source: Dict[str, Any], target: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """RFC 6902 patch from source to target; values may be datetimes or ObjectIds"""
+    dumps = lambda value: json.dumps(value, default=str)
+    return jsonpatch.JsonPatch.from_diff(source, target, dumps=dumps).patch
+
+
+def changes_summary(patch: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Count a JSON patch's operations the way the old DeepDiff summary did"""
+    ops = [operation['op'] for operation in patch]
+    return {
+        'values_changed': ops.count('replace') + ops.count('move'),
+        'items_added': ops.count('add') + ops.count('copy'),
+        'items_removed': ops.count('remove'),
+    }
+
 class WorkflowVersionControl:
     """
     Manages workflow versions with change tracking and rollback capability
@@ -43,18 +74,13 @@ class WorkflowVersionControl:
             # Get current version number
             latest_version = await self.db.workflow_versions.find_one(
                 {'workflow_id': workflow_id},
+                {'version_number': 1},
                 sort=[('version_number', -1)]
             )
             
             version_number = (latest_version['version_number'] + 1) if latest_version else 1
             
-            # Get previous version data for diff
-            previous_data = latest_version['workflow_data'] if latest_version else {}
-            
-            # Calculate diff
-            diff = DeepDiff(previous_data, workflow_data, ignore_order=True)
-            
-            # Create version record
+            # Stored in full until the compaction job replaces it with a patch
             version_record = {
                 'workflow_id': workflow_id,
                 'version_number': version_number,
@@ -62,7 +88,6 @@ class WorkflowVersionControl:
                 'change_description': change_description,
                 'changed_by': changed_by,
                 'changed_at': datetime.utcnow(),
-                'diff': json.loads(diff.to_json()) if diff else {},
                 'is_current': True
             }
             
@@ -75,6 +100,12 @@ class WorkflowVersionControl:
             # Insert new version
             result = await self.db.workflow_versions.insert_one(version_record)
             version_record['id'] = str(result.inserted_id)
+            del version_record['_id']
+            
+            await job_queue.enqueue('workflow_version_compact', {
+                'workflow_id': workflow_id,
+                'version_number': version_number
+            })
             
             logger.info(f"Created version {version_number} for workflow {workflow_id}")
             
@@ -84,6 +115,61 @@ class WorkflowVersionControl:
             logger.error(f"Error creating workflow version: {str(e)}")
             raise
     
+    async def compact_version(self, workflow_id: str, version_number: int) -> bool:
+        """
+        Store a version's patch from the previous version, dropping its full
+        data unless it is a snapshot; False if it was already compacted
+        """
+        version = await self.db.workflow_versions.find_one({
+            'workflow_id': workflow_id,
+            'version_number': version_number,
+            'patch': {'$exists': False}
+        })
+        if not version:
+            return False
+        
+        previous = await self.rebuild_version(workflow_id, version_number - 1) if version_number > 1 else {}
+        patch = make_patch(previous or {}, version['workflow_data'])
+        update = {'$set': {'patch': patch, 'changes_summary': changes_summary(patch)}}
+        # A version after a gap in the history stays a snapshot
+        if (version_number - 1) % SNAPSHOT_EVERY and previous is not None:
+            update['$unset'] = {'workflow_data': ''}
+        
+        await self.db.workflow_versions.update_one({'_id': version['_id'], 'patch': {'$exists': False}}, update)
+        return True
+    
+    async def rebuild_version(self, workflow_id: str, version_number: int) -> Optional[Dict[str, Any]]:
+        """Workflow data of a version: the nearest snapshot with later patches replayed onto it"""
+        snapshot = await self.db.workflow_versions.find_one(
+            {
+                'workflow_id': workflow_id,
+                'version_number': {'$lte': version_number},
+                'workflow_data': {'$exists': True}
+            },
+            {'version_number': 1, 'workflow_data': 1},
+            sort=[('version_number', -1)]
+        )
+        if not snapshot:
+            return None
+        
+        data = snapshot['workflow_data']
+        if snapshot['version_number'] == version_number:
+            return data
+        
+        patches = await self.db.workflow_versions.find(
+            {
+                'workflow_id': workflow_id,
+                'version_number': {'$gt': snapshot['version_number'], '$lte': version_number}
+            },
+            {'version_number': 1, 'patch': 1}
+        ).sort('version_number', 1).to_list(None)
+        if not patches or patches[-1]['version_number'] != version_number:
+            return None
+        
+        for version in patches:
+            data = jsonpatch.apply_patch(data, version['patch'])
+        return data
+    
     async def get_version_history(
         self,
         workflow_id: str,
@@ -139,6 +225,8 @@ class WorkflowVersionControl:
             if version:
                 version['id'] = str(version['_id'])
                 del version['_id']
+                if 'workflow_data' not in version:
+                    version['workflow_data'] = await self.rebuild_version(workflow_id, version_number)
             
             return version
             
@@ -197,6 +285,7 @@ class WorkflowVersionControl:
                 {'_id': ObjectId(workflow_id)},
                 {'$set': update_data}
             )
+            invalidate_subscriptions()
             
             # Create a new version record for the rollback
             await self.create_version(
@@ -232,32 +321,37 @@ class WorkflowVersionControl:
             Diff between the two versions
         """
         try:
+            # Consecutive versions: the later one's stored patch is the diff
+            if version_b == version_a + 1:
+                stored = await self.db.workflow_versions.find_one(
+                    {'workflow_id': workflow_id, 'version_number': version_b},
+                    {'patch': 1}
+                )
+                if stored and 'patch' in stored:
+                    return self._comparison(workflow_id, version_a, version_b, stored['patch'])
+            
             # Get both versions
-            v_a = await self.get_specific_version(workflow_id, version_a)
-            v_b = await self.get_specific_version(workflow_id, version_b)
+            data_a = await self.rebuild_version(workflow_id, version_a)
+            data_b = await self.rebuild_version(workflow_id, version_b)
             
-            if not v_a or not v_b:
+            if data_a is None or data_b is None:
                 raise ValueError("One or both versions not found")
             
-            # Calculate diff
-            diff = DeepDiff(v_a['workflow_data'], v_b['workflow_data'], ignore_order=True)
-            
-            return {
-                'workflow_id': workflow_id,
-                'version_a': version_a,
-                'version_b': version_b,
-                'diff': json.loads(diff.to_json()) if diff else {},
-                'changes_summary': {
-                    'values_changed': len(diff.get('values_changed', {})),
-                    'items_added': len(diff.get('dictionary_item_added', [])) + len(diff.get('iterable_item_added', [])),
-                    'items_removed': len(diff.get('dictionary_item_removed', [])) + len(diff.get('iterable_item_removed', []))
-                }
-            }
+            return self._comparison(workflow_id, version_a, version_b, make_patch(data_a, data_b))
             
         except Exception as e:
             logger.error(f"Error comparing versions: {str(e)}")
             raise
     
+    def _comparison(self, workflow_id: str, version_a: int, version_b: int, patch: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            'workflow_id': workflow_id,
+            'version_a': version_a,
+            'version_b': version_b,
+            'diff': patch,
+            'changes_summary': changes_summary(patch)
+        }
+    
     async def get_change_summary(
         self,
         workflow_id: str,
@@ -279,7 +373,7 @@ class WorkflowVersionControl:
             versions = await self.db.workflow_versions.find({
                 'workflow_id': workflow_id,
                 'changed_at': {'$gte': start_date}
-            }).sort('version_number', -1).to_list(length=1000)
+            }, {'workflow_data': 0, 'patch': 0}).sort('version_number', -1).to_list(length=1000)
             
             # Count changes by user
             changes_by_user = {}
@@ -294,7 +388,7 @@ class WorkflowVersionControl:
                     'change_description': v['change_description'],
                     'changed_by': v['changed_by'],
                     'changed_at': v['changed_at'],
-                    'has_diff': bool(v.get('diff'))
+                    'has_diff': any(v.get('changes_summary', {}).values()) or bool(v.get('diff'))
                 }
                 for v in versions[:10]
             ]